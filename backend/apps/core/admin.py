@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Year, Month, DeliveryReportSnapshot, FinReportSnapshot
+from .models import Year, Month, DeliveryReportSnapshot, FinReportSnapshot, Employee, TimeEntry, DeliveryCubeCell
 
 
 @admin.register(Year)
@@ -30,3 +30,26 @@ class FinReportSnapshotAdmin(admin.ModelAdmin):
     list_display = ('month', 'cash_income', 'gross_profit', 'net_margin_cash', 'updated_at')
     list_filter = ('month__year',)
     readonly_fields = ('created_at', 'updated_at')
+
+
+@admin.register(Employee)
+class EmployeeAdmin(admin.ModelAdmin):
+    list_display = ('code', 'created_at')
+    search_fields = ('code',)
+    readonly_fields = ('created_at',)
+
+
+@admin.register(TimeEntry)
+class TimeEntryAdmin(admin.ModelAdmin):
+    list_display = ('employee', 'date', 'kind', 'billable', 'engagement', 'contract', 'minutes', 'revenue')
+    list_filter = ('kind', 'billable', 'engagement', 'contract')
+    search_fields = ('employee__code',)
+    raw_id_fields = ('employee', 'month')
+    date_hierarchy = 'date'
+
+
+@admin.register(DeliveryCubeCell)
+class DeliveryCubeCellAdmin(admin.ModelAdmin):
+    list_display = ('year', 'month', 'engagement', 'contract', 'total_minutes', 'billable_minutes', 'revenue')
+    list_filter = ('year', 'month', 'engagement', 'contract')
+    readonly_fields = ('updated_at',)
@@ -0,0 +1,89 @@
+"""
+Composite GET requests: several API reads answered in one round trip.
+
+/api/batch/ takes keyed sub-requests, each the path and query parameters of
+a GET endpoint under /api/, and runs them in turn against the views
+themselves. Sub-requests skip the middleware stack and authentication: they
+are made as the batch's already authenticated user (DRF's forced
+authentication), on the same thread and so on the same database connection,
+and read the same result cache. Each answer keeps its own status code, so
+one failing read does not fail the others.
+"""
+import json
+from copy import copy
+from urllib.parse import urlencode
+
+from django.http import Http404, QueryDict
+from django.urls import Resolver404, resolve
+from rest_framework.exceptions import ValidationError
+
+API_PREFIX = '/api/'
+MAX_REQUESTS = 20
+
+
+def parse_requests(payload):
+    """
+    Validate a batch payload, {"requests": {key: {"path": "/api/...",
+    "params": {...}}}}, into {key: (path, query string)}.
+    Raises ValidationError.
+    """
+    requests = payload.get('requests') if isinstance(payload, dict) else None
+    if not isinstance(requests, dict) or not requests:
+        raise ValidationError({'requests': 'A non-empty object of keyed sub-requests is required'})
+    if len(requests) > MAX_REQUESTS:
+        raise ValidationError({'requests': f'At most {MAX_REQUESTS} sub-requests per batch'})
+
+    parsed = {}
+    for key, spec in requests.items():
+        if isinstance(spec, str):
+            spec = {'path': spec}
+        path = spec.get('path') if isinstance(spec, dict) else None
+        if not isinstance(path, str) or not path.startswith(API_PREFIX) or '?' in path:
+            raise ValidationError({key: f'"path" must be an API path starting with {API_PREFIX}, without a query'})
+        params = spec.get('params') or {}
+        if not isinstance(params, dict):
+            raise ValidationError({key: '"params" must be an object'})
+        pairs = []
+        for name, value in params.items():
+            for item in value if isinstance(value, list) else [value]:
+                if isinstance(item, bool):
+                    item = str(item).lower()
+                pairs.append((name, '' if item is None else item))
+        parsed[key] = (path, urlencode(pairs))
+    return parsed
+
+
+def run_batch(request, requests):
+    """Answer each of `requests` ({key: (path, query string)}) as {key: {"status", "body"}}."""
+    return {key: _run(request, path, query) for key, (path, query) in requests.items()}
+
+
+def _run(request, path, query):
+    try:
+        match = resolve(path)
+    except Resolver404:
+        return {'status': 404, 'body': {'detail': 'Not found.'}}
+    if match.url_name == 'batch':
+        return {'status': 400, 'body': {'detail': 'Batches cannot be nested.'}}
+
+    sub = copy(request._request)
+    sub.method = 'GET'
+    sub.path = sub.path_info = path
+    sub.META = {**sub.META, 'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': query}
+    sub.GET = QueryDict(query)
+    sub.resolver_match = match
+    # Authenticated once, for the whole batch
+    sub._force_auth_user = request.user
+    sub._force_auth_token = request.auth
+
+    try:
+        response = match.func(sub, *match.args, **match.kwargs)
+    except Http404:
+        return {'status': 404, 'body': {'detail': 'Not found.'}}
+    if hasattr(response, 'data'):
+        body = response.data
+    elif response.get('Content-Type', '').startswith('application/json'):
+        body = json.loads(response.content)
+    else:
+        body = None
+    return {'status': response.status_code, 'body': body}
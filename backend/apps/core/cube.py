@@ -0,0 +1,113 @@
+"""
+Engagement model x contract type x period cube over TimeEntry.
+
+refresh_delivery_cube() maintains DeliveryCubeCell incrementally: the base
+cells of the touched months are re-aggregated from TimeEntry with one GROUP
+BY, and the rollups above them (ALL engagements, ALL contracts, whole year)
+are rebuilt from base cells only, never from the raw entries.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Q, Sum
+
+from .models import DeliveryCubeCell, Month, TimeEntry
+
+ALL = DeliveryCubeCell.ALL
+WHOLE_YEAR = DeliveryCubeCell.WHOLE_YEAR
+MEASURES = ('total_minutes', 'project_minutes', 'billable_minutes', 'revenue')
+
+# Query-string names for the dimension codes
+ENGAGEMENTS = {
+    'all': ALL,
+    'none': TimeEntry.ENGAGEMENT_NONE,
+    'outsourcing': TimeEntry.ENGAGEMENT_OUTSOURCING,
+    'outstaffing': TimeEntry.ENGAGEMENT_OUTSTAFFING,
+}
+CONTRACTS = {
+    'all': ALL,
+    'none': TimeEntry.CONTRACT_NONE,
+    'tm': TimeEntry.CONTRACT_TM,
+    'fp': TimeEntry.CONTRACT_FP,
+}
+
+
+def refresh_delivery_cube(month_ids):
+    """
+    Recompute every cube cell affected by the time entries of `month_ids`:
+    all levels of those months, and the whole-year level of their years.
+    Returns the number of cells written.
+    """
+    months = list(Month.objects.filter(pk__in=month_ids).values('id', 'year_id', 'month'))
+    if not months:
+        return 0
+    period = {m['id']: (m['year_id'], m['month']) for m in months}
+    year_ids = {year_id for year_id, _ in period.values()}
+
+    project = Q(kind=TimeEntry.KIND_PROJECT)
+    base = (
+        TimeEntry.objects
+        .filter(month_id__in=list(period))
+        .values('month_id', 'engagement', 'contract')
+        .annotate(
+            m_total=Sum('minutes'),
+            m_project=Sum('minutes', filter=project),
+            m_billable=Sum('minutes', filter=project & Q(billable=True)),
+            m_revenue=Sum('revenue'),
+        )
+        .order_by()
+    )
+
+    month_cells = defaultdict(_empty)
+    for row in base:
+        year_id, month = period[row['month_id']]
+        measures = (row['m_total'], row['m_project'], row['m_billable'], row['m_revenue'])
+        _add_rollups(month_cells, year_id, month, row['engagement'], row['contract'], measures)
+
+    touched = Q()
+    for year_id, month in period.values():
+        touched |= Q(year_id=year_id, month=month)
+
+    with transaction.atomic():
+        DeliveryCubeCell.objects.filter(touched | Q(year_id__in=year_ids, month=WHOLE_YEAR)).delete()
+        DeliveryCubeCell.objects.bulk_create(_cells(month_cells))
+
+        # Whole-year rollups from the (at most 12 x 3 x 3) base cells per year
+        year_cells = defaultdict(_empty)
+        stored = (
+            DeliveryCubeCell.objects
+            .filter(year_id__in=year_ids)
+            .exclude(month=WHOLE_YEAR)
+            .exclude(engagement=ALL)
+            .exclude(contract=ALL)
+            .values_list('year_id', 'engagement', 'contract', *MEASURES)
+        )
+        for year_id, engagement, contract, *measures in stored:
+            _add_rollups(year_cells, year_id, WHOLE_YEAR, engagement, contract, measures)
+        DeliveryCubeCell.objects.bulk_create(_cells(year_cells))
+
+    return len(month_cells) + len(year_cells)
+
+
+def _empty():
+    return [0, 0, 0, Decimal('0')]
+
+
+def _add_rollups(cells, year_id, month, engagement, contract, measures):
+    """Add one base cell's measures to itself and every rollup above it."""
+    for e in (engagement, ALL):
+        for c in (contract, ALL):
+            totals = cells[(year_id, month, e, c)]
+            for i, value in enumerate(measures):
+                totals[i] += value or 0
+
+
+def _cells(totals):
+    return [
+        DeliveryCubeCell(
+            year_id=year_id, month=month, engagement=engagement, contract=contract,
+            **dict(zip(MEASURES, values))
+        )
+        for (year_id, month, engagement, contract), values in totals.items()
+    ]
@@ -0,0 +1,273 @@
+"""
+Dashboard payloads, cached and pre-rendered after imports.
+
+dashboard_payload() builds what /api/dashboard/<year>/<month>/ returns: the
+month's snapshots and the six months of history before it. Payloads are
+kept in the result cache (utils.result_cache) tagged snapshots:<year> for
+their own year and the year before, which their history can reach, so
+expiring a year's tag expires every payload that could read it.
+
+Writes do not render anything themselves. They call schedule_warm() with
+the years (and report types) they touched; once the transaction commits,
+the tags of those years are bumped and the payloads they expired are
+rendered again, together with the default chart series of the touched
+report types (/api/reports/series/ over each touched year), so the next
+reader hits the cache. Requests within one transaction are merged into one
+warm-up, after which the changes are published to clients (apps.core.events).
+A transaction that rolls back drops its warm-up with its other on_commit
+callbacks.
+
+Rendering runs on a background thread of the process
+(DASHBOARD_WARM_ASYNC), not in the request that committed; warm-ups queued
+while one runs are merged into the next. Expired payloads are bumped at
+commit, so readers never get a stale one in the meantime; they render it
+themselves until the warm-up has run.
+"""
+import atexit
+import logging
+import queue
+import threading
+
+from django.conf import settings
+from django.db import connections, transaction
+
+from apps.reports.matrix import series
+from apps.reports.models import OrgUnit, Report, ReportType
+from apps.reports.tags import report_tags
+from utils.result_cache import results
+
+from .events import publish
+from .models import DeliveryReportSnapshot, FinReportSnapshot, Month, Year
+from .serializers import DeliveryReportSerializer, FinReportSerializer
+
+HISTORY_MONTHS = 6
+
+logger = logging.getLogger(__name__)
+
+_queue = queue.Queue()
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def dashboard_payload(year, month):
+    """
+    The dashboard of one month: its delivery and financial snapshots and the
+    chart history of the last HISTORY_MONTHS months up to it.
+    Raises Year.DoesNotExist or Month.DoesNotExist.
+    """
+    year_obj = Year.objects.get(year=year)
+    month_obj = Month.objects.select_related('delivery_report', 'fin_report').get(year=year_obj, month=month)
+
+    response_data = {
+        'year': year,
+        'month': month,
+        'month_display': month_obj.month_display,
+    }
+
+    # Get delivery report if exists
+    try:
+        response_data['delivery_report'] = DeliveryReportSerializer(month_obj.delivery_report).data
+    except DeliveryReportSnapshot.DoesNotExist:
+        response_data['delivery_report'] = None
+
+    # Get financial report if exists
+    try:
+        response_data['fin_report'] = FinReportSerializer(month_obj.fin_report).data
+    except FinReportSnapshot.DoesNotExist:
+        response_data['fin_report'] = None
+
+    # Get historical data for charts, with both snapshots joined in
+    historical_months = (
+        Month.objects
+        .filter(year__year__lte=year)
+        .select_related('year', 'delivery_report', 'fin_report')
+        .order_by('-year__year', '-month')[:HISTORY_MONTHS]
+    )
+
+    historical_data = []
+    for hist_month in reversed(list(historical_months)):
+        month_data = {
+            'month': hist_month.month_display,
+            'year': hist_month.year.year,
+        }
+
+        # Add delivery metrics if available
+        try:
+            delivery = hist_month.delivery_report
+            if delivery.revenue:
+                month_data['delivery_revenue'] = float(delivery.revenue)
+            if delivery.fte:
+                month_data['fte'] = delivery.fte
+        except DeliveryReportSnapshot.DoesNotExist:
+            pass
+
+        # Add financial metrics if available
+        try:
+            fin = hist_month.fin_report
+            if fin.cash_income:
+                month_data['cash_income'] = float(fin.cash_income)
+            if fin.accrual_income:
+                month_data['accrual_income'] = float(fin.accrual_income)
+            if fin.accrual_revenue:
+                month_data['accrual_revenue'] = float(fin.accrual_revenue)
+            if fin.gross_profit:
+                month_data['gross_profit'] = float(fin.gross_profit)
+            if fin.cogs:
+                month_data['cogs'] = float(fin.cogs)
+        except FinReportSnapshot.DoesNotExist:
+            pass
+
+        historical_data.append(month_data)
+
+    response_data['historical_data'] = historical_data
+    return response_data
+
+
+def dashboard_tags(year):
+    """Result cache tags of a month's payload: the snapshots and months of its year and the year before."""
+    return [f'snapshots:{year}', f'snapshots:{year - 1}']
+
+
+def cached_dashboard(year, month):
+    """dashboard_payload from the result cache, rendered and stored on a miss."""
+    return results.get_or_set(
+        'dashboard', {'year': year, 'month': month}, dashboard_tags(year),
+        lambda: dashboard_payload(year, month)
+    )
+
+
+def expire(years):
+    """Expire the cached payloads that read any of `years`; run once their data has committed."""
+    results.bump(*(f'snapshots:{year}' for year in years))
+
+
+def warm_dashboards(years=None):
+    """
+    Render and cache the payload of every month of `years` (default: all).
+    Returns the number of payloads cached.
+    """
+    months = Month.objects.all()
+    if years is not None:
+        months = months.filter(year__year__in=list(years))
+    count = 0
+    for year, month in months.values_list('year__year', 'month'):
+        results.set(
+            'dashboard', {'year': year, 'month': month}, dashboard_tags(year),
+            dashboard_payload(year, month)
+        )
+        count += 1
+    return count
+
+
+def warm_series(report_type, years=None):
+    """
+    Cache the default chart series of `report_type`, the company unit's
+    series over each of `years` (default: every year with reports), as the
+    result /api/reports/series/?report_type=&from=YYYY-01&to=YYYY-12 reads.
+    Returns the number of series cached.
+    """
+    reports = Report.objects.active().filter(report_type=report_type, org_unit__slug=OrgUnit.ROOT_SLUG)
+    if years is None:
+        years = reports.values_list('year__year', flat=True).distinct()
+    count = 0
+    for year in sorted(set(years)):
+        values, periods = series(report_type, reports, (year, 1), (year, 12))
+        params = {'report_type': report_type.slug, 'from': f'{year}-01', 'to': f'{year}-12'}
+        results.set(
+            'reports.series', params, report_tags(report_type.slug, [year]),
+            {'periods': periods, 'series': values}
+        )
+        count += 1
+    return count
+
+
+class _Warmup:
+    """The warm-up of one transaction: dashboards of `years`, series of {report type id: years}."""
+
+    def __init__(self):
+        self.years = set()
+        self.series = {}
+        self.committed = False
+
+    def add(self, years=(), report_type_years=None):
+        self.years.update(years)
+        for report_type_id, type_years in (report_type_years or {}).items():
+            self.series.setdefault(report_type_id, set()).update(type_years)
+
+    def __call__(self):
+        """on_commit: expire what the transaction changed, then render it off the request"""
+        self.committed = True
+        if not self.years and not self.series:
+            return
+        if self.years:
+            expire(self.years)
+        if settings.DASHBOARD_WARM_ASYNC:
+            _start_worker()
+            _queue.put(self)
+        else:
+            self.run()
+
+    def run(self):
+        """Render the expired payloads and series, then tell clients"""
+        if self.years:
+            # A year's payloads and the next year's read it
+            warm_dashboards(self.years | {year + 1 for year in self.years})
+        report_types = list(ReportType.objects.filter(pk__in=list(self.series)))
+        for report_type in report_types:
+            warm_series(report_type, self.series[report_type.pk])
+        # Tell clients, now that what they will re-fetch is warm
+        publish(self.years, {report_type: self.series[report_type.pk] for report_type in report_types})
+
+
+def schedule_warm(years=(), report_type_years=None):
+    """
+    After the current transaction commits (at once outside of one): expire
+    and re-render the dashboards that read `years`, and cache the default
+    series of {report type id: years} in `report_type_years`.
+    """
+    connection = transaction.get_connection()
+    warmup = None
+    if connection.in_atomic_block:
+        # The warm-up this transaction registered, unless a rollback discarded it
+        warmup = next((
+            func for _, func, _ in reversed(connection.run_on_commit)
+            if isinstance(func, _Warmup) and not func.committed
+        ), None)
+    if warmup is not None:
+        warmup.add(years, report_type_years)
+        return
+    warmup = _Warmup()
+    warmup.add(years, report_type_years)
+    transaction.on_commit(warmup, robust=True)
+
+
+def _start_worker():
+    global _worker
+    with _worker_lock:
+        if _worker is None:
+            _worker = threading.Thread(target=_work, name='dashboard-warmer', daemon=True)
+            _worker.start()
+            # Management commands exit right after they commit
+            atexit.register(_queue.join)
+
+
+def _work():
+    while True:
+        warmups = [_queue.get()]
+        while True:
+            try:
+                warmups.append(_queue.get_nowait())
+            except queue.Empty:
+                break
+        merged = _Warmup()
+        for warmup in warmups:
+            merged.add(warmup.years, warmup.series)
+        try:
+            merged.run()
+        except Exception:
+            logger.exception('Dashboard warm-up failed')
+        finally:
+            # Hold no connection while idle
+            connections.close_all()
+            for _ in warmups:
+                _queue.task_done()
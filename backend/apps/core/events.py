@@ -0,0 +1,143 @@
+"""
+Data-change notifications over server-sent events.
+
+Once a write commits, publish() records one DataChange per report type and
+year it changed (from apps.core.dashboard, after the caches are warm, so
+clients re-fetching on an event hit them). /api/events/ streams those rows
+to clients as they appear:
+
+    id: 42
+    event: change
+    data: {"source": "reports", "report_type": "financial", "year": 2025, "version": 17}
+
+so a client re-fetches only the report type and year that changed. The
+table is the only channel between workers: each stream polls it every
+POLL_INTERVAL seconds, which needs nothing but the database. Streams end
+after STREAM_SECONDS (the browser reconnects and resumes from its
+Last-Event-ID); a client that fell behind the retention window is sent a
+"reset" event to re-fetch everything.
+
+Under ASGI (config/asgi.py) streams are async iterators and hold no thread
+while they wait. Under WSGI (runserver) a waiting stream would hold a worker
+thread, so it sends what is pending and ends; the browser polls again after
+RECONNECT_MS.
+
+EventSource cannot send headers, so browsers authenticate with a ticket in
+the query string rather than their access token: issue_ticket() signs the
+user id for this endpoint only, valid for TICKET_SECONDS.
+"""
+import asyncio
+import json
+import time
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.core import signing
+from django.db.models import Max, Min
+from django.utils import timezone
+
+from .models import DataChange
+
+POLL_INTERVAL = 1
+KEEPALIVE_INTERVAL = 15
+STREAM_SECONDS = 300
+# Milliseconds the browser waits before reconnecting
+RECONNECT_MS = 3000
+RETENTION = timedelta(days=1)
+BATCH_SIZE = 200
+TICKET_SECONDS = 60
+TICKET_SALT = 'apps.core.events'
+
+
+def publish(years=(), report_type_years=None):
+    """
+    Record the committed changes: the snapshots of `years`, and the reports
+    of {report type: years} in `report_type_years`. Returns the rows.
+    """
+    changes = [DataChange(source=DataChange.SOURCE_SNAPSHOTS, year=year) for year in sorted(set(years))]
+    for report_type, type_years in (report_type_years or {}).items():
+        changes.extend(
+            DataChange(report_type=report_type, year=year, version=report_type.data_version)
+            for year in sorted(set(type_years))
+        )
+    if not changes:
+        return []
+    DataChange.objects.filter(created_at__lt=timezone.now() - RETENTION).delete()
+    return DataChange.objects.bulk_create(changes)
+
+
+def issue_ticket(user):
+    """A short-lived ticket authenticating `user` on the event stream."""
+    return signing.TimestampSigner(salt=TICKET_SALT).sign(str(user.pk))
+
+
+def ticket_user(ticket):
+    """The active user a ticket of issue_ticket() was issued to, or None when invalid or expired."""
+    try:
+        user_id = signing.TimestampSigner(salt=TICKET_SALT).unsign(ticket, max_age=TICKET_SECONDS)
+    except signing.BadSignature:
+        return None
+    return get_user_model().objects.filter(pk=user_id, is_active=True).first()
+
+
+def latest_id():
+    return DataChange.objects.aggregate(latest=Max('id'))['latest'] or 0
+
+
+def pending(last_id):
+    """
+    The events after `last_id` as (id, SSE message) pairs, starting with a
+    reset when events after it were already pruned.
+    """
+    events = []
+    if last_id:
+        oldest = DataChange.objects.aggregate(oldest=Min('id'))['oldest']
+        if oldest is None or oldest > last_id + 1:
+            latest = latest_id()
+            if latest > last_id:
+                return [(latest, message(latest, 'reset', {}))]
+    for change in (
+        DataChange.objects.filter(id__gt=last_id)
+        .select_related('report_type')
+        .order_by('id')[:BATCH_SIZE]
+    ):
+        events.append((change.id, message(change.id, 'change', {
+            'source': change.source,
+            'report_type': change.report_type.slug if change.report_type_id else None,
+            'year': change.year,
+            'version': change.version,
+        })))
+    return events
+
+
+def message(event_id, event, data):
+    return f'id: {event_id}\nevent: {event}\ndata: {json.dumps(data)}\n\n'
+
+
+def stream(last_id):
+    """
+    The event stream for WSGI servers: the events pending now, then the end
+    of the stream, so no worker thread waits on it.
+    """
+    yield f'retry: {RECONNECT_MS}\n\n'
+    for _, text in pending(last_id):
+        yield text
+
+
+async def astream(last_id):
+    """The event stream for ASGI servers: waits without holding a thread."""
+    yield f'retry: {RECONNECT_MS}\n\n'
+    poll = sync_to_async(pending)
+    deadline = time.monotonic() + STREAM_SECONDS
+    quiet_since = time.monotonic()
+    while True:
+        for last_id, text in await poll(last_id):
+            quiet_since = time.monotonic()
+            yield text
+        if time.monotonic() >= deadline:
+            return
+        if time.monotonic() - quiet_since >= KEEPALIVE_INTERVAL:
+            quiet_since = time.monotonic()
+            yield ': keep-alive\n\n'
+        await asyncio.sleep(POLL_INTERVAL)
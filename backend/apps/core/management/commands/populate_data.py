@@ -1,6 +1,8 @@
 from django.core.management.base import BaseCommand
 from django.contrib.auth.models import User
 from apps.core.models import Year, Month
+from apps.reports.batches import get_or_create_active_batch
+from apps.reports.dependencies import refresh_downstream
 from apps.reports.models import ReportType, Report
 from decimal import Decimal
 import random
@@ -48,6 +50,8 @@ class Command(BaseCommand):
     def generate_year_data(self, user, year_num, delivery_type, financial_type):
         # Create year
         year_obj, created = Year.objects.get_or_create(year=year_num, defaults={'created_by': user})
+        delivery_batch = get_or_create_active_batch(delivery_type, year_obj, user, source='seed')
+        financial_batch = get_or_create_active_batch(financial_type, year_obj, user, source='seed')
 
         # Base metrics that will grow over time
         base_fte = 45 + (year_num - 2024) * 5  # Start with 45, grow by 5 each year
@@ -71,6 +75,8 @@ class Command(BaseCommand):
                 base_fte, base_revenue, seasonal_multiplier, prev_month_revenue
             )
             Report.objects.create(
+                batch=delivery_batch,
+                org_unit=delivery_batch.org_unit,
                 report_type=delivery_type,
                 year=year_obj,
                 month=month_obj,
@@ -83,6 +89,8 @@ class Command(BaseCommand):
                 base_revenue, seasonal_multiplier, prev_month_revenue, prev_month_salary
             )
             Report.objects.create(
+                batch=financial_batch,
+                org_unit=financial_batch.org_unit,
                 report_type=financial_type,
                 year=year_obj,
                 month=month_obj,
@@ -94,6 +102,10 @@ class Command(BaseCommand):
             prev_month_revenue = Decimal(str(delivery_data['revenue']))
             prev_month_salary = Decimal(str(delivery_data['salary']))
 
+        months_written = {(year_obj.year, month): None for month in range(1, 13)}
+        for batch in (delivery_batch, financial_batch):
+            refresh_downstream(batch.report_type, {batch.org_unit_id: months_written}, year_ids=[year_obj.pk])
+
     def get_seasonal_multiplier(self, month_num):
         """Returns seasonal business variation (0.85 to 1.15)"""
         # Lower activity in summer (July-August) and holidays (December)
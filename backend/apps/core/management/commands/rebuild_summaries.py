@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.core.models import Year
+from apps.core.summaries import SNAPSHOT_REPORT_TYPES, refresh_report_summaries, refresh_snapshot_summaries
+from apps.reports.models import ReportType
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the annual summaries of every report type and snapshot table'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--year', type=int, action='append', dest='years', metavar='YEAR',
+            help='Year to rebuild; repeat for several (default: all)'
+        )
+
+    def handle(self, *args, **options):
+        years = Year.objects.all()
+        if options['years']:
+            years = years.filter(year__in=options['years'])
+        year_ids = list(years.values_list('pk', flat=True))
+
+        started = time.perf_counter()
+        report_types = list(ReportType.objects.all())
+        for report_type in report_types:
+            refresh_report_summaries(report_type, year_ids)
+        for model in SNAPSHOT_REPORT_TYPES:
+            refresh_snapshot_summaries(model, year_ids)
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt the summaries of {len(year_ids)} years for {len(report_types)} report types '
+            f'in {(time.perf_counter() - started) * 1000:.0f} ms'
+        ))
@@ -1,4 +1,5 @@
 from django.core.management.base import BaseCommand
+from apps.reports.dependencies import rebuild_derived
 from apps.reports.models import ReportType
 
 
@@ -17,6 +18,7 @@ class Command(BaseCommand):
         if created:
             self.stdout.write(self.style.SUCCESS(f'✓ Created: {delivery_type.name}'))
         else:
+            rebuild_derived(delivery_type)
             self.stdout.write(self.style.SUCCESS(f'✓ Updated: {delivery_type.name}'))
 
         # Create Financial Report Type
@@ -28,6 +30,7 @@ class Command(BaseCommand):
         if created:
             self.stdout.write(self.style.SUCCESS(f'✓ Created: {financial_type.name}'))
         else:
+            rebuild_derived(financial_type)
             self.stdout.write(self.style.SUCCESS(f'✓ Updated: {financial_type.name}'))
 
         total_types = ReportType.objects.count()
@@ -96,34 +99,39 @@ class Command(BaseCommand):
                 'billability_outstaffing': {'label': 'Billability Outstaffing', 'type': 'percentage', 'format': '0.00%', 'description': 'Billability for outstaffing'},
                 'billability_tm': {'label': 'Billability T&M', 'type': 'percentage', 'format': '0.00%', 'description': 'Billability for Time & Materials'},
                 'billability_fp': {'label': 'Billability FP', 'type': 'percentage', 'format': '0.00%', 'description': 'Billability for Fixed Price'},
-                'fte': {'label': 'FTE', 'type': 'integer', 'format': '0', 'description': 'Full-time equivalent employees'},
-                'av_rate_h': {'label': 'Avg Rate/Hour', 'type': 'decimal', 'format': '$0,0.00', 'description': 'Average hourly rate'},
+                'fte': {'label': 'FTE', 'type': 'integer', 'rollup': 'last', 'format': '0', 'description': 'Full-time equivalent employees'},
+                'av_rate_h': {'label': 'Avg Rate/Hour', 'type': 'decimal', 'aggregation': 'none', 'format': '$0,0.00', 'description': 'Average hourly rate'},
                 'revenue': {'label': 'Revenue', 'type': 'decimal', 'format': '$0,0.00', 'description': 'Total revenue'},
                 'revenue_growth_mtm': {'label': 'Revenue Growth MtM', 'type': 'percentage', 'format': '0.00%', 'description': 'Month-to-month revenue growth'},
                 'salary': {'label': 'Salary', 'type': 'decimal', 'format': '$0,0.00', 'description': 'Total salary costs'},
                 'salary_growth_mtm': {'label': 'Salary Growth MtM', 'type': 'percentage', 'format': '0.00%', 'description': 'Month-to-month salary growth'},
-                'av_salary_h': {'label': 'Avg Salary/Hour', 'type': 'decimal', 'format': '$0,0.00', 'description': 'Average salary per hour'},
+                'av_salary_h': {'label': 'Avg Salary/Hour', 'type': 'decimal', 'aggregation': 'none', 'format': '$0,0.00', 'description': 'Average salary per hour'},
                 'gp': {'label': 'Gross Profit', 'type': 'decimal', 'format': '$0,0.00', 'description': 'Gross profit'},
-                'gp_fte_h': {'label': 'GP/FTE/Hour', 'type': 'decimal', 'format': '$0,0.00', 'description': 'Gross profit per FTE per hour'},
-                'rev_prod_salary': {'label': 'Revenue/Salary', 'type': 'decimal', 'format': '0.00', 'description': 'Revenue to salary ratio'},
-                'gm_percent': {'label': 'Gross Margin %', 'type': 'percentage', 'format': '0.00%', 'description': 'Gross margin percentage'},
+                'gp_fte_h': {'label': 'GP/FTE/Hour', 'type': 'decimal', 'aggregation': 'none', 'format': '$0,0.00', 'description': 'Gross profit per FTE per hour'},
+                'rev_prod_salary': {'label': 'Revenue/Salary', 'type': 'decimal', 'aggregation': 'none', 'format': '0.00', 'description': 'Revenue to salary ratio'},
+                'gm_percent': {'label': 'Gross Margin %', 'type': 'percentage', 'format': '0.00%', 'description': 'Gross margin percentage', 'formula': 'gp / revenue * 100', 'persist': True},
                 'bench_cost': {'label': 'Bench Cost', 'type': 'decimal', 'format': '$0,0.00', 'description': 'Cost of bench time'},
                 'pto_cost': {'label': 'PTO Cost', 'type': 'decimal', 'format': '$0,0.00', 'description': 'Cost of PTO'},
-                'avg_revenue_outstaffing': {'label': 'Avg Revenue Outstaffing', 'type': 'decimal', 'format': '$0,0.00', 'description': 'Average revenue per outstaffing'},
-                'avg_revenue_outsourcing': {'label': 'Avg Revenue Outsourcing', 'type': 'decimal', 'format': '$0,0.00', 'description': 'Average revenue per outsourcing'},
-                'avg_income_outstaffing': {'label': 'Avg Income Outstaffing', 'type': 'decimal', 'format': '$0,0.00', 'description': 'Average income per outstaffing'},
-                'avg_income_outsourcing': {'label': 'Avg Income Outsourcing', 'type': 'decimal', 'format': '$0,0.00', 'description': 'Average income per outsourcing'},
-                'avg_revenue_tm': {'label': 'Avg Revenue T&M', 'type': 'decimal', 'format': '$0,0.00', 'description': 'Average revenue for T&M'},
-                'avg_revenue_fp': {'label': 'Avg Revenue FP', 'type': 'decimal', 'format': '$0,0.00', 'description': 'Average revenue for Fixed Price'},
-                'avg_income_tm': {'label': 'Avg Income T&M', 'type': 'decimal', 'format': '$0,0.00', 'description': 'Average income for T&M'},
-                'avg_income_fp': {'label': 'Avg Income FP', 'type': 'decimal', 'format': '$0,0.00', 'description': 'Average income for Fixed Price'},
-                'avg_income_per_employee': {'label': 'Avg Income/Employee', 'type': 'decimal', 'format': '$0,0.00', 'description': 'Average income per employee'},
-                'avg_salary_prod': {'label': 'Avg Salary (Prod)', 'type': 'decimal', 'format': '$0,0.00', 'description': 'Average production salary'},
+                'avg_revenue_outstaffing': {'label': 'Avg Revenue Outstaffing', 'type': 'decimal', 'aggregation': 'none', 'format': '$0,0.00', 'description': 'Average revenue per outstaffing'},
+                'avg_revenue_outsourcing': {'label': 'Avg Revenue Outsourcing', 'type': 'decimal', 'aggregation': 'none', 'format': '$0,0.00', 'description': 'Average revenue per outsourcing'},
+                'avg_income_outstaffing': {'label': 'Avg Income Outstaffing', 'type': 'decimal', 'aggregation': 'none', 'format': '$0,0.00', 'description': 'Average income per outstaffing'},
+                'avg_income_outsourcing': {'label': 'Avg Income Outsourcing', 'type': 'decimal', 'aggregation': 'none', 'format': '$0,0.00', 'description': 'Average income per outsourcing'},
+                'avg_revenue_tm': {'label': 'Avg Revenue T&M', 'type': 'decimal', 'aggregation': 'none', 'format': '$0,0.00', 'description': 'Average revenue for T&M'},
+                'avg_revenue_fp': {'label': 'Avg Revenue FP', 'type': 'decimal', 'aggregation': 'none', 'format': '$0,0.00', 'description': 'Average revenue for Fixed Price'},
+                'avg_income_tm': {'label': 'Avg Income T&M', 'type': 'decimal', 'aggregation': 'none', 'format': '$0,0.00', 'description': 'Average income for T&M'},
+                'avg_income_fp': {'label': 'Avg Income FP', 'type': 'decimal', 'aggregation': 'none', 'format': '$0,0.00', 'description': 'Average income for Fixed Price'},
+                'avg_income_per_employee': {'label': 'Avg Income/Employee', 'type': 'decimal', 'aggregation': 'none', 'format': '$0,0.00', 'description': 'Average income per employee'},
+                'avg_salary_prod': {'label': 'Avg Salary (Prod)', 'type': 'decimal', 'aggregation': 'none', 'format': '$0,0.00', 'description': 'Average production salary'},
             },
             'display_config': {
                 'table_columns': ['month', 'fte', 'revenue', 'salary', 'gp', 'gm_percent'],
                 'summary_fields': ['revenue', 'salary', 'gp'],
-            }
+            },
+            'checks': [
+                {'name': 'Base hours', 'rule': 'base_hours = total_spent - pto', 'tolerance': 1},
+                {'name': 'Utilization (excl. PTO)', 'rule': 'utilization_excl_pto = project_hours / base_hours * 100', 'tolerance': 0.05},
+                {'name': 'Utilization (incl. PTO)', 'rule': 'utilization_incl_pto = project_hours / total_spent * 100', 'tolerance': 0.05},
+            ],
         }
 
     def get_financial_config(self):
@@ -163,28 +171,40 @@ class Command(BaseCommand):
             },
             'field_schema': {
                 'accrual_revenue': {'label': 'Accrual Revenue', 'type': 'decimal', 'format': '$0,0.00', 'description': 'Accrual revenue from QBO'},
+                'accrual_revenue_mtm_percent': {'label': 'Accrual Revenue MtM %', 'type': 'percentage', 'format': '0.00%', 'description': 'Accrual revenue change from the previous month', 'formula': '(accrual_revenue - prev(accrual_revenue)) / prev(accrual_revenue) * 100', 'persist': True},
                 'accrual_income': {'label': 'Accrual Income', 'type': 'decimal', 'format': '$0,0.00', 'description': 'Accrual income from Jira'},
                 'cash_income': {'label': 'Cash Income', 'type': 'decimal', 'format': '$0,0.00', 'description': 'Cash income'},
+                'cash_income_ytd': {'label': 'Cash Income YTD', 'type': 'decimal', 'rollup': 'last', 'format': '$0,0.00', 'description': 'Cash income since January', 'formula': 'ytd(cash_income)', 'persist': True},
                 'sales_commissions': {'label': 'Sales Commissions', 'type': 'decimal', 'format': '$0,0.00', 'description': 'Sales commissions'},
                 'cogs': {'label': 'COGS', 'type': 'decimal', 'format': '$0,0.00', 'description': 'Cost of goods sold'},
                 'gross_profit': {'label': 'Gross Profit', 'type': 'decimal', 'format': '$0,0.00', 'description': 'Gross profit'},
-                'gross_margin_percent': {'label': 'Gross Margin %', 'type': 'percentage', 'format': '0.00%', 'description': 'Gross margin percentage'},
+                'gross_margin_percent': {'label': 'Gross Margin %', 'type': 'percentage', 'format': '0.00%', 'description': 'Gross margin percentage', 'formula': 'gross_profit / accrual_revenue * 100', 'persist': True},
                 'overhead': {'label': 'Overhead', 'type': 'decimal', 'format': '$0,0.00', 'description': 'Overhead costs'},
-                'production_team_fte': {'label': 'Production Team FTE', 'type': 'integer', 'format': '0', 'description': 'Production team full-time equivalents'},
-                'overhead_by_fte': {'label': 'Overhead by FTE', 'type': 'decimal', 'format': '$0,0.00', 'description': 'Overhead cost per FTE'},
+                'production_team_fte': {'label': 'Production Team FTE', 'type': 'integer', 'rollup': 'last', 'format': '0', 'description': 'Production team full-time equivalents'},
+                'overhead_by_fte': {'label': 'Overhead by FTE', 'type': 'decimal', 'aggregation': 'none', 'format': '$0,0.00', 'description': 'Overhead cost per FTE', 'formula': 'overhead / production_team_fte', 'persist': True},
                 'net_margin_before_tax': {'label': 'Net Margin (Before Tax)', 'type': 'decimal', 'format': '$0,0.00', 'description': 'Net margin before tax'},
                 'net_margin_before_tax_jira': {'label': 'Net Margin (Jira)', 'type': 'decimal', 'format': '$0,0.00', 'description': 'Net margin before tax from Jira'},
                 'net_margin_cash': {'label': 'Net Margin (Cash)', 'type': 'decimal', 'format': '$0,0.00', 'description': 'Net margin cash basis'},
+                'profit_margin': {'label': 'Profit Margin %', 'type': 'percentage', 'format': '0.00%', 'description': 'Net cash margin as a share of cash income', 'formula': 'net_margin_cash / cash_income * 100'},
                 'income_tax': {'label': 'Income Tax', 'type': 'decimal', 'format': '$0,0.00', 'description': 'Income tax'},
                 'dividends_to_be_paid': {'label': 'Dividends To Be Paid', 'type': 'decimal', 'format': '$0,0.00', 'description': 'Dividends to be paid'},
                 'paid_dividends': {'label': 'Paid Dividends', 'type': 'decimal', 'format': '$0,0.00', 'description': 'Dividends already paid'},
                 'dividends_percent': {'label': 'Dividends %', 'type': 'percentage', 'format': '0.00%', 'description': 'Dividends percentage'},
                 'emergency_fund_to_be_saved': {'label': 'Emergency Fund (To Save)', 'type': 'decimal', 'format': '$0,0.00', 'description': 'Emergency fund to be saved'},
                 'emergency_fund_saved': {'label': 'Emergency Fund (Saved)', 'type': 'decimal', 'format': '$0,0.00', 'description': 'Emergency fund already saved'},
+                'emergency_fund_saved_ytd': {'label': 'Emergency Fund Saved YTD', 'type': 'decimal', 'rollup': 'last', 'format': '$0,0.00', 'description': 'Emergency fund saved since January', 'formula': 'ytd(emergency_fund_saved)', 'persist': True},
                 'emergency_fund_percent': {'label': 'Emergency Fund %', 'type': 'percentage', 'format': '0.00%', 'description': 'Emergency fund percentage'},
             },
             'display_config': {
                 'table_columns': ['month', 'accrual_revenue', 'gross_profit', 'net_margin_before_tax'],
                 'summary_fields': ['accrual_revenue', 'gross_profit', 'net_margin_before_tax'],
-            }
+            },
+            'checks': [
+                {'name': 'Gross profit', 'rule': 'gross_profit = accrual_revenue - cogs', 'tolerance': 1},
+                {'name': 'Overhead by FTE', 'rule': 'overhead_by_fte = overhead / production_team_fte', 'tolerance': 0.01},
+                {'name': 'Net margin before tax', 'rule': 'net_margin_before_tax = accrual_revenue - cogs - overhead', 'tolerance': 1},
+                {'name': 'Net margin before tax (Jira)', 'rule': 'net_margin_before_tax_jira = accrual_income - cogs - overhead', 'tolerance': 1},
+                {'name': 'Net margin (cash)', 'rule': 'net_margin_cash = cash_income - cogs - overhead', 'tolerance': 1},
+                {'name': 'Emergency fund saved', 'rule': 'emergency_fund_saved = net_margin_cash - paid_dividends', 'tolerance': 1},
+            ],
         }
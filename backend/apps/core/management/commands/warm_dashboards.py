@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.core.dashboard import warm_dashboards, warm_series
+from apps.reports.models import ReportType
+
+
+class Command(BaseCommand):
+    help = 'Pre-render the dashboard of every month and the default chart series of every year into the cache'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--year', type=int, action='append', dest='years', metavar='YEAR',
+            help='Year to warm; repeat for several (default: all)'
+        )
+
+    def handle(self, *args, **options):
+        years = options['years']
+        started = time.perf_counter()
+        dashboards = warm_dashboards(years)
+        series = sum(warm_series(report_type, years) for report_type in ReportType.objects.all())
+        self.stdout.write(self.style.SUCCESS(
+            f'Cached {dashboards} dashboards and {series} chart series '
+            f'in {(time.perf_counter() - started) * 1000:.0f} ms'
+        ))
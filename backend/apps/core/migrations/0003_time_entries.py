@@ -0,0 +1,47 @@
+# Generated by Django 4.2.27 on 2026-10-19 10:37
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_remove_deliveryreportsnapshot_delivery_accuracy_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Employee',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('code', models.CharField(max_length=100, unique=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Employee',
+                'verbose_name_plural': 'Employees',
+                'ordering': ['code'],
+            },
+        ),
+        migrations.CreateModel(
+            name='TimeEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('kind', models.PositiveSmallIntegerField(choices=[(1, 'Project'), (2, 'Internal'), (3, 'PTO')])),
+                ('billable', models.BooleanField(default=False)),
+                ('engagement', models.PositiveSmallIntegerField(choices=[(0, '-'), (1, 'Outsourcing'), (2, 'Outstaffing')], default=0)),
+                ('contract', models.PositiveSmallIntegerField(choices=[(0, '-'), (1, 'T&M'), (2, 'Fixed Price')], default=0)),
+                ('minutes', models.PositiveIntegerField()),
+                ('employee', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='time_entries', to='core.employee')),
+                ('month', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='time_entries', to='core.month')),
+            ],
+            options={
+                'verbose_name': 'Time Entry',
+                'verbose_name_plural': 'Time Entries',
+                'indexes': [models.Index(fields=['month', 'employee'], name='core_timeen_month_i_26a5b0_idx')],
+                'unique_together': {('employee', 'date', 'kind', 'billable', 'engagement', 'contract')},
+            },
+        ),
+    ]
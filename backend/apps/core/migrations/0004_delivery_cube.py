@@ -0,0 +1,40 @@
+# Generated by Django 4.2.27 on 2026-10-19 10:42
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_time_entries'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='timeentry',
+            name='revenue',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.CreateModel(
+            name='DeliveryCubeCell',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.PositiveSmallIntegerField(help_text='1-12, or 0 for the whole year')),
+                ('engagement', models.SmallIntegerField(help_text='TimeEntry engagement code, or -1 for all')),
+                ('contract', models.SmallIntegerField(help_text='TimeEntry contract code, or -1 for all')),
+                ('total_minutes', models.BigIntegerField(default=0)),
+                ('project_minutes', models.BigIntegerField(default=0)),
+                ('billable_minutes', models.BigIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('year', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='delivery_cube', to='core.year')),
+            ],
+            options={
+                'verbose_name': 'Delivery Cube Cell',
+                'verbose_name_plural': 'Delivery Cube Cells',
+                'ordering': ['year', 'month', 'engagement', 'contract'],
+                'unique_together': {('year', 'month', 'engagement', 'contract')},
+            },
+        ),
+    ]
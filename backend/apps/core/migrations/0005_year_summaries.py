@@ -0,0 +1,39 @@
+# Generated by Django 4.2.27 on 2026-10-19 11:21
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+# Summaries of existing data are built by `manage.py rebuild_summaries`, so
+# this migration does not depend on the application code computing them
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0007_report_rollups'),
+        ('core', '0004_delivery_cube'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='YearSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(choices=[('reports', 'Reports'), ('snapshots', 'Snapshots')], default='reports', max_length=10)),
+                ('months', models.JSONField(default=list, help_text='Month numbers with data, e.g. [1, 2, 3]')),
+                ('totals', models.JSONField(default=dict)),
+                ('averages', models.JSONField(default=dict)),
+                ('minimums', models.JSONField(default=dict, help_text='{"field": {"month": 3, "value": 10.5}}')),
+                ('maximums', models.JSONField(default=dict, help_text='{"field": {"month": 7, "value": 42.0}}')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('report_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='year_summaries', to='reports.reporttype')),
+                ('year', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='summaries', to='core.year')),
+            ],
+            options={
+                'verbose_name': 'Year Summary',
+                'verbose_name_plural': 'Year Summaries',
+                'ordering': ['-year__year', 'report_type__slug', 'source'],
+                'unique_together': {('year', 'report_type', 'source')},
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.27 on 2026-10-19 11:37
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0007_report_rollups'),
+        ('core', '0005_year_summaries'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DataChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(choices=[('reports', 'Reports'), ('snapshots', 'Snapshots')], default='reports', max_length=10)),
+                ('year', models.PositiveIntegerField()),
+                ('version', models.PositiveIntegerField(blank=True, help_text="The report type's data_version once the change committed", null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('report_type', models.ForeignKey(blank=True, help_text='Changed report type; empty for snapshot changes', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='changes', to='reports.reporttype')),
+            ],
+            options={
+                'verbose_name': 'Data Change',
+                'verbose_name_plural': 'Data Changes',
+                'ordering': ['id'],
+            },
+        ),
+    ]
@@ -178,3 +178,187 @@ class FinReportSnapshot(models.Model):
         if self.cash_income and self.cash_income > 0:
             return (self.net_margin_cash / self.cash_income) * 100
         return 0
+
+
+class Employee(models.Model):
+    """A person appearing in timesheet exports, identified by the export's employee code."""
+    code = models.CharField(max_length=100, unique=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['code']
+        verbose_name = 'Employee'
+        verbose_name_plural = 'Employees'
+
+    def __str__(self):
+        return self.code
+
+
+class TimeEntry(models.Model):
+    """
+    Hours one employee logged on one day, summed per category.
+    Raw input for the hour-based delivery metrics (total spent, PTO, base,
+    project and billable hours, utilization, billability, FTE), which are
+    rolled up per month into DeliveryReportSnapshot.
+    Kept narrow (small-int codes, minutes as an integer) since a year holds
+    millions of rows.
+    """
+    KIND_PROJECT = 1
+    KIND_INTERNAL = 2
+    KIND_PTO = 3
+    KIND_CHOICES = [
+        (KIND_PROJECT, 'Project'),
+        (KIND_INTERNAL, 'Internal'),
+        (KIND_PTO, 'PTO'),
+    ]
+
+    ENGAGEMENT_NONE = 0
+    ENGAGEMENT_OUTSOURCING = 1
+    ENGAGEMENT_OUTSTAFFING = 2
+    ENGAGEMENT_CHOICES = [
+        (ENGAGEMENT_NONE, '-'),
+        (ENGAGEMENT_OUTSOURCING, 'Outsourcing'),
+        (ENGAGEMENT_OUTSTAFFING, 'Outstaffing'),
+    ]
+
+    CONTRACT_NONE = 0
+    CONTRACT_TM = 1
+    CONTRACT_FP = 2
+    CONTRACT_CHOICES = [
+        (CONTRACT_NONE, '-'),
+        (CONTRACT_TM, 'T&M'),
+        (CONTRACT_FP, 'Fixed Price'),
+    ]
+
+    employee = models.ForeignKey(Employee, on_delete=models.CASCADE, related_name='time_entries')
+    date = models.DateField()
+    # Denormalized from date so monthly rollups group without a join
+    month = models.ForeignKey(Month, on_delete=models.CASCADE, related_name='time_entries')
+    kind = models.PositiveSmallIntegerField(choices=KIND_CHOICES)
+    billable = models.BooleanField(default=False)
+    engagement = models.PositiveSmallIntegerField(choices=ENGAGEMENT_CHOICES, default=ENGAGEMENT_NONE)
+    contract = models.PositiveSmallIntegerField(choices=CONTRACT_CHOICES, default=CONTRACT_NONE)
+    minutes = models.PositiveIntegerField()
+    # Revenue attributed to these hours, when the export carries it
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        verbose_name = 'Time Entry'
+        verbose_name_plural = 'Time Entries'
+        unique_together = ['employee', 'date', 'kind', 'billable', 'engagement', 'contract']
+        indexes = [
+            models.Index(fields=['month', 'employee']),
+        ]
+
+    def __str__(self):
+        return f"{self.employee} {self.date} {self.get_kind_display()} {self.minutes / 60:.2f}h"
+
+
+class DeliveryCubeCell(models.Model):
+    """
+    Pre-aggregated time entries for one cell of the engagement model x
+    contract type x period cube.
+
+    Every level of the cube is materialized: a dimension set to ALL holds the
+    rollup over that dimension, and month 0 holds the whole year. Any slice or
+    drill-down is therefore a lookup on the unique key instead of a scan of
+    TimeEntry. Maintained incrementally by apps.core.cube.refresh_delivery_cube.
+    """
+    ALL = -1
+    WHOLE_YEAR = 0
+
+    year = models.ForeignKey(Year, on_delete=models.CASCADE, related_name='delivery_cube')
+    month = models.PositiveSmallIntegerField(help_text="1-12, or 0 for the whole year")
+    engagement = models.SmallIntegerField(help_text="TimeEntry engagement code, or -1 for all")
+    contract = models.SmallIntegerField(help_text="TimeEntry contract code, or -1 for all")
+
+    total_minutes = models.BigIntegerField(default=0)
+    project_minutes = models.BigIntegerField(default=0)
+    billable_minutes = models.BigIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['year', 'month', 'engagement', 'contract']
+        verbose_name = 'Delivery Cube Cell'
+        verbose_name_plural = 'Delivery Cube Cells'
+        unique_together = ['year', 'month', 'engagement', 'contract']
+
+    def __str__(self):
+        return f"{self.year} {self.month or 'year'} e={self.engagement} c={self.contract}"
+
+
+class YearSummary(models.Model):
+    """
+    Annual statistics of one report type's numeric fields for a year: totals,
+    averages, the months with the lowest and highest value, and which months
+    are covered. Kept per source, the company's active reports or the legacy
+    snapshot tables. Maintained by apps.core.summaries, from signals on every
+    save and delete and explicitly after bulk writes.
+    """
+    SOURCE_REPORTS = 'reports'
+    SOURCE_SNAPSHOTS = 'snapshots'
+    SOURCE_CHOICES = [
+        (SOURCE_REPORTS, 'Reports'),
+        (SOURCE_SNAPSHOTS, 'Snapshots'),
+    ]
+
+    year = models.ForeignKey(Year, on_delete=models.CASCADE, related_name='summaries')
+    report_type = models.ForeignKey(
+        'reports.ReportType', on_delete=models.CASCADE, related_name='year_summaries'
+    )
+    source = models.CharField(max_length=10, choices=SOURCE_CHOICES, default=SOURCE_REPORTS)
+
+    months = models.JSONField(default=list, help_text="Month numbers with data, e.g. [1, 2, 3]")
+    totals = models.JSONField(default=dict)
+    averages = models.JSONField(default=dict)
+    minimums = models.JSONField(default=dict, help_text='{"field": {"month": 3, "value": 10.5}}')
+    maximums = models.JSONField(default=dict, help_text='{"field": {"month": 7, "value": 42.0}}')
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-year__year', 'report_type__slug', 'source']
+        verbose_name = 'Year Summary'
+        verbose_name_plural = 'Year Summaries'
+        unique_together = ['year', 'report_type', 'source']
+
+    def __str__(self):
+        return f"{self.year} {self.report_type.slug} ({self.source})"
+
+
+class DataChange(models.Model):
+    """
+    A committed change to the data of one year, as pushed to clients by
+    /api/events/ (see apps.core.events): the reports of a report type, or the
+    legacy snapshots and months behind the dashboard. The table is the feed
+    every worker reads, so its ids order events across workers. Rows are
+    kept for RETENTION only.
+    """
+    SOURCE_REPORTS = 'reports'
+    SOURCE_SNAPSHOTS = 'snapshots'
+    SOURCE_CHOICES = [
+        (SOURCE_REPORTS, 'Reports'),
+        (SOURCE_SNAPSHOTS, 'Snapshots'),
+    ]
+
+    source = models.CharField(max_length=10, choices=SOURCE_CHOICES, default=SOURCE_REPORTS)
+    report_type = models.ForeignKey(
+        'reports.ReportType', on_delete=models.CASCADE, null=True, blank=True, related_name='changes',
+        help_text='Changed report type; empty for snapshot changes'
+    )
+    year = models.PositiveIntegerField()
+    version = models.PositiveIntegerField(
+        null=True, blank=True, help_text="The report type's data_version once the change committed"
+    )
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        ordering = ['id']
+        verbose_name = 'Data Change'
+        verbose_name_plural = 'Data Changes'
+
+    def __str__(self):
+        subject = self.report_type.slug if self.report_type_id else self.source
+        return f"{subject} {self.year} (#{self.pk})"
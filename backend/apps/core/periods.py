@@ -0,0 +1,23 @@
+from .models import Year, Month
+
+
+def get_or_create_months(year_value, month_numbers, user=None):
+    """
+    Resolve a Year and its Month rows for the given month numbers.
+    Existing months are loaded in one query and missing ones are created
+    with a single bulk insert, instead of one get_or_create per month.
+    Returns (year, {month_number: Month}).
+    """
+    year, _ = Year.objects.get_or_create(year=year_value, defaults={'created_by': user})
+
+    wanted = sorted({int(m) for m in month_numbers})
+    months = {m.month: m for m in Month.objects.filter(year=year, month__in=wanted)}
+
+    missing = [Month(year=year, month=number) for number in wanted if number not in months]
+    if missing:
+        Month.objects.bulk_create(missing, ignore_conflicts=True)
+        # Re-read so every month has its primary key (bulk_create with
+        # ignore_conflicts does not return ids on all backends)
+        months = {m.month: m for m in Month.objects.filter(year=year, month__in=wanted)}
+
+    return year, months
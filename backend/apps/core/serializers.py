@@ -1,16 +1,37 @@
 from rest_framework import serializers
-from .models import Year, Month, DeliveryReportSnapshot, FinReportSnapshot
+from .models import Year, Month, DeliveryReportSnapshot, FinReportSnapshot, DeliveryCubeCell, YearSummary
+from .cube import ENGAGEMENTS, CONTRACTS
+
+
+class YearSummarySerializer(serializers.ModelSerializer):
+    report_type_slug = serializers.CharField(source='report_type.slug', read_only=True)
+    months_count = serializers.SerializerMethodField()
+
+    class Meta:
+        model = YearSummary
+        fields = [
+            'report_type_slug', 'source', 'months', 'months_count',
+            'totals', 'averages', 'minimums', 'maximums', 'updated_at'
+        ]
+        read_only_fields = fields
+
+    def get_months_count(self, obj):
+        return len(obj.months)
 
 
 class YearSerializer(serializers.ModelSerializer):
     months_count = serializers.SerializerMethodField()
+    summaries = YearSummarySerializer(many=True, read_only=True)
 
     class Meta:
         model = Year
-        fields = ['id', 'year', 'created_at', 'months_count']
+        fields = ['id', 'year', 'created_at', 'months_count', 'summaries']
         read_only_fields = ['created_at']
 
     def get_months_count(self, obj):
+        # Annotated by YearViewSet, so lists do not count per row
+        if hasattr(obj, 'month_total'):
+            return obj.month_total
         return obj.months.count()
 
 
@@ -64,3 +85,45 @@ class MonthDetailSerializer(MonthSerializer):
 
     class Meta(MonthSerializer.Meta):
         fields = MonthSerializer.Meta.fields + ['delivery_report', 'fin_report']
+
+
+class DeliveryCubeCellSerializer(serializers.ModelSerializer):
+    year_value = serializers.IntegerField(source='year.year', read_only=True)
+    engagement = serializers.SerializerMethodField()
+    contract = serializers.SerializerMethodField()
+    total_hours = serializers.SerializerMethodField()
+    project_hours = serializers.SerializerMethodField()
+    billable_hours = serializers.SerializerMethodField()
+    billability = serializers.SerializerMethodField()
+
+    class Meta:
+        model = DeliveryCubeCell
+        fields = [
+            'year_value', 'month', 'engagement', 'contract',
+            'total_hours', 'project_hours', 'billable_hours', 'billability', 'revenue',
+            'updated_at',
+        ]
+
+    def get_engagement(self, obj):
+        return _label(ENGAGEMENTS, obj.engagement)
+
+    def get_contract(self, obj):
+        return _label(CONTRACTS, obj.contract)
+
+    def get_total_hours(self, obj):
+        return round(obj.total_minutes / 60, 2)
+
+    def get_project_hours(self, obj):
+        return round(obj.project_minutes / 60, 2)
+
+    def get_billable_hours(self, obj):
+        return round(obj.billable_minutes / 60, 2)
+
+    def get_billability(self, obj):
+        if not obj.project_minutes:
+            return None
+        return round(obj.billable_minutes * 100 / obj.project_minutes, 2)
+
+
+def _label(names, code):
+    return next(name for name, value in names.items() if value == code)
@@ -0,0 +1,63 @@
+"""
+Keep YearSummary current on every save and delete of a Report or snapshot
+(see apps.core.summaries), and the cached dashboards of the changed years
+(see apps.core.dashboard). Summaries are rewritten inside the writer's
+transaction; dashboards are re-rendered once it commits. Single-row writes,
+admin edits included, also expire the cached results of the report type and
+year they touch (see apps.reports.tags).
+"""
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from apps.reports.models import ReportType
+from apps.reports.tags import invalidate_report_type, invalidate_reports, invalidate_year
+
+from .dashboard import schedule_warm
+from .models import DeliveryReportSnapshot, FinReportSnapshot, Month, Year
+from .summaries import refresh_report_summaries, refresh_snapshot_summaries
+
+
+def _cascade_from_summary_owner(origin):
+    """Whether a delete started from a year or report type, whose summaries go with it."""
+    model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    return issubclass(model, (Year, ReportType))
+
+
+@receiver(post_save, sender='reports.Report')
+@receiver(post_delete, sender='reports.Report')
+def report_changed(sender, instance, origin=None, **kwargs):
+    if origin is not None and _cascade_from_summary_owner(origin):
+        return
+    invalidate_reports(instance.report_type, [instance.year.year])
+    refresh_report_summaries(instance.report_type, [instance.year_id], unit_ids=[instance.org_unit_id])
+
+
+@receiver(post_save, sender=ReportType)
+@receiver(post_delete, sender=ReportType)
+def report_type_changed(sender, instance, **kwargs):
+    invalidate_report_type(instance)
+
+
+@receiver(post_delete, sender=Year)
+def year_deleted(sender, instance, **kwargs):
+    invalidate_year(instance.year)
+
+
+@receiver(post_save, sender=DeliveryReportSnapshot)
+@receiver(post_delete, sender=DeliveryReportSnapshot)
+@receiver(post_save, sender=FinReportSnapshot)
+@receiver(post_delete, sender=FinReportSnapshot)
+def snapshot_changed(sender, instance, origin=None, **kwargs):
+    years = dict(Month.objects.filter(pk=instance.month_id).values_list('year_id', 'year__year'))
+    schedule_warm(years.values())
+    if origin is not None and _cascade_from_summary_owner(origin):
+        return
+    refresh_snapshot_summaries(sender, list(years))
+
+
+@receiver(post_save, sender=Month)
+@receiver(post_delete, sender=Month)
+def month_changed(sender, instance, **kwargs):
+    # A new or removed month shifts the history of the dashboards after it
+    schedule_warm([instance.year.year])
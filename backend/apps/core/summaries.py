@@ -0,0 +1,118 @@
+"""
+Annual summaries of each report type, precomputed so year lists need no
+client-side sums over twelve reports.
+
+YearSummary is rebuilt for one year, report type and source at a time: the
+year's months are loaded in one query as a months x fields frame and every
+statistic is computed column-wise over it. Sources are the company unit's
+active reports (derived fields included) and the legacy snapshot tables.
+
+Every single-row save and delete refreshes the summaries of its year through
+signals (apps.core.signals), inside the writer's transaction. Bulk writes and
+batch activation send no signals; they call refresh_report_summaries or
+refresh_snapshot_summaries themselves.
+"""
+import numpy as np
+import pandas as pd
+from django.db import models, transaction
+
+from apps.reports.matrix import numeric_fields, period_frame
+from apps.reports.models import OrgUnit, Report, ReportType
+
+from .models import DeliveryReportSnapshot, FinReportSnapshot, Year, YearSummary
+
+# Report type of each legacy snapshot table
+SNAPSHOT_REPORT_TYPES = {
+    DeliveryReportSnapshot: 'delivery',
+    FinReportSnapshot: 'financial',
+}
+
+
+def summarize(frame):
+    """
+    Statistics of `frame` (one row per month number with data, one column
+    per numeric field, NaN for missing values) as YearSummary field values.
+    Fields without any value are left out.
+    """
+    frame = frame.apply(pd.to_numeric, errors='coerce').astype(float).dropna(axis=1, how='all')
+    minimum, maximum = frame.min(), frame.max()
+    lowest, highest = frame.idxmin(), frame.idxmax()
+    return {
+        'months': sorted(int(m) for m in frame.index),
+        'totals': _values(frame.sum()),
+        'averages': _values(frame.mean()),
+        'minimums': {
+            name: {'month': int(lowest[name]), 'value': round(float(minimum[name]), 2)}
+            for name in frame.columns
+        },
+        'maximums': {
+            name: {'month': int(highest[name]), 'value': round(float(maximum[name]), 2)}
+            for name in frame.columns
+        },
+    }
+
+
+def _values(column):
+    return {name: round(float(value), 2) for name, value in column.items() if not np.isnan(value)}
+
+
+def _store(year_id, report_type, source, frame):
+    """Write the summary of `frame`, or delete it when the year has no data left."""
+    with transaction.atomic():
+        if frame.empty:
+            YearSummary.objects.filter(year_id=year_id, report_type=report_type, source=source).delete()
+            return None
+        summary, _ = YearSummary.objects.update_or_create(
+            year_id=year_id, report_type=report_type, source=source, defaults=summarize(frame)
+        )
+        return summary
+
+
+def refresh_report_summaries(report_type, year_ids, unit_ids=None):
+    """
+    Rebuild the report summaries of `report_type` for `year_ids` from the
+    company unit's active reports. With `unit_ids` (the units whose reports
+    changed), nothing is done unless the company unit is among them.
+    """
+    if unit_ids is not None and not OrgUnit.objects.filter(
+        pk__in=list(unit_ids), slug=OrgUnit.ROOT_SLUG
+    ).exists():
+        return
+    fields = numeric_fields(report_type.field_schema)
+    reports = Report.objects.active().filter(report_type=report_type, org_unit__slug=OrgUnit.ROOT_SLUG)
+    for year_id, year in Year.objects.filter(pk__in=list(year_ids)).values_list('pk', 'year'):
+        frame = period_frame(report_type, reports, (year, 1), (year, 12), fields=fields)
+        frame = frame.reindex(columns=fields)
+        frame.index = [int(period[5:7]) for period in frame.index]
+        _store(year_id, report_type, YearSummary.SOURCE_REPORTS, frame)
+
+
+def snapshot_fields(model):
+    """The numeric fields of a snapshot model."""
+    return [
+        field.name for field in model._meta.concrete_fields
+        if isinstance(field, (models.DecimalField, models.IntegerField)) and not field.primary_key
+    ]
+
+
+def refresh_snapshot_summaries(model, year_ids):
+    """
+    Rebuild the snapshot summaries of `model` (a snapshot table of
+    SNAPSHOT_REPORT_TYPES) for `year_ids`; skipped while its report type is
+    not set up.
+    """
+    report_type = ReportType.objects.filter(slug=SNAPSHOT_REPORT_TYPES[model]).first()
+    if report_type is None:
+        return
+    fields = snapshot_fields(model)
+    rows = pd.DataFrame.from_records(
+        list(
+            model.objects.filter(month__year_id__in=list(year_ids))
+            .values_list('month__year_id', 'month__month', *fields)
+        ),
+        columns=['year_id', 'month'] + fields,
+    )
+    by_year = dict(tuple(rows.groupby('year_id')))
+    for year_id in set(year_ids):
+        frame = by_year.get(year_id, rows.iloc[:0]).set_index('month')[fields]
+        _store(year_id, report_type, YearSummary.SOURCE_SNAPSHOTS, frame)
@@ -1,3 +1,436 @@
-from django.test import TestCase
+import json
+import queue
+from datetime import date
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import transaction
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from apps.reports.models import Report, ReportType
+from utils.result_cache import results
+
+from . import dashboard, events
+from .cube import ALL, WHOLE_YEAR, refresh_delivery_cube
+from .models import DataChange, DeliveryCubeCell, Employee, FinReportSnapshot, Month, TimeEntry, Year, YearSummary
+from .periods import get_or_create_months
+
+
+class DeliveryCubeTests(TestCase):
+    """Every level of the engagement x contract x period cube is materialized."""
+
+    def setUp(self):
+        self.user = User.objects.create(username='cube')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.year, self.months = get_or_create_months(2099, [1, 2])
+        self.alice = Employee.objects.create(code='alice')
+
+    def _entry(self, month, minutes, engagement, contract, billable=True, revenue=0):
+        return TimeEntry.objects.create(
+            employee=self.alice, date=date(2099, month, minutes // 60), month=self.months[month],
+            kind=TimeEntry.KIND_PROJECT, billable=billable,
+            engagement=engagement, contract=contract, minutes=minutes, revenue=revenue
+        )
+
+    def _cell(self, month, engagement, contract):
+        return DeliveryCubeCell.objects.get(
+            year=self.year, month=month, engagement=engagement, contract=contract
+        )
+
+    def test_rollups_cover_every_level(self):
+        self._entry(1, 60, TimeEntry.ENGAGEMENT_OUTSOURCING, TimeEntry.CONTRACT_TM, revenue=100)
+        self._entry(1, 120, TimeEntry.ENGAGEMENT_OUTSTAFFING, TimeEntry.CONTRACT_TM, billable=False)
+        self._entry(2, 180, TimeEntry.ENGAGEMENT_OUTSOURCING, TimeEntry.CONTRACT_FP, revenue=300)
+        refresh_delivery_cube([m.pk for m in self.months.values()])
+
+        self.assertEqual(self._cell(1, TimeEntry.ENGAGEMENT_OUTSOURCING, TimeEntry.CONTRACT_TM).total_minutes, 60)
+        self.assertEqual(self._cell(1, ALL, TimeEntry.CONTRACT_TM).total_minutes, 180)
+        self.assertEqual(self._cell(1, ALL, ALL).billable_minutes, 60)
+        year = self._cell(WHOLE_YEAR, TimeEntry.ENGAGEMENT_OUTSOURCING, ALL)
+        self.assertEqual(year.total_minutes, 240)
+        self.assertEqual(year.revenue, Decimal('400.00'))
+        self.assertEqual(self._cell(WHOLE_YEAR, ALL, ALL).total_minutes, 360)
+
+    def test_refresh_recomputes_only_touched_months(self):
+        january = self._entry(1, 60, TimeEntry.ENGAGEMENT_OUTSOURCING, TimeEntry.CONTRACT_TM)
+        self._entry(2, 120, TimeEntry.ENGAGEMENT_OUTSOURCING, TimeEntry.CONTRACT_TM)
+        refresh_delivery_cube([m.pk for m in self.months.values()])
+        february_cell = self._cell(2, ALL, ALL)
+
+        january.delete()
+        self._entry(1, 240, TimeEntry.ENGAGEMENT_OUTSTAFFING, TimeEntry.CONTRACT_FP)
+        refresh_delivery_cube([self.months[1].pk])
+
+        # The vanished January combination is gone, February was not rewritten
+        self.assertFalse(DeliveryCubeCell.objects.filter(
+            month=1, engagement=TimeEntry.ENGAGEMENT_OUTSOURCING
+        ).exists())
+        self.assertEqual(self._cell(2, ALL, ALL).pk, february_cell.pk)
+        self.assertEqual(self._cell(WHOLE_YEAR, ALL, ALL).total_minutes, 360)
+
+    def test_slice_and_drill_down_endpoint(self):
+        self._entry(1, 60, TimeEntry.ENGAGEMENT_OUTSOURCING, TimeEntry.CONTRACT_TM, revenue=100)
+        self._entry(2, 120, TimeEntry.ENGAGEMENT_OUTSOURCING, TimeEntry.CONTRACT_FP, revenue=50)
+        refresh_delivery_cube([m.pk for m in self.months.values()])
+
+        response = self.client.get('/api/delivery-cube/', {
+            'year': 2099, 'month': 'year', 'engagement': 'outsourcing', 'contract': 'all'
+        })
+        [cell] = response.data['results']
+        self.assertEqual(cell['revenue'], '150.00')
+        self.assertEqual(cell['total_hours'], 3)
+
+        # Drill down by month: the two months and the whole-year rollup
+        response = self.client.get('/api/delivery-cube/', {
+            'year': 2099, 'engagement': 'all', 'contract': 'all'
+        })
+        self.assertEqual([c['month'] for c in response.data['results']], [0, 1, 2])
+
+        response = self.client.get('/api/delivery-cube/', {'engagement': 'retainer'})
+        self.assertEqual(response.status_code, 400)
+
+
+class YearSummaryTests(TestCase):
+    """Year summaries follow every write of reports and snapshots; year lists need no sums."""
+
+    def setUp(self):
+        self.user = User.objects.create(username='summaries')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.report_type = ReportType.objects.create(
+            name='Financial', slug='financial', field_schema={
+                'cash_income': {'type': 'decimal'},
+                'net_margin_cash': {'type': 'decimal'},
+                'profit_margin': {'type': 'percentage', 'formula': 'net_margin_cash / cash_income * 100'},
+            }
+        )
+
+    def _summary(self, source):
+        return YearSummary.objects.get(year__year=2099, report_type=self.report_type, source=source)
+
+    def test_report_writes_keep_the_summary_current(self):
+        response = self.client.post('/api/reports/bulk-create/', {
+            'report_type_slug': 'financial',
+            'year': 2099,
+            'months': [
+                {'month': 1, 'data': {'cash_income': 100, 'net_margin_cash': 10}},
+                {'month': 2, 'data': {'cash_income': 300, 'net_margin_cash': 90}},
+                {'month': 3, 'data': {'cash_income': 200}},
+            ],
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        summary = self._summary(YearSummary.SOURCE_REPORTS)
+        self.assertEqual(summary.months, [1, 2, 3])
+        self.assertEqual(summary.totals, {'cash_income': 600, 'net_margin_cash': 100, 'profit_margin': 40})
+        self.assertEqual(summary.averages['cash_income'], 200)
+        self.assertEqual(summary.minimums['cash_income'], {'month': 1, 'value': 100})
+        self.assertEqual(summary.maximums['profit_margin'], {'month': 2, 'value': 30})
+
+        # A plain save outside the API is caught by the signal
+        march = Report.objects.active().get(year__year=2099, month__month=3)
+        march.data = {'cash_income': 500}
+        march.save()
+        self.assertEqual(self._summary(YearSummary.SOURCE_REPORTS).maximums['cash_income'], {'month': 3, 'value': 500})
+
+        for month in (1, 2, 3):
+            report = Report.objects.active().get(year__year=2099, month__month=month)
+            self.assertEqual(self.client.delete(f'/api/reports/{report.pk}/').status_code, 204)
+        self.assertFalse(YearSummary.objects.exists())
+
+    def test_snapshot_summaries_and_year_list(self):
+        year, months = get_or_create_months(2099, [1, 2])
+        FinReportSnapshot.objects.create(month=months[1], cash_income=Decimal('100.50'), production_team_fte=4)
+        snapshot = FinReportSnapshot.objects.create(month=months[2], cash_income=Decimal('99.50'), production_team_fte=None)
+        summary = self._summary(YearSummary.SOURCE_SNAPSHOTS)
+        self.assertEqual(summary.months, [1, 2])
+        self.assertEqual(summary.totals['cash_income'], 200)
+        self.assertEqual(summary.averages['production_team_fte'], 4)
+
+        get_or_create_months(2098, [1])
+        # Page count, years with their month counts, summaries: however many years
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/years/')
+        self.assertEqual(response.status_code, 200)
+        years = {y['year']: y for y in response.data['results']}
+        self.assertEqual(years[2099]['months_count'], 2)
+        self.assertEqual(years[2099]['summaries'][0]['report_type_slug'], 'financial')
+        self.assertEqual(years[2099]['summaries'][0]['totals']['cash_income'], 200)
+        self.assertEqual(years[2098]['summaries'], [])
+
+        snapshot.delete()
+        self.assertEqual(self._summary(YearSummary.SOURCE_SNAPSHOTS).months, [1])
+        # Deleting the year takes its summaries along without refreshing them
+        year.delete()
+        self.assertFalse(YearSummary.objects.exists())
+
+
+    def test_rebuild_command_restores_summaries(self):
+        _, months = get_or_create_months(2099, [1, 2])
+        FinReportSnapshot.objects.create(month=months[1], cash_income=Decimal('100'))
+        self.client.post('/api/reports/bulk-create/', {
+            'report_type_slug': 'financial', 'year': 2099, 'months': [{'month': 2, 'data': {'cash_income': 300}}],
+        }, format='json')
+        expected = sorted(YearSummary.objects.values_list('source', 'months', 'totals'))
+        YearSummary.objects.all().delete()
+
+        call_command('rebuild_summaries', stdout=StringIO())
+
+        self.assertEqual(sorted(YearSummary.objects.values_list('source', 'months', 'totals')), expected)
+        self.assertEqual(len(expected), 2)
+
+
+@override_settings(DASHBOARD_WARM_ASYNC=False)
+class DashboardWarmerTests(TestCase):
+    """Writes re-render the dashboards and chart series they touch once they commit."""
+
+    def setUp(self):
+        results.clear()
+        self.user = User.objects.create(username='warmer')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.report_type = ReportType.objects.create(
+            name='Financial', slug='financial', field_schema={'cash_income': {'type': 'decimal'}}
+        )
+
+    def _dashboard(self, year, month):
+        response = self.client.get(f'/api/dashboard/{year}/{month}/')
+        return response.status_code, response.data
+
+    def test_dashboards_are_warm_after_each_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            _, months = get_or_create_months(2099, [1, 2])
+            FinReportSnapshot.objects.create(month=months[1], cash_income=Decimal('100'))
+            snapshot = FinReportSnapshot.objects.create(month=months[2], cash_income=Decimal('200'))
+
+        with self.assertNumQueries(0):
+            status, data = self._dashboard(2099, 2)
+        self.assertEqual(status, 200)
+        self.assertEqual([m.get('cash_income') for m in data['historical_data']], [100, 200])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            snapshot.cash_income = Decimal('250')
+            snapshot.save()
+        with self.assertNumQueries(0):
+            _, data = self._dashboard(2099, 2)
+        self.assertEqual(data['fin_report']['cash_income'], '250.00')
+        # The next year's January reads December's year through its history
+        with self.captureOnCommitCallbacks(execute=True):
+            get_or_create_months(2100, [1])
+            Month.objects.get(year__year=2100).save()
+        with self.assertNumQueries(0):
+            _, data = self._dashboard(2100, 1)
+        self.assertEqual(len(data['historical_data']), 3)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Month.objects.get(year__year=2099, month=2).delete()
+        self.assertEqual(self._dashboard(2099, 2)[0], 404)
+
+    @override_settings(DASHBOARD_WARM_ASYNC=True)
+    def test_warm_ups_run_off_the_request(self):
+        with mock.patch.object(dashboard, '_start_worker'), \
+                mock.patch.object(dashboard, '_queue', queue.Queue()) as pending:
+            with self.captureOnCommitCallbacks(execute=True):
+                _, months = get_or_create_months(2099, [1])
+                FinReportSnapshot.objects.create(month=months[1], cash_income=Decimal('100'))
+            warmup = pending.get_nowait()
+        self.assertEqual(warmup.years, {2099})
+        self.assertFalse(DataChange.objects.exists())
+
+        warmup.run()
+        with self.assertNumQueries(0):
+            self.assertEqual(self._dashboard(2099, 1)[0], 200)
+        self.assertEqual(DataChange.objects.get().year, 2099)
+
+    def test_rolled_back_warm_ups_are_dropped(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            with self.assertRaises(ValueError), transaction.atomic():
+                dashboard.schedule_warm([2098])
+                raise ValueError
+            dashboard.schedule_warm([2099])
+            dashboard.schedule_warm([2100])
+        self.assertEqual([callback.years for callback in callbacks], [{2099, 2100}])
+
+    def test_imports_warm_the_default_series_and_the_command_warms_everything(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/reports/bulk-create/', {
+                'report_type_slug': 'financial',
+                'year': 2099,
+                'months': [{'month': 1, 'data': {'cash_income': 100}}],
+            }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+
+        params = {'report_type': 'financial', 'from': '2099-01', 'to': '2099-12'}
+        # Only the report type lookup; the series is a cache hit
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/reports/series/', params)
+        self.assertEqual(response.data, {'periods': ['2099-01'], 'series': {'cash_income': [100]}})
+
+        results.clear()
+        out = StringIO()
+        call_command('warm_dashboards', stdout=out)
+        self.assertIn('Cached 1 dashboards and 1 chart series', out.getvalue())
+        with self.assertNumQueries(0):
+            self.assertEqual(self._dashboard(2099, 1)[0], 200)
+        with self.assertNumQueries(1):
+            self.client.get('/api/reports/series/', params)
+
+
+class BatchTests(TestCase):
+    """Several API reads answered in one authenticated round trip."""
+
+    def setUp(self):
+        results.clear()
+        self.user = User.objects.create(username='batch')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        ReportType.objects.create(name='Financial', slug='financial', field_schema={'cash_income': {'type': 'decimal'}})
+        response = self.client.post('/api/reports/bulk-create/', {
+            'report_type_slug': 'financial',
+            'year': 2099,
+            'months': [{'month': m, 'data': {'cash_income': 100 * m}} for m in (1, 2)],
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+
+    def _batch(self, requests):
+        return self.client.post('/api/batch/', {'requests': requests}, format='json')
+
+    def test_sub_requests_answer_like_their_endpoints(self):
+        response = self._batch({
+            'types': '/api/report-types/',
+            'reports': {'path': '/api/reports/', 'params': {'report_type': 'financial', 'month': [2]}},
+            'years': {'path': '/api/years/'},
+            'dashboard': {'path': '/api/dashboard/2099/3/'},
+            'unknown': {'path': '/api/nothing-here/'},
+            'nested': {'path': '/api/batch/'},
+        })
+        self.assertEqual(response.status_code, 200)
+        data = response.data
+        self.assertEqual(set(data), {'types', 'reports', 'years', 'dashboard', 'unknown', 'nested'})
+
+        self.assertEqual([t['slug'] for t in data['types']['body']['results']], ['financial'])
+        reports = self.client.get('/api/reports/', {'report_type': 'financial', 'month': 2}).data
+        self.assertEqual(data['reports'], {'status': 200, 'body': reports})
+        self.assertEqual([r['data'] for r in reports['results']], [{'cash_income': 200}])
+        self.assertEqual([y['year'] for y in data['years']['body']['results']], [2099])
+        self.assertEqual(data['dashboard']['status'], 404)
+        self.assertEqual(data['unknown']['status'], 404)
+        self.assertEqual(data['nested']['status'], 400)
+
+    def test_invalid_batches_and_anonymous_callers_are_rejected(self):
+        self.assertEqual(self._batch({}).status_code, 400)
+        self.assertEqual(self._batch({'admin': '/admin/'}).status_code, 400)
+        self.assertEqual(self._batch({'reports': '/api/reports/?year=2099'}).status_code, 400)
+
+        self.client.force_authenticate(None)
+        self.assertEqual(self._batch({'types': '/api/report-types/'}).status_code, 401)
+
+
+@mock.patch.object(events, 'STREAM_SECONDS', 0)
+@override_settings(DASHBOARD_WARM_ASYNC=False)
+class DataChangeEventTests(TestCase):
+    """Committed changes are streamed to clients as server-sent events."""
+
+    def setUp(self):
+        results.clear()
+        self.user = User.objects.create(username='events')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.report_type = ReportType.objects.create(
+            name='Financial', slug='financial', field_schema={'cash_income': {'type': 'decimal'}}
+        )
+
+    def _ticket(self):
+        response = self.client.post('/api/events/ticket/')
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data['ticket']
+
+    def _import(self, year):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/reports/bulk-create/', {
+                'report_type_slug': 'financial',
+                'year': year,
+                'months': [{'month': 1, 'data': {'cash_income': 100}}],
+            }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+
+    def _messages(self, text):
+        return [
+            (dict(line.split(': ', 1) for line in block.splitlines()))
+            for block in text.strip().split('\n\n') if block.startswith('id:')
+        ]
+
+    def test_imports_publish_one_change_per_report_type_and_year_once_committed(self):
+        self._import(2099)
+        self.report_type.refresh_from_db()
+        change = DataChange.objects.get(source=DataChange.SOURCE_REPORTS)
+        self.assertEqual(
+            (change.report_type, change.year, change.version), (self.report_type, 2099, self.report_type.data_version)
+        )
+
+        response = self.client.get('/api/events/', {'ticket': self._ticket(), 'last_event_id': 0})
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        messages = self._messages(b''.join(response.streaming_content).decode())
+        self.assertIn({
+            'id': str(change.id), 'event': 'change',
+            'data': json.dumps({
+                'source': 'reports', 'report_type': 'financial', 'year': 2099,
+                'version': self.report_type.data_version,
+            }),
+        }, messages)
+
+        # Without Last-Event-ID a stream starts from now
+        response = self.client.get('/api/events/', {'ticket': self._ticket()})
+        self.assertEqual(self._messages(b''.join(response.streaming_content).decode()), [])
+
+    @mock.patch.object(events, 'STREAM_SECONDS', 300)
+    def test_wsgi_streams_end_after_one_poll(self):
+        self._import(2099)
+        with mock.patch.object(events.time, 'sleep', side_effect=AssertionError('waited')):
+            response = self.client.get('/api/events/', {'ticket': self._ticket(), 'last_event_id': 0})
+            text = b''.join(response.streaming_content).decode()
+        self.assertTrue(text.startswith(f'retry: {events.RECONNECT_MS}'))
+        self.assertEqual(len(self._messages(text)), 1)
+
+    def test_async_stream_resumes_and_resets_clients_that_fell_behind(self):
+        self._import(2098)
+        last_id = events.latest_id()
+        self._import(2099)
+
+        async def collect(start):
+            return ''.join([text async for text in events.astream(start)])
+
+        messages = self._messages(async_to_sync(collect)(last_id))
+        self.assertEqual({json.loads(m['data'])['year'] for m in messages}, {2099})
+
+        # Pruned before this client read the 2099 change
+        self._import(2097)
+        DataChange.objects.filter(id__lte=last_id + 1).delete()
+        messages = self._messages(async_to_sync(collect)(last_id))
+        self.assertEqual([(m['id'], m['event']) for m in messages], [(str(events.latest_id()), 'reset')])
+
+    def test_streams_need_a_valid_ticket(self):
+        ticket = self._ticket()
+        client = APIClient()
+        self.assertEqual(client.get('/api/events/').status_code, 401)
+        self.assertEqual(client.post('/api/events/ticket/').status_code, 401)
+        self.assertEqual(client.get('/api/events/', {'ticket': 'not-a-ticket'}).status_code, 401)
+        self.assertEqual(client.get('/api/events/', {'ticket': ticket}).status_code, 200)
+        # Access tokens are not accepted in the query string
+        token = str(AccessToken.for_user(self.user))
+        self.assertEqual(client.get('/api/events/', {'ticket': token}).status_code, 401)
+        self.assertEqual(client.get('/api/events/', {'token': token}).status_code, 401)
+        response = client.get('/api/events/', HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.assertEqual(response.status_code, 200)
+
+        with mock.patch.object(events, 'TICKET_SECONDS', -1):
+            self.assertEqual(client.get('/api/events/', {'ticket': ticket}).status_code, 401)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(client.get('/api/events/', {'ticket': ticket}).status_code, 401)
@@ -5,8 +5,13 @@ from . import views
 router = DefaultRouter()
 router.register(r'years', views.YearViewSet, basename='year')
 router.register(r'months', views.MonthViewSet, basename='month')
+router.register(r'delivery-cube', views.DeliveryCubeViewSet, basename='delivery-cube')
 
 urlpatterns = [
     path('', include(router.urls)),
     path('dashboard/<int:year>/<int:month>/', views.dashboard_data, name='dashboard-data'),
+    path('cache-stats/', views.cache_stats, name='cache-stats'),
+    path('batch/', views.batch, name='batch'),
+    path('events/', views.events, name='events'),
+    path('events/ticket/', views.events_ticket, name='events-ticket'),
 ]
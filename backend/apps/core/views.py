@@ -1,15 +1,28 @@
 from rest_framework import viewsets, status
 from rest_framework.decorators import action, api_view, permission_classes
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
+from django.core.handlers.asgi import ASGIRequest
+from django.db.models import Count, Prefetch
+from django.http import JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
-from .models import Year, Month, DeliveryReportSnapshot, FinReportSnapshot
+from django.views.decorators.http import require_GET
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from utils.result_cache import results
+from . import events as data_events
+from .batch import parse_requests, run_batch
+from .cube import ENGAGEMENTS, CONTRACTS
+from .dashboard import cached_dashboard
+from .models import Year, Month, DeliveryReportSnapshot, FinReportSnapshot, DeliveryCubeCell, YearSummary
 from .serializers import (
     YearSerializer,
     MonthSerializer,
     MonthDetailSerializer,
     DeliveryReportSerializer,
-    FinReportSerializer
+    FinReportSerializer,
+    DeliveryCubeCellSerializer
 )
 
 
@@ -17,12 +30,28 @@ class YearViewSet(viewsets.ModelViewSet):
     """
     ViewSet for Year model.
     Provides list, retrieve, create, update, and delete operations.
+    Each year comes with its precomputed summaries (YearSummary); filter
+    them with ?report_type=<slug> and/or ?source=reports|snapshots.
     """
-    queryset = Year.objects.all()
     serializer_class = YearSerializer
     permission_classes = [IsAuthenticated]
     ordering = ['-year']
 
+    def get_queryset(self):
+        summaries = YearSummary.objects.select_related('report_type').order_by('report_type__slug', 'source')
+        report_type = self.request.query_params.get('report_type')
+        if report_type:
+            summaries = summaries.filter(report_type__slug=report_type)
+        source = self.request.query_params.get('source')
+        if source:
+            summaries = summaries.filter(source=source)
+        return (
+            Year.objects
+            .annotate(month_total=Count('months'))
+            .prefetch_related(Prefetch('summaries', queryset=summaries))
+            .order_by('-year')
+        )
+
     def perform_create(self, serializer):
         serializer.save(created_by=self.request.user)
 
@@ -78,80 +107,55 @@ class MonthViewSet(viewsets.ModelViewSet):
             )
 
 
+class DeliveryCubeViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Slices of the engagement model x contract type x period cube.
+    Every level is pre-aggregated, so each filter combination is a lookup on
+    the cell key. A dimension left out of the query returns all of its
+    members (including its 'all' rollup), which is how to drill down.
+    Query params:
+    - year: e.g. 2025
+    - month: 1-12, or 'year' for the whole-year rollup
+    - engagement: outsourcing, outstaffing, none or all
+    - contract: tm, fp, none or all
+    """
+    serializer_class = DeliveryCubeCellSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        queryset = DeliveryCubeCell.objects.select_related('year')
+        params = self.request.query_params
+
+        year = params.get('year')
+        if year:
+            queryset = queryset.filter(year__year=year)
+
+        month = params.get('month')
+        if month:
+            if month != 'year' and not month.isdigit():
+                raise ValidationError({'month': "Must be 1-12 or 'year'"})
+            queryset = queryset.filter(month=DeliveryCubeCell.WHOLE_YEAR if month == 'year' else month)
+
+        for name, codes in (('engagement', ENGAGEMENTS), ('contract', CONTRACTS)):
+            value = params.get(name)
+            if value:
+                if value not in codes:
+                    raise ValidationError({name: f'Must be one of: {", ".join(codes)}'})
+                queryset = queryset.filter(**{name: codes[value]})
+
+        return queryset
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def dashboard_data(request, year, month):
     """
     Get all dashboard data for a specific year and month.
     Returns both delivery and financial reports with aggregated data for charts.
+    Served from the result cache, which imports pre-render (see apps.core.dashboard).
     """
     try:
-        year_obj = Year.objects.get(year=year)
-        month_obj = Month.objects.get(year=year_obj, month=month)
-
-        response_data = {
-            'year': year,
-            'month': month,
-            'month_display': month_obj.month_display,
-        }
-
-        # Get delivery report if exists
-        try:
-            delivery_report = month_obj.delivery_report
-            response_data['delivery_report'] = DeliveryReportSerializer(delivery_report).data
-        except DeliveryReportSnapshot.DoesNotExist:
-            response_data['delivery_report'] = None
-
-        # Get financial report if exists
-        try:
-            fin_report = month_obj.fin_report
-            response_data['fin_report'] = FinReportSerializer(fin_report).data
-        except FinReportSnapshot.DoesNotExist:
-            response_data['fin_report'] = None
-
-        # Get historical data for charts (last 6 months)
-        historical_months = Month.objects.filter(
-            year__year__lte=year
-        ).order_by('-year__year', '-month')[:6]
-
-        historical_data = []
-        for hist_month in reversed(list(historical_months)):
-            month_data = {
-                'month': hist_month.month_display,
-                'year': hist_month.year.year,
-            }
-
-            # Add delivery metrics if available
-            try:
-                delivery = hist_month.delivery_report
-                if delivery.revenue:
-                    month_data['delivery_revenue'] = float(delivery.revenue)
-                if delivery.fte:
-                    month_data['fte'] = delivery.fte
-            except DeliveryReportSnapshot.DoesNotExist:
-                pass
-
-            # Add financial metrics if available
-            try:
-                fin = hist_month.fin_report
-                if fin.cash_income:
-                    month_data['cash_income'] = float(fin.cash_income)
-                if fin.accrual_income:
-                    month_data['accrual_income'] = float(fin.accrual_income)
-                if fin.accrual_revenue:
-                    month_data['accrual_revenue'] = float(fin.accrual_revenue)
-                if fin.gross_profit:
-                    month_data['gross_profit'] = float(fin.gross_profit)
-                if fin.cogs:
-                    month_data['cogs'] = float(fin.cogs)
-            except FinReportSnapshot.DoesNotExist:
-                pass
-
-            historical_data.append(month_data)
-
-        response_data['historical_data'] = historical_data
-
-        return Response(response_data, status=status.HTTP_200_OK)
+        return Response(cached_dashboard(year, month), status=status.HTTP_200_OK)
 
     except Year.DoesNotExist:
         return Response(
@@ -163,3 +167,72 @@ def dashboard_data(request, year, month):
             {'detail': f'Month {month} not found for year {year}'},
             status=status.HTTP_404_NOT_FOUND
         )
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def batch(request):
+    """
+    Run several GET requests of the API in one round trip (see apps.core.batch).
+    Body: {"requests": {"types": {"path": "/api/report-types/"},
+                        "reports": {"path": "/api/reports/", "params": {"year": 2025}}}}
+    Returns {"types": {"status": 200, "body": ...}, "reports": {...}}.
+    """
+    return Response(run_batch(request, parse_requests(request.data)))
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def cache_stats(request):
+    """
+    Hits and misses of the result cache served by this process, in total and
+    per query (reports.list, reports.series, reports.rollups, dashboard).
+    """
+    return Response(results.stats())
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def events_ticket(request):
+    """
+    A ticket for /api/events/?ticket=, valid for a minute. EventSource
+    cannot send headers, and the ticket keeps the access token out of URLs
+    (and server logs).
+    """
+    return Response({
+        'ticket': data_events.issue_ticket(request.user),
+        'expires_in': data_events.TICKET_SECONDS,
+    })
+
+
+@require_GET
+def events(request):
+    """
+    Server-sent events announcing committed data changes (see apps.core.events).
+    Authenticated by a ?ticket= from /api/events/ticket/ or an Authorization
+    header. Resumes after the Last-Event-ID header or ?last_event_id=,
+    otherwise starts from now. Under WSGI the stream ends after sending what
+    is pending and the browser reconnects RECONNECT_MS later.
+    """
+    ticket = request.GET.get('ticket')
+    if ticket:
+        user = data_events.ticket_user(ticket)
+    else:
+        try:
+            user = (JWTAuthentication().authenticate(request) or (None, None))[0]
+        except (InvalidToken, TokenError):
+            user = None
+    if user is None or not user.is_active:
+        return JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=401)
+
+    last_id = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+    last_id = int(last_id) if last_id and last_id.isdigit() else data_events.latest_id()
+    if isinstance(request, ASGIRequest):
+        content = data_events.astream(last_id)
+    else:
+        content = data_events.stream(last_id)
+    response = StreamingHttpResponse(content, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Unbuffered through nginx
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -1,3 +1,16 @@
 from django.contrib import admin
+from .models import ImportLog, ImportLock
 
-# Register your models here.
+
+@admin.register(ImportLog)
+class ImportLogAdmin(admin.ModelAdmin):
+    list_display = ('__str__', 'source', 'year', 'mode', 'status', 'rows', 'total_seconds', 'created_at')
+    list_filter = ('source', 'status', 'mode')
+    search_fields = ('file_name', 'report_type')
+    readonly_fields = ('created_at',)
+
+
+@admin.register(ImportLock)
+class ImportLockAdmin(admin.ModelAdmin):
+    list_display = ('key', 'owner', 'acquired_at')
+    readonly_fields = ('acquired_at',)
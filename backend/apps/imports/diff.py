@@ -0,0 +1,91 @@
+import numpy as np
+import pandas as pd
+
+
+def diff_snapshot_frame(model, frame, existing):
+    """
+    Compare parsed snapshot values against the stored rows.
+
+    - frame: DataFrame indexed by month number, one column per model field
+      (Decimal/int/None cells, as produced by the parsers)
+    - existing: DataFrame with the stored values, same layout (may be missing
+      months or be empty)
+
+    Returns a boolean DataFrame aligned with `frame` marking the cells that
+    differ. Empty parsed cells never count as a change because the importers
+    leave those fields untouched.
+    """
+    fields = list(frame.columns)
+    existing = existing.reindex(index=frame.index, columns=fields)
+
+    new = _to_float(frame)
+    old = _to_float(existing)
+
+    # Compare at the precision the column is stored with, so "2,506" in the
+    # file matches Decimal('2506.00') in the database
+    places = np.array([getattr(model._meta.get_field(f), 'decimal_places', 0) or 0 for f in fields])
+    scale = 10.0 ** places
+
+    present = ~np.isnan(new)
+    with np.errstate(invalid='ignore'):
+        differs = np.rint(new * scale) != np.rint(old * scale)
+    changed = present & (np.isnan(old) | differs)
+
+    return pd.DataFrame(changed, index=frame.index, columns=fields)
+
+
+def diff_report_data(new_data, old_data):
+    """
+    Compare Report.data payloads key by key.
+
+    - new_data: {month_number: data_dict} being imported
+    - old_data: {month_number: data_dict} currently stored
+
+    Returns a boolean DataFrame (months x keys) marking changed cells. Keys
+    that disappear from a month's payload count as changed.
+    """
+    months = sorted(new_data)
+    new = pd.DataFrame.from_dict({m: new_data[m] for m in months}, orient='index')
+    old = pd.DataFrame.from_dict({m: old_data[m] for m in months if m in old_data}, orient='index')
+
+    columns = new.columns.union(old.columns)
+    new = new.reindex(index=months, columns=columns)
+    old = old.reindex(index=months, columns=columns)
+
+    both_missing = new.isna() & old.isna()
+    equal = (new == old).fillna(False).astype(bool)
+    return ~(equal | both_missing)
+
+
+def summarize_changes(changed, created_months, label=str):
+    """
+    Build the change summary returned by diff-mode imports.
+
+    - changed: boolean DataFrame (months x fields) from one of the diff helpers
+    - created_months: months that had no stored row before the import
+    - label: callable turning a month number into its display value
+
+    Only months with changed cells are written: a new month whose values
+    are all empty is neither created nor reported.
+    """
+    rows_changed = changed.any(axis=1)
+    touched = [m for m in changed.index if rows_changed[m]]
+    fields = {
+        field: [label(m) for m in changed.index[changed[field]]]
+        for field in changed.columns
+        if changed[field].any()
+    }
+
+    return {
+        'months': [label(m) for m in touched],
+        'created': [label(m) for m in touched if m in created_months],
+        'updated': [label(m) for m in touched if m not in created_months],
+        'unchanged': [label(m) for m in changed.index if not rows_changed[m]],
+        'fields': fields,
+        'cells_changed': int(changed.to_numpy().sum()),
+    }
+
+
+def _to_float(frame):
+    """Convert a frame of Decimal/int/None cells into a float array with NaN gaps."""
+    return frame.apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float, na_value=np.nan)
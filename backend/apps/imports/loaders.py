@@ -0,0 +1,175 @@
+"""
+Set-based upsert loader for large imports and historical backfills.
+
+PostgreSQL: rows are streamed with COPY FROM STDIN into a temporary staging
+table and merged with a single INSERT ... ON CONFLICT DO UPDATE.
+SQLite: one executemany of INSERT ... ON CONFLICT DO UPDATE inside a single
+transaction. Other backends fall back to bulk_create(update_conflicts=True).
+"""
+import csv
+import io
+import json
+import uuid
+from datetime import date, datetime
+from decimal import Decimal
+
+from django.db import DEFAULT_DB_ALIAS, connection, connections, models, transaction
+from django.utils import timezone
+
+
+def bulk_upsert(model, rows, conflict_fields, update_fields, keep_existing=()):
+    """
+    Insert or update `rows` in `model`'s table in one set-based statement.
+
+    - rows: list of dicts keyed by field name (FKs by attname, e.g. 'month_id')
+    - conflict_fields: fields of the unique constraint identifying a row
+    - update_fields: fields overwritten when the row already exists
+    - keep_existing: subset of update_fields where a NULL in the new row keeps
+      the stored value (mirrors importers skipping empty cells)
+
+    auto_now/auto_now_add columns missing from the rows are filled in as
+    save() would. Rows repeating a key are merged, the last one winning.
+    Returns the number of rows sent to the database.
+    """
+    if not rows:
+        return 0
+
+    rows, update_fields = _with_timestamps(model, rows, update_fields)
+    fields = list(rows[0].keys())
+    rows = _dedupe(rows, conflict_fields)
+
+    with transaction.atomic():
+        if connection.vendor == 'postgresql':
+            _copy_upsert(model, fields, rows, conflict_fields, update_fields, keep_existing)
+        elif connection.vendor == 'sqlite':
+            _executemany_upsert(model, fields, rows, conflict_fields, update_fields, keep_existing)
+        else:
+            model.objects.bulk_create(
+                [model(**row) for row in rows],
+                update_conflicts=True,
+                unique_fields=conflict_fields,
+                update_fields=update_fields,
+            )
+
+    return len(rows)
+
+
+def _copy_upsert(model, fields, rows, conflict_fields, update_fields, keep_existing):
+    table = model._meta.db_table
+    columns = [_column(model, f) for f in fields]
+    staging = f'{table}_staging_{uuid.uuid4().hex[:12]}'
+    qn = connection.ops.quote_name
+    column_list = ', '.join(qn(c) for c in columns)
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow([_copy_value(model, f, row[f]) for f in fields])
+    buffer.seek(0)
+
+    with connection.cursor() as cursor:
+        # Same column types as the target table, no constraints and no WAL.
+        # If the COPY or the merge fails, the rollback discards it; dropping
+        # it then would fail in the aborted transaction and hide the error.
+        cursor.execute(
+            f'CREATE TEMP TABLE {qn(staging)} ON COMMIT DROP AS '
+            f'SELECT {column_list} FROM {qn(table)} WITH NO DATA'
+        )
+        cursor.copy_expert(
+            f"COPY {qn(staging)} ({column_list}) FROM STDIN WITH (FORMAT csv, NULL '\\N')",
+            buffer
+        )
+        cursor.execute(
+            f'INSERT INTO {qn(table)} ({column_list}) '
+            f'SELECT {column_list} FROM {qn(staging)} '
+            f'{_on_conflict(model, conflict_fields, update_fields, keep_existing)}'
+        )
+        # Chunked loads share one transaction: do not keep them all until commit
+        cursor.execute(f'DROP TABLE {qn(staging)}')
+
+
+def _executemany_upsert(model, fields, rows, conflict_fields, update_fields, keep_existing):
+    table = model._meta.db_table
+    qn = connection.ops.quote_name
+    column_list = ', '.join(qn(_column(model, f)) for f in fields)
+    placeholders = ', '.join(['%s'] * len(fields))
+    model_fields = [model._meta.get_field(f) for f in fields]
+
+    # The `connection` proxy resolves a thread-local on every attribute
+    # access; bind the real connection once for the per-value conversions
+    db = connections[DEFAULT_DB_ALIAS]
+    params = [
+        [field.get_db_prep_save(row[name], db) for field, name in zip(model_fields, fields)]
+        for row in rows
+    ]
+
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'INSERT INTO {qn(table)} ({column_list}) VALUES ({placeholders}) '
+            f'{_on_conflict(model, conflict_fields, update_fields, keep_existing)}',
+            params
+        )
+
+
+def _on_conflict(model, conflict_fields, update_fields, keep_existing):
+    qn = connection.ops.quote_name
+    table = qn(model._meta.db_table)
+    target = ', '.join(qn(_column(model, f)) for f in conflict_fields)
+
+    assignments = []
+    for name in update_fields:
+        column = qn(_column(model, name))
+        if name in keep_existing:
+            assignments.append(f'{column} = COALESCE(EXCLUDED.{column}, {table}.{column})')
+        else:
+            assignments.append(f'{column} = EXCLUDED.{column}')
+
+    return f'ON CONFLICT ({target}) DO UPDATE SET {", ".join(assignments)}'
+
+
+def _column(model, name):
+    return model._meta.get_field(name).column
+
+
+def _copy_value(model, name, value):
+    """Render one value for COPY ... (FORMAT csv)."""
+    if value is None:
+        return '\\N'
+
+    field = model._meta.get_field(name)
+    if isinstance(field, models.JSONField):
+        return json.dumps(value, cls=field.encoder)
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, models.Model):
+        return str(value.pk)
+    if isinstance(value, Decimal):
+        return format(value, 'f')
+    return str(value)
+
+
+def _with_timestamps(model, rows, update_fields):
+    now = timezone.now()
+    defaults = {}
+    update_fields = list(update_fields)
+    for field in model._meta.concrete_fields:
+        if not isinstance(field, models.DateField) or field.name in rows[0]:
+            continue
+        if field.auto_now or field.auto_now_add:
+            defaults[field.name] = now
+        if field.auto_now and field.name not in update_fields:
+            update_fields.append(field.name)
+
+    if defaults:
+        rows = [{**row, **defaults} for row in rows]
+    return rows, update_fields
+
+
+def _dedupe(rows, conflict_fields):
+    """Keep the last row per conflict key; ON CONFLICT cannot touch a row twice."""
+    merged = {}
+    for row in rows:
+        merged[tuple(row[f] for f in conflict_fields)] = row
+    return list(merged.values())
@@ -0,0 +1,165 @@
+"""
+Import coordination: one writer per (report type, year).
+
+Imports for the same key queue behind each other; imports for different
+years (or types) run in parallel.
+
+PostgreSQL: transaction-scoped advisory locks (pg_advisory_xact_lock),
+released automatically on commit or rollback.
+Other databases: a row in ImportLock per held key, plus an in-process lock
+so threads of one server queue without polling the table. SQLite allows a
+single writer and fails transactions that read before writing while another
+writer is active, so there all keys share one in-process lock and only the
+ImportLock rows are per key.
+"""
+import hashlib
+import os
+import socket
+import threading
+import time
+from contextlib import ExitStack, contextmanager, nullcontext
+from datetime import timedelta
+
+from django.db import DatabaseError, connection, transaction
+from django.utils import timezone
+
+from .models import ImportLock
+
+# Seconds to wait for another import of the same key before giving up
+LOCK_TIMEOUT = 60
+# ImportLock rows older than this are left over from a crashed process
+STALE_AFTER = timedelta(minutes=10)
+POLL_INTERVAL = 0.05
+
+_held = threading.local()
+_local_locks = {}
+_local_locks_guard = threading.Lock()
+
+
+class ImportLockTimeout(Exception):
+    """Another import of the same report type and year kept the lock too long."""
+
+
+def lock_key(model, year, report_type=None):
+    """Key for imports writing `model` rows of one year (and report type, for Report)."""
+    label = model._meta.label_lower
+    if report_type:
+        label = f'{label}/{report_type}'
+    return f'{label}:{year}'
+
+
+@contextmanager
+def import_lock(*keys, timeout=LOCK_TIMEOUT, timer=None):
+    """
+    Run the block in a transaction holding every lock in `keys`.
+
+        with import_lock(lock_key(Report, 2024, 'delivery'), timer=timer):
+            ...
+
+    Time spent waiting is recorded as the 'lock' stage of `timer`, if given.
+    Locks are taken in sorted order so multi-key callers cannot deadlock.
+    Keys already held by this thread are not taken again, so nested
+    import_lock() blocks (e.g. a workbook import calling the parsers) work.
+    Raises ImportLockTimeout if a lock is not free within `timeout` seconds.
+    """
+    held = _held_keys()
+    wanted = sorted(set(keys) - held)
+    waiting = timer.stage('lock') if timer else nullcontext()
+
+    if connection.vendor == 'postgresql':
+        with transaction.atomic():
+            with waiting:
+                for key in wanted:
+                    _advisory_lock(key, timeout)
+            held.update(wanted)
+            try:
+                yield
+            finally:
+                held.difference_update(wanted)
+        return
+
+    with ExitStack() as stack:
+        deadline = time.monotonic() + timeout
+        with waiting:
+            for key in wanted:
+                stack.enter_context(_table_lock(key, deadline))
+        held.update(wanted)
+        try:
+            with transaction.atomic():
+                if wanted:
+                    # Write first: SQLite only waits for its write lock if the
+                    # transaction has not read anything yet
+                    ImportLock.objects.filter(key__in=wanted).update(acquired_at=timezone.now())
+                yield
+        finally:
+            held.difference_update(wanted)
+
+
+def _held_keys():
+    if not hasattr(_held, 'keys'):
+        _held.keys = set()
+    return _held.keys
+
+
+def _advisory_lock(key, timeout):
+    # Advisory locks take a bigint; use the first 8 bytes of a stable hash
+    lock_id = int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), 'big', signed=True)
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT current_setting('lock_timeout')")
+        previous = cursor.fetchone()[0]
+        cursor.execute("SELECT set_config('lock_timeout', %s, true)", [f'{int(timeout * 1000)}ms'])
+        try:
+            cursor.execute('SELECT pg_advisory_xact_lock(%s)', [lock_id])
+        except DatabaseError as e:
+            # lock_not_available; the surrounding transaction is rolled back
+            raise ImportLockTimeout(f'Another import of {key} is still running') from e
+        cursor.execute("SELECT set_config('lock_timeout', %s, true)", [previous])
+
+
+@contextmanager
+def _table_lock(key, deadline):
+    local = _local_lock(key)
+    if not local.acquire(timeout=max(deadline - time.monotonic(), 0)):
+        raise ImportLockTimeout(f'Another import of {key} is still running')
+
+    try:
+        _insert_lock_row(key, deadline)
+        try:
+            yield
+        finally:
+            _delete_lock_row(key)
+    finally:
+        local.release()
+
+
+def _local_lock(key):
+    if connection.vendor == 'sqlite':
+        key = '*'
+    with _local_locks_guard:
+        # Re-entrant: a thread taking several keys may get the shared SQLite lock twice
+        return _local_locks.setdefault(key, threading.RLock())
+
+
+def _insert_lock_row(key, deadline):
+    owner = f'{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}'[:100]
+    while True:
+        try:
+            with transaction.atomic():
+                ImportLock.objects.filter(key=key, acquired_at__lt=timezone.now() - STALE_AFTER).delete()
+                ImportLock.objects.create(key=key, owner=owner)
+            return
+        except DatabaseError:
+            # IntegrityError: held by another process; otherwise the
+            # database is busy with another writer
+            if time.monotonic() >= deadline:
+                raise ImportLockTimeout(f'Another import of {key} is still running')
+            time.sleep(POLL_INTERVAL)
+
+
+def _delete_lock_row(key):
+    for _ in range(100):
+        try:
+            ImportLock.objects.filter(key=key).delete()
+            return
+        except DatabaseError:
+            time.sleep(POLL_INTERVAL)
@@ -0,0 +1,263 @@
+import gc
+import io
+import json
+import platform
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+
+import pandas as pd
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from apps.imports.parsers import DeliveryReportParser, FinancialReportParser, clean_value
+from apps.imports.synthetic import delivery_csv, financial_csv, bulk_create_payload
+from apps.reports.models import ReportType
+from apps.reports.views import ReportViewSet
+
+BENCHMARK_DIR = Path(settings.BASE_DIR) / 'benchmarks'
+
+# Year used for benchmark writes; everything is rolled back afterwards
+BENCHMARK_YEAR = 2099
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the import pipeline on synthetic files and compare against a stored baseline'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scales', default='1,100',
+            help='Comma-separated scale factors, e.g. 1,100,10000 (default: 1,100)'
+        )
+        parser.add_argument(
+            '--output', default=str(BENCHMARK_DIR / 'results.json'),
+            help='Where to write the JSON results'
+        )
+        parser.add_argument(
+            '--baseline', default=str(BENCHMARK_DIR / 'baseline.json'),
+            help='Baseline results to compare against'
+        )
+        parser.add_argument(
+            '--save-baseline', action='store_true',
+            help='Store this run as the new baseline'
+        )
+        parser.add_argument(
+            '--repeat', type=int, default=3,
+            help='Runs per benchmark; the fastest run is recorded (default: 3)'
+        )
+        parser.add_argument(
+            '--threshold', type=float, default=0.25,
+            help='Allowed throughput drop before flagging a regression (0.25 = 25%%)'
+        )
+        parser.add_argument(
+            '--fail-on-regression', action='store_true',
+            help='Exit with an error if any regression is flagged'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            scales = [int(s) for s in options['scales'].split(',') if s.strip()]
+        except ValueError:
+            raise CommandError('--scales must be a comma-separated list of integers')
+
+        results = []
+        for scale in scales:
+            self.stdout.write(f'Running benchmarks at {scale}x...')
+            results.extend(self.run_scale(scale, options['repeat']))
+
+        baseline = self.load_baseline(options['baseline'])
+        regressions = compare_to_baseline(results, baseline, options['threshold'])
+
+        report = {
+            'generated_at': datetime.now(timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'database': connection.vendor,
+            'threshold': options['threshold'],
+            'results': results,
+            'regressions': regressions,
+        }
+        self.write_json(options['output'], report)
+        self.print_results(results, regressions)
+
+        if options['save_baseline']:
+            self.write_json(options['baseline'], report)
+            self.stdout.write(self.style.SUCCESS(f'✓ Baseline saved to {options["baseline"]}'))
+
+        if regressions and options['fail_on_regression']:
+            raise CommandError(f'{len(regressions)} benchmark regression(s) flagged')
+
+    def run_scale(self, scale, repeat=1):
+        """Run every benchmark at one scale inside a transaction that is rolled back."""
+        delivery_text, delivery_rows = delivery_csv(scale)
+        financial_text, financial_rows = financial_csv(scale)
+        payload, payload_cells = bulk_create_payload(scale, year=BENCHMARK_YEAR)
+
+        # clean_value input: every cell of the delivery file, as read from CSV
+        cells = pd.read_csv(io.StringIO(delivery_text), header=1, dtype=str).to_numpy().ravel()
+
+        results = []
+        with transaction.atomic():
+            user = User.objects.create(username=f'benchmark-{time.time_ns()}')
+            report_type = ReportType.objects.create(name='Benchmark', slug=f'benchmark-{time.time_ns()}')
+            payload['report_type_slug'] = report_type.slug
+
+            results.append(measure('clean_value', scale, len(cells), lambda: [clean_value(c) for c in cells], repeat))
+            results.append(measure(
+                'delivery_parser', scale, delivery_rows,
+                lambda: _check_import(DeliveryReportParser().parse_and_import(
+                    io.StringIO(delivery_text), BENCHMARK_YEAR, user
+                )),
+                repeat
+            ))
+            results.append(measure(
+                'financial_parser', scale, financial_rows,
+                lambda: _check_import(FinancialReportParser().parse_and_import(
+                    io.StringIO(financial_text), BENCHMARK_YEAR, user
+                )),
+                repeat
+            ))
+            results.append(measure(
+                'report_bulk_create', scale, payload_cells,
+                lambda: _post_bulk_create(payload, user),
+                repeat
+            ))
+
+            transaction.set_rollback(True)
+
+        return results
+
+    def load_baseline(self, path):
+        baseline_path = Path(path)
+        if not baseline_path.exists():
+            return None
+        with open(baseline_path) as f:
+            return json.load(f)
+
+    def write_json(self, path, data):
+        output = Path(path)
+        output.parent.mkdir(parents=True, exist_ok=True)
+        with open(output, 'w') as f:
+            json.dump(data, f, indent=2)
+
+    def print_results(self, results, regressions):
+        self.stdout.write('')
+        self.stdout.write(f'{"benchmark":<22}{"scale":>8}{"rows":>12}{"rows/sec":>14}{"queries":>10}{"peak MB":>10}')
+        for r in results:
+            self.stdout.write(
+                f'{r["name"]:<22}{r["scale"]:>8}{r["rows"]:>12}{r["rows_per_sec"]:>14.0f}'
+                f'{r["queries"]:>10}{r["peak_mb"]:>10.1f}'
+            )
+
+        if regressions:
+            self.stdout.write('')
+            for reg in regressions:
+                self.stdout.write(self.style.ERROR(f'✗ Regression: {reg["key"]} {reg["reason"]}'))
+        else:
+            self.stdout.write(self.style.SUCCESS('\n✓ No regressions against baseline'))
+
+
+def measure(name, scale, rows, fn, repeat=1):
+    """
+    Time `fn` and collect throughput, query count and peak memory.
+    Each run is rolled back to a savepoint so every repeat starts from the
+    same database state; the fastest run is kept. Memory is measured in one
+    more run, since tracing allocations slows the timed ones down.
+    """
+    best = None
+    for _ in range(max(repeat, 1)):
+        gc.collect()
+        with transaction.atomic(), CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            fn()
+            seconds = time.perf_counter() - start
+            transaction.set_rollback(True)
+
+        if best is None or seconds < best[0]:
+            best = (seconds, len(queries))
+
+    seconds, query_count = best
+    return {
+        'name': name,
+        'scale': scale,
+        'rows': rows,
+        'seconds': round(seconds, 6),
+        'rows_per_sec': round(rows / seconds, 2) if seconds else None,
+        'queries': query_count,
+        'peak_mb': round(peak_mb(fn), 2),
+    }
+
+
+def compare_to_baseline(results, baseline, threshold):
+    """
+    Flag results slower than the baseline by more than `threshold`, or
+    issuing more queries. Results without a baseline entry are skipped.
+    """
+    if not baseline:
+        return []
+
+    previous = {f'{r["name"]}@{r["scale"]}': r for r in baseline.get('results', [])}
+    regressions = []
+    for r in results:
+        key = f'{r["name"]}@{r["scale"]}'
+        base = previous.get(key)
+        if not base:
+            continue
+
+        if base.get('rows_per_sec') and r['rows_per_sec'] is not None:
+            if r['rows_per_sec'] < base['rows_per_sec'] * (1 - threshold):
+                regressions.append({
+                    'key': key,
+                    'metric': 'rows_per_sec',
+                    'baseline': base['rows_per_sec'],
+                    'current': r['rows_per_sec'],
+                    'reason': f'throughput {r["rows_per_sec"]:.0f} rows/s vs {base["rows_per_sec"]:.0f} baseline',
+                })
+        if r['queries'] > base.get('queries', r['queries']):
+            regressions.append({
+                'key': key,
+                'metric': 'queries',
+                'baseline': base['queries'],
+                'current': r['queries'],
+                'reason': f'{r["queries"]} queries vs {base["queries"]} baseline',
+            })
+
+    return regressions
+
+
+def peak_mb(fn):
+    """
+    Peak memory allocated while `fn` runs, in MB: what this benchmark needs
+    on top of what the process already held (tracemalloc sees Python objects
+    and NumPy/pandas buffers). The run is rolled back.
+    """
+    gc.collect()
+    tracemalloc.start()
+    try:
+        with transaction.atomic():
+            fn()
+            transaction.set_rollback(True)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak / (1024 * 1024)
+
+
+def _check_import(outcome):
+    success, result = outcome
+    if not success:
+        raise CommandError(f'Benchmark import failed: {result}')
+
+
+def _post_bulk_create(payload, user):
+    request = APIRequestFactory().post('/api/reports/bulk-create/', payload, format='json')
+    force_authenticate(request, user=user)
+    # Large scales exceed the upload limit meant for real clients
+    with override_settings(DATA_UPLOAD_MAX_MEMORY_SIZE=None):
+        response = ReportViewSet.as_view({'post': 'bulk_create'})(request)
+    if response.status_code != 201:
+        raise CommandError(f'Benchmark bulk_create failed: {response.data}')
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.imports.locks import ImportLockTimeout
+from apps.imports.readers import file_format, supported_extensions
+from apps.imports.timesheets import TimesheetImporter
+from apps.imports.timing import record_import
+
+
+class Command(BaseCommand):
+    help = 'Load a timesheet export (CSV/XLSX/Parquet/Arrow) and recompute the hour metrics of its months'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Timesheet file to load')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = file_format(path)
+        if fmt is None:
+            raise CommandError(f'Unsupported file type. Allowed: {supported_extensions()}')
+
+        importer = TimesheetImporter()
+        with open(path, 'rb') as file:
+            try:
+                success, result = importer.parse_and_import(file, None, file_format=fmt)
+            except ImportLockTimeout as e:
+                success, result = False, str(e)
+        timings = record_import(
+            'timesheets', importer.timer, None,
+            file_name=path, rows=result['entries'] if success else 0,
+            error='' if success else result
+        )
+        if not success:
+            raise CommandError(result)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"✓ {result['entries']} entries for {result['employees']} employees "
+            f"({result['skipped']} rows skipped) in {timings['total']['seconds']:.2f}s"
+        ))
+        self.stdout.write(f"  Months updated: {', '.join(result['months_updated'])}")
@@ -0,0 +1,41 @@
+# Generated by Django 4.2.27 on 2026-10-19 10:24
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportLog',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(choices=[('delivery', 'Delivery import'), ('financial', 'Financial import'), ('workbook', 'Workbook import'), ('bulk_create', 'Report bulk create')], max_length=20)),
+                ('report_type', models.CharField(blank=True, help_text='Report type slug, if known', max_length=100)),
+                ('year', models.IntegerField(blank=True, null=True)),
+                ('file_name', models.CharField(blank=True, max_length=255)),
+                ('mode', models.CharField(default='replace', max_length=20)),
+                ('status', models.CharField(choices=[('success', 'Success'), ('failed', 'Failed')], max_length=20)),
+                ('rows', models.IntegerField(default=0, help_text='Months written or compared')),
+                ('timings', models.JSONField(default=dict, help_text='\n        Seconds and query counts per stage. Example:\n        {\n            "read": {"seconds": 0.012, "queries": 0},\n            "write": {"seconds": 0.080, "queries": 24},\n            "total": {"seconds": 0.120, "queries": 31}\n        }\n        ')),
+                ('total_seconds', models.FloatField(default=0)),
+                ('error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='import_logs', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Import Log',
+                'verbose_name_plural': 'Import Logs',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['source', '-created_at'], name='imports_imp_source_efa6e9_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 4.2.27 on 2026-10-19 10:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('imports', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportLock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(help_text='e.g. core.deliveryreportsnapshot:2024', max_length=255, unique=True)),
+                ('owner', models.CharField(help_text='host:pid:thread holding the lock', max_length=100)),
+                ('acquired_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Import Lock',
+                'verbose_name_plural': 'Import Locks',
+            },
+        ),
+    ]
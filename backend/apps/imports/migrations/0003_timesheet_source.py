@@ -0,0 +1,18 @@
+# Generated by Django 4.2.27 on 2026-10-19 10:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('imports', '0002_importlock'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='importlog',
+            name='source',
+            field=models.CharField(choices=[('delivery', 'Delivery import'), ('financial', 'Financial import'), ('workbook', 'Workbook import'), ('timesheets', 'Timesheet import'), ('bulk_create', 'Report bulk create')], max_length=20),
+        ),
+    ]
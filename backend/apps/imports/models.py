@@ -1,3 +1,80 @@
 from django.db import models
+from django.contrib.auth.models import User
 
-# Create your models here.
+
+class ImportLog(models.Model):
+    """
+    One import run (CSV/XLSX/Parquet upload or bulk-create) with its
+    per-stage timings and query counts.
+    """
+    SOURCE_CHOICES = [
+        ('delivery', 'Delivery import'),
+        ('financial', 'Financial import'),
+        ('workbook', 'Workbook import'),
+        ('timesheets', 'Timesheet import'),
+        ('bulk_create', 'Report bulk create'),
+    ]
+    STATUS_CHOICES = [
+        ('success', 'Success'),
+        ('failed', 'Failed'),
+    ]
+
+    source = models.CharField(max_length=20, choices=SOURCE_CHOICES)
+    report_type = models.CharField(max_length=100, blank=True, help_text="Report type slug, if known")
+    year = models.IntegerField(null=True, blank=True)
+    file_name = models.CharField(max_length=255, blank=True)
+    mode = models.CharField(max_length=20, default='replace')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES)
+    rows = models.IntegerField(default=0, help_text="Months written or compared")
+
+    timings = models.JSONField(
+        default=dict,
+        help_text="""
+        Seconds and query counts per stage. Example:
+        {
+            "read": {"seconds": 0.012, "queries": 0},
+            "write": {"seconds": 0.080, "queries": 24},
+            "total": {"seconds": 0.120, "queries": 31}
+        }
+        """
+    )
+    total_seconds = models.FloatField(default=0)
+    error = models.TextField(blank=True)
+
+    created_by = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='import_logs'
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = 'Import Log'
+        verbose_name_plural = 'Import Logs'
+        indexes = [
+            models.Index(fields=['source', '-created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.get_source_display()} {self.year or ''} - {self.status}"
+
+
+class ImportLock(models.Model):
+    """
+    Held while an import writes one (report type, year), on databases
+    without advisory locks (SQLite). A row older than the stale timeout is
+    treated as left behind by a crashed process and removed.
+    """
+    key = models.CharField(max_length=255, unique=True, help_text="e.g. core.deliveryreportsnapshot:2024")
+    owner = models.CharField(max_length=100, help_text="host:pid:thread holding the lock")
+    acquired_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Import Lock'
+        verbose_name_plural = 'Import Locks'
+
+    def __str__(self):
+        return f"{self.key} ({self.owner})"
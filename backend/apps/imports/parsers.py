@@ -1,7 +1,23 @@
 import pandas as pd
 from decimal import Decimal, InvalidOperation
-from django.db import transaction
-from apps.core.models import Year, Month, DeliveryReportSnapshot, FinReportSnapshot
+from django.utils import timezone
+from apps.core.models import DeliveryReportSnapshot, FinReportSnapshot
+from apps.core.dashboard import schedule_warm
+from apps.core.periods import get_or_create_months
+from apps.core.summaries import refresh_snapshot_summaries
+from apps.reports.benchmarks import store_benchmarks
+from apps.reports.checks import run_checks
+from apps.reports.models import ReportType
+from .diff import diff_snapshot_frame, summarize_changes
+from .loaders import bulk_upsert
+from .locks import ImportLockTimeout, import_lock, lock_key
+from .readers import read_table, clean_column
+from .timing import StageTimer
+
+MONTH_NAMES = ['January', 'February', 'March', 'April', 'May', 'June',
+               'July', 'August', 'September', 'October', 'November', 'December']
+
+IMPORT_MODES = ('replace', 'diff', 'bulk')
 
 
 def clean_value(value):
@@ -19,210 +35,388 @@ def clean_value(value):
         return None
 
 
-class DeliveryReportParser:
-    """Parser for delivery report CSV files (transposed format)."""
+class SnapshotImporter:
+    """
+    Shared write logic for the snapshot parsers.
+    Subclasses turn a file into a DataFrame indexed by month number with one
+    column per model field; this class writes that frame for a year.
+    """
+    model = None
+    integer_fields = ()
+    # Row holding the column headers in CSV/XLSX uploads
+    header_row = 1
+    # Report type whose checks run on parsed files and that benchmarks
+    # parsed with them (frame.attrs['benchmarks']) belong to
+    report_type_slug = None
+
+    def __init__(self):
+        # Per-stage timings of the last parse/import run by this instance
+        self.timer = StageTimer()
+
+    def import_frame(self, frame, year_value, user, mode='replace'):
+        """
+        Write parsed values for one year.
+        - replace: update_or_create every parsed month (all parsed fields rewritten)
+        - diff: load stored rows in one query and write only changed cells
+        - bulk: one set-based upsert of every parsed month (COPY on PostgreSQL)
+
+        Runs under the import lock for (model, year): concurrent imports of
+        the same year queue, other years proceed in parallel.
+
+        The report type's checks are run first; their violations are
+        returned with the result but do not stop the import.
 
-    def parse_and_import(self, file, year_value, user):
+        Rows are written in place: snapshot tables are not versioned by
+        ReportBatch, so there is no previous version to roll back to.
+        """
+        report_type = self.report_type()
+        with self.timer.stage('check'):
+            violations = run_checks(report_type.checks, frame) if report_type else []
+
+        # Commit time is measured from the end of the writes to the end of
+        # the atomic block
+        lock = import_lock(lock_key(self.model, year_value), timer=self.timer)
+        with self.timer.until_exit('commit'), lock:
+            with self.timer.stage('resolve_periods'):
+                year, months = get_or_create_months(year_value, frame.index, user)
+
+            with self.timer.stage('write'):
+                changes = None
+                if mode == 'diff':
+                    changes = self._write_changes(frame, year, months, user)
+                    refresh_snapshot_summaries(self.model, [year.pk])
+                elif mode == 'bulk':
+                    self._write_bulk(frame, months, user)
+                    refresh_snapshot_summaries(self.model, [year.pk])
+                else:
+                    # update_or_create sends the signals that refresh summaries
+                    for month_num, values in frame.iterrows():
+                        report_data = {'uploaded_by': user}
+                        report_data.update(_present(values))
+                        self.model.objects.update_or_create(
+                            month=months[month_num],
+                            defaults=report_data
+                        )
+                self._write_benchmarks(frame, year, report_type)
+                schedule_warm([year.year])
+
+            self.timer.start('commit')
+
+        result = {
+            'months_imported': [MONTH_NAMES[m - 1] for m in frame.index],
+            'count': len(frame.index),
+            'violations': violations,
+        }
+        if changes is not None:
+            result['changes'] = changes
+        return result
+
+    def _write_changes(self, frame, year, months, user):
+        """Diff `frame` against the stored rows and bulk-write the changed cells only."""
+        fields = list(frame.columns)
+        stored = self.model.objects.filter(month__year=year).values('month__month', *fields)
+        existing = pd.DataFrame.from_records(list(stored), columns=['month__month'] + fields)
+        existing = existing.set_index('month__month')
+
+        changed = diff_snapshot_frame(self.model, frame, existing)
+        created_months = set(frame.index) - set(existing.index)
+        now = timezone.now()
+
+        to_create = []
+        to_update = {}
+        for month_num in frame.index:
+            row_changes = changed.loc[month_num]
+            # Unchanged, or a new month without any value
+            if not row_changes.any():
+                continue
+
+            if month_num in created_months:
+                to_create.append(self.model(
+                    month=months[month_num],
+                    uploaded_by=user,
+                    **_present(frame.loc[month_num])
+                ))
+                continue
+
+            # Group rows by the set of changed fields so each bulk_update
+            # only touches the columns that actually differ
+            changed_fields = tuple(f for f in fields if row_changes[f])
+            obj = self.model(month=months[month_num], uploaded_by=user, updated_at=now)
+            for field in changed_fields:
+                setattr(obj, field, frame.at[month_num, field])
+            to_update.setdefault(changed_fields, []).append(obj)
+
+        if to_create:
+            self.model.objects.bulk_create(to_create)
+        for changed_fields, objs in to_update.items():
+            self.model.objects.bulk_update(objs, list(changed_fields) + ['uploaded_by', 'updated_at'])
+
+        return summarize_changes(changed, created_months, label=lambda m: MONTH_NAMES[m - 1])
+
+    def report_type(self):
+        """The ReportType of `report_type_slug`, or None if it is not set up."""
+        if not self.report_type_slug:
+            return None
+        return ReportType.objects.filter(slug=self.report_type_slug).first()
+
+    def _write_benchmarks(self, frame, year, report_type):
+        """Store the benchmarks parsed with `frame` for the year."""
+        texts = frame.attrs.get('benchmarks')
+        if texts and report_type is not None:
+            store_benchmarks(report_type, year, texts)
+
+    def _write_bulk(self, frame, months, user):
+        """Upsert every parsed month in one statement; empty cells keep stored values."""
+        fields = list(frame.columns)
+        rows = [
+            {
+                'month_id': months[month_num].pk,
+                'uploaded_by_id': getattr(user, 'pk', None),
+                **values.to_dict(),
+            }
+            for month_num, values in frame.iterrows()
+        ]
+        bulk_upsert(
+            self.model, rows,
+            conflict_fields=['month_id'],
+            update_fields=fields + ['uploaded_by_id'],
+            keep_existing=fields
+        )
+
+    def _finalize(self, frame):
+        """Normalize a parsed frame: object cells, None for gaps, ints for integer fields."""
+        frame = frame.astype(object)
+        frame = frame.where(frame.notna(), None)
+
+        # Special handling for FTE (integer)
+        for field_name in self.integer_fields:
+            if field_name in frame.columns:
+                frame[field_name] = pd.Series(
+                    [None if v is None else int(v) for v in frame[field_name]],
+                    index=frame.index,
+                    dtype=object
+                )
+
+        return frame
+
+
+class DeliveryReportParser(SnapshotImporter):
+    """Parser for delivery report CSV files (transposed format)."""
+    model = DeliveryReportSnapshot
+    integer_fields = ('fte',)
+    report_type_slug = 'delivery'
+
+    # Map metric names to model fields
+    metrics_map = {
+        'Total Spent': 'total_spent',
+        'PTO': 'pto',
+        'Base': 'base_hours',
+        'Project hours': 'project_hours',
+        'Billable hours': 'billable_hours',
+        'Utilization(Excl PTO)': 'utilization_excl_pto',
+        'Utilization(Incl PTO)': 'utilization_incl_pto',
+        'Billability': 'billability',
+        'Billability Outsoursing': 'billability_outsourcing',
+        'Billability Outstaffing': 'billability_outstaffing',
+        'Billability T&M': 'billability_tm',
+        'Billability FP': 'billability_fp',
+        'FTE': 'fte',
+        'Av. Rate, h': 'av_rate_h',
+        'Revenue': 'revenue',
+        'Revenue growth, MtM 2024': 'revenue_growth_mtm',
+        'Salary': 'salary',
+        'Salary growth, MtM 2024': 'salary_growth_mtm',
+        'Av.Salary, h': 'av_salary_h',
+        'GP': 'gp',
+        'GP/FTE, h': 'gp_fte_h',
+        'Rev/prod salary': 'rev_prod_salary',
+        'GM,%': 'gm_percent',
+        'Avarage revenue per Outstaffing\n': 'avg_revenue_outstaffing',
+        'Avarage revenue per Outstaffing': 'avg_revenue_outstaffing',
+        'Avarage revenue per Outsourcing': 'avg_revenue_outsourcing',
+        'Avarage income per Outstaffing': 'avg_income_outstaffing',
+        'Avarage income per Outsourcing': 'avg_income_outsourcing',
+        'Avarage revenue per T&M\n': 'avg_revenue_tm',
+        'Avarage revenue per T&M': 'avg_revenue_tm',
+        'Avarage revenue per Fixed Price': 'avg_revenue_fp',
+        'Avarage income per T&M': 'avg_income_tm',
+        'Avarage income per Fixed Price': 'avg_income_fp',
+        'Average income per employee': 'avg_income_per_employee',
+        'Avarage salary prod': 'avg_salary_prod',
+    }
+
+    def parse(self, file, file_format='csv'):
         """
         Parse transposed CSV where rows are metrics and columns are months.
         Expected structure:
         - Row 1: empty, "Benchmark", empty columns
         - Row 2: "Name", empty, "January", "February", ..., "December"
         - Row 3+: Metric name, benchmark value, data for each month
-        """
-        try:
-            # Read CSV with header=1 (second row is header with month names)
-            df = pd.read_csv(file, header=1)
-
-            # Get or create year
-            year, _ = Year.objects.get_or_create(year=year_value, defaults={'created_by': user})
-
-            # Month names to look for in columns
-            month_names = ['January', 'February', 'March', 'April', 'May', 'June',
-                          'July', 'August', 'September', 'October', 'November', 'December']
-
-            # Map metric names to model fields
-            metrics_map = {
-                'Total Spent': 'total_spent',
-                'PTO': 'pto',
-                'Base': 'base_hours',
-                'Project hours': 'project_hours',
-                'Billable hours': 'billable_hours',
-                'Utilization(Excl PTO)': 'utilization_excl_pto',
-                'Utilization(Incl PTO)': 'utilization_incl_pto',
-                'Billability': 'billability',
-                'Billability Outsoursing': 'billability_outsourcing',
-                'Billability Outstaffing': 'billability_outstaffing',
-                'Billability T&M': 'billability_tm',
-                'Billability FP': 'billability_fp',
-                'FTE': 'fte',
-                'Av. Rate, h': 'av_rate_h',
-                'Revenue': 'revenue',
-                'Revenue growth, MtM 2024': 'revenue_growth_mtm',
-                'Salary': 'salary',
-                'Salary growth, MtM 2024': 'salary_growth_mtm',
-                'Av.Salary, h': 'av_salary_h',
-                'GP': 'gp',
-                'GP/FTE, h': 'gp_fte_h',
-                'Rev/prod salary': 'rev_prod_salary',
-                'GM,%': 'gm_percent',
-                'Avarage revenue per Outstaffing\n': 'avg_revenue_outstaffing',
-                'Avarage revenue per Outstaffing': 'avg_revenue_outstaffing',
-                'Avarage revenue per Outsourcing': 'avg_revenue_outsourcing',
-                'Avarage income per Outstaffing': 'avg_income_outstaffing',
-                'Avarage income per Outsourcing': 'avg_income_outsourcing',
-                'Avarage revenue per T&M\n': 'avg_revenue_tm',
-                'Avarage revenue per T&M': 'avg_revenue_tm',
-                'Avarage revenue per Fixed Price': 'avg_revenue_fp',
-                'Avarage income per T&M': 'avg_income_tm',
-                'Avarage income per Fixed Price': 'avg_income_fp',
-                'Average income per employee': 'avg_income_per_employee',
-                'Avarage salary prod': 'avg_salary_prod',
-            }
 
-            months_imported = []
-
-            with transaction.atomic():
-                # Process each month column
-                for month_num, month_name in enumerate(month_names, start=1):
-                    # Find the column with this month name
-                    month_col = None
-                    for col in df.columns:
-                        if month_name in str(col):
-                            month_col = col
-                            break
-
-                    if month_col is None:
-                        continue
-
-                    # Get or create month
-                    month, _ = Month.objects.get_or_create(
-                        year=year,
-                        month=month_num
-                    )
-
-                    # Collect data for this month
-                    report_data = {'uploaded_by': user}
-
-                    for _, row in df.iterrows():
-                        # First column (Name) contains metric name
-                        metric_name = str(row.iloc[0]).strip() if not pd.isna(row.iloc[0]) else ''
-
-                        if not metric_name:
-                            continue
-
-                        # Check if this metric is in our map
-                        if metric_name in metrics_map:
-                            field_name = metrics_map[metric_name]
-                            value = clean_value(row[month_col])
-
-                            if value is not None:
-                                # Special handling for FTE (integer)
-                                if field_name == 'fte':
-                                    report_data[field_name] = int(value)
-                                else:
-                                    report_data[field_name] = value
-
-                    # Create or update delivery report only if we have data
-                    if len(report_data) > 1:  # More than just uploaded_by
-                        DeliveryReportSnapshot.objects.update_or_create(
-                            month=month,
-                            defaults=report_data
-                        )
-                        months_imported.append(month_name)
+        XLSX sheets use the same layout; Parquet/Arrow files carry the
+        row-2 headers as column names.
 
-            return True, {'months_imported': months_imported, 'count': len(months_imported)}
+        Returns a DataFrame indexed by month number with one column per
+        model field. Months without any value are dropped. The Benchmark
+        column is returned as frame.attrs['benchmarks'] ({field: text}).
+        """
+        # Second row is header with month names
+        with self.timer.stage('read'):
+            df = read_table(file, file_format, header_row=self.header_row)
+        return self.parse_table(df)
+
+    def parse_table(self, df):
+        """Parse a delivery table whose columns are already named."""
+        with self.timer.stage('parse'):
+            # First column (Name) contains metric name
+            names = df.iloc[:, 0].map(lambda v: '' if pd.isna(v) else str(v).strip())
+            known = names.isin(self.metrics_map.keys())
+            fields = names[known].map(self.metrics_map)
+
+            month_columns = {}
+            for month_num, month_name in enumerate(MONTH_NAMES, start=1):
+                # Find the column with this month name
+                month_col = next((col for col in df.columns if month_name in str(col)), None)
+                if month_col is not None:
+                    month_columns[month_num] = month_col
+
+        with self.timer.stage('clean'):
+            columns = {}
+            for month_num, month_col in month_columns.items():
+                values = clean_column(df.loc[known, month_col], clean_value)
+                # Later rows win for metrics listed twice, but never with an empty value
+                columns[month_num] = values.groupby(fields.values, sort=False).last()
+
+            frame = pd.DataFrame(columns).T.dropna(how='all')
+            frame = self._finalize(frame)
+            frame.attrs['benchmarks'] = self._benchmarks(df, known, fields, month_columns)
+            return frame
+
+    def _benchmarks(self, df, known, fields, month_columns):
+        """{field: text} from the Benchmark column (the second one), later rows winning."""
+        if len(df.columns) < 2 or df.columns[1] in month_columns.values():
+            return {}
+        texts = df.loc[known, df.columns[1]].map(
+            lambda v: None if pd.isna(v) or not str(v).strip() else str(v).strip()
+        )
+        return {
+            field: text
+            for field, text in texts.groupby(fields.values, sort=False).last().items()
+            if pd.notna(text)
+        }
+
+    def parse_and_import(self, file, year_value, user, mode='replace', file_format='csv'):
+        """
+        Parse a delivery file and write it for `year_value`. A busy import
+        lock is not a failed import: ImportLockTimeout is raised.
+        """
+        try:
+            frame = self.parse(file, file_format)
+            return True, self.import_frame(frame, year_value, user, mode=mode)
 
+        except ImportLockTimeout:
+            raise
         except Exception as e:
             import traceback
             return False, f"Import failed: {str(e)}\n{traceback.format_exc()}"
 
 
-class FinancialReportParser:
+class FinancialReportParser(SnapshotImporter):
     """Parser for financial report CSV files."""
-
-    def parse_and_import(self, file, year_value, user):
+    model = FinReportSnapshot
+    integer_fields = ('production_team_fte',)
+    report_type_slug = 'financial'
+
+    # Map column names to model fields
+    fields_map = {
+        'Accrual Revenue (From QBO)': 'accrual_revenue',
+        'Accrual income (From Jira)': 'accrual_income',
+        'Cash income': 'cash_income',
+        'Sales commissions': 'sales_commissions',
+        'COGS': 'cogs',
+        'Gross Profit': 'gross_profit',
+        'Gross Margin, %': 'gross_margin_percent',
+        'Overhead': 'overhead',
+        'Production Team, FTE': 'production_team_fte',
+        'Overhead by FTE': 'overhead_by_fte',
+        'Net Margin before tax, $': 'net_margin_before_tax',
+        'Net Margin before tax, $(From Jira)': 'net_margin_before_tax_jira',
+        'Net Margin before tax, $\n(From Jira)': 'net_margin_before_tax_jira',
+        'Net Margin(cash), $': 'net_margin_cash',
+        'Income Tax': 'income_tax',
+        'Dividends to be paid': 'dividends_to_be_paid',
+        'Paid dividends': 'paid_dividends',
+        'Emergency fund to be saved': 'emergency_fund_to_be_saved',
+        'Emergency fund - saved': 'emergency_fund_saved',
+        'Dividends, %': 'dividends_percent',
+        'Emergency fund': 'emergency_fund_percent',
+    }
+
+    def parse(self, file, file_format='csv'):
         """
         Parse financial CSV where first column is month number.
         Expected structure:
         - Row 1: Optional type information
         - Row 2: Headers
         - Rows 3+: Data with month numbers in first column
+
+        XLSX sheets use the same layout; Parquet/Arrow files carry the
+        row-2 headers as column names.
+
+        Returns a DataFrame indexed by month number with one column per
+        model field. Every valid month row is kept, even if empty.
+        """
+        # Skip the first row if it's type info
+        with self.timer.stage('read'):
+            df = read_table(file, file_format, header_row=self.header_row)
+        return self.parse_table(df)
+
+    def parse_table(self, df):
+        """Parse a financial table whose columns are already named."""
+        with self.timer.stage('parse'):
+            # First column is month number; skip rows that are not a valid month
+            month_nums = df.iloc[:, 0].map(_month_number)
+            df = df[month_nums.notna()]
+            month_nums = month_nums[month_nums.notna()].astype(int)
+            columns = [(col, field) for col, field in self.fields_map.items() if col in df.columns]
+
+        with self.timer.stage('clean'):
+            frame = pd.DataFrame(index=month_nums.values)
+            for col_name, field_name in columns:
+                frame[field_name] = clean_column(df[col_name], clean_value).values
+
+            # Rows repeating a month are merged, later non-empty values winning
+            if frame.index.has_duplicates:
+                frame = frame.groupby(level=0, sort=False).last()
+
+            return self._finalize(frame)
+
+    def parse_and_import(self, file, year_value, user, mode='replace', file_format='csv'):
+        """
+        Parse a financial file and write it for `year_value`. A busy import
+        lock is not a failed import: ImportLockTimeout is raised.
         """
         try:
-            # Read CSV, skipping first row if it's type info
-            df = pd.read_csv(file, skiprows=1)
-
-            # Get or create year
-            year, _ = Year.objects.get_or_create(year=year_value, defaults={'created_by': user})
-
-            # Map column names to model fields
-            fields_map = {
-                'Accrual Revenue (From QBO)': 'accrual_revenue',
-                'Accrual income (From Jira)': 'accrual_income',
-                'Cash income': 'cash_income',
-                'Sales commissions': 'sales_commissions',
-                'COGS': 'cogs',
-                'Gross Profit': 'gross_profit',
-                'Gross Margin, %': 'gross_margin_percent',
-                'Overhead': 'overhead',
-                'Production Team, FTE': 'production_team_fte',
-                'Overhead by FTE': 'overhead_by_fte',
-                'Net Margin before tax, $': 'net_margin_before_tax',
-                'Net Margin before tax, $(From Jira)': 'net_margin_before_tax_jira',
-                'Net Margin before tax, $\n(From Jira)': 'net_margin_before_tax_jira',
-                'Net Margin(cash), $': 'net_margin_cash',
-                'Income Tax': 'income_tax',
-                'Dividends to be paid': 'dividends_to_be_paid',
-                'Paid dividends': 'paid_dividends',
-                'Emergency fund to be saved': 'emergency_fund_to_be_saved',
-                'Emergency fund - saved': 'emergency_fund_saved',
-                'Dividends, %': 'dividends_percent',
-                'Emergency fund': 'emergency_fund_percent',
-            }
-
-            months_imported = []
-
-            with transaction.atomic():
-                for _, row in df.iterrows():
-                    month_num = row.iloc[0]  # First column is month number
-
-                    # Skip if not a valid month
-                    try:
-                        month_num = int(month_num)
-                        if month_num < 1 or month_num > 12:
-                            continue
-                    except (ValueError, TypeError):
-                        continue
-
-                    # Get or create month
-                    month, _ = Month.objects.get_or_create(
-                        year=year,
-                        month=month_num
-                    )
-
-                    # Collect data for this month
-                    report_data = {'uploaded_by': user}
-
-                    for col_name, field_name in fields_map.items():
-                        if col_name in df.columns:
-                            value = clean_value(row[col_name])
-                            if value is not None:
-                                # Special handling for FTE (integer)
-                                if field_name == 'production_team_fte':
-                                    report_data[field_name] = int(value)
-                                else:
-                                    report_data[field_name] = value
-
-                    # Create or update financial report
-                    FinReportSnapshot.objects.update_or_create(
-                        month=month,
-                        defaults=report_data
-                    )
-
-                    months_imported.append(month.get_month_display())
-
-            return True, {'months_imported': months_imported, 'count': len(months_imported)}
+            frame = self.parse(file, file_format)
+            return True, self.import_frame(frame, year_value, user, mode=mode)
 
+        except ImportLockTimeout:
+            raise
         except Exception as e:
             return False, [f"Import failed: {str(e)}"]
+
+
+def _month_number(value):
+    """Return the month number for a first-column cell, or None if it is not 1-12."""
+    try:
+        month_num = int(value)
+    except (ValueError, TypeError):
+        return None
+    if month_num < 1 or month_num > 12:
+        return None
+    return month_num
+
+
+def _present(values):
+    """Field values from a parsed row, without the empty cells."""
+    return {field: value for field, value in values.items() if value is not None}
@@ -0,0 +1,93 @@
+import pandas as pd
+from decimal import Decimal
+from pathlib import Path
+
+# File extension -> format handled by read_table()
+FILE_FORMATS = {
+    '.csv': 'csv',
+    '.xlsx': 'xlsx',
+    '.xlsm': 'xlsx',
+    '.parquet': 'parquet',
+    '.arrow': 'arrow',
+    '.feather': 'arrow',
+    '.ipc': 'arrow',
+}
+
+
+def file_format(filename):
+    """Return the format for an uploaded file name, or None if unsupported."""
+    name = filename.lower()
+    for extension, fmt in FILE_FORMATS.items():
+        if name.endswith(extension):
+            return fmt
+    return None
+
+
+def supported_extensions():
+    return ', '.join(sorted(FILE_FORMATS))
+
+
+def read_table(file, fmt='csv', header_row=0, sheet_name=0):
+    """
+    Read an uploaded file into a DataFrame with its header applied.
+
+    - csv / xlsx: spreadsheet layout, column headers on `header_row`
+      (rows above it are skipped)
+    - parquet / arrow: machine-generated feeds, the stored column names are
+      the header and values keep their numeric types
+    """
+    if fmt == 'csv':
+        return pd.read_csv(file, header=header_row)
+    if fmt == 'xlsx':
+        return pd.read_excel(file, sheet_name=sheet_name, header=header_row)
+    if fmt == 'parquet':
+        return pd.read_parquet(file)
+    if fmt == 'arrow':
+        return _read_arrow(file)
+    raise ValueError(f'Unsupported file format: {fmt}')
+
+
+def read_workbook(file):
+    """
+    Read every sheet of an XLSX workbook in a single pass.
+    Returns {sheet_name: DataFrame} without headers applied; use
+    apply_header() with the layout of the matching report type.
+    """
+    return pd.read_excel(file, sheet_name=None, header=None)
+
+
+def apply_header(raw, header_row):
+    """Promote row `header_row` of a header-less sheet to column names."""
+    columns = [
+        f'Unnamed: {i}' if pd.isna(name) else (str(name) if not isinstance(name, str) else name)
+        for i, name in enumerate(raw.iloc[header_row])
+    ]
+    df = raw.iloc[header_row + 1:].reset_index(drop=True)
+    df.columns = columns
+    return df.infer_objects()
+
+
+def clean_column(series, clean_value):
+    """
+    Convert one column of raw cells to field values.
+    Typed numeric columns (XLSX numbers, Parquet/Arrow) are taken as-is;
+    only text columns go through `clean_value` string parsing.
+    """
+    if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+        values = series.astype(float)
+        return values.map(lambda v: None if pd.isna(v) else Decimal(repr(v)))
+    return series.map(clean_value)
+
+
+def _read_arrow(file):
+    """Read an Arrow IPC file (Feather v2) or stream."""
+    import pyarrow as pa
+
+    data = file.read() if hasattr(file, 'read') else Path(file).read_bytes()
+    source = pa.BufferReader(data)
+    try:
+        table = pa.ipc.open_file(source).read_all()
+    except pa.ArrowInvalid:
+        source.seek(0)
+        table = pa.ipc.open_stream(source).read_all()
+    return table.to_pandas()
@@ -0,0 +1,165 @@
+"""
+Synthetic import files for benchmarks and tests.
+
+Files follow the layouts in sample_data/: the delivery report is transposed
+(metrics as rows, months as columns, with a Benchmark column) and the
+financial report has one row per month under a value-type row. `scale`
+multiplies the number of data rows: extra delivery rows repeat the metric
+names, extra financial rows repeat the month numbers, so every generated
+row is still parsed and cleaned by the importers. Timesheets are one row
+per employee and weekday.
+"""
+import csv
+import io
+import numpy as np
+import pandas as pd
+from .parsers import MONTH_NAMES
+
+# (metric name, value kind) in the order of the real delivery export
+DELIVERY_METRICS = [
+    ('Total Spent', 'hours'), ('PTO', 'hours'), ('Base', 'hours'),
+    ('Project hours', 'hours'),
+    ('Utilization(Excl PTO)', 'percent'), ('Utilization(Incl PTO)', 'percent'),
+    ('Billable hours', 'hours'), ('Billability', 'percent'),
+    ('Billability Outsoursing', 'percent'), ('Billability Outstaffing', 'percent'),
+    ('Billability T&M', 'percent'), ('Billability FP', 'percent'),
+    ('FTE', 'integer'), ('Av. Rate, h', 'currency'), ('Revenue', 'currency'),
+    ('Revenue growth, MtM 2024', 'percent'), ('Salary', 'currency'),
+    ('Salary growth, MtM 2024', 'percent'), ('Av.Salary, h', 'currency'),
+    ('GP', 'currency'), ('GP/FTE, h', 'currency'), ('Rev/prod salary', 'currency'),
+    ('GM,%', 'percent'),
+    ('Avarage revenue per Outstaffing\n', 'currency'),
+    ('Avarage revenue per Outsourcing', 'currency'),
+    ('Avarage income per Outstaffing', 'currency'),
+    ('Avarage income per Outsourcing', 'currency'),
+    ('Avarage revenue per T&M\n', 'currency'),
+    ('Avarage revenue per Fixed Price', 'currency'),
+    ('Avarage income per T&M', 'currency'),
+    ('Avarage income per Fixed Price', 'currency'),
+    ('Average income per employee', 'currency'),
+    ('Avarage salary prod', 'plain'),
+]
+
+# (column header, value-type label, value kind) of the financial export
+FINANCIAL_COLUMNS = [
+    ('Accrual Revenue (From QBO)', 'Number, USD', 'plain'),
+    ('Accrual income (From Jira)', 'Number, USD', 'currency'),
+    ('Cash income', 'Number, USD', 'plain'),
+    ('Sales commissions', 'Number, USD', 'plain'),
+    ('COGS', 'Number, USD', 'currency'),
+    ('Gross Profit', 'Number, USD', 'plain'),
+    ('Gross Margin, %', 'Number, Percent', 'percent'),
+    ('Overhead', 'Number, USD', 'plain'),
+    ('Production Team, FTE', 'Plain Number', 'integer'),
+    ('Overhead by FTE', 'Number, USD', 'plain'),
+    ('Net Margin before tax, $', 'Number, USD', 'currency'),
+    ('Net Margin before tax, $\n(From Jira)', 'Number, USD', 'currency'),
+    ('Net Margin(cash), $', 'Number, USD', 'currency'),
+    ('Income Tax', 'Number, USD', 'plain'),
+    ('Dividends to be paid', 'Number, USD', 'currency'),
+    ('Paid dividends', 'Number, USD', 'currency'),
+    ('Emergency fund to be saved', 'Number, USD', 'currency'),
+    ('Emergency fund - saved', 'Number, USD', 'currency'),
+    ('Dividends, %', 'Number, Percent', 'percent'),
+    ('Emergency fund', 'Number, Percent', 'percent'),
+]
+
+
+def delivery_csv(scale=1, seed=0):
+    """Return (csv_text, data_row_count) for a transposed delivery report."""
+    rng = np.random.default_rng(seed)
+    rows = len(DELIVERY_METRICS) * scale
+    values = rng.uniform(10, 5000, size=(rows, len(MONTH_NAMES)))
+
+    out = io.StringIO()
+    writer = csv.writer(out, lineterminator='\n')
+    writer.writerow(['', 'Benchmark'] + [''] * (len(MONTH_NAMES) + 1))
+    writer.writerow(['Name', ''] + MONTH_NAMES + [''])
+    for i in range(rows):
+        name, kind = DELIVERY_METRICS[i % len(DELIVERY_METRICS)]
+        benchmark = '90-95%' if kind == 'percent' else ''
+        writer.writerow([name, benchmark] + [_format(v, kind) for v in values[i]] + [''])
+
+    return out.getvalue(), rows
+
+
+def financial_csv(scale=1, seed=0):
+    """Return (csv_text, data_row_count) for a financial report."""
+    rng = np.random.default_rng(seed)
+    rows = len(MONTH_NAMES) * scale
+    values = rng.uniform(-500, 5000, size=(rows, len(FINANCIAL_COLUMNS)))
+
+    out = io.StringIO()
+    writer = csv.writer(out, lineterminator='\n')
+    writer.writerow(['This row won\'t be in actual table. For DEV only. Contains information about value type']
+                    + [label for _, label, _ in FINANCIAL_COLUMNS])
+    writer.writerow(['Month'] + [header for header, _, _ in FINANCIAL_COLUMNS])
+    for i in range(rows):
+        month = i % len(MONTH_NAMES) + 1
+        writer.writerow([month] + [_format(v, kind) for v, (_, _, kind) in zip(values[i], FINANCIAL_COLUMNS)])
+
+    # Trailing blank and total rows are present in real exports and skipped by the parser
+    writer.writerow([''] * (len(FINANCIAL_COLUMNS) + 1))
+    writer.writerow(['Total'] + ['-'] * len(FINANCIAL_COLUMNS))
+
+    return out.getvalue(), rows
+
+
+def bulk_create_payload(scale=1, year=2099, report_type_slug='delivery', seed=0):
+    """
+    Return (payload, cell_count) for ReportViewSet.bulk_create.
+    Every month carries `scale` copies of the delivery metrics as data keys.
+    """
+    rng = np.random.default_rng(seed)
+    keys = [f'metric_{i}' for i in range(len(DELIVERY_METRICS) * scale)]
+    values = np.round(rng.uniform(10, 5000, size=(len(MONTH_NAMES), len(keys))), 2)
+
+    months = [
+        {'month': month, 'data': dict(zip(keys, values[month - 1].tolist()))}
+        for month in range(1, len(MONTH_NAMES) + 1)
+    ]
+    payload = {'report_type_slug': report_type_slug, 'year': year, 'months': months}
+    return payload, len(MONTH_NAMES) * len(keys)
+
+
+def _format(value, kind):
+    """Format a number the way the spreadsheet exports do."""
+    if kind == 'hours':
+        return f'{value:,.0f}  '
+    if kind == 'percent':
+        return f'{value / 50:.2f}%'
+    if kind == 'currency':
+        sign = '-' if value < 0 else ''
+        return f'{sign}${abs(value):,.2f}'
+    if kind == 'integer':
+        return str(int(value) // 100)
+    return f'{value:.2f}'
+
+
+def timesheet_csv(employees=10, year=2099, months=(1,), seed=0):
+    """
+    Return (csv_text, row_count) for a timesheet export: every employee logs
+    8 hours on each weekday of `months`, split between project, internal and
+    PTO time.
+    """
+    rng = np.random.default_rng(seed)
+    days = [
+        day for month in months
+        for day in pd.date_range(f'{year}-{month:02d}-01', periods=31, freq='D')
+        if day.month == month and day.weekday() < 5
+    ]
+
+    out = io.StringIO()
+    writer = csv.writer(out, lineterminator='\n')
+    writer.writerow(['Employee', 'Date', 'Hours', 'Type', 'Billable', 'Engagement', 'Contract'])
+    rows = 0
+    for e in range(employees):
+        engagement = ('Outsourcing', 'Outstaffing')[e % 2]
+        contract = ('T&M', 'Fixed Price')[e % 2]
+        for day in days:
+            kind = rng.choice(['Project', 'Project', 'Project', 'Internal', 'PTO'])
+            billable = 'Yes' if kind == 'Project' and rng.random() < 0.9 else 'No'
+            writer.writerow([f'E{e:05d}', day.strftime('%Y-%m-%d'), '8', kind, billable, engagement, contract])
+            rows += 1
+
+    return out.getvalue(), rows
@@ -1,3 +1,801 @@
-from django.test import TestCase
+import json
+import tempfile
+import threading
+import time
+import unittest
+from datetime import timedelta
+from unittest import mock
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from io import BytesIO, StringIO
+from pathlib import Path
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import IntegrityError, connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from apps.core.models import DeliveryCubeCell, DeliveryReportSnapshot, FinReportSnapshot, TimeEntry
+from apps.reports.batches import start_batch
+from apps.reports.models import Benchmark, Report, ReportType
+from . import locks
+from .loaders import bulk_upsert
+from .locks import STALE_AFTER, ImportLockTimeout, import_lock, lock_key
+from .management.commands.benchmark_imports import compare_to_baseline, measure
+from .models import ImportLock, ImportLog
+from .parsers import DeliveryReportParser, FinancialReportParser
+from .synthetic import DELIVERY_METRICS, delivery_csv, financial_csv, bulk_create_payload, timesheet_csv
+from .timesheets import TimesheetImporter
+from .timing import StageTimer
+
+
+class SyntheticFileTests(TestCase):
+    """Generated files must parse like the real exports in sample_data/."""
+
+    def test_delivery_csv_parses_every_month_and_metric(self):
+        text, rows = delivery_csv(scale=1)
+        frame = DeliveryReportParser().parse(StringIO(text))
+
+        self.assertEqual(rows, len(DELIVERY_METRICS))
+        self.assertEqual(list(frame.index), list(range(1, 13)))
+        self.assertEqual(
+            set(frame.columns),
+            set(DeliveryReportParser.metrics_map.values())
+        )
+        self.assertTrue(frame.notna().all().all())
+
+    def test_delivery_import_stores_the_benchmark_column(self):
+        ReportType.objects.create(name='Delivery', slug='delivery')
+        text, _ = delivery_csv(scale=1)
+        success, result = DeliveryReportParser().parse_and_import(
+            StringIO(text), 2099, User.objects.create(username='benchmarks'), mode='bulk'
+        )
+        self.assertTrue(success, result)
+
+        percent_fields = {
+            DeliveryReportParser.metrics_map[name] for name, kind in DELIVERY_METRICS if kind == 'percent'
+        }
+        benchmarks = Benchmark.objects.filter(year__year=2099)
+        self.assertEqual({b.metric for b in benchmarks}, percent_fields)
+        self.assertEqual({(b.text, b.low, b.high) for b in benchmarks}, {('90-95%', 90, 95)})
+
+    def test_delivery_csv_scales_rows(self):
+        _, rows = delivery_csv(scale=3)
+        self.assertEqual(rows, 3 * len(DELIVERY_METRICS))
+
+    def test_financial_csv_parses_every_month(self):
+        text, rows = financial_csv(scale=2)
+        frame = FinancialReportParser().parse(StringIO(text))
+
+        self.assertEqual(rows, 24)
+        self.assertEqual(list(frame.index), list(range(1, 13)))
+        self.assertIn('production_team_fte', frame.columns)
+        self.assertIsInstance(frame.at[1, 'production_team_fte'], int)
+
+    def test_bulk_create_payload_shape(self):
+        payload, cells = bulk_create_payload(scale=2, year=2099)
+
+        self.assertEqual(payload['year'], 2099)
+        self.assertEqual(len(payload['months']), 12)
+        self.assertEqual(cells, 12 * 2 * len(DELIVERY_METRICS))
+
+
+class IdentityCheckTests(TestCase):
+    """Report type checks run on the parsed file, in the dry run and in the import."""
+
+    CSV = (
+        'types\n'
+        'Month,Accrual Revenue (From QBO),COGS,Gross Profit\n'
+        '1,"$1,000.00",$400.00,$600.00\n'
+        '2,"$1,000.00",$400.00,$650.00\n'
+        '3,"$1,000.00",$400.00,\n'
+    )
+
+    def setUp(self):
+        self.user = User.objects.create(username='checks')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        ReportType.objects.create(
+            name='Financial', slug='financial',
+            field_schema={'accrual_revenue': {}, 'cogs': {}, 'gross_profit': {}},
+            checks=[{'name': 'Gross profit', 'rule': 'gross_profit = accrual_revenue - cogs', 'tolerance': 1}]
+        )
+
+    def _post(self, endpoint, **data):
+        upload = SimpleUploadedFile('financial.csv', self.CSV.encode(), content_type='text/csv')
+        return self.client.post(f'/api/import/{endpoint}/', {'file': upload, **data}, format='multipart')
+
+    def test_dry_run_reports_violations_without_writing(self):
+        response = self._post('validate', report_type='financial')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(response.data['row_count'], 3)
+        # Month 3 has no gross profit and is not checked
+        self.assertEqual(response.data['violations'], [{
+            'check': 'Gross profit', 'rule': 'gross_profit = accrual_revenue - cogs', 'period': 2,
+            'left': 650.0, 'right': 600.0, 'difference': 50.0, 'allowed': 1.0,
+        }])
+        self.assertFalse(FinReportSnapshot.objects.exists())
+
+    def test_import_returns_violations_and_still_writes(self):
+        response = self._post('financial', year=2099)
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual([v['period'] for v in response.data['data']['violations']], [2])
+        self.assertIn('check', response.data['timings'])
+        self.assertEqual(FinReportSnapshot.objects.filter(month__year__year=2099).count(), 3)
+
+
+class BenchmarkCommandTests(TestCase):
+
+    def test_command_writes_results_and_saves_baseline(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            output = Path(tmp) / 'results.json'
+            baseline = Path(tmp) / 'baseline.json'
+
+            call_command(
+                'benchmark_imports', scales='1', repeat=1,
+                output=str(output), baseline=str(baseline), save_baseline=True,
+                stdout=StringIO()
+            )
+
+            results = json.loads(output.read_text())
+            self.assertTrue(baseline.exists())
+
+        names = {r['name'] for r in results['results']}
+        self.assertEqual(
+            names,
+            {'clean_value', 'delivery_parser', 'financial_parser', 'report_bulk_create'}
+        )
+        for r in results['results']:
+            self.assertEqual(r['scale'], 1)
+            self.assertGreater(r['rows_per_sec'], 0)
+            self.assertGreater(r['peak_mb'], 0)
+        self.assertEqual(results['regressions'], [])
+
+    def test_peak_memory_is_measured_per_benchmark(self):
+        large = measure('large', 1, 1, lambda: bytearray(50 * 1024 * 1024))
+        small = measure('small', 1, 1, lambda: None)
+
+        self.assertGreaterEqual(large['peak_mb'], 50)
+        self.assertLess(small['peak_mb'], 1)
+
+    def test_compare_flags_slower_and_chattier_runs(self):
+        baseline = {'results': [
+            {'name': 'delivery_parser', 'scale': 1, 'rows_per_sec': 1000, 'queries': 10},
+        ]}
+        results = [
+            {'name': 'delivery_parser', 'scale': 1, 'rows_per_sec': 500, 'queries': 12},
+            {'name': 'financial_parser', 'scale': 1, 'rows_per_sec': 1, 'queries': 99},
+        ]
+
+        regressions = compare_to_baseline(results, baseline, threshold=0.25)
+
+        self.assertEqual(
+            {(r['key'], r['metric']) for r in regressions},
+            {('delivery_parser@1', 'rows_per_sec'), ('delivery_parser@1', 'queries')}
+        )
+
+    def test_compare_tolerates_noise_within_threshold(self):
+        baseline = {'results': [
+            {'name': 'clean_value', 'scale': 1, 'rows_per_sec': 1000, 'queries': 0},
+        ]}
+        results = [{'name': 'clean_value', 'scale': 1, 'rows_per_sec': 800, 'queries': 0}]
+
+        self.assertEqual(compare_to_baseline(results, baseline, threshold=0.25), [])
+
+
+class ImportTimingTests(TestCase):
+    """Per-stage timings are recorded for every import and summarized as percentiles."""
+
+    def setUp(self):
+        self.user = User.objects.create(username='timings')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_stages_count_queries_and_end_when_the_commit_fails(self):
+        timer = StageTimer()
+        with timer.stage('write'):
+            User.objects.count()
+            User.objects.exists()
+        with self.assertRaises(RuntimeError):
+            with timer.until_exit('commit'), transaction.atomic():
+                timer.start('commit')
+                raise RuntimeError('commit failed')
+
+        self.assertEqual(connection.execute_wrappers, [])
+        self.assertEqual(list(timer.as_dict()), ['write', 'commit', 'total'])
+        self.assertEqual(timer.as_dict()['write']['queries'], 2)
+
+    def test_upload_records_an_import_log(self):
+        text, _ = delivery_csv(scale=1)
+        response = self.client.post('/api/import/delivery/', {
+            'file': SimpleUploadedFile('delivery.csv', text.encode()), 'year': 2099,
+        })
+        self.assertEqual(response.status_code, 201, response.data)
+
+        log = ImportLog.objects.get()
+        self.assertEqual((log.source, log.status, log.year, log.rows), ('delivery', 'success', 2099, 12))
+        self.assertEqual(log.timings, response.data['timings'])
+        # In pipeline order in the response (jsonb does not keep key order)
+        self.assertEqual(
+            list(response.data['timings']),
+            ['read', 'parse', 'clean', 'check', 'lock', 'resolve_periods', 'write', 'commit', 'total']
+        )
+        self.assertGreater(log.timings['write']['queries'], 0)
+
+    def test_timings_endpoint_reports_percentiles_of_successful_imports(self):
+        for seconds in range(1, 11):
+            ImportLog.objects.create(source='delivery', status='success', timings={
+                'write': {'seconds': seconds, 'queries': 2 * seconds},
+                'total': {'seconds': seconds, 'queries': 2 * seconds},
+            })
+        slow = {'write': {'seconds': 99, 'queries': 99}}
+        ImportLog.objects.create(source='delivery', status='failed', timings=slow)
+        ImportLog.objects.create(source='financial', status='success', timings=slow)
+
+        response = self.client.get('/api/import/timings/', {'source': 'delivery'})
+
+        self.assertEqual(response.data['count'], 10)
+        self.assertEqual(list(response.data['stages']), ['write', 'total'])
+        self.assertEqual(response.data['stages']['write'], {
+            'count': 10, 'p50_seconds': 5.5, 'p95_seconds': 9.55, 'p50_queries': 11.0, 'p95_queries': 19.1,
+        })
+        self.assertEqual(self.client.get('/api/import/timings/', {'limit': 'x'}).status_code, 400)
+
+
+class DiffImportTests(TestCase):
+    """mode='diff' writes only the cells that differ from the stored rows and reports them."""
+
+    HEADER = 'Dev row,,\nMonth,Accrual Revenue (From QBO),Cash income\n'
+
+    def setUp(self):
+        self.user = User.objects.create(username='diff')
+
+    def _import(self, rows, mode='diff'):
+        success, result = FinancialReportParser().parse_and_import(
+            StringIO(self.HEADER + rows), 2099, self.user, mode=mode
+        )
+        self.assertTrue(success, result)
+        return result
+
+    def test_unchanged_reimport_writes_nothing(self):
+        self._import('1,100,50\n2,200,60\n', mode='replace')
+
+        with CaptureQueriesContext(connection) as queries:
+            result = self._import('1,100.00,50\n2,200,60\n')
+
+        self.assertEqual(result['changes'], {
+            'months': [], 'created': [], 'updated': [], 'unchanged': ['January', 'February'],
+            'fields': {}, 'cells_changed': 0,
+        })
+        self.assertFalse(any(q['sql'].startswith('UPDATE "core_finreportsnapshot"') for q in queries))
+
+    def test_changed_cell_and_new_month(self):
+        self._import('1,100,50\n2,200,60\n', mode='replace')
+        january = FinReportSnapshot.objects.get(month__month=1).updated_at
+
+        result = self._import('1,100,50\n2,200,61\n3,300,70\n')
+
+        self.assertEqual(result['changes'], {
+            'months': ['February', 'March'], 'created': ['March'], 'updated': ['February'],
+            'unchanged': ['January'],
+            'fields': {'accrual_revenue': ['March'], 'cash_income': ['February', 'March']},
+            'cells_changed': 3,
+        })
+        stored = dict(FinReportSnapshot.objects.values_list('month__month', 'cash_income'))
+        self.assertEqual(stored, {1: Decimal('50.00'), 2: Decimal('61.00'), 3: Decimal('70.00')})
+        self.assertEqual(FinReportSnapshot.objects.get(month__month=1).updated_at, january)
+
+    def test_empty_cells_are_not_changes(self):
+        self._import('1,100,50\n', mode='replace')
+
+        result = self._import('1,,50\n')
+
+        self.assertEqual(result['changes']['unchanged'], ['January'])
+        self.assertEqual(FinReportSnapshot.objects.get().accrual_revenue, Decimal('100.00'))
+
+    def test_new_month_without_values_is_not_created(self):
+        self._import('1,100,50\n', mode='replace')
+
+        result = self._import('1,100,50\n2,,\n3,-,n/a\n')
+
+        self.assertEqual(result['changes']['created'], [])
+        self.assertEqual(result['changes']['months'], [])
+        self.assertEqual(result['changes']['unchanged'], ['January', 'February', 'March'])
+        self.assertEqual(list(FinReportSnapshot.objects.values_list('month__month', flat=True)), [1])
+
+
+class FileFormatTests(TestCase):
+    """XLSX, Parquet and Arrow uploads go through the same parsers as CSV."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create(username='formats'))
+
+    def _post(self, url, name, content, **data):
+        response = self.client.post(url, {'file': SimpleUploadedFile(name, content), **data})
+        self.assertEqual(response.status_code, 201, response.data)
+        return response.data
+
+    def test_xlsx_skips_the_rows_above_the_header(self):
+        sheet_bytes = _xlsx({'Sheet1': [
+            ['Type info row', 'Number, USD', 'Number, USD'],
+            ['Month', 'Accrual Revenue (From QBO)', 'Cash income'],
+            [1, 1234.5, '$2,000.00'],
+            [2, 99, None],
+            ['Total', 1333.5, 2000],
+        ]})
+
+        data = self._post('/api/import/financial/', 'financial.xlsx', sheet_bytes, year=2099)
+
+        self.assertEqual(data['data']['months_imported'], ['January', 'February'])
+        january, february = FinReportSnapshot.objects.order_by('month__month')
+        self.assertEqual(january.accrual_revenue, Decimal('1234.50'))
+        self.assertEqual(january.cash_income, Decimal('2000.00'))
+        self.assertEqual(february.accrual_revenue, Decimal('99.00'))
+
+    def test_parquet_and_arrow_use_their_column_names(self):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        table = pa.table({
+            'Month': [1, 2],
+            'Accrual Revenue (From QBO)': [100.25, 200.0],
+            'Cash income': [50.0, None],
+        })
+        parquet = BytesIO()
+        pq.write_table(table, parquet)
+        self._post('/api/import/financial/', 'financial.parquet', parquet.getvalue(), year=2099)
+        self.assertEqual(FinReportSnapshot.objects.get(month__month=1).accrual_revenue, Decimal('100.25'))
+
+        entries = pa.table({
+            'Employee': ['alice', 'alice'],
+            'Date': ['2099-03-02', '2099-03-03'],
+            'Hours': [8.0, 6.5],
+            'Type': ['Project', 'PTO'],
+            'Billable': [True, False],
+        })
+        arrow = BytesIO()
+        with pa.ipc.new_file(arrow, entries.schema) as writer:
+            writer.write_table(entries)
+        data = self._post('/api/import/timesheets/', 'timesheets.arrow', arrow.getvalue())
+
+        self.assertEqual(data['data']['entries'], 2)
+        self.assertEqual(DeliveryReportSnapshot.objects.get(month__month=3).total_spent, Decimal('14.50'))
+
+    def test_workbook_imports_each_matching_sheet_with_its_header_row(self):
+        workbook = _xlsx({
+            'Delivery 2099': [
+                ['', 'Benchmark', 'January', ''],
+                ['Name', '', 'January', 'February'],
+                ['Total Spent', '', 160, 150],
+                ['PTO', '', 8, None],
+            ],
+            'Financials': [
+                ['Type info row', 'Number, USD'],
+                ['Month', 'Cash income'],
+                [1, 500],
+            ],
+            'Notes': [['Anything else is ignored']],
+        })
+
+        data = self._post('/api/import/workbook/', 'book.xlsx', workbook, year=2099)
+
+        self.assertEqual(set(data['data']), {'Delivery 2099', 'Financials'})
+        self.assertEqual(data['data']['Delivery 2099']['months_imported'], ['January', 'February'])
+        january = DeliveryReportSnapshot.objects.get(month__month=1)
+        self.assertEqual((january.total_spent, january.pto), (Decimal('160.00'), Decimal('8.00')))
+        self.assertEqual(FinReportSnapshot.objects.get().cash_income, Decimal('500.00'))
+
+    def test_workbook_without_a_matching_sheet_is_rejected(self):
+        response = self.client.post('/api/import/workbook/', {
+            'file': SimpleUploadedFile('book.xlsx', _xlsx({'Notes': [['x']]})), 'year': 2099,
+        })
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('No sheet matches', response.data['error'])
+
+
+def _xlsx(sheets):
+    """An XLSX file with one sheet per {name: rows}."""
+    from openpyxl import Workbook
+
+    workbook = Workbook()
+    workbook.remove(workbook.active)
+    for name, rows in sheets.items():
+        sheet = workbook.create_sheet(name)
+        for row in rows:
+            sheet.append(row)
+    out = BytesIO()
+    workbook.save(out)
+    return out.getvalue()
+
+
+class BulkLoaderTests(TestCase):
+    """
+    Run against whichever database is configured; the COPY tests need
+    DB_ENGINE=postgresql (see README).
+    """
+
+    def setUp(self):
+        self.user = User.objects.create(username='loader')
+
+    def test_bulk_mode_creates_then_updates_snapshots(self):
+        text, _ = financial_csv(scale=1)
+        success, result = FinancialReportParser().parse_and_import(
+            StringIO(text), 2099, self.user, mode='bulk'
+        )
+        self.assertTrue(success, result)
+        self.assertEqual(FinReportSnapshot.objects.filter(month__year__year=2099).count(), 12)
+
+        replace_text, _ = financial_csv(scale=1, seed=1)
+        FinancialReportParser().parse_and_import(StringIO(replace_text), 2098, self.user)
+        bulk_text, _ = financial_csv(scale=1, seed=1)
+        FinancialReportParser().parse_and_import(StringIO(bulk_text), 2099, self.user, mode='bulk')
+
+        # Same rows as the row-by-row import path
+        fields = [f for f in FinancialReportParser.fields_map.values()]
+        bulk = list(FinReportSnapshot.objects.filter(month__year__year=2099)
+                    .order_by('month__month').values(*fields))
+        replace = list(FinReportSnapshot.objects.filter(month__year__year=2098)
+                       .order_by('month__month').values(*fields))
+        self.assertEqual(bulk, replace)
+
+    def test_bulk_mode_uses_a_constant_number_of_queries(self):
+        small, _ = delivery_csv(scale=1)
+        large, _ = delivery_csv(scale=20, seed=1)
+        parser = DeliveryReportParser()
+
+        with CaptureQueriesContext(connection) as first:
+            parser.parse_and_import(StringIO(small), 2099, self.user, mode='bulk')
+        with CaptureQueriesContext(connection) as second:
+            parser.parse_and_import(StringIO(large), 2099, self.user, mode='bulk')
+
+        # Second run finds the year and months already present
+        self.assertLessEqual(len(second), len(first))
+
+    def test_empty_cells_keep_stored_values(self):
+        parser = DeliveryReportParser()
+        parser.parse_and_import(StringIO(delivery_csv(scale=1)[0]), 2099, self.user, mode='bulk')
+        stored = DeliveryReportSnapshot.objects.get(month__year__year=2099, month__month=1)
+
+        # Only revenue, and only January, is present in the second upload
+        text = 'x,Benchmark\nName,,January\nRevenue,,"$1,234.50"\n'
+        success, result = parser.parse_and_import(StringIO(text), 2099, self.user, mode='bulk')
+        self.assertTrue(success, result)
+
+        updated = DeliveryReportSnapshot.objects.get(pk=stored.pk)
+        self.assertEqual(updated.revenue, Decimal('1234.50'))
+        self.assertEqual(updated.fte, stored.fte)
+        self.assertEqual(updated.salary, stored.salary)
+
+    def test_upsert_merges_duplicate_keys_last_wins(self):
+        report_type = ReportType.objects.create(name='Loader', slug='loader')
+        parser = FinancialReportParser()
+        parser.parse_and_import(StringIO(financial_csv(scale=1)[0]), 2099, self.user)
+        months = {s.month.month: s.month for s in FinReportSnapshot.objects.select_related('month')}
+        batch = start_batch(report_type, months[1].year)
+
+        rows = [
+            {'batch_id': batch.pk, 'report_type_id': report_type.pk, 'year_id': months[1].year_id,
+             'org_unit_id': batch.org_unit_id, 'month_id': months[1].pk, 'data': {'revenue': value}}
+            for value in (1, 2, 3)
+        ]
+        self.assertEqual(bulk_upsert(Report, rows, ['batch_id', 'month_id'], ['data']), 1)
+        self.assertEqual(Report.objects.get(report_type=report_type).data, {'revenue': 3})
+
+    def test_bulk_create_endpoint_reports_created_and_updated(self):
+        ReportType.objects.create(name='Delivery', slug='delivery-bulk')
+        payload, _ = bulk_create_payload(scale=1, report_type_slug='delivery-bulk')
+        payload['mode'] = 'bulk'
+        client = APIClient()
+        client.force_authenticate(self.user)
+
+        first = client.post('/api/reports/bulk-create/', payload, format='json')
+        payload['months'] = payload['months'][:3]
+        payload['months'][0]['data'] = {'metric_0': 1.5}
+        second = client.post('/api/reports/bulk-create/', payload, format='json')
+
+        self.assertEqual(first.status_code, 201, first.data)
+        self.assertEqual(len(first.data['created']), 12)
+        self.assertEqual(second.data['created'], [])
+        self.assertEqual(second.data['updated'], ['2099-01', '2099-02', '2099-03'])
+        self.assertEqual(
+            Report.objects.active().get(report_type__slug='delivery-bulk', month__month=1).data,
+            {'metric_0': 1.5}
+        )
+        # Months not sent the second time are carried into the new batch
+        self.assertEqual(Report.objects.filter(batch_id=second.data['batch']).count(), 12)
+
+    @unittest.skipUnless(connection.vendor == 'postgresql', 'COPY path needs PostgreSQL')
+    def test_copy_path_streams_through_a_dropped_staging_table(self):
+        text, _ = delivery_csv(scale=1)
+        with CaptureQueriesContext(connection) as queries:
+            success, result = DeliveryReportParser().parse_and_import(
+                StringIO(text), 2099, self.user, mode='bulk'
+            )
+        self.assertTrue(success, result)
+
+        statements = [q['sql'] for q in queries.captured_queries]
+        self.assertTrue(any(s.startswith('CREATE TEMP TABLE') for s in statements))
+        self.assertTrue(any('ON CONFLICT' in s for s in statements))
+
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT count(*) FROM pg_tables WHERE tablename LIKE %s", ['%_staging_%'])
+            self.assertEqual(cursor.fetchone()[0], 0)
+        self.assertEqual(DeliveryReportSnapshot.objects.filter(month__year__year=2099).count(), 12)
+
+    @unittest.skipUnless(connection.vendor == 'postgresql', 'COPY path needs PostgreSQL')
+    def test_copy_path_round_trips_json_and_nulls(self):
+        report_type = ReportType.objects.create(name='Loader', slug='loader')
+        FinancialReportParser().parse_and_import(StringIO(financial_csv(scale=1)[0]), 2099, self.user)
+        month = FinReportSnapshot.objects.select_related('month').first().month
+        batch = start_batch(report_type, month.year)
+
+        data = {'name': 'a "quoted", multi\nline value', 'empty': None, 'n': 1.25}
+        bulk_upsert(
+            Report,
+            [{'batch_id': batch.pk, 'report_type_id': report_type.pk, 'year_id': month.year_id,
+              'org_unit_id': batch.org_unit_id, 'month_id': month.pk, 'data': data, 'uploaded_by_id': None}],
+            ['batch_id', 'month_id'],
+            ['data', 'uploaded_by_id']
+        )
+
+        report = Report.objects.get(report_type=report_type)
+        self.assertEqual(report.data, data)
+        self.assertIsNone(report.uploaded_by_id)
+
+    @unittest.skipUnless(connection.vendor == 'postgresql', 'COPY path needs PostgreSQL')
+    def test_copy_path_failure_raises_the_database_error(self):
+        FinancialReportParser().parse_and_import(StringIO(financial_csv(scale=1)[0]), 2099, self.user)
+        month = FinReportSnapshot.objects.first().month_id
+
+        # Not the InFailedSqlTransaction of cleaning up in the aborted transaction
+        with self.assertRaises(IntegrityError):
+            bulk_upsert(
+                FinReportSnapshot,
+                [{'month_id': month, 'cogs': None, 'uploaded_by_id': None, 'created_at': None}],
+                ['month_id'],
+                ['cogs']
+            )
+
+
+class TimesheetTests(TestCase):
+    """Raw time entries and their rollup into the monthly delivery hours."""
+
+    CSV = (
+        'Employee,Date,Hours,Type,Billable,Engagement,Contract\n'
+        'alice,2099-01-05,6,Project,Yes,Outsourcing,T&M\n'
+        'alice,2099-01-05,2,Project,No,Outsourcing,T&M\n'
+        'alice,2099-01-06,8,PTO,No,,\n'
+        'bob,2099-01-05,4,Project,Yes,Outstaffing,Fixed Price\n'
+        'bob,2099-01-05,4,Internal,No,,\n'
+        'bob,2099-02-02,8,Project,Yes,Outstaffing,Fixed Price\n'
+        'bob,2099-02-03,8,Meeting,No,,\n'
+    )
+
+    def setUp(self):
+        self.user = User.objects.create(username='timesheets')
+
+    def _import(self, text):
+        success, result = TimesheetImporter().parse_and_import(StringIO(text), self.user)
+        self.assertTrue(success, result)
+        return result
+
+    def test_rollup_derives_delivery_hours(self):
+        result = self._import(self.CSV)
+
+        self.assertEqual(result['skipped'], 1)
+        self.assertEqual(result['months_updated'], ['January 2099', 'February 2099'])
+        january = DeliveryReportSnapshot.objects.get(month__year__year=2099, month__month=1)
+        self.assertEqual(january.total_spent, Decimal('24.00'))
+        self.assertEqual(january.pto, Decimal('8.00'))
+        self.assertEqual(january.base_hours, Decimal('16.00'))
+        self.assertEqual(january.project_hours, Decimal('12.00'))
+        self.assertEqual(january.billable_hours, Decimal('10.00'))
+        self.assertEqual(january.utilization_excl_pto, Decimal('75.00'))
+        self.assertEqual(january.utilization_incl_pto, Decimal('50.00'))
+        self.assertEqual(january.billability, Decimal('83.33'))
+        self.assertEqual(january.billability_outsourcing, Decimal('75.00'))
+        self.assertEqual(january.billability_fp, Decimal('100.00'))
+        self.assertEqual(january.fte, 2)
+        year = DeliveryCubeCell.objects.get(
+            month=DeliveryCubeCell.WHOLE_YEAR, engagement=DeliveryCubeCell.ALL, contract=DeliveryCubeCell.ALL
+        )
+        self.assertEqual(year.total_minutes, 32 * 60)
+
+    def test_reload_replaces_only_touched_months(self):
+        self._import(self.CSV)
+        DeliveryReportSnapshot.objects.filter(month__month=1).update(revenue=1000)
+        DeliveryReportSnapshot.objects.filter(month__month=2).update(fte=99)
+
+        self._import('Employee,Date,Hours,Type,Billable\nalice,2099-01-07,3,Project,Yes\n')
+
+        january = DeliveryReportSnapshot.objects.get(month__month=1)
+        # alice's January entries are replaced; bob's are kept
+        self.assertEqual(january.total_spent, Decimal('11.00'))
+        self.assertEqual(january.fte, 2)
+        self.assertEqual(january.revenue, Decimal('1000.00'))
+        self.assertEqual(DeliveryReportSnapshot.objects.get(month__month=2).fte, 99)
+        self.assertEqual(TimeEntry.objects.filter(employee__code='alice').count(), 1)
+
+    def test_reload_keeps_months_an_employee_is_not_loaded_for(self):
+        self._import('Employee,Date,Hours,Type,Billable\nalice,2099-02-05,8,Project,Yes\n')
+
+        self._import(
+            'Employee,Date,Hours,Type,Billable\n'
+            'alice,2099-01-05,8,Project,Yes\n'
+            'bob,2099-02-06,8,Project,Yes\n'
+        )
+
+        # The file has alice in January and bob in February only
+        self.assertEqual(
+            sorted(TimeEntry.objects.values_list('employee__code', 'date__month')),
+            [('alice', 1), ('alice', 2), ('bob', 2)]
+        )
+        self.assertEqual(DeliveryReportSnapshot.objects.get(month__month=2).total_spent, Decimal('16.00'))
+
+    def test_synthetic_export_loads_every_weekday(self):
+        text, rows = timesheet_csv(employees=3, months=(1, 2))
+        result = self._import(text)
+
+        self.assertEqual(result['entries'], rows)
+        self.assertEqual(TimeEntry.objects.count(), rows)
+        january_days = TimeEntry.objects.filter(month__month=1).count()
+        self.assertEqual(DeliveryReportSnapshot.objects.get(month__month=1).total_spent, 8 * january_days)
+
+    def test_missing_columns_are_reported(self):
+        text = 'Employee,Date\nalice,2099-01-01\n'
+        success, result = TimesheetImporter().parse_and_import(StringIO(text), self.user)
+        self.assertFalse(success)
+        self.assertIn('hours', result)
+
+
+class ImportLockTableTests(TestCase):
+    """The ImportLock rows used on databases without advisory locks."""
+
+    def setUp(self):
+        if connection.vendor == 'postgresql':
+            self.skipTest('PostgreSQL uses advisory locks')
+        self.key = lock_key(Report, 2099, 'delivery')
+
+    def test_lock_row_exists_only_while_held(self):
+        with import_lock(self.key):
+            self.assertEqual(list(ImportLock.objects.values_list('key', flat=True)), [self.key])
+        self.assertFalse(ImportLock.objects.exists())
+
+    def test_lock_held_by_another_process_times_out(self):
+        ImportLock.objects.create(key=self.key, owner='other-host:1:1')
+
+        with self.assertRaises(ImportLockTimeout):
+            with import_lock(self.key, timeout=0.2):
+                pass
+
+    def test_busy_lock_is_a_409_from_the_upload_endpoints(self):
+        client = APIClient()
+        client.force_authenticate(User.objects.create(username='queued'))
+        busy = ImportLockTimeout('Another import is still running')
+        uploads = {
+            '/api/import/delivery/': ('delivery.csv', delivery_csv(scale=1)[0]),
+            '/api/import/financial/': ('financial.csv', financial_csv(scale=1)[0]),
+            '/api/import/timesheets/': ('timesheets.csv', timesheet_csv(employees=1, months=(1,))[0]),
+        }
+
+        with mock.patch.object(locks, '_table_lock', side_effect=busy):
+            for url, (name, text) in uploads.items():
+                response = client.post(url, {'file': SimpleUploadedFile(name, text.encode()), 'year': 2099})
+                self.assertEqual(response.status_code, 409, url)
+                self.assertEqual(response.data['error'], str(busy))
+
+        self.assertEqual(list(ImportLog.objects.values_list('status', flat=True)), ['failed'] * 3)
+
+    def test_stale_lock_is_taken_over(self):
+        ImportLock.objects.create(key=self.key, owner='crashed-host:1:1')
+        ImportLock.objects.update(acquired_at=timezone.now() - STALE_AFTER - timedelta(seconds=1))
+
+        with import_lock(self.key, timeout=0.2):
+            self.assertNotEqual(ImportLock.objects.get().owner, 'crashed-host:1:1')
+
+    def test_nested_locks_are_reentrant(self):
+        other = lock_key(Report, 2098, 'delivery')
+        with import_lock(self.key, other):
+            with import_lock(self.key, timeout=0.2):
+                pass
+            self.assertEqual(ImportLock.objects.count(), 2)
+
+
+@override_settings(DASHBOARD_WARM_ASYNC=False)
+class ImportConcurrencyTests(TransactionTestCase):
+    """Hammer the import endpoints from many threads; committed data, so no TestCase."""
+
+    THREADS = 8
+
+    def setUp(self):
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest('in-memory SQLite fails concurrent writers instead of waiting; '
+                          'set DB_TEST_NAME to a file')
+        self.user = User.objects.create(username='hammer')
+        ReportType.objects.create(name='Delivery', slug='delivery-hammer')
+
+    def _run(self, calls):
+        def call(fn):
+            try:
+                return fn()
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=self.THREADS) as pool:
+            return list(pool.map(call, calls))
+
+    def _client(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        return client
+
+    def _upload(self, endpoint, text, year, mode='replace'):
+        upload = SimpleUploadedFile('report.csv', text.encode(), content_type='text/csv')
+        return self._client().post(
+            f'/api/import/{endpoint}/', {'file': upload, 'year': year, 'mode': mode}, format='multipart'
+        )
+
+    def test_same_year_uploads_queue_without_errors(self):
+        delivery, _ = delivery_csv(scale=1)
+        financial, _ = financial_csv(scale=1)
+        calls = []
+        for i in range(self.THREADS):
+            mode = ('replace', 'diff', 'bulk')[i % 3]
+            calls.append(lambda mode=mode: self._upload('delivery', delivery, 2099, mode))
+            calls.append(lambda mode=mode: self._upload('financial', financial, 2099, mode))
+
+        responses = self._run(calls)
+
+        self.assertEqual([r.status_code for r in responses], [201] * len(calls),
+                         [r.data for r in responses if r.status_code != 201])
+        self.assertEqual(DeliveryReportSnapshot.objects.filter(month__year__year=2099).count(), 12)
+        self.assertEqual(FinReportSnapshot.objects.filter(month__year__year=2099).count(), 12)
+
+    def test_bulk_create_from_many_threads(self):
+        calls = []
+        for i in range(self.THREADS * 2):
+            payload, _ = bulk_create_payload(scale=1, year=2098 + i % 2, report_type_slug='delivery-hammer', seed=i)
+            payload['mode'] = ('replace', 'diff', 'bulk')[i % 3]
+            calls.append(lambda payload=payload: self._client().post(
+                '/api/reports/bulk-create/', payload, format='json'
+            ))
+
+        responses = self._run(calls)
+
+        self.assertEqual([r.status_code for r in responses], [201] * len(calls),
+                         [r.data for r in responses if r.status_code != 201])
+        for year in (2098, 2099):
+            self.assertEqual(Report.objects.active().filter(year__year=year).count(), 12)
+        self.assertFalse(ImportLock.objects.exists())
+
+    @unittest.skipIf(connection.vendor == 'sqlite', 'SQLite has a single writer; all imports queue')
+    def test_other_years_do_not_wait(self):
+        held = threading.Event()
+        release = threading.Event()
+
+        def hold_2098():
+            with import_lock(lock_key(Report, 2098, 'delivery-hammer')):
+                held.set()
+                release.wait(10)
+
+        def take(year):
+            held.wait(10)
+            try:
+                with import_lock(lock_key(Report, year, 'delivery-hammer'), timeout=0.5):
+                    return 'acquired'
+            except ImportLockTimeout:
+                return 'timed out'
+
+        def finish():
+            held.wait(10)
+            time.sleep(1)
+            release.set()
+
+        results = self._run([hold_2098, lambda: take(2099), lambda: take(2098), finish])
+
+        self.assertEqual(results[1:3], ['acquired', 'timed out'])
@@ -0,0 +1,315 @@
+"""
+Timesheet ingestion: raw per-employee, per-day time entries, and their
+monthly rollup into the hour-based DeliveryReportSnapshot metrics and the
+engagement x contract delivery cube.
+
+A load replaces the entries of every (employee, month) it contains and then
+re-aggregates only those months, with one GROUP BY over TimeEntry.
+"""
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+from django.db.models import Count, Q, Sum
+
+from apps.core.cube import refresh_delivery_cube
+from apps.core.dashboard import schedule_warm
+from apps.core.models import DeliveryReportSnapshot, Employee, TimeEntry
+from apps.core.periods import get_or_create_months
+from apps.core.summaries import refresh_snapshot_summaries
+from .loaders import bulk_upsert
+from .locks import ImportLockTimeout, import_lock, lock_key
+from .parsers import MONTH_NAMES
+from .readers import read_table
+from .timing import StageTimer
+
+# Accepted header names (case-insensitive) per column; engagement,
+# contract and revenue are optional
+COLUMNS = {
+    'employee': ('employee', 'employee id', 'employee code', 'email'),
+    'date': ('date', 'day'),
+    'hours': ('hours', 'time spent', 'spent'),
+    'kind': ('type', 'kind', 'activity'),
+    'billable': ('billable',),
+    'engagement': ('engagement', 'engagement model'),
+    'contract': ('contract', 'contract type', 'billing'),
+    'revenue': ('revenue', 'amount'),
+}
+OPTIONAL_COLUMNS = ('engagement', 'contract', 'revenue')
+
+KINDS = {
+    'project': TimeEntry.KIND_PROJECT,
+    'internal': TimeEntry.KIND_INTERNAL,
+    'bench': TimeEntry.KIND_INTERNAL,
+    'pto': TimeEntry.KIND_PTO,
+    'vacation': TimeEntry.KIND_PTO,
+    'sick leave': TimeEntry.KIND_PTO,
+}
+ENGAGEMENTS = {
+    'outsourcing': TimeEntry.ENGAGEMENT_OUTSOURCING,
+    'outstaffing': TimeEntry.ENGAGEMENT_OUTSTAFFING,
+}
+CONTRACTS = {
+    't&m': TimeEntry.CONTRACT_TM,
+    'tm': TimeEntry.CONTRACT_TM,
+    'time and materials': TimeEntry.CONTRACT_TM,
+    'fp': TimeEntry.CONTRACT_FP,
+    'fixed price': TimeEntry.CONTRACT_FP,
+}
+TRUE_VALUES = {'yes', 'y', 'true', '1', 'billable'}
+
+KEY_COLUMNS = ['employee', 'date', 'kind', 'billable', 'engagement', 'contract']
+
+# DeliveryReportSnapshot fields derived from time entries
+HOUR_FIELDS = (
+    'total_spent', 'pto', 'base_hours', 'project_hours', 'billable_hours',
+    'utilization_excl_pto', 'utilization_incl_pto', 'billability',
+    'billability_outsourcing', 'billability_outstaffing',
+    'billability_tm', 'billability_fp', 'fte',
+)
+
+# Entries written per bulk_upsert call, to bound memory on large loads
+CHUNK_SIZE = 50000
+
+
+class TimesheetImporter:
+    """Parse timesheet exports and load them into TimeEntry."""
+
+    def __init__(self):
+        # Per-stage timings of the last parse/import run by this instance
+        self.timer = StageTimer()
+        self.skipped = 0
+
+    def parse(self, file, file_format='csv'):
+        """
+        Parse a timesheet export with one row per employee, day and activity:
+
+            Employee, Date, Hours, Type, Billable[, Engagement][, Contract][, Revenue]
+
+        Type is Project, Internal/Bench or PTO/Vacation/Sick leave. Rows with
+        an unknown type, bad date or no hours are skipped (counted in
+        self.skipped). Returns one row per entry key with summed minutes.
+        """
+        with self.timer.stage('read'):
+            df = read_table(file, file_format, header_row=0)
+        return self.parse_table(df)
+
+    def parse_table(self, df):
+        with self.timer.stage('parse'):
+            columns = _match_columns(df.columns)
+            missing = [c for c in COLUMNS if c not in columns and c not in OPTIONAL_COLUMNS]
+            if missing:
+                raise ValueError(f"Missing timesheet column(s): {', '.join(missing)}")
+            df = df.rename(columns={source: name for name, source in columns.items()})
+
+        with self.timer.stage('clean'):
+            frame = pd.DataFrame({
+                'employee': df['employee'].astype(str).str.strip(),
+                'date': pd.to_datetime(df['date'], errors='coerce').dt.date,
+                'kind': _codes(df['kind'], KINDS),
+                'billable': _lower(df['billable']).isin(TRUE_VALUES) if df['billable'].dtype != bool
+                else df['billable'],
+                'engagement': _codes(df.get('engagement'), ENGAGEMENTS, default=0, index=df.index),
+                'contract': _codes(df.get('contract'), CONTRACTS, default=0, index=df.index),
+                'minutes': np.rint(_numbers(df['hours']) * 60),
+                'revenue': _numbers(df['revenue']).fillna(0) if 'revenue' in df else 0.0,
+            })
+
+            valid = (
+                frame['date'].notna() & frame['kind'].notna()
+                & (frame['minutes'] > 0) & (frame['employee'] != '') & (frame['employee'] != 'nan')
+            )
+            self.skipped = int((~valid).sum())
+            frame = frame[valid].astype({'kind': int, 'engagement': int, 'contract': int, 'minutes': int})
+
+            # Several rows for the same key (e.g. two projects on one day) are summed
+            frame = frame.groupby(KEY_COLUMNS, as_index=False, sort=False)[['minutes', 'revenue']].sum()
+            return frame.assign(revenue=frame['revenue'].round(2))
+
+    def import_frame(self, frame, user):
+        """
+        Replace the entries of every (employee, month) in `frame` and
+        recompute the hour metrics and cube cells of the months it touches.
+        """
+        periods = pd.DatetimeIndex(pd.to_datetime(frame['date']))
+        touched = sorted(set(zip(periods.year, periods.month)))
+        years = sorted({year for year, _ in touched})
+        locks = [lock_key(TimeEntry, y) for y in years] + [lock_key(DeliveryReportSnapshot, y) for y in years]
+
+        with self.timer.until_exit('commit'), import_lock(*locks, timer=self.timer):
+            with self.timer.stage('resolve_periods'):
+                month_ids = {}
+                year_ids = []
+                for year in years:
+                    year_obj, months = get_or_create_months(year, [m for y, m in touched if y == year], user)
+                    year_ids.append(year_obj.pk)
+                    month_ids.update({(year, number): month.pk for number, month in months.items()})
+                employee_ids = _resolve_employees(frame['employee'].unique())
+
+            with self.timer.stage('write'):
+                frame = frame.assign(
+                    employee_id=frame['employee'].map(employee_ids),
+                    month_id=[month_ids[key] for key in zip(periods.year, periods.month)],
+                )
+                # Only the (employee, month) pairs of the file: one IN list per month
+                pairs = Q()
+                for month_id, employees in frame.groupby('month_id')['employee_id']:
+                    pairs |= Q(month_id=month_id, employee_id__in=employees.unique().tolist())
+                TimeEntry.objects.filter(pairs).delete()
+
+                columns = [
+                    'employee_id', 'date', 'month_id', 'kind', 'billable', 'engagement', 'contract',
+                    'minutes', 'revenue',
+                ]
+                for start in range(0, len(frame), CHUNK_SIZE):
+                    rows = frame.iloc[start:start + CHUNK_SIZE][columns].to_dict('records')
+                    bulk_upsert(
+                        TimeEntry, rows,
+                        conflict_fields=['employee_id', 'date', 'kind', 'billable', 'engagement', 'contract'],
+                        update_fields=['minutes', 'revenue']
+                    )
+
+            with self.timer.stage('rollup'):
+                rollup_delivery_hours(list(month_ids.values()), user)
+                refresh_delivery_cube(list(month_ids.values()))
+                refresh_snapshot_summaries(DeliveryReportSnapshot, year_ids)
+                schedule_warm(years)
+
+            self.timer.start('commit')
+
+        return {
+            'entries': len(frame),
+            'employees': len(employee_ids),
+            'skipped': self.skipped,
+            'months_updated': [f'{MONTH_NAMES[m - 1]} {y}' for y, m in touched],
+        }
+
+    def parse_and_import(self, file, user, file_format='csv'):
+        """
+        Parse a timesheet file and load it. A busy import lock is not a
+        failed import: ImportLockTimeout is raised.
+        """
+        try:
+            frame = self.parse(file, file_format)
+            if frame.empty:
+                return False, 'Import failed: no valid time entries found'
+            return True, self.import_frame(frame, user)
+
+        except ImportLockTimeout:
+            raise
+        except Exception as e:
+            return False, f"Import failed: {str(e)}"
+
+
+def rollup_delivery_hours(month_ids, user=None):
+    """
+    Recompute the hour-based delivery metrics of `month_ids` from TimeEntry
+    with one GROUP BY month and upsert them into DeliveryReportSnapshot.
+    Other snapshot fields (revenue, salary, ...) are left untouched.
+    """
+    project = Q(kind=TimeEntry.KIND_PROJECT)
+    billable = project & Q(billable=True)
+    segments = {
+        'outsourcing': Q(engagement=TimeEntry.ENGAGEMENT_OUTSOURCING),
+        'outstaffing': Q(engagement=TimeEntry.ENGAGEMENT_OUTSTAFFING),
+        'tm': Q(contract=TimeEntry.CONTRACT_TM),
+        'fp': Q(contract=TimeEntry.CONTRACT_FP),
+    }
+
+    # Aliases are prefixed so they cannot clash with TimeEntry field names
+    sums = {
+        'm_total': Sum('minutes'),
+        'm_pto': Sum('minutes', filter=Q(kind=TimeEntry.KIND_PTO)),
+        'm_project': Sum('minutes', filter=project),
+        'm_billable': Sum('minutes', filter=billable),
+        'employees': Count('employee', distinct=True),
+    }
+    for name, segment in segments.items():
+        sums[f'm_project_{name}'] = Sum('minutes', filter=project & segment)
+        sums[f'm_billable_{name}'] = Sum('minutes', filter=billable & segment)
+
+    totals = (
+        TimeEntry.objects
+        .filter(month_id__in=month_ids)
+        .values('month_id')
+        .annotate(**sums)
+        .order_by()
+    )
+
+    rows = []
+    for t in totals:
+        base = (t['m_total'] or 0) - (t['m_pto'] or 0)
+        row = {
+            'month_id': t['month_id'],
+            'uploaded_by_id': getattr(user, 'pk', None),
+            'total_spent': _hours(t['m_total']),
+            'pto': _hours(t['m_pto']),
+            'base_hours': _hours(base),
+            'project_hours': _hours(t['m_project']),
+            'billable_hours': _hours(t['m_billable']),
+            'utilization_excl_pto': _percent(t['m_project'], base),
+            'utilization_incl_pto': _percent(t['m_project'], t['m_total']),
+            'billability': _percent(t['m_billable'], t['m_project']),
+            'fte': t['employees'],
+        }
+        for name in segments:
+            row[f'billability_{name}'] = _percent(t[f'm_billable_{name}'], t[f'm_project_{name}'])
+        rows.append(row)
+
+    bulk_upsert(
+        DeliveryReportSnapshot, rows,
+        conflict_fields=['month_id'],
+        update_fields=list(HOUR_FIELDS) + ['uploaded_by_id']
+    )
+    return len(rows)
+
+
+def _match_columns(headers):
+    """Map each known column to the first header matching one of its names."""
+    normalized = {str(h).strip().lower(): h for h in headers}
+    columns = {}
+    for name, aliases in COLUMNS.items():
+        for alias in aliases:
+            if alias in normalized:
+                columns[name] = normalized[alias]
+                break
+    return columns
+
+
+def _lower(series):
+    return series.astype(str).str.strip().str.lower()
+
+
+def _codes(series, mapping, default=None, index=None):
+    """Map text labels to small-int codes; unknown labels become `default`."""
+    if series is None:
+        return pd.Series(default, index=index)
+    codes = _lower(series).map(mapping)
+    return codes if default is None else codes.fillna(default)
+
+
+def _numbers(series):
+    if pd.api.types.is_numeric_dtype(series):
+        return series.astype(float)
+    return pd.to_numeric(series.astype(str).str.replace(',', '').str.strip(), errors='coerce')
+
+
+def _resolve_employees(codes):
+    """Return {code: employee_id}, creating unknown employees in one insert."""
+    codes = [str(c) for c in codes]
+    ids = dict(Employee.objects.filter(code__in=codes).values_list('code', 'id'))
+    missing = [Employee(code=c) for c in codes if c not in ids]
+    if missing:
+        Employee.objects.bulk_create(missing, ignore_conflicts=True)
+        ids = dict(Employee.objects.filter(code__in=codes).values_list('code', 'id'))
+    return ids
+
+
+def _hours(minutes):
+    return (Decimal(int(minutes or 0)) / 60).quantize(Decimal('0.01'))
+
+
+def _percent(part, whole):
+    if not whole:
+        return None
+    return (Decimal(int(part or 0)) * 100 / Decimal(int(whole))).quantize(Decimal('0.01'))
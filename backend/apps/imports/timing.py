@@ -0,0 +1,138 @@
+import time
+from contextlib import contextmanager
+import numpy as np
+from django.db import connection
+from .models import ImportLog
+
+# Stages every import reports, in pipeline order
+IMPORT_STAGES = ('read', 'parse', 'clean', 'check', 'lock', 'resolve_periods', 'write', 'rollup', 'commit')
+
+
+class StageTimer:
+    """
+    Collects wall time and query counts per import stage.
+
+        timer = StageTimer()
+        with timer.stage('read'):
+            df = read_table(...)
+
+    Re-entering a stage adds to its totals. Queries are counted with a
+    connection execute wrapper, so this works with DEBUG off.
+    """
+
+    def __init__(self):
+        self.stages = {}
+        self._open = {}
+
+    @contextmanager
+    def stage(self, name):
+        self.start(name)
+        try:
+            yield
+        finally:
+            self.stop(name)
+
+    @contextmanager
+    def until_exit(self, name):
+        """
+        End `name`, started later with start(), when the block exits, e.g.
+        to time the commit of a transaction the block wraps:
+
+            with timer.until_exit('commit'), transaction.atomic():
+                ...
+                timer.start('commit')
+
+        It is ended even if the commit raises.
+        """
+        try:
+            yield
+        finally:
+            if name in self._open:
+                self.stop(name)
+
+    def start(self, name):
+        """Start timing `name`; use stop() to end it (for spans that can't be a with-block)."""
+        counter = _QueryCounter()
+        wrapper = connection.execute_wrapper(counter)
+        wrapper.__enter__()
+        self._open[name] = (time.perf_counter(), counter, wrapper)
+
+    def stop(self, name):
+        started, counter, wrapper = self._open.pop(name)
+        wrapper.__exit__(None, None, None)
+        totals = self.stages.setdefault(name, {'seconds': 0.0, 'queries': 0})
+        totals['seconds'] += time.perf_counter() - started
+        totals['queries'] += counter.count
+
+    def as_dict(self):
+        """Stage totals in pipeline order plus an overall total."""
+        ordered = [s for s in IMPORT_STAGES if s in self.stages]
+        ordered += [s for s in self.stages if s not in IMPORT_STAGES]
+
+        timings = {
+            name: {
+                'seconds': round(self.stages[name]['seconds'], 6),
+                'queries': self.stages[name]['queries'],
+            }
+            for name in ordered
+        }
+        timings['total'] = {
+            'seconds': round(sum(s['seconds'] for s in self.stages.values()), 6),
+            'queries': sum(s['queries'] for s in self.stages.values()),
+        }
+        return timings
+
+
+class _QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def record_import(source, timer, user, year=None, report_type='', file_name='',
+                  mode='replace', rows=0, error=''):
+    """Store an ImportLog for a finished import and return its timings."""
+    timings = timer.as_dict()
+    ImportLog.objects.create(
+        source=source,
+        report_type=report_type,
+        year=year,
+        file_name=file_name[:255],
+        mode=mode,
+        status='failed' if error else 'success',
+        rows=rows,
+        timings=timings,
+        total_seconds=timings['total']['seconds'],
+        error=str(error),
+        created_by=user if user and user.is_authenticated else None,
+    )
+    return timings
+
+
+def stage_percentiles(timings_list):
+    """
+    p50/p95 of seconds and queries per stage across import logs.
+    Stages missing from a log (e.g. no 'read' for bulk-create) are skipped
+    for that log only.
+    """
+    stages = {}
+    for name in IMPORT_STAGES + ('total',):
+        rows = [t[name] for t in timings_list if name in t]
+        if not rows:
+            continue
+
+        seconds = np.array([r['seconds'] for r in rows], dtype=float)
+        queries = np.array([r['queries'] for r in rows], dtype=float)
+        p50_s, p95_s = np.percentile(seconds, [50, 95])
+        p50_q, p95_q = np.percentile(queries, [50, 95])
+        stages[name] = {
+            'count': len(rows),
+            'p50_seconds': round(float(p50_s), 6),
+            'p95_seconds': round(float(p95_s), 6),
+            'p50_queries': round(float(p50_q), 1),
+            'p95_queries': round(float(p95_q), 1),
+        }
+    return stages
@@ -4,5 +4,8 @@ from . import views
 urlpatterns = [
     path('delivery/', views.import_delivery_report, name='import-delivery'),
     path('financial/', views.import_financial_report, name='import-financial'),
+    path('workbook/', views.import_workbook, name='import-workbook'),
+    path('timesheets/', views.import_timesheets, name='import-timesheets'),
     path('validate/', views.validate_csv, name='validate-csv'),
+    path('timings/', views.import_timings, name='import-timings'),
 ]
@@ -1,10 +1,27 @@
-import pandas as pd
 from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes, parser_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.parsers import MultiPartParser, FormParser
-from .parsers import DeliveryReportParser, FinancialReportParser
+from apps.reports.checks import run_checks
+from .locks import ImportLockTimeout, import_lock, lock_key
+from .parsers import DeliveryReportParser, FinancialReportParser, IMPORT_MODES
+from .models import ImportLog
+from .readers import file_format, supported_extensions, read_workbook, apply_header
+from .timesheets import TimesheetImporter
+from .timing import StageTimer, record_import, stage_percentiles
+
+# Parsers used by the dry-run validation, by report type
+VALIDATORS = {
+    'delivery': DeliveryReportParser,
+    'financial': FinancialReportParser,
+}
+
+# Workbook sheets are matched to parsers by name (case-insensitive substring)
+WORKBOOK_SHEETS = {
+    'delivery': DeliveryReportParser,
+    'financ': FinancialReportParser,
+}
 
 
 @api_view(['POST'])
@@ -12,10 +29,14 @@ from .parsers import DeliveryReportParser, FinancialReportParser
 @parser_classes([MultiPartParser, FormParser])
 def import_delivery_report(request):
     """
-    Import delivery report from CSV file.
+    Import delivery report from a CSV, XLSX, Parquet or Arrow file.
     Expects:
-    - file: CSV file
+    - file: CSV/XLSX/Parquet/Arrow file
     - year: Year value (e.g., 2025)
+    - mode: 'replace' (default), 'diff' to write only changed values, or
+      'bulk' for a single set-based upsert (large backfills)
+    Snapshots are written in place; the upload is not versioned and cannot
+    be rolled back like a bulk-create.
     """
     if 'file' not in request.FILES:
         return Response(
@@ -38,28 +59,56 @@ def import_delivery_report(request):
             status=status.HTTP_400_BAD_REQUEST
         )
 
+    mode = request.data.get('mode', 'replace')
+    if mode not in IMPORT_MODES:
+        return Response(
+            {'error': f'Invalid mode. Must be one of: {", ".join(IMPORT_MODES)}'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
     file = request.FILES['file']
 
     # Check file extension
-    if not file.name.endswith('.csv'):
+    fmt = file_format(file.name)
+    if fmt is None:
         return Response(
-            {'error': 'Only CSV files are allowed'},
+            {'error': f'Unsupported file type. Allowed: {supported_extensions()}'},
             status=status.HTTP_400_BAD_REQUEST
         )
 
     # Parse and import
     parser = DeliveryReportParser()
-    success, result = parser.parse_and_import(file, year_value, request.user)
+    try:
+        success, result = parser.parse_and_import(
+            file, year_value, request.user, mode=mode, file_format=fmt
+        )
+    except ImportLockTimeout as e:
+        timings = record_import(
+            'delivery', parser.timer, request.user,
+            year=year_value, report_type='delivery', file_name=file.name, mode=mode, error=e
+        )
+        return Response(
+            {'error': str(e), 'timings': timings},
+            status=status.HTTP_409_CONFLICT
+        )
+    timings = record_import(
+        'delivery', parser.timer, request.user,
+        year=year_value, report_type='delivery', file_name=file.name, mode=mode,
+        rows=result['count'] if success else 0,
+        error='' if success else result
+    )
 
     if success:
         return Response({
             'message': 'Delivery report imported successfully',
-            'data': result
+            'data': result,
+            'timings': timings
         }, status=status.HTTP_201_CREATED)
     else:
         return Response({
             'error': 'Failed to import delivery report',
-            'details': result
+            'details': result,
+            'timings': timings
         }, status=status.HTTP_400_BAD_REQUEST)
 
 
@@ -68,10 +117,14 @@ def import_delivery_report(request):
 @parser_classes([MultiPartParser, FormParser])
 def import_financial_report(request):
     """
-    Import financial report from CSV file.
+    Import financial report from a CSV, XLSX, Parquet or Arrow file.
     Expects:
-    - file: CSV file
+    - file: CSV/XLSX/Parquet/Arrow file
     - year: Year value (e.g., 2025)
+    - mode: 'replace' (default), 'diff' to write only changed values, or
+      'bulk' for a single set-based upsert (large backfills)
+    Snapshots are written in place; the upload is not versioned and cannot
+    be rolled back like a bulk-create.
     """
     if 'file' not in request.FILES:
         return Response(
@@ -94,28 +147,56 @@ def import_financial_report(request):
             status=status.HTTP_400_BAD_REQUEST
         )
 
+    mode = request.data.get('mode', 'replace')
+    if mode not in IMPORT_MODES:
+        return Response(
+            {'error': f'Invalid mode. Must be one of: {", ".join(IMPORT_MODES)}'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
     file = request.FILES['file']
 
     # Check file extension
-    if not file.name.endswith('.csv'):
+    fmt = file_format(file.name)
+    if fmt is None:
         return Response(
-            {'error': 'Only CSV files are allowed'},
+            {'error': f'Unsupported file type. Allowed: {supported_extensions()}'},
             status=status.HTTP_400_BAD_REQUEST
         )
 
     # Parse and import
     parser = FinancialReportParser()
-    success, result = parser.parse_and_import(file, year_value, request.user)
+    try:
+        success, result = parser.parse_and_import(
+            file, year_value, request.user, mode=mode, file_format=fmt
+        )
+    except ImportLockTimeout as e:
+        timings = record_import(
+            'financial', parser.timer, request.user,
+            year=year_value, report_type='financial', file_name=file.name, mode=mode, error=e
+        )
+        return Response(
+            {'error': str(e), 'timings': timings},
+            status=status.HTTP_409_CONFLICT
+        )
+    timings = record_import(
+        'financial', parser.timer, request.user,
+        year=year_value, report_type='financial', file_name=file.name, mode=mode,
+        rows=result['count'] if success else 0,
+        error='' if success else result
+    )
 
     if success:
         return Response({
             'message': 'Financial report imported successfully',
-            'data': result
+            'data': result,
+            'timings': timings
         }, status=status.HTTP_201_CREATED)
     else:
         return Response({
             'error': 'Failed to import financial report',
-            'details': result
+            'details': result,
+            'timings': timings
         }, status=status.HTTP_400_BAD_REQUEST)
 
 
@@ -124,9 +205,11 @@ def import_financial_report(request):
 @parser_classes([MultiPartParser, FormParser])
 def validate_csv(request):
     """
-    Validate CSV file without importing.
+    Validate an import file without importing (dry run).
+    The file is parsed like an import and the report type's checks are run,
+    so the response lists the same violations the import would.
     Expects:
-    - file: CSV file
+    - file: CSV/XLSX/Parquet/Arrow file
     - report_type: 'delivery' or 'financial'
     """
     if 'file' not in request.FILES:
@@ -145,23 +228,247 @@ def validate_csv(request):
     file = request.FILES['file']
 
     # Check file extension
-    if not file.name.endswith('.csv'):
+    fmt = file_format(file.name)
+    if fmt is None:
         return Response(
-            {'error': 'Only CSV files are allowed'},
+            {'error': f'Unsupported file type. Allowed: {supported_extensions()}'},
             status=status.HTTP_400_BAD_REQUEST
         )
 
-    # Simple validation - just check if we can read the CSV
+    parser = VALIDATORS[report_type]()
     try:
-        df = pd.read_csv(file)
+        frame = parser.parse(file, fmt)
+        report_type = parser.report_type()
+        with parser.timer.stage('check'):
+            violations = run_checks(report_type.checks, frame) if report_type else []
         return Response({
             'valid': True,
-            'message': 'CSV file is valid',
-            'row_count': len(df),
-            'column_count': len(df.columns)
+            'message': 'File is valid',
+            'row_count': len(frame),
+            'column_count': len(frame.columns),
+            'violations': violations,
+            'timings': parser.timer.as_dict()
         }, status=status.HTTP_200_OK)
     except Exception as e:
         return Response({
             'valid': False,
             'error': str(e)
         }, status=status.HTTP_400_BAD_REQUEST)
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+@parser_classes([MultiPartParser, FormParser])
+def import_workbook(request):
+    """
+    Import several report types from one XLSX workbook.
+    All sheets are read in a single pass; each sheet whose name contains
+    "delivery" or "financ" is imported with the matching parser, in one
+    transaction.
+    Expects:
+    - file: XLSX file
+    - year: Year value (e.g., 2025)
+    - mode: 'replace' (default), 'diff' to write only changed values, or
+      'bulk' for a single set-based upsert (large backfills)
+    Snapshots are written in place; the upload is not versioned and cannot
+    be rolled back like a bulk-create.
+    """
+    if 'file' not in request.FILES:
+        return Response(
+            {'error': 'No file provided'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    year = request.data.get('year')
+    if not year:
+        return Response(
+            {'error': 'Year is required'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    try:
+        year_value = int(year)
+    except ValueError:
+        return Response(
+            {'error': 'Invalid year format'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    mode = request.data.get('mode', 'replace')
+    if mode not in IMPORT_MODES:
+        return Response(
+            {'error': f'Invalid mode. Must be one of: {", ".join(IMPORT_MODES)}'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    file = request.FILES['file']
+    if file_format(file.name) != 'xlsx':
+        return Response(
+            {'error': 'Only XLSX workbooks are allowed'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    timer = StageTimer()
+    try:
+        with timer.stage('read'):
+            sheets = read_workbook(file)
+    except Exception as e:
+        return Response({
+            'error': 'Failed to read workbook',
+            'details': str(e)
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    frames = {}
+    try:
+        for sheet_name, raw in sheets.items():
+            parser_class = next(
+                (cls for key, cls in WORKBOOK_SHEETS.items() if key in sheet_name.lower()),
+                None
+            )
+            if parser_class is None:
+                continue
+            parser = parser_class()
+            # All sheets report into one set of stage timings
+            parser.timer = timer
+            frames[sheet_name] = (parser, parser.parse_table(apply_header(raw, parser.header_row)))
+    except Exception as e:
+        return Response({
+            'error': 'Failed to parse workbook',
+            'details': str(e)
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    if not frames:
+        return Response(
+            {'error': 'No sheet matches a report type (expected "Delivery" or "Financial" sheets)'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    # Lock every target up front, in one sorted pass, before any sheet writes
+    locks = [lock_key(parser.model, year_value) for parser, _ in frames.values()]
+    try:
+        with timer.until_exit('commit'), import_lock(*locks, timer=timer):
+            result = {
+                sheet_name: parser.import_frame(frame, year_value, request.user, mode=mode)
+                for sheet_name, (parser, frame) in frames.items()
+            }
+            timer.start('commit')
+    except ImportLockTimeout as e:
+        timings = record_import(
+            'workbook', timer, request.user,
+            year=year_value, file_name=file.name, mode=mode, error=e
+        )
+        return Response(
+            {'error': str(e), 'timings': timings},
+            status=status.HTTP_409_CONFLICT
+        )
+    except Exception as e:
+        timings = record_import(
+            'workbook', timer, request.user,
+            year=year_value, file_name=file.name, mode=mode, error=e
+        )
+        return Response({
+            'error': 'Failed to import workbook',
+            'details': str(e),
+            'timings': timings
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    timings = record_import(
+        'workbook', timer, request.user,
+        year=year_value, file_name=file.name, mode=mode,
+        rows=sum(r['count'] for r in result.values())
+    )
+    return Response({
+        'message': 'Workbook imported successfully',
+        'data': result,
+        'timings': timings
+    }, status=status.HTTP_201_CREATED)
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+@parser_classes([MultiPartParser, FormParser])
+def import_timesheets(request):
+    """
+    Import raw time entries (one row per employee, day and activity) from a
+    CSV, XLSX, Parquet or Arrow file.
+    Entries of every employee and month in the file replace the stored ones,
+    and the hour metrics of those months (hours, utilization, billability,
+    FTE) are recomputed in DeliveryReportSnapshot.
+    Expects:
+    - file: CSV/XLSX/Parquet/Arrow file with Employee, Date, Hours, Type and
+      Billable columns (Engagement and Contract optional)
+    """
+    if 'file' not in request.FILES:
+        return Response(
+            {'error': 'No file provided'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    file = request.FILES['file']
+
+    # Check file extension
+    fmt = file_format(file.name)
+    if fmt is None:
+        return Response(
+            {'error': f'Unsupported file type. Allowed: {supported_extensions()}'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    importer = TimesheetImporter()
+    try:
+        success, result = importer.parse_and_import(file, request.user, file_format=fmt)
+    except ImportLockTimeout as e:
+        timings = record_import('timesheets', importer.timer, request.user, file_name=file.name, error=e)
+        return Response(
+            {'error': str(e), 'timings': timings},
+            status=status.HTTP_409_CONFLICT
+        )
+    timings = record_import(
+        'timesheets', importer.timer, request.user,
+        file_name=file.name, rows=result['entries'] if success else 0,
+        error='' if success else result
+    )
+
+    if success:
+        return Response({
+            'message': 'Timesheets imported successfully',
+            'data': result,
+            'timings': timings
+        }, status=status.HTTP_201_CREATED)
+    else:
+        return Response({
+            'error': 'Failed to import timesheets',
+            'details': result,
+            'timings': timings
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def import_timings(request):
+    """
+    p50/p95 seconds and query counts per import stage across recent
+    successful imports.
+    Query params:
+    - source: delivery, financial, workbook, timesheets or bulk_create (optional)
+    - limit: number of recent imports to include (default 100, max 1000)
+    """
+    try:
+        limit = min(max(int(request.query_params.get('limit', 100)), 1), 1000)
+    except ValueError:
+        return Response(
+            {'error': 'limit must be an integer'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    logs = ImportLog.objects.filter(status='success')
+    source = request.query_params.get('source')
+    if source:
+        logs = logs.filter(source=source)
+
+    timings_list = list(logs.values_list('timings', flat=True)[:limit])
+
+    return Response({
+        'count': len(timings_list),
+        'stages': stage_percentiles(timings_list)
+    }, status=status.HTTP_200_OK)
@@ -0,0 +1,153 @@
+"""
+Anomalous months: metric values that deviate from the metric's own history.
+
+The reports of one org unit become a months x metrics matrix (every numeric
+field_schema field, derived ones computed) on a gap-free monthly grid, and
+three baselines are computed over the whole matrix at once:
+
+- zscore: mean and standard deviation of the trailing `window` months
+- mad: median and median absolute deviation of the same window, scored as
+  0.6745 * (x - median) / MAD (the robust z-score, unmoved by earlier outliers)
+- seasonal: mean and standard deviation of the same calendar month in the
+  previous years
+
+A baseline needs `min_history` values (two prior years for seasonal) and a
+non-zero spread before it can flag anything. A month is reported when any
+method's score passes its threshold. Results are cached per report type
+until its reports next change.
+"""
+import warnings
+
+import numpy as np
+from django.core.cache import cache
+from numpy.lib.stride_tricks import sliding_window_view
+
+from utils.single_flight import load
+
+from .matrix import metric_frame, monthly_grid
+
+DEFAULT_WINDOW = 12
+DEFAULT_THRESHOLD = 3.0
+DEFAULT_MAD_THRESHOLD = 3.5
+DEFAULT_MIN_HISTORY = 6
+MIN_SEASONS = 2
+# Entries are keyed by data_version, so stale ones are never read; this only bounds their lifetime
+CACHE_TIMEOUT = 24 * 60 * 60
+# Scales the MAD of normally distributed data to its standard deviation
+MAD_SCALE = 0.6745
+
+
+def _trailing(values, window, min_history):
+    """(zscore, mad) scores and baselines of each cell against the `window` months before it."""
+    months, metrics = values.shape
+    padded = np.vstack([np.full((window, metrics), np.nan), values])
+    # windows[t] holds months t - window .. t - 1, shape (months, metrics, window)
+    windows = sliding_window_view(padded, window, axis=0)[:months]
+    enough = np.sum(~np.isnan(windows), axis=2) >= min_history
+
+    mean = np.nanmean(windows, axis=2)
+    std = np.nanstd(windows, axis=2, ddof=1)
+    median = np.nanmedian(windows, axis=2)
+    mad = np.nanmedian(np.abs(windows - median[..., None]), axis=2)
+
+    zscore = np.where(enough & (std > 0), (values - mean) / std, np.nan)
+    robust = np.where(enough & (mad > 0), MAD_SCALE * (values - median) / mad, np.nan)
+    return (zscore, mean), (robust, median)
+
+
+def _seasonal(values, first):
+    """Score and baseline of each cell against the same calendar month of earlier years."""
+    months, metrics = values.shape
+    lead = first % 12
+    years = -(-(lead + months) // 12)
+    # (years, 12, metrics), January-aligned
+    table = np.full((years * 12, metrics), np.nan)
+    table[lead:lead + months] = values
+    table = table.reshape(years, 12, metrics)
+
+    present = ~np.isnan(table)
+    filled = np.where(present, table, 0.0)
+    # Sums over the strictly earlier years of each calendar month
+    count = np.cumsum(present, axis=0) - present
+    total = np.cumsum(filled, axis=0) - filled
+    squares = np.cumsum(filled ** 2, axis=0) - filled ** 2
+
+    mean = total / count
+    variance = np.clip((squares - count * mean ** 2) / (count - 1), 0, None)
+    std = np.sqrt(variance)
+    score = np.where((count >= MIN_SEASONS) & (std > 0), (table - mean) / std, np.nan)
+
+    def unpad(array):
+        return array.reshape(years * 12, metrics)[lead:lead + months]
+
+    return unpad(score), unpad(np.where(count > 0, mean, np.nan))
+
+
+def detect(frame, window=DEFAULT_WINDOW, threshold=DEFAULT_THRESHOLD,
+           mad_threshold=DEFAULT_MAD_THRESHOLD, min_history=DEFAULT_MIN_HISTORY):
+    """
+    Anomalies of `frame` (one row per 'YYYY-MM' period in order, one numeric
+    column per metric, as from matrix.period_frame): a list of {"period",
+    "metric", "value", "methods": {method: {"score", "baseline"}}} by period
+    then metric, "methods" holding the methods that flagged it.
+    """
+    if frame.empty or not len(frame.columns):
+        return []
+    values, first, rows = monthly_grid(frame)
+    with warnings.catch_warnings(), np.errstate(divide='ignore', invalid='ignore'):
+        # All-NaN windows (no history yet) are expected; they score NaN
+        warnings.simplefilter('ignore', RuntimeWarning)
+        (zscore, mean), (robust, median) = _trailing(values, window, min(min_history, window))
+        seasonal, seasonal_mean = _seasonal(values, first)
+
+    methods = {
+        'zscore': (zscore, mean, threshold),
+        'mad': (robust, median, mad_threshold),
+        'seasonal': (seasonal, seasonal_mean, threshold),
+    }
+    flags = {}
+    for name, (score, _, limit) in methods.items():
+        with np.errstate(invalid='ignore'):
+            flags[name] = (np.abs(score) > limit)[rows]
+
+    flagged = np.logical_or.reduce(list(flags.values()))
+    anomalies = []
+    for i, column in np.argwhere(flagged):
+        row = rows[i]
+        anomalies.append({
+            'period': frame.index[i],
+            'metric': frame.columns[column],
+            'value': round(float(values[row, column]), 4),
+            'methods': {
+                name: {
+                    'score': round(float(score[row, column]), 2),
+                    'baseline': round(float(baseline[row, column]), 4),
+                }
+                for name, (score, baseline, _) in methods.items()
+                if flags[name][i, column]
+            },
+        })
+    return anomalies
+
+
+def report_anomalies(report_type, org_unit, start=None, end=None, **options):
+    """
+    detect over the active reports of `report_type` and `org_unit` through
+    `end`, keeping the anomalies from `start` on; every earlier month counts
+    as history. `options` are detect's. Cached until reports of the type
+    change (ReportType.data_version), and computed once for concurrent
+    requests.
+    """
+    key = report_type.cache_key(
+        'anomalies', org_unit.pk,
+        '{}-{}'.format(*start) if start else '', '{}-{}'.format(*end) if end else '',
+        ','.join(f'{name}={value}' for name, value in sorted(options.items()))
+    )
+
+    def compute():
+        result = detect(metric_frame(report_type, org_unit, end), **options)
+        if start:
+            result = [a for a in result if a['period'] >= f'{start[0]}-{start[1]:02d}']
+        return result
+
+    return load(cache, key, compute, CACHE_TIMEOUT)[0]
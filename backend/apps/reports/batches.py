@@ -0,0 +1,91 @@
+"""
+Versioned report datasets.
+
+Each import writes a new ReportBatch for its (report type, year, org unit),
+copying forward the months it does not touch, and then points
+ActiveReportBatch at it. Readers filter on the active batch, so they never
+see a half-written year, and rolling back is one pointer update.
+Activation also brings derived metrics that read across months (and the
+consolidated totals) up to date with the newly visible data.
+"""
+from .models import ActiveReportBatch, Report, ReportBatch
+from .dependencies import refresh_downstream
+from .org import root_unit
+
+
+def active_batch(report_type, year, org_unit=None):
+    """The active batch for (report_type, year, org_unit), or None."""
+    pointer = (
+        ActiveReportBatch.objects
+        .filter(report_type=report_type, year=year, org_unit=org_unit or root_unit())
+        .select_related('batch')
+        .first()
+    )
+    return pointer.batch if pointer else None
+
+
+def get_or_create_active_batch(report_type, year, user=None, source='manual', org_unit=None):
+    """The active batch, creating and activating an empty one if there is none."""
+    org_unit = org_unit or root_unit()
+    batch = active_batch(report_type, year, org_unit)
+    if batch is None:
+        batch = ReportBatch.objects.create(
+            report_type=report_type, year=year, org_unit=org_unit,
+            source=source, created_by=user
+        )
+        activate(batch, user)
+    return batch
+
+
+def start_batch(report_type, year, user=None, source='', carry_from=None, skip_months=(), org_unit=None):
+    """
+    Create a new (inactive) batch. Reports of `carry_from` whose month number
+    is not in `skip_months` are copied into it with one insert.
+    """
+    batch = ReportBatch.objects.create(
+        report_type=report_type, year=year, org_unit=org_unit or root_unit(),
+        parent=carry_from, source=source, created_by=user
+    )
+
+    if carry_from is not None:
+        carried = (
+            Report.objects
+            .filter(batch=carry_from)
+            .exclude(month__month__in=list(skip_months))
+        )
+        Report.objects.bulk_create([
+            Report(
+                report_type_id=r.report_type_id,
+                year_id=r.year_id,
+                month_id=r.month_id,
+                org_unit_id=r.org_unit_id,
+                batch=batch,
+                data=r.data,
+                uploaded_by_id=r.uploaded_by_id,
+            )
+            for r in carried
+        ])
+
+    return batch
+
+
+def activate(batch, user=None, months=None):
+    """
+    Point readers of (batch.report_type, batch.year, batch.org_unit) at
+    `batch`, recompute the derived cells downstream of `months` (month
+    numbers that differ from the previous version; default: all) and re-sum
+    the consolidated reports above its unit.
+    """
+    ActiveReportBatch.objects.update_or_create(
+        report_type_id=batch.report_type_id,
+        year_id=batch.year_id,
+        org_unit_id=batch.org_unit_id,
+        defaults={'batch': batch, 'activated_by': user}
+    )
+    months = range(1, 13) if months is None else months
+    refresh_downstream(
+        batch.report_type,
+        {batch.org_unit_id: {(batch.year.year, month): None for month in months}},
+        year_ids=[batch.year_id]
+    )
+    return batch
@@ -0,0 +1,182 @@
+"""
+Benchmarks: per-year targets of report metrics, and how far actual values
+deviate from them.
+
+The delivery CSV carries a Benchmark column next to the metric names:
+"85-90%" (a range), "100.00%" or "$2.00" (an exact target), ">100%" (a
+bound), "<Revenue growth" (bounded by another metric of the same month).
+parse_benchmark turns that text into bounds; deviations compares a whole
+period range against them at once, every metric and month in one set of
+array operations.
+"""
+import re
+from decimal import Decimal, InvalidOperation
+
+import numpy as np
+import pandas as pd
+
+from apps.imports.loaders import bulk_upsert
+
+from .models import Benchmark
+
+RANGE = re.compile(r'^(-?\d+(?:\.\d+)?)\s*[-–]\s*(-?\d+(?:\.\d+)?)$')
+BOUND = re.compile(r'^(<=|>=|<|>)\s*(.+)$')
+
+
+def _number(text):
+    """A benchmark number without $ , % and spaces, or None."""
+    try:
+        return Decimal(text.replace('$', '').replace(',', '').replace('%', '').strip())
+    except InvalidOperation:
+        return None
+
+
+def benchmark_names(report_type):
+    """
+    {lower-cased name: field} of the metrics of `report_type`: CSV column
+    names from parsing_config, labels and field names from field_schema.
+    """
+    names = {}
+    mappings = report_type.parsing_config.get('field_mappings', {})
+    for column, mapping in mappings.items():
+        if isinstance(mapping, dict) and mapping.get('field'):
+            names[column.strip().lower()] = mapping['field']
+    for field, schema in report_type.field_schema.items():
+        names[field.lower()] = field
+        if isinstance(schema, dict) and schema.get('label'):
+            names[schema['label'].strip().lower()] = field
+    return names
+
+
+def _resolve(name, names):
+    """The field `name` refers to: an exact name, or the only field some name starts with."""
+    name = name.strip().lower()
+    if name in names:
+        return names[name]
+    fields = {field for known, field in names.items() if known.startswith(name)}
+    return fields.pop() if len(fields) == 1 else None
+
+
+def parse_benchmark(text, names):
+    """
+    Bounds of a benchmark text as a dict of low, high (Decimal or None) and
+    low_reference, high_reference (field names or ''). Unreadable text gives
+    no bounds. `names` resolves metric names (see benchmark_names).
+    """
+    bounds = {'low': None, 'high': None, 'low_reference': '', 'high_reference': ''}
+    text = text.strip()
+
+    match = BOUND.match(text)
+    if match:
+        side = 'low' if match.group(1).startswith('>') else 'high'
+        value = _number(match.group(2))
+        if value is not None:
+            bounds[side] = value
+        else:
+            bounds[f'{side}_reference'] = _resolve(match.group(2), names) or ''
+        return bounds
+
+    match = RANGE.match(text.replace('$', '').replace(',', '').replace('%', '').strip())
+    if match:
+        low, high = sorted([Decimal(match.group(1)), Decimal(match.group(2))])
+        bounds.update(low=low, high=high)
+        return bounds
+
+    value = _number(text)
+    if value is not None:
+        bounds.update(low=value, high=value)
+    return bounds
+
+
+def store_benchmarks(report_type, year, texts):
+    """
+    Save the benchmarks of one year ({field: text}) in one upsert; empty
+    texts are skipped. Returns the number of benchmarks written.
+    """
+    names = benchmark_names(report_type)
+    rows = [
+        {
+            'report_type_id': report_type.pk,
+            'year_id': year.pk,
+            'metric': field,
+            'text': text.strip(),
+            **parse_benchmark(text, names),
+        }
+        for field, text in texts.items()
+        if isinstance(text, str) and text.strip()
+    ]
+    return bulk_upsert(
+        Benchmark, rows,
+        conflict_fields=['report_type_id', 'year_id', 'metric'],
+        update_fields=['text', 'low', 'high', 'low_reference', 'high_reference']
+    )
+
+
+def deviations(frame, benchmarks):
+    """
+    Compare `frame` (one row per 'YYYY-MM' period, one column per field,
+    as from matrix.period_frame) with `benchmarks` (Benchmark rows of its
+    years). Returns {metric: {"benchmark", "value", "low", "high",
+    "deviation", "status"}}, each a list with one entry per period:
+    deviation is how far the value is above the high or below the low bound
+    (0 inside), status "over", "under", "within", or None without a value
+    or a benchmark for that year.
+    """
+    benchmarks = pd.DataFrame.from_records(
+        [
+            (b.year.year, b.metric, b.text, b.low, b.high, b.low_reference, b.high_reference)
+            for b in benchmarks
+        ],
+        columns=['year', 'metric', 'text', 'low', 'high', 'low_reference', 'high_reference']
+    )
+    if benchmarks.empty or frame.empty:
+        return {}
+
+    metrics = sorted(benchmarks['metric'].unique())
+    numeric = frame.apply(pd.to_numeric, errors='coerce')
+    years = [int(period[:4]) for period in frame.index]
+
+    def per_period(column, dtype=float):
+        """periods x metrics array of a benchmark column, by each period's year"""
+        table = benchmarks.pivot(index='year', columns='metric', values=column)
+        return table.reindex(index=years, columns=metrics).to_numpy(dtype=dtype)
+
+    values = numeric.reindex(columns=metrics).to_numpy(dtype=float)
+    bounds = {}
+    for side in ('low', 'high'):
+        bound = per_period(side)
+        references = per_period(f'{side}_reference', dtype=object)
+        for field in {r for r in references.ravel() if isinstance(r, str) and r}:
+            column = numeric[field].to_numpy(dtype=float) if field in numeric else np.full(len(years), np.nan)
+            bound = np.where(references == field, column[:, None], bound)
+        bounds[side] = bound
+    low, high = bounds['low'], bounds['high']
+
+    with np.errstate(invalid='ignore'):
+        over = values > high
+        under = values < low
+    unknown = np.isnan(values) | (np.isnan(low) & np.isnan(high))
+    deviation = np.where(over, values - high, np.where(under, values - low, 0.0))
+    deviation[unknown] = np.nan
+    status = np.full(values.shape, 'within', dtype=object)
+    status[under] = 'under'
+    status[over] = 'over'
+    status[unknown] = None
+    texts = per_period('text', dtype=object)
+
+    result = {}
+    for i, metric in enumerate(metrics):
+        result[metric] = {
+            'benchmark': [t if isinstance(t, str) else None for t in texts[:, i]],
+            'value': _json(values[:, i]),
+            'low': _json(low[:, i]),
+            'high': _json(high[:, i]),
+            'deviation': _json(deviation[:, i]),
+            'status': list(status[:, i]),
+        }
+    return result
+
+
+def _json(column):
+    """Floats rounded to 4 places, None for NaN."""
+    return [None if np.isnan(v) else round(float(v), 4) for v in column]
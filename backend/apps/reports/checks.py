@@ -0,0 +1,120 @@
+"""
+Accounting-identity checks declared per report type (ReportType.checks).
+
+A rule states that two formulas over the fields of one month agree:
+
+    {"name": "Gross profit", "rule": "gross_profit = accrual_revenue - cogs",
+     "tolerance": 1, "relative_tolerance": 0.005}
+
+Both sides are parsed with the formula engine and evaluated over every
+imported month at once, one NumPy array per side, so a rule costs the same
+whether one month or ten years are imported. A month fails a rule when
+|left - right| > tolerance + relative_tolerance * |right| (as numpy.isclose);
+months where either side is null are not checked. Violations are reported,
+never blocking.
+"""
+import re
+
+import numpy as np
+import pandas as pd
+
+from .formulas import FormulaError, parse
+
+DEFAULT_TOLERANCE = 0.01
+# A single "=", not part of "==", "<=", ">=" or "!="
+EQUALS = re.compile(r'(?<![<>=!])=(?!=)')
+
+
+class Rule:
+    """A parsed check: its name, rule text, both side formulas and tolerances."""
+
+    def __init__(self, name, text, left, right, tolerance, relative_tolerance):
+        self.name = name
+        self.text = text
+        self.left = left
+        self.right = right
+        self.tolerance = tolerance
+        self.relative_tolerance = relative_tolerance
+
+
+def parse_rule(check):
+    """Parse one entry of ReportType.checks into a Rule; raises FormulaError."""
+    if not isinstance(check, dict) or not isinstance(check.get('rule'), str):
+        raise FormulaError("Each check must be an object with a 'rule' string")
+    text = check['rule']
+    sides = EQUALS.split(text)
+    if len(sides) != 2:
+        raise FormulaError(f"Check {text!r} must have the form 'left = right'")
+    left, right = parse(sides[0].strip()), parse(sides[1].strip())
+    if left.lags or right.lags:
+        raise FormulaError(f"Check {text!r} cannot use prev() or ytd()")
+
+    try:
+        tolerance = float(check.get('tolerance', DEFAULT_TOLERANCE))
+        relative_tolerance = float(check.get('relative_tolerance', 0))
+    except (TypeError, ValueError):
+        raise FormulaError(f"Tolerances of {text!r} must be numbers")
+    if tolerance < 0 or relative_tolerance < 0:
+        raise FormulaError(f"Tolerances of {text!r} cannot be negative")
+
+    return Rule(check.get('name') or text, text, left, right, tolerance, relative_tolerance)
+
+
+def parse_checks(checks, field_schema=None):
+    """
+    Rules of a ReportType.checks list. With `field_schema`, rules using
+    fields it does not define are rejected.
+    """
+    if not isinstance(checks, list):
+        raise FormulaError("checks must be a list")
+    rules = [parse_rule(check) for check in checks]
+    if field_schema is not None:
+        for rule in rules:
+            unknown = (rule.left.fields | rule.right.fields) - set(field_schema)
+            if unknown:
+                raise FormulaError(f"Check {rule.text!r} uses unknown field(s): {', '.join(sorted(unknown))}")
+    return rules
+
+
+def run_checks(checks, frame):
+    """
+    Evaluate `checks` (a ReportType.checks list) over `frame` (one row per
+    month or period, one column per field). Returns the violations, by rule
+    then row: [{"check", "rule", "period", "left", "right", "difference",
+    "allowed"}], "period" being the frame's index label.
+    """
+    if not checks or frame.empty:
+        return []
+    rules = parse_checks(checks)
+
+    length = len(frame)
+    columns = {
+        name: pd.to_numeric(frame[name], errors='coerce').to_numpy(dtype=float)
+        for name in frame.columns
+    }
+    labels = list(frame.index)
+
+    violations = []
+    for rule in rules:
+        left = rule.left.evaluate(columns, length)
+        right = rule.right.evaluate(columns, length)
+        difference = left - right
+        allowed = rule.tolerance + rule.relative_tolerance * np.abs(right)
+        with np.errstate(invalid='ignore'):
+            failed = np.abs(difference) > allowed
+        for row in np.flatnonzero(failed):
+            violations.append({
+                'check': rule.name,
+                'rule': rule.text,
+                'period': _label(labels[row]),
+                'left': round(float(left[row]), 4),
+                'right': round(float(right[row]), 4),
+                'difference': round(float(difference[row]), 4),
+                'allowed': round(float(allowed[row]), 4),
+            })
+    return violations
+
+
+def _label(value):
+    """Index labels as plain JSON values (month numbers come back as numpy ints)."""
+    return value.item() if isinstance(value, np.generic) else value
@@ -0,0 +1,124 @@
+"""
+Correlations between metrics, within and across report types, including
+lagged ones: does utilization lead cash income by a month?
+
+All numeric fields of the requested report types are joined into one
+months x metrics array (matrix.joined_metric_frame). For each lag L the
+Pearson correlation of every metric at month t - L with every metric at
+month t is computed at once from a handful of matrix products over the
+masked array, each pair using only the months where both values exist
+(pairwise-complete, as pandas' DataFrame.corr). Row i, column j of the lag L
+matrix answers "does metric i lead metric j by L months?".
+"""
+import warnings
+
+import numpy as np
+from django.core.cache import cache
+
+from utils.single_flight import load
+
+from .matrix import joined_metric_frame
+
+DEFAULT_MAX_LAG = 3
+MAX_LAG = 12
+DEFAULT_MIN_PERIODS = 6
+DEFAULT_TOP = 20
+CACHE_TIMEOUT = 24 * 60 * 60
+
+
+def lagged_correlations(values, max_lag=DEFAULT_MAX_LAG, min_periods=DEFAULT_MIN_PERIODS):
+    """
+    Correlations of the columns of `values` (months x metrics, NaN for
+    missing) for lags 0..max_lag: (correlations, counts), both
+    lags x metrics x metrics. correlations[L, i, j] correlates column i at
+    month t - L with column j at month t over the counts[L, i, j] months
+    where both exist; NaN below `min_periods` months or without variance.
+    """
+    months, metrics = values.shape
+    # Centered, so the sums below do not cancel catastrophically
+    with warnings.catch_warnings():
+        # Columns without any value are all NaN
+        warnings.simplefilter('ignore', RuntimeWarning)
+        centered = values - np.nanmean(values, axis=0)
+    present = (~np.isnan(centered)).astype(float)
+    filled = np.where(present > 0, centered, 0.0)
+
+    correlations = np.full((max_lag + 1, metrics, metrics), np.nan)
+    counts = np.zeros((max_lag + 1, metrics, metrics), dtype=int)
+    for lag in range(min(max_lag, months - 1) + 1):
+        a, b = filled[:months - lag], filled[lag:]
+        mask_a, mask_b = present[:months - lag], present[lag:]
+        n = mask_a.T @ mask_b
+        sum_a, sum_b = a.T @ mask_b, mask_a.T @ b
+        with np.errstate(divide='ignore', invalid='ignore'):
+            covariance = a.T @ b - sum_a * sum_b / n
+            variance_a = (a ** 2).T @ mask_b - sum_a ** 2 / n
+            variance_b = mask_a.T @ b ** 2 - sum_b ** 2 / n
+            r = covariance / np.sqrt(variance_a * variance_b)
+        # Variances that are zero up to rounding leave nothing to correlate
+        flat = (variance_a <= 1e-12 * (a ** 2).T @ mask_b) | (variance_b <= 1e-12 * mask_a.T @ b ** 2)
+        r[(n < min_periods) | flat] = np.nan
+        correlations[lag] = np.clip(r, -1, 1)
+        counts[lag] = n
+    return correlations, counts
+
+
+def drivers(correlations, counts, metrics, top=DEFAULT_TOP):
+    """
+    The strongest leading relationships: pairs of different metrics at a lag
+    of one month or more, by |r|, as [{"leader", "follower", "lag", "r", "months"}].
+    """
+    strength = np.abs(correlations[1:])
+    strength[:, np.arange(len(metrics)), np.arange(len(metrics))] = np.nan
+    flat = np.where(np.isnan(strength), -1, strength).ravel()
+    order = np.argsort(-flat, kind='stable')[:top]
+    result = []
+    for index in order:
+        if flat[index] < 0:
+            break
+        lag, i, j = np.unravel_index(index, strength.shape)
+        result.append({
+            'leader': metrics[i],
+            'follower': metrics[j],
+            'lag': int(lag) + 1,
+            'r': round(float(correlations[lag + 1, i, j]), 4),
+            'months': int(counts[lag + 1, i, j]),
+        })
+    return result
+
+
+def report_correlations(report_types, org_unit, start=None, end=None,
+                        max_lag=DEFAULT_MAX_LAG, min_periods=DEFAULT_MIN_PERIODS):
+    """
+    Lagged correlations between the numeric fields of `report_types` for
+    `org_unit` over a period range: {"periods", "metrics", "lags",
+    "correlations": {lag: metrics x metrics}, "drivers"}. Cached until
+    reports of any of the types change (ReportType.data_version), and
+    computed once for concurrent requests.
+    """
+    key = 'correlations:{}:{}:{}:{}:{}:{}'.format(
+        ','.join(f'{t.pk}.{t.data_version}' for t in report_types), org_unit.pk,
+        '{}-{}'.format(*start) if start else '', '{}-{}'.format(*end) if end else '',
+        max_lag, min_periods
+    )
+
+    def compute():
+        frame = joined_metric_frame(report_types, org_unit, start, end)
+        metrics = list(frame.columns)
+        correlations, counts = lagged_correlations(frame.to_numpy(dtype=float), max_lag, min_periods)
+        return {
+            'periods': list(frame.index),
+            'metrics': metrics,
+            'lags': list(range(max_lag + 1)),
+            'correlations': {
+                str(lag): [_json(row) for row in matrix] for lag, matrix in enumerate(correlations)
+            },
+            'drivers': drivers(correlations, counts, metrics),
+        }
+
+    return load(cache, key, compute, CACHE_TIMEOUT)[0]
+
+
+def _json(row):
+    """Floats rounded to 4 places, None for NaN."""
+    return [None if np.isnan(v) else v for v in np.round(row, 4).tolist()]
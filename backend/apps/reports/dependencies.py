@@ -0,0 +1,180 @@
+"""
+Incremental recomputation of derived metrics.
+
+Derived fields (field_schema formulas) can read other periods through
+prev() and ytd(), so correcting one month of one org unit invalidates a
+chain of (field, period) cells: the same month's formulas over the corrected
+fields, the next month's prev() readers, the rest of the year's ytd()
+readers, and whatever depends on those in turn. MetricGraph walks that
+chain from the changed cells; recompute_downstream loads only the window of
+reports the affected cells need, evaluates them vectorized and writes back
+the persisted cells whose value changed.
+"""
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+from django.db.models import F, Q
+
+from apps.core.dashboard import schedule_warm
+from apps.core.models import Year
+from apps.core.summaries import refresh_report_summaries
+from .formulas import evaluate_frame, lookback_months, persisted_fields, schema_formulas, shift
+from .matrix import period_range_filter
+from .models import Report, ReportType
+from .org import refresh_consolidated
+from .rollups import refresh_rollups
+from .tags import invalidate_reports
+
+
+class MetricGraph:
+    """Dependencies between the fields of one field_schema, by lag."""
+
+    def __init__(self, field_schema):
+        self.field_schema = field_schema
+        self.formulas = schema_formulas(field_schema)
+        # Position in evaluation order: within a period, cells are computed by rank
+        self.rank = {name: rank for rank, name in enumerate(self.formulas)}
+        # field -> [(derived field reading it, lag kind or None)]
+        self.dependents = defaultdict(list)
+        for name, formula in self.formulas.items():
+            for field, kinds in formula.reads.items():
+                self.dependents[field].extend((name, kind) for kind in kinds)
+        self.lookback = lookback_months(self.formulas)
+
+    def affected(self, changes):
+        """
+        The derived cells downstream of `changes` ({(year, month): changed
+        fields, or None when the whole month changed}) as (period, field)
+        pairs in topological order: by period, then by evaluation order.
+        """
+        pending = []
+        for period, fields in changes.items():
+            if fields is None:
+                fields = set(self.field_schema) | set(self.dependents)
+            pending.extend((field, period) for field in fields)
+
+        seen = set()
+        cells = set()
+        while pending:
+            field, period = pending.pop()
+            if (field, period) in seen:
+                continue
+            seen.add((field, period))
+            if field in self.formulas:
+                cells.add((period, field))
+            for dependent, kind in self.dependents.get(field, ()):
+                pending.extend((dependent, target) for target in _targets(period, kind))
+
+        return sorted(cells, key=lambda cell: (cell[0], self.rank[cell[1]]))
+
+
+def _targets(period, kind):
+    """Periods whose cells read `period` through `kind`."""
+    if kind is None:
+        return [period]
+    if kind == 'prev':
+        return [shift(period, 1)]
+    year, month = period
+    return [(year, m) for m in range(month, 13)]
+
+
+def recompute_downstream(report_type, org_unit_id, changes):
+    """
+    Recompute the persisted derived cells of one report type and org unit
+    downstream of `changes` (as for MetricGraph.affected) over the active
+    reports, writing only the reports whose stored value differs.
+    Returns the ids of the years whose reports were rewritten.
+    """
+    graph = MetricGraph(report_type.field_schema)
+    persisted = persisted_fields(report_type.field_schema)
+    cells = [(period, field) for period, field in graph.affected(changes) if field in persisted]
+    if not cells:
+        return set()
+
+    first, last = cells[0][0], max(period for period, _ in cells)
+    rows = {
+        f'{year}-{month:02d}': (pk, year_id, data)
+        for pk, year_id, year, month, data in (
+            Report.objects.active()
+            .filter(report_type=report_type, org_unit_id=org_unit_id)
+            .filter(period_range_filter(shift(first, -graph.lookback), last))
+            .order_by('year__year', 'month__month')
+            .values_list('pk', 'year_id', 'year__year', 'month__month', 'data')
+        )
+    }
+    if not rows:
+        return set()
+    frame = pd.DataFrame(
+        [data for _, _, data in rows.values()], index=pd.Index(list(rows), name='period')
+    )
+    computed = evaluate_frame(report_type.field_schema, frame, fields={field for _, field in cells})
+
+    changed = {}
+    for (year, month), field in cells:
+        label = f'{year}-{month:02d}'
+        if label not in rows:
+            continue
+        pk, year_id, data = rows[label]
+        value = computed.at[label, field]
+        # Missing inputs keep the stored value
+        if not np.isfinite(value):
+            continue
+        value = round(float(value), 2)
+        if data.get(field) != value:
+            data[field] = value
+            changed[pk] = (year_id, data)
+
+    Report.objects.bulk_update(
+        [Report(pk=pk, data=data) for pk, (_, data) in changed.items()], ['data']
+    )
+    return {year_id for year_id, _ in changed.values()}
+
+
+def refresh_downstream(report_type, changes_by_unit, year_ids=()):
+    """
+    After reports of `report_type` changed ({org unit id: changes}):
+    recompute the derived cells downstream of each unit's changes, then
+    re-sum the consolidated totals above those units for `year_ids` and
+    every year whose reports were rewritten, and rebuild the rollups of each
+    unit's changed years and the company's year summaries. Bumps the report
+    type's data_version and the result cache tags of the touched years, so
+    cached results computed from those reports expire, and pre-renders the
+    changed years' chart series once the data commits.
+    """
+    ReportType.objects.filter(pk=report_type.pk).update(data_version=F('data_version') + 1)
+    years = set(year_ids)
+    unit_years = set()
+    # A December change reaches January's prev() through the formulas
+    lags = any(f.lags for f in schema_formulas(report_type.field_schema).values())
+    for unit_id, changes in changes_by_unit.items():
+        years |= recompute_downstream(report_type, unit_id, changes)
+        for year, month in changes:
+            unit_years.add((unit_id, year))
+            if lags and month == 12:
+                unit_years.add((unit_id, year + 1))
+    for year_id in years:
+        refresh_consolidated(report_type, year_id, list(changes_by_unit))
+    refresh_rollups(report_type, unit_years)
+    changed_years = {year for _, year in unit_years}
+    touched_years = dict(
+        Year.objects.filter(Q(year__in=changed_years) | Q(pk__in=list(year_ids))).values_list('pk', 'year')
+    )
+    refresh_report_summaries(report_type, touched_years, unit_ids=changes_by_unit)
+    invalidate_reports(report_type, changed_years | set(touched_years.values()))
+    schedule_warm(report_type_years={report_type.pk: changed_years})
+
+
+def rebuild_derived(report_type):
+    """
+    Recompute every persisted derived cell and rollup of `report_type`, for
+    when its formulas or rollup declarations changed rather than its data.
+    """
+    changes = defaultdict(dict)
+    for unit_id, year, month in (
+        Report.objects.active()
+        .filter(report_type=report_type)
+        .values_list('org_unit_id', 'year__year', 'month__month')
+    ):
+        changes[unit_id][(year, month)] = None
+    refresh_downstream(report_type, changes)
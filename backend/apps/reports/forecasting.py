@@ -0,0 +1,250 @@
+"""
+Forecasts of every numeric metric of a report type, fitted all at once.
+
+The stored numeric fields of one org unit form a months x metrics matrix on
+a gap-free monthly grid (see matrix.monthly_grid) and two seasonal models
+are fitted to every column in one batch:
+
+- linear: least squares on a trend and a calendar-month effect. The normal
+  equations of all metrics are built with one batched matmul (each metric
+  weighting only its own observed months) and solved with one batched
+  numpy.linalg.solve.
+- smoothing: additive Holt-Winters. The recursion steps through the months
+  once, updating the level, trend and seasonal state of every metric and of
+  every candidate (alpha, beta, gamma) together; each metric keeps the
+  candidate with the smallest one-step-ahead error.
+
+"auto" backtests both on the last `horizon` months and keeps the better
+model per metric. Seasonal terms are only fitted for metrics with two years
+of history. Derived fields are not forecast themselves: their formulas are
+evaluated over the forecast inputs, so ratios stay consistent with them.
+"""
+import warnings
+from itertools import product
+
+import numpy as np
+import pandas as pd
+from django.core.cache import cache
+
+from utils.single_flight import load
+
+from .formulas import evaluate_frame, schema_formulas
+from .matrix import metric_frame, monthly_grid
+
+METHODS = ('auto', 'linear', 'smoothing')
+DEFAULT_HORIZON = 3
+MAX_HORIZON = 24
+# Months of history a metric needs before seasonal terms are fitted
+SEASONAL_HISTORY = 24
+# Candidate smoothing parameters, all fitted together
+ALPHAS = (0.1, 0.3, 0.5, 0.8)
+BETAS = (0.01, 0.1, 0.3)
+GAMMAS = (0.05, 0.2, 0.5)
+# Spread of the low/high band, in standard deviations of the fit's errors
+BAND = 1.96
+RIDGE = 1e-6
+CACHE_TIMEOUT = 24 * 60 * 60
+
+
+def _calendar(first, months):
+    """Calendar month index (0-11) of `months` grid rows from ordinal `first`."""
+    return (first + np.arange(months)) % 12
+
+
+def fit_linear(values, first, horizon):
+    """
+    Forecast the `horizon` months after `values` (months x metrics, NaN for
+    missing) with a trend and calendar-month effects per metric.
+    Returns (forecast, band), both horizon x metrics.
+    """
+    months, metrics = values.shape
+    observed = ~np.isnan(values)
+    count = observed.sum(axis=0)
+
+    def design(rows):
+        """Intercept, trend in years, one column per calendar month"""
+        return np.column_stack([
+            np.ones(len(rows)), rows / 12.0, np.eye(12)[_calendar(first, months + horizon)[rows]]
+        ])
+
+    x = design(np.arange(months))
+    weights = observed.astype(float)
+    filled = np.where(observed, values, 0.0)
+    # (metrics, p, p) and (metrics, p): every metric's normal equations at
+    # once, each over its own observed months
+    a = (weights.T[:, :, None] * x).transpose(0, 2, 1) @ x
+    b = filled.T @ x
+
+    # Ridge on the month effects keeps them identifiable next to the
+    # intercept; too little history switches them (or the trend) off
+    penalty = np.full((metrics, x.shape[1]), RIDGE)
+    penalty[:, 2:] = np.where(count >= SEASONAL_HISTORY, 1e-3, 1e9)[:, None]
+    penalty[:, 1] = np.where(count >= 3, RIDGE, 1e9)
+    a += penalty[:, :, None] * np.eye(x.shape[1])
+    coefficients = np.linalg.solve(a, b[:, :, None])[:, :, 0]
+
+    residuals = np.where(observed, values - x @ coefficients.T, 0.0)
+    dof = np.maximum(count - 2, 1)
+    spread = np.sqrt((residuals ** 2).sum(axis=0) / dof)
+
+    forecast = design(np.arange(months, months + horizon)) @ coefficients.T
+    forecast[:, count == 0] = np.nan
+    return forecast, np.broadcast_to(BAND * spread, forecast.shape).copy()
+
+
+def fit_smoothing(values, first, horizon):
+    """
+    Forecast the `horizon` months after `values` (months x metrics, NaN for
+    missing) with additive Holt-Winters, choosing the smoothing parameters
+    per metric. Returns (forecast, band), both horizon x metrics.
+    """
+    months, metrics = values.shape
+    observed = ~np.isnan(values)
+    count = observed.sum(axis=0)
+    seasonal = count >= SEASONAL_HISTORY
+
+    grid = np.array(list(product(ALPHAS, BETAS, GAMMAS)))
+    alpha, beta = grid[:, 0, None], grid[:, 1, None]
+    gamma = grid[:, 2, None] * seasonal
+    candidates = len(grid)
+
+    # Initial state: the first year's mean, the change to the second year's
+    # mean as trend, and the first year's deviations from that line as the
+    # seasonal offsets (only with two years of history)
+    start = np.nanmean(values[:12], axis=0)
+    start = np.where(np.isnan(start), np.nanmean(values, axis=0), start)
+    slope = np.where(seasonal, (np.nanmean(values[12:24], axis=0) - start) / 12, 0.0)
+    slope = np.nan_to_num(slope)
+    calendar = _calendar(first, months + horizon)
+    offsets = np.zeros((12, metrics))
+    first_year = values[:12] - (start + slope * (np.arange(min(12, months))[:, None] - 5.5))
+    offsets[calendar[:min(12, months)]] = np.where(np.isnan(first_year), 0.0, first_year)
+    offsets *= seasonal
+
+    # The state before the first month
+    level = np.broadcast_to(np.nan_to_num(start - 6.5 * slope), (candidates, metrics)).copy()
+    trend = np.broadcast_to(slope, (candidates, metrics)).copy()
+    season = np.broadcast_to(offsets, (candidates, 12, metrics)).copy()
+    errors = np.zeros((candidates, metrics))
+
+    for t in range(months):
+        month = calendar[t]
+        expected = level + trend + season[:, month]
+        y = values[t]
+        seen = observed[t]
+        if t:
+            errors += np.where(seen, (y - expected) ** 2, 0.0)
+        new_level = np.where(seen, alpha * (y - season[:, month]) + (1 - alpha) * (level + trend), level + trend)
+        trend = np.where(seen, beta * (new_level - level) + (1 - beta) * trend, trend)
+        season[:, month] = np.where(seen, gamma * (y - new_level) + (1 - gamma) * season[:, month], season[:, month])
+        level = new_level
+
+    best = errors.argmin(axis=0)
+    columns = np.arange(metrics)
+    level, trend, season = level[best, columns], trend[best, columns], season[best, :, columns].T
+    steps = np.arange(1, horizon + 1)[:, None]
+    forecast = level + steps * trend + season[calendar[months:]]
+    forecast[:, count == 0] = np.nan
+
+    spread = np.sqrt(errors[best, columns] / np.maximum(count - 1, 1))
+    return forecast, BAND * spread * np.sqrt(steps)
+
+
+FITS = {'linear': fit_linear, 'smoothing': fit_smoothing}
+
+
+def fit(values, first, horizon, method='auto'):
+    """
+    Forecast every column of `values` with `method` (see METHODS). Returns
+    (forecast, band, method chosen per metric).
+    """
+    metrics = values.shape[1]
+    if method != 'auto':
+        forecast, band = FITS[method](values, first, horizon)
+        return forecast, band, np.full(metrics, method, dtype=object)
+
+    results = {name: function(values, first, horizon) for name, function in FITS.items()}
+    chosen = np.full(metrics, 'linear', dtype=object)
+    if len(values) > horizon + SEASONAL_HISTORY // 2:
+        # Backtest: fit without the last `horizon` months, compare on them
+        held_out = values[-horizon:]
+        errors = {}
+        for name, function in FITS.items():
+            backtest, _ = function(values[:-horizon], first, horizon)
+            errors[name] = np.nanmean(np.abs(backtest - held_out), axis=0)
+        # Metrics without held-out values compare as NaN and stay linear
+        chosen[errors['smoothing'] < errors['linear']] = 'smoothing'
+
+    smoothing = chosen == 'smoothing'
+    forecast = np.where(smoothing, results['smoothing'][0], results['linear'][0])
+    band = np.where(smoothing, results['smoothing'][1], results['linear'][1])
+    return forecast, band, chosen
+
+
+def forecast_frame(field_schema, frame, horizon=DEFAULT_HORIZON, method='auto'):
+    """
+    Forecast the `horizon` months after `frame` (one row per 'YYYY-MM'
+    period in order, one numeric column per metric, as from
+    matrix.metric_frame). Returns {"history_end", "periods", "metrics":
+    {metric: {"method", "values", "low", "high"}}}; derived fields have
+    method "formula" and no band.
+    """
+    if frame.empty:
+        return {'history_end': None, 'periods': [], 'metrics': {}}
+
+    formulas = schema_formulas(field_schema)
+    inputs = [name for name in frame.columns if name not in formulas]
+    values, first, _ = monthly_grid(frame[inputs])
+    last = first + len(values) - 1
+    periods = [f'{o // 12}-{o % 12 + 1:02d}' for o in range(last + 1, last + 1 + horizon)]
+
+    if inputs:
+        with warnings.catch_warnings(), np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+            # Metrics without values give all-NaN means; they forecast null
+            warnings.simplefilter('ignore', RuntimeWarning)
+            forecast, band, chosen = fit(values, first, horizon, method)
+    else:
+        forecast, band, chosen = np.empty((horizon, 0)), np.empty((horizon, 0)), []
+
+    metrics = {}
+    for column, name in enumerate(inputs):
+        metrics[name] = {
+            'method': chosen[column],
+            'values': _json(forecast[:, column]),
+            'low': _json(forecast[:, column] - band[:, column]),
+            'high': _json(forecast[:, column] + band[:, column]),
+        }
+
+    derived = [name for name in frame.columns if name in formulas]
+    if derived:
+        future = pd.DataFrame(forecast, index=pd.Index(periods, name='period'), columns=inputs)
+        combined = evaluate_frame(field_schema, pd.concat([frame[inputs], future]), fields=derived)
+        for name in derived:
+            metrics[name] = {
+                'method': 'formula',
+                'values': _json(combined[name].to_numpy(dtype=float)[-horizon:]),
+                'low': [None] * horizon,
+                'high': [None] * horizon,
+            }
+
+    return {'history_end': frame.index[-1], 'periods': periods, 'metrics': metrics}
+
+
+def report_forecast(report_type, org_unit, horizon=DEFAULT_HORIZON, method='auto'):
+    """
+    forecast_frame over the active reports of `report_type` and `org_unit`.
+    Cached until reports of the type change (ReportType.data_version), and
+    computed once for concurrent requests.
+    """
+    key = report_type.cache_key('forecast', org_unit.pk, horizon, method)
+
+    def compute():
+        frame = metric_frame(report_type, org_unit)
+        return forecast_frame(report_type.field_schema, frame, horizon, method)
+
+    return load(cache, key, compute, CACHE_TIMEOUT)[0]
+
+
+def _json(column):
+    """Floats rounded to 4 places, None for NaN."""
+    return [None if np.isnan(v) else v for v in np.round(np.where(np.isfinite(column), column, np.nan), 4).tolist()]
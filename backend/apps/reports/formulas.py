@@ -0,0 +1,345 @@
+"""
+Derived metrics declared in ReportType.field_schema.
+
+A field_schema entry may carry a formula over other fields of the same
+report type:
+
+    "gm_percent": {"label": "Gross Margin %", "type": "percentage",
+                   "formula": "gp / revenue * 100"}
+
+Formulas are parsed once (with Python's ast module, restricted to
+arithmetic, numbers, field names and a few functions) into an expression
+tree, and evaluated with NumPy over whole columns: one array per field with
+one value per period, so every derived series of a multi-year range is
+computed in a single pass. Division by zero and missing inputs give null.
+
+Two functions reach across periods: prev(x) is x in the previous calendar
+month and ytd(x) is the sum of x from January through the current month
+(nulls count as 0). They cannot be nested.
+"""
+import ast
+import operator
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+MAX_FORMULA_LENGTH = 500
+MAX_ROUND_DIGITS = 15
+
+BINARY_OPERATORS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.Pow: operator.pow,
+}
+UNARY_OPERATORS = {
+    ast.USub: operator.neg,
+    ast.UAdd: operator.pos,
+}
+
+
+def _coalesce(*columns):
+    result = columns[0]
+    for column in columns[1:]:
+        result = np.where(np.isnan(result), column, result)
+    return result
+
+
+def _round(column, digits=0.0):
+    return np.round(column, int(digits))
+
+
+# Functions available in formulas: name -> (implementation, min args, max args)
+FUNCTIONS = {
+    'abs': (np.abs, 1, 1),
+    'min': (lambda *c: np.fmin.reduce(np.broadcast_arrays(*c)), 2, None),
+    'max': (lambda *c: np.fmax.reduce(np.broadcast_arrays(*c)), 2, None),
+    'round': (_round, 1, 2),
+    'coalesce': (_coalesce, 2, None),
+}
+
+# Functions that read other periods; each takes one argument
+LAGS = ('prev', 'ytd')
+
+
+class FormulaError(ValueError):
+    """A formula that cannot be parsed, references unknown fields or forms a cycle."""
+
+
+class Formula:
+    """
+    A parsed formula: its source, its expression tree and how it reads
+    each field ({field: {None, 'prev', 'ytd'}}, None for the same period).
+    """
+
+    def __init__(self, source, tree, reads):
+        self.source = source
+        self.tree = tree
+        self.reads = reads
+        self.fields = frozenset(reads)
+        # Fields read from other periods
+        self.lags = {field: kinds - {None} for field, kinds in reads.items() if kinds - {None}}
+
+    def evaluate(self, columns, length, periods=None):
+        """
+        Evaluate over `columns` ({field: float ndarray}, all of `length`);
+        a field missing from `columns` is all-null. Formulas using lags need
+        `periods`, the Periods of the rows.
+        """
+        if self.lags and periods is None:
+            raise FormulaError(f"{self.source!r} reads other periods and needs them to evaluate")
+        with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+            result = _evaluate(self.tree, columns, length, periods)
+        result = np.broadcast_to(np.asarray(result, dtype=float), (length,)).copy()
+        result[~np.isfinite(result)] = np.nan
+        return result
+
+
+@lru_cache(maxsize=1024)
+def parse(source):
+    """Parse a formula into a Formula; cached, so each distinct formula is parsed once."""
+    if not isinstance(source, str) or not source.strip():
+        raise FormulaError("Formula must be a non-empty string")
+    if len(source) > MAX_FORMULA_LENGTH:
+        raise FormulaError(f"Formula is longer than {MAX_FORMULA_LENGTH} characters")
+    try:
+        node = ast.parse(source.strip(), mode='eval').body
+    except SyntaxError as e:
+        raise FormulaError(f"Invalid formula {source!r}: {e.msg}")
+
+    reads = {}
+    tree = _build(node, reads, source)
+    return Formula(source, tree, {field: frozenset(kinds) for field, kinds in reads.items()})
+
+
+def _build(node, reads, source, lag=None):
+    """
+    Turn an ast node into a nested-tuple expression tree, rejecting anything
+    else. `lag` is the lag function the node is inside of, if any.
+    """
+    if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)) and not isinstance(node.value, bool):
+        # A NumPy scalar, so constant-only subexpressions follow NumPy's
+        # float rules too (1/0 is inf, not a ZeroDivisionError)
+        try:
+            return ('const', np.float64(node.value))
+        except OverflowError:
+            raise FormulaError(f"Number too large in {source!r}")
+    if isinstance(node, ast.Name):
+        reads.setdefault(node.id, set()).add(lag)
+        return ('field', node.id)
+    if isinstance(node, ast.BinOp) and type(node.op) in BINARY_OPERATORS:
+        return ('binary', BINARY_OPERATORS[type(node.op)],
+                _build(node.left, reads, source, lag), _build(node.right, reads, source, lag))
+    if isinstance(node, ast.UnaryOp) and type(node.op) in UNARY_OPERATORS:
+        return ('unary', UNARY_OPERATORS[type(node.op)], _build(node.operand, reads, source, lag))
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and not node.keywords:
+        name = node.func.id
+        if name in LAGS:
+            if lag:
+                raise FormulaError(f"{name}() cannot be used inside {lag}() in {source!r}")
+            if len(node.args) != 1:
+                raise FormulaError(f"Wrong number of arguments to {name}() in {source!r}")
+            return ('lag', name, _build(node.args[0], reads, source, name))
+        if name not in FUNCTIONS:
+            raise FormulaError(f"Unknown function {name!r} in {source!r}")
+        function, min_args, max_args = FUNCTIONS[name]
+        if len(node.args) < min_args or (max_args is not None and len(node.args) > max_args):
+            raise FormulaError(f"Wrong number of arguments to {name}() in {source!r}")
+        if name == 'round' and len(node.args) == 2 and not (
+            isinstance(node.args[1], ast.Constant) and type(node.args[1].value) is int
+            and abs(node.args[1].value) <= MAX_ROUND_DIGITS
+        ):
+            raise FormulaError(
+                f"round() digits must be an integer constant up to {MAX_ROUND_DIGITS} in {source!r}"
+            )
+        return ('call', function, tuple(_build(arg, reads, source, lag) for arg in node.args))
+    raise FormulaError(f"Unsupported expression in {source!r}")
+
+
+class Periods:
+    """
+    The (year, month) of each row of a frame, in period order, with what the
+    lag functions need: the row of each row's previous month (-1 if absent)
+    and the row's year.
+    """
+
+    def __init__(self, periods):
+        self.periods = list(periods)
+        self.years = np.array([year for year, _ in self.periods], dtype=int)
+        position = {period: row for row, period in enumerate(self.periods)}
+        self.previous = np.array(
+            [position.get(shift(period, -1), -1) for period in self.periods], dtype=int
+        )
+
+    @classmethod
+    def from_index(cls, index):
+        """Periods of an index of 'YYYY-MM' labels."""
+        return cls(tuple(int(part) for part in label.split('-')) for label in index)
+
+    def prev(self, column):
+        return np.where(self.previous >= 0, column[self.previous], np.nan)
+
+    def ytd(self, column):
+        return pd.Series(np.nan_to_num(column, nan=0.0)).groupby(self.years).cumsum().to_numpy()
+
+
+def shift(period, months):
+    """The (year, month) `months` after (or before, if negative) `period`."""
+    ordinal = period[0] * 12 + period[1] - 1 + months
+    return ordinal // 12, ordinal % 12 + 1
+
+
+def _evaluate(tree, columns, length, periods):
+    kind = tree[0]
+    if kind == 'const':
+        return tree[1]
+    if kind == 'field':
+        column = columns.get(tree[1])
+        return np.full(length, np.nan) if column is None else column
+    if kind == 'binary':
+        return tree[1](_evaluate(tree[2], columns, length, periods), _evaluate(tree[3], columns, length, periods))
+    if kind == 'unary':
+        return tree[1](_evaluate(tree[2], columns, length, periods))
+    if kind == 'lag':
+        column = np.broadcast_to(
+            np.asarray(_evaluate(tree[2], columns, length, periods), dtype=float), (length,)
+        )
+        return getattr(periods, tree[1])(column)
+    return tree[1](*(_evaluate(arg, columns, length, periods) for arg in tree[2]))
+
+
+def schema_formulas(field_schema):
+    """
+    {field: Formula} for the derived fields of a field_schema, in evaluation
+    order (a formula comes after the derived fields it reads).
+    Raises FormulaError for bad formulas, unknown fields or cycles.
+    """
+    formulas = {
+        name: parse(schema['formula'])
+        for name, schema in field_schema.items()
+        if isinstance(schema, dict) and schema.get('formula')
+    }
+
+    for name, formula in formulas.items():
+        unknown = formula.fields - set(field_schema)
+        if unknown:
+            raise FormulaError(f"Formula of {name!r} uses unknown field(s): {', '.join(sorted(unknown))}")
+
+    ordered = {}
+    visiting = set()
+
+    def visit(name):
+        if name in ordered:
+            return
+        if name in visiting:
+            # Lagged references count too: a series cannot be vectorized over itself
+            raise FormulaError(f"Formula cycle through {name!r}")
+        visiting.add(name)
+        for dependency in sorted(formulas[name].fields & set(formulas)):
+            visit(dependency)
+        visiting.discard(name)
+        ordered[name] = formulas[name]
+
+    for name in formulas:
+        visit(name)
+    return ordered
+
+
+def lookback_months(formulas):
+    """
+    How many months before a period the `formulas` (as from schema_formulas)
+    may read to compute it: 1 per prev(), 11 per ytd(), chained through
+    derived fields.
+    """
+    needed = {}
+    for name, formula in formulas.items():
+        months = 0
+        for field, kinds in formula.reads.items():
+            reach = max({None: 0, 'prev': 1, 'ytd': 11}[kind] for kind in kinds)
+            months = max(months, reach + needed.get(field, 0))
+        needed[name] = months
+    return max(needed.values(), default=0)
+
+
+def uses_lags(formulas, name):
+    """Whether the derived field `name` reads other periods, directly or through other formulas."""
+    return any(formulas[field].lags for field in _closure(formulas, [name]))
+
+
+def persisted_fields(field_schema):
+    """Derived fields whose computed value is stored in Report.data on write."""
+    return {
+        name for name, schema in field_schema.items()
+        if isinstance(schema, dict) and schema.get('formula') and schema.get('persist')
+    }
+
+
+def evaluate_frame(field_schema, frame, fields=None):
+    """
+    Add the derived columns of `field_schema` to `frame` (one row per period,
+    one column per field) and return it. Non-numeric cells are treated as
+    null. With `fields`, only those derived fields (and what they depend on)
+    are computed. Lag functions need the frame indexed by 'YYYY-MM' in
+    period order, starting early enough for what they read (see
+    lookback_months).
+    """
+    formulas = schema_formulas(field_schema)
+    if fields is not None:
+        wanted = _closure(formulas, fields)
+        formulas = {name: f for name, f in formulas.items() if name in wanted}
+
+    length = len(frame)
+    periods = None
+    if any(formula.lags for formula in formulas.values()):
+        periods = Periods.from_index(frame.index)
+    columns = {
+        name: pd.to_numeric(frame[name], errors='coerce').to_numpy(dtype=float)
+        for name in frame.columns
+    }
+    for name, formula in formulas.items():
+        columns[name] = formula.evaluate(columns, length, periods)
+
+    derived = pd.DataFrame({name: columns[name] for name in formulas}, index=frame.index)
+    return pd.concat([frame.drop(columns=list(formulas), errors='ignore'), derived], axis=1)
+
+
+def apply_formulas(field_schema, data_by_key):
+    """
+    Overwrite the persisted derived fields in each data dict of
+    `data_by_key` ({key: data}) with their computed values, vectorized over
+    all entries. A field whose inputs are missing (non-finite result) keeps
+    its stored value. Fields that read other periods are left alone; they are
+    computed once the data is stored (see dependencies.recompute_downstream).
+    Returns `data_by_key`.
+    """
+    formulas = schema_formulas(field_schema)
+    persisted = {
+        name for name in persisted_fields(field_schema) if not uses_lags(formulas, name)
+    }
+    if not persisted or not data_by_key:
+        return data_by_key
+
+    keys = list(data_by_key)
+    frame = pd.DataFrame([data_by_key[k] for k in keys], index=keys)
+    computed = evaluate_frame(field_schema, frame, fields=persisted)
+    for key in keys:
+        for name in persisted:
+            value = computed.at[key, name]
+            if np.isfinite(value):
+                data_by_key[key][name] = round(float(value), 2)
+    return data_by_key
+
+
+def _closure(formulas, fields):
+    """`fields` plus every derived field they depend on."""
+    wanted = set()
+    pending = [f for f in fields if f in formulas]
+    while pending:
+        name = pending.pop()
+        if name in wanted:
+            continue
+        wanted.add(name)
+        pending.extend(f for f in formulas[name].fields if f in formulas)
+    return wanted
@@ -0,0 +1,79 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.reports.forecasting import DEFAULT_HORIZON, MAX_HORIZON, METHODS, report_forecast
+from apps.reports.models import OrgUnit, ReportType
+from apps.reports.org import root_unit
+
+
+class Command(BaseCommand):
+    help = 'Forecast every numeric metric of report types for the next months'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--report-type', action='append', dest='report_types', metavar='SLUG',
+            help='Report type to forecast; repeat for several (default: all)'
+        )
+        parser.add_argument(
+            '--org-unit', default=None,
+            help='Org unit slug (default: the company unit)'
+        )
+        parser.add_argument(
+            '--horizon', type=int, default=DEFAULT_HORIZON,
+            help=f'Months to forecast after the last reported one (default: {DEFAULT_HORIZON})'
+        )
+        parser.add_argument(
+            '--method', choices=METHODS, default='auto',
+            help='linear, smoothing, or auto to pick the better per metric (default: auto)'
+        )
+        parser.add_argument(
+            '--json', action='store_true',
+            help='Print the forecasts as JSON instead of a table'
+        )
+
+    def handle(self, *args, **options):
+        if not 1 <= options['horizon'] <= MAX_HORIZON:
+            raise CommandError(f'--horizon must be between 1 and {MAX_HORIZON}')
+
+        report_types = ReportType.objects.all()
+        if options['report_types']:
+            report_types = report_types.filter(slug__in=options['report_types'])
+            missing = set(options['report_types']) - {t.slug for t in report_types}
+            if missing:
+                raise CommandError(f"Unknown report type(s): {', '.join(sorted(missing))}")
+        if options['org_unit']:
+            try:
+                org_unit = OrgUnit.objects.get(slug=options['org_unit'])
+            except OrgUnit.DoesNotExist:
+                raise CommandError(f"Unknown org unit: {options['org_unit']}")
+        else:
+            org_unit = root_unit()
+
+        results = {}
+        for report_type in report_types.order_by('slug'):
+            started = time.perf_counter()
+            result = report_forecast(report_type, org_unit, options['horizon'], options['method'])
+            results[report_type.slug] = result
+            if not options['json']:
+                self.write_table(report_type, result, time.perf_counter() - started)
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+
+    def write_table(self, report_type, result, seconds):
+        metrics = result['metrics']
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f"{report_type.name}: {len(metrics)} metrics after {result['history_end'] or 'no data'} "
+            f"({seconds * 1000:.1f} ms)"
+        ))
+        if not metrics:
+            return
+        width = max(len(name) for name in metrics)
+        self.stdout.write(f"  {'metric':<{width}}  {'method':<9}  " + '  '.join(f'{p:>14}' for p in result['periods']))
+        for name, forecast in metrics.items():
+            values = '  '.join(
+                f'{value:>14,.2f}' if value is not None else f"{'-':>14}" for value in forecast['values']
+            )
+            self.stdout.write(f"  {name:<{width}}  {forecast['method']:<9}  {values}")
@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.reports.models import Report, ReportRollup, ReportType
+from apps.reports.rollups import refresh_rollups
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the quarter, half-year, YTD and full-year rollups of every report type, unit and year'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--year', type=int, action='append', dest='years', metavar='YEAR',
+            help='Year to rebuild; repeat for several (default: all)'
+        )
+
+    def handle(self, *args, **options):
+        years = options['years']
+        started = time.perf_counter()
+        written = 0
+        for report_type in ReportType.objects.all():
+            # Stored rollups of years without reports left are deleted
+            unit_years = set()
+            for queryset in (Report.objects.active(), ReportRollup.objects.all()):
+                queryset = queryset.filter(report_type=report_type)
+                if years:
+                    queryset = queryset.filter(year__year__in=years)
+                unit_years.update(queryset.values_list('org_unit_id', 'year__year').distinct())
+            written += refresh_rollups(report_type, unit_years)
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt {written} rollups in {(time.perf_counter() - started) * 1000:.0f} ms'
+        ))
@@ -3,6 +3,8 @@ from decimal import Decimal
 from django.core.management.base import BaseCommand
 from django.contrib.auth import get_user_model
 from apps.core.models import Year, Month
+from apps.reports.batches import get_or_create_active_batch
+from apps.reports.dependencies import refresh_downstream
 from apps.reports.models import ReportType, Report
 
 User = get_user_model()
@@ -42,6 +44,8 @@ class Command(BaseCommand):
         for year_value in years:
             # Get or create Year
             year_obj, _ = Year.objects.get_or_create(year=year_value)
+            delivery_batch = get_or_create_active_batch(delivery_type, year_obj, user, source='seed')
+            financial_batch = get_or_create_active_batch(financial_type, year_obj, user, source='seed')
 
             # Apply year-over-year growth
             year_multiplier = 1 + (year_value - 2024) * 0.15  # 15% growth per year
@@ -91,10 +95,12 @@ class Command(BaseCommand):
                 }
 
                 report, created = Report.objects.update_or_create(
-                    report_type=delivery_type,
-                    year=year_obj,
+                    batch=delivery_batch,
                     month=month_obj,
                     defaults={
+                        'report_type': delivery_type,
+                        'org_unit': delivery_batch.org_unit,
+                        'year': year_obj,
                         'data': delivery_data,
                         'uploaded_by': user
                     }
@@ -136,10 +142,12 @@ class Command(BaseCommand):
                 }
 
                 report, created = Report.objects.update_or_create(
-                    report_type=financial_type,
-                    year=year_obj,
+                    batch=financial_batch,
                     month=month_obj,
                     defaults={
+                        'report_type': financial_type,
+                        'org_unit': financial_batch.org_unit,
+                        'year': year_obj,
                         'data': financial_data,
                         'uploaded_by': user
                     }
@@ -152,6 +160,10 @@ class Command(BaseCommand):
 
                 self.stdout.write(f'  Processed {year_value}-{month_num:02d}')
 
+            months_written = {(year_obj.year, month): None for month in months}
+            for batch in (delivery_batch, financial_batch):
+                refresh_downstream(batch.report_type, {batch.org_unit_id: months_written}, year_ids=[year_obj.pk])
+
         self.stdout.write(self.style.SUCCESS(
             f'\n✓ Seeding completed! Created: {created_count}, Updated: {updated_count}'
         ))
@@ -0,0 +1,149 @@
+"""
+Reports of a period range as one pandas frame (rows: periods, columns: fields),
+the shape the formula engine evaluates over.
+"""
+import numpy as np
+import pandas as pd
+from django.db.models import Q
+
+from .formulas import evaluate_frame, lookback_months, schema_formulas, shift
+from .models import Report
+
+NUMERIC_TYPES = ('decimal', 'integer', 'percentage')
+
+
+def period_range_filter(start=None, end=None, prefix=''):
+    """
+    Q for periods between `start` and `end` ((year, month) tuples, inclusive).
+    `prefix` points at the model holding the year/month FKs, e.g. 'report__'.
+    """
+    q = Q()
+    if start:
+        q &= (Q(**{f'{prefix}year__year__gt': start[0]})
+              | Q(**{f'{prefix}year__year': start[0], f'{prefix}month__month__gte': start[1]}))
+    if end:
+        q &= (Q(**{f'{prefix}year__year__lt': end[0]})
+              | Q(**{f'{prefix}year__year': end[0], f'{prefix}month__month__lte': end[1]}))
+    return q
+
+
+def report_frame(reports):
+    """
+    One row per report of `reports` (which should hold one report per
+    period), indexed by 'YYYY-MM' in period order, one column per data key.
+    """
+    rows = list(
+        reports
+        .order_by('year__year', 'month__month')
+        .values_list('year__year', 'month__month', 'data')
+    )
+    index = [f'{year}-{month:02d}' for year, month, _ in rows]
+    return pd.DataFrame([data for _, _, data in rows], index=pd.Index(index, name='period'))
+
+
+def period_frame(report_type, reports, start=None, end=None, fields=None):
+    """
+    report_frame of the `reports` between `start` and `end` with the derived
+    fields of `report_type` (or only those needed for `fields`) computed.
+    Derived fields are always computed from their formula, never read from
+    the stored data; months before `start` that prev()/ytd() read are loaded
+    but not returned.
+    """
+    lookback = lookback_months(schema_formulas(report_type.field_schema))
+    window = reports.filter(period_range_filter(start and shift(start, -lookback), end))
+    frame = evaluate_frame(report_type.field_schema, report_frame(window), fields=fields)
+    if start:
+        frame = frame[frame.index >= f'{start[0]}-{start[1]:02d}']
+    return frame
+
+
+def series(report_type, reports, start=None, end=None, fields=None):
+    """
+    Stored and derived series of `report_type` over the `reports` between
+    `start` and `end`: ({field: [value or None per period]}, [periods]).
+    """
+    frame = period_frame(report_type, reports, start, end, fields=fields)
+    if fields is not None:
+        frame = frame.reindex(columns=list(fields))
+
+    numeric = frame.apply(pd.to_numeric, errors='coerce').round(4)
+    # Objects so NaN can become None for JSON
+    numeric = numeric.astype(object).where(numeric.notna(), None)
+    return {name: numeric[name].tolist() for name in numeric.columns}, list(frame.index)
+
+
+def numeric_fields(field_schema):
+    """The numeric fields of a field_schema: decimal, integer and percentage ones, and formulas."""
+    return [
+        name for name, schema in field_schema.items()
+        if isinstance(schema, dict) and (schema.get('type') in NUMERIC_TYPES or schema.get('formula'))
+    ]
+
+
+def metric_frame(report_type, org_unit, end=None):
+    """
+    Every numeric field of the active reports of `report_type` and
+    `org_unit` through `end` as floats (derived fields computed): the whole
+    history, in one query.
+    """
+    fields = numeric_fields(report_type.field_schema)
+    reports = Report.objects.active().filter(report_type=report_type, org_unit=org_unit)
+    frame = period_frame(report_type, reports, None, end, fields=fields)
+    return frame.reindex(columns=fields).apply(pd.to_numeric, errors='coerce')
+
+
+def monthly_grid(frame):
+    """
+    The values of `frame` (indexed by 'YYYY-MM', numeric) on a monthly grid
+    from its first to its last period, missing months as NaN rows.
+    Returns (values, ordinal of the first period, grid row of each frame row);
+    a period's ordinal is year * 12 + month - 1.
+    """
+    ordinals = np.array([int(p[:4]) * 12 + int(p[5:7]) - 1 for p in frame.index], dtype=int)
+    first = ordinals.min()
+    rows = ordinals - first
+    values = np.full((rows.max() + 1, frame.shape[1]), np.nan)
+    values[rows] = frame.to_numpy(dtype=float)
+    return values, first, rows
+
+
+def joined_metric_frame(report_types, org_unit, start=None, end=None):
+    """
+    The numeric fields of several report types side by side, from one query
+    over the active reports of `org_unit`: one row per month of a gap-free
+    grid between `start` and `end` (missing months all NaN), one float
+    column per '<report type slug>.<field>', derived fields computed.
+    """
+    report_types = list(report_types)
+    lookback = max(
+        (lookback_months(schema_formulas(t.field_schema)) for t in report_types), default=0
+    )
+    rows = (
+        Report.objects.active()
+        .filter(report_type__in=report_types, org_unit=org_unit)
+        .filter(period_range_filter(start and shift(start, -lookback), end))
+        .order_by('year__year', 'month__month')
+        .values_list('report_type_id', 'year__year', 'month__month', 'data')
+    )
+    by_type = {}
+    for report_type_id, year, month, data in rows:
+        by_type.setdefault(report_type_id, []).append((f'{year}-{month:02d}', data))
+
+    frames = []
+    for report_type in report_types:
+        fields = numeric_fields(report_type.field_schema)
+        typed = by_type.get(report_type.pk, [])
+        frame = pd.DataFrame(
+            [data for _, data in typed], index=pd.Index([label for label, _ in typed], name='period')
+        )
+        frame = evaluate_frame(report_type.field_schema, frame, fields=fields)
+        frame = frame.reindex(columns=fields).apply(pd.to_numeric, errors='coerce')
+        frames.append(frame.add_prefix(f'{report_type.slug}.'))
+
+    joined = pd.concat(frames, axis=1).sort_index() if frames else pd.DataFrame()
+    if joined.empty:
+        return joined
+    first = start or tuple(int(part) for part in joined.index[0].split('-'))
+    last = end or tuple(int(part) for part in joined.index[-1].split('-'))
+    months = range(first[0] * 12 + first[1] - 1, last[0] * 12 + last[1])
+    return joined.reindex([f'{o // 12}-{o % 12 + 1:02d}' for o in months])
@@ -0,0 +1,93 @@
+# Generated by Django 4.2.27 on 2026-10-19 10:34
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def create_initial_batches(apps, schema_editor):
+    """Put the existing reports of each (report type, year) in one active batch."""
+    Report = apps.get_model('reports', 'Report')
+    ReportBatch = apps.get_model('reports', 'ReportBatch')
+    ActiveReportBatch = apps.get_model('reports', 'ActiveReportBatch')
+
+    pairs = Report.objects.order_by().values_list('report_type_id', 'year_id').distinct()
+    for report_type_id, year_id in pairs:
+        batch = ReportBatch.objects.create(
+            report_type_id=report_type_id, year_id=year_id, source='migration'
+        )
+        Report.objects.filter(report_type_id=report_type_id, year_id=year_id).update(batch=batch)
+        ActiveReportBatch.objects.create(
+            report_type_id=report_type_id, year_id=year_id, batch=batch
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_remove_deliveryreportsnapshot_delivery_accuracy_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('reports', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReportBatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(blank=True, help_text='e.g. bulk_create, manual, seed', max_length=50)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='report_batches', to=settings.AUTH_USER_MODEL)),
+                ('parent', models.ForeignKey(blank=True, help_text='Batch that was active when this one was written', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='children', to='reports.reportbatch')),
+                ('report_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='batches', to='reports.reporttype')),
+                ('year', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='report_batches', to='core.year')),
+            ],
+            options={
+                'verbose_name': 'Report Batch',
+                'verbose_name_plural': 'Report Batches',
+                'ordering': ['-created_at', '-id'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ActiveReportBatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('activated_at', models.DateTimeField(auto_now=True)),
+                ('activated_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('batch', models.OneToOneField(on_delete=django.db.models.deletion.RESTRICT, related_name='activation', to='reports.reportbatch')),
+                ('report_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='active_batches', to='reports.reporttype')),
+                ('year', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='active_report_batches', to='core.year')),
+            ],
+            options={
+                'verbose_name': 'Active Report Batch',
+                'verbose_name_plural': 'Active Report Batches',
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name='report',
+            unique_together=set(),
+        ),
+        migrations.AddField(
+            model_name='report',
+            name='batch',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='reports', to='reports.reportbatch'),
+        ),
+        migrations.RunPython(create_initial_batches, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='report',
+            name='batch',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reports', to='reports.reportbatch'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='report',
+            unique_together={('batch', 'month')},
+        ),
+        migrations.AddIndex(
+            model_name='reportbatch',
+            index=models.Index(fields=['report_type', 'year', '-created_at'], name='reports_rep_report__b48793_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='activereportbatch',
+            unique_together={('report_type', 'year')},
+        ),
+    ]
@@ -0,0 +1,200 @@
+# Generated by Django 4.2.27 on 2026-10-19 10:45
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def create_root_unit(apps, schema_editor):
+    """
+    Put all existing reports under a root 'company' unit and consolidate
+    them (the root has no children yet, so its totals are its own reports).
+    """
+    OrgUnit = apps.get_model('reports', 'OrgUnit')
+    OrgUnitClosure = apps.get_model('reports', 'OrgUnitClosure')
+    Report = apps.get_model('reports', 'Report')
+    ReportBatch = apps.get_model('reports', 'ReportBatch')
+    ActiveReportBatch = apps.get_model('reports', 'ActiveReportBatch')
+    ConsolidatedReport = apps.get_model('reports', 'ConsolidatedReport')
+
+    root = OrgUnit.objects.create(name='Company', slug='company')
+    OrgUnitClosure.objects.create(ancestor=root, descendant=root, depth=0)
+    for model in (Report, ReportBatch, ActiveReportBatch):
+        model.objects.update(org_unit=root)
+
+    def additive(report):
+        schema = report.report_type.field_schema
+        data = {}
+        for key, value in report.data.items():
+            if schema.get(key, {}).get('type') not in ('decimal', 'integer'):
+                continue
+            if schema[key].get('aggregation', 'sum') != 'sum' or isinstance(value, bool):
+                continue
+            if isinstance(value, (int, float)):
+                data[key] = value
+                continue
+            try:
+                data[key] = round(float(value), 2)
+            except (TypeError, ValueError):
+                pass
+        return data
+
+    active = Report.objects.filter(batch__activation__isnull=False).select_related('report_type')
+    ConsolidatedReport.objects.bulk_create([
+        ConsolidatedReport(
+            report_type_id=report.report_type_id,
+            org_unit=root,
+            year_id=report.year_id,
+            month_id=report.month_id,
+            data=additive(report),
+            unit_count=1,
+        )
+        for report in active
+    ])
+
+
+def remove_root_unit(apps, schema_editor):
+    for name in ('Report', 'ReportBatch', 'ActiveReportBatch'):
+        apps.get_model('reports', name).objects.update(org_unit=None)
+    apps.get_model('reports', 'ConsolidatedReport').objects.all().delete()
+    apps.get_model('reports', 'OrgUnitClosure').objects.all().delete()
+    apps.get_model('reports', 'OrgUnit').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_delivery_cube'),
+        ('reports', '0002_report_batches'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConsolidatedReport',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data', models.JSONField(default=dict)),
+                ('unit_count', models.PositiveIntegerField(default=0, help_text='Units with a report in this month')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Consolidated Report',
+                'verbose_name_plural': 'Consolidated Reports',
+                'ordering': ['year__year', 'month__month'],
+            },
+        ),
+        migrations.CreateModel(
+            name='OrgUnit',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('slug', models.SlugField(unique=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Org Unit',
+                'verbose_name_plural': 'Org Units',
+                'ordering': ['name'],
+            },
+        ),
+        migrations.CreateModel(
+            name='OrgUnitClosure',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('depth', models.PositiveSmallIntegerField()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='orgunitclosure',
+            name='ancestor',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='descendant_links', to='reports.orgunit'),
+        ),
+        migrations.AddField(
+            model_name='orgunitclosure',
+            name='descendant',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ancestor_links', to='reports.orgunit'),
+        ),
+        migrations.AddField(
+            model_name='orgunit',
+            name='parent',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='children', to='reports.orgunit'),
+        ),
+        migrations.AddField(
+            model_name='consolidatedreport',
+            name='month',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='consolidated_reports', to='core.month'),
+        ),
+        migrations.AddField(
+            model_name='consolidatedreport',
+            name='org_unit',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='consolidated_reports', to='reports.orgunit'),
+        ),
+        migrations.AddField(
+            model_name='consolidatedreport',
+            name='report_type',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='consolidated_reports', to='reports.reporttype'),
+        ),
+        migrations.AddField(
+            model_name='consolidatedreport',
+            name='year',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='consolidated_reports', to='core.year'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='activereportbatch',
+            unique_together=set(),
+        ),
+        migrations.AddField(
+            model_name='activereportbatch',
+            name='org_unit',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='active_report_batches', to='reports.orgunit'),
+        ),
+        migrations.AddField(
+            model_name='report',
+            name='org_unit',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='reports', to='reports.orgunit'),
+        ),
+        migrations.AddField(
+            model_name='reportbatch',
+            name='org_unit',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='report_batches', to='reports.orgunit'),
+        ),
+        migrations.RunPython(create_root_unit, remove_root_unit),
+        migrations.AlterField(
+            model_name='activereportbatch',
+            name='org_unit',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='active_report_batches', to='reports.orgunit'),
+        ),
+        migrations.AlterField(
+            model_name='report',
+            name='org_unit',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='reports', to='reports.orgunit'),
+        ),
+        migrations.AlterField(
+            model_name='reportbatch',
+            name='org_unit',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='report_batches', to='reports.orgunit'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='activereportbatch',
+            unique_together={('report_type', 'year', 'org_unit')},
+        ),
+        migrations.AddIndex(
+            model_name='report',
+            index=models.Index(fields=['org_unit', 'report_type', 'year'], name='reports_rep_org_uni_d7985c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='orgunitclosure',
+            index=models.Index(fields=['descendant', 'ancestor'], name='reports_org_descend_bdc5bc_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='orgunitclosure',
+            unique_together={('ancestor', 'descendant')},
+        ),
+        migrations.AddIndex(
+            model_name='consolidatedreport',
+            index=models.Index(fields=['org_unit', 'report_type', 'year'], name='reports_con_org_uni_b3c08b_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='consolidatedreport',
+            unique_together={('report_type', 'org_unit', 'month')},
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.27 on 2026-10-19 10:57
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_delivery_cube'),
+        ('reports', '0003_org_units'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Benchmark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('metric', models.CharField(help_text="Field name in the report type's field_schema", max_length=100)),
+                ('text', models.CharField(help_text='Benchmark as written in the source file', max_length=100)),
+                ('low', models.DecimalField(blank=True, decimal_places=4, max_digits=15, null=True)),
+                ('high', models.DecimalField(blank=True, decimal_places=4, max_digits=15, null=True)),
+                ('low_reference', models.CharField(blank=True, help_text='Metric used as lower bound', max_length=100)),
+                ('high_reference', models.CharField(blank=True, help_text='Metric used as upper bound', max_length=100)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('report_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='benchmarks', to='reports.reporttype')),
+                ('year', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='benchmarks', to='core.year')),
+            ],
+            options={
+                'ordering': ['report_type', 'year__year', 'metric'],
+                'unique_together': {('report_type', 'year', 'metric')},
+            },
+        ),
+    ]
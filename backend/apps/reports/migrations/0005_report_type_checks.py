@@ -0,0 +1,18 @@
+# Generated by Django 4.2.27 on 2026-10-19 11:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0004_benchmarks'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reporttype',
+            name='checks',
+            field=models.JSONField(blank=True, default=list, help_text='\n        Identities between fields, checked for every imported month. Example:\n        [\n            {\n                "name": "Gross profit",\n                "rule": "gross_profit = accrual_revenue - cogs",\n                "tolerance": 1,  # absolute, default 0.01\n                "relative_tolerance": 0.005  # share of the right side, default 0\n            }\n        ]\n        '),
+        ),
+    ]
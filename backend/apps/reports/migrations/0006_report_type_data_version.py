@@ -0,0 +1,18 @@
+# Generated by Django 4.2.27 on 2026-10-19 11:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0005_report_type_checks'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reporttype',
+            name='data_version',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
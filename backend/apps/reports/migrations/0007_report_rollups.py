@@ -0,0 +1,38 @@
+# Generated by Django 4.2.27 on 2026-10-19 11:16
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+# Rollups of existing reports are built by `manage.py rebuild_rollups`, so
+# this migration does not depend on the application code computing them
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_delivery_cube'),
+        ('reports', '0006_report_type_data_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReportRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('Q1', 'Q1'), ('Q2', 'Q2'), ('Q3', 'Q3'), ('Q4', 'Q4'), ('H1', 'H1'), ('H2', 'H2'), ('YTD', 'Year to date'), ('FY', 'Full year')], max_length=3)),
+                ('data', models.JSONField(default=dict)),
+                ('months', models.PositiveSmallIntegerField(default=0, help_text='Months with a report in the period')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('org_unit', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rollups', to='reports.orgunit')),
+                ('report_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rollups', to='reports.reporttype')),
+                ('year', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rollups', to='core.year')),
+            ],
+            options={
+                'verbose_name': 'Report Rollup',
+                'verbose_name_plural': 'Report Rollups',
+                'ordering': ['year__year', 'period'],
+                'indexes': [models.Index(fields=['report_type', 'year', 'period'], name='reports_rep_report__a05e82_idx')],
+                'unique_together': {('report_type', 'org_unit', 'year', 'period')},
+            },
+        ),
+    ]
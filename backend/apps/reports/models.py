@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
 from apps.core.models import Year, Month
 
@@ -82,6 +82,28 @@ class ReportType(models.Model):
         """
     )
 
+    # Accounting identities checked on import (see apps.reports.checks)
+    checks = models.JSONField(
+        default=list,
+        blank=True,
+        help_text="""
+        Identities between fields, checked for every imported month. Example:
+        [
+            {
+                "name": "Gross profit",
+                "rule": "gross_profit = accrual_revenue - cogs",
+                "tolerance": 1,  # absolute, default 0.01
+                "relative_tolerance": 0.005  # share of the right side, default 0
+            }
+        ]
+        """
+    )
+
+    # Bumped whenever reports of this type change (see
+    # apps.reports.dependencies.refresh_downstream); part of the cache key of
+    # results computed from them
+    data_version = models.PositiveIntegerField(default=0, editable=False)
+
     # Metadata
     created_by = models.ForeignKey(
         User,
@@ -101,12 +123,212 @@ class ReportType(models.Model):
         suffix = ' (System)' if self.is_system else ''
         return f"{self.icon} {self.name}{suffix}"
 
+    def cache_key(self, name, *parts):
+        """Cache key of a result `name` computed from this type's reports; expires with data_version"""
+        return ':'.join(str(part) for part in (name, self.pk, self.data_version, *parts))
+
+
+class OrgUnit(models.Model):
+    """
+    A node of the organization tree (company, department, team).
+    Each unit has its own reports; consolidated figures of a unit cover the
+    unit and all of its descendants. OrgUnitClosure is kept in sync on save.
+    """
+    ROOT_SLUG = 'company'
+
+    name = models.CharField(max_length=100)
+    slug = models.SlugField(unique=True)
+    parent = models.ForeignKey(
+        'self',
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        related_name='children'
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['name']
+        verbose_name = 'Org Unit'
+        verbose_name_plural = 'Org Units'
+
+    def __str__(self):
+        return self.name
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            old_parent_id = None
+            if not self._state.adding:
+                old_parent_id = OrgUnit.objects.filter(pk=self.pk).values_list('parent_id', flat=True).first()
+                if self.parent_id and OrgUnitClosure.objects.filter(
+                    ancestor_id=self.pk, descendant_id=self.parent_id
+                ).exists():
+                    raise ValueError("An org unit cannot be moved under one of its descendants")
+
+            adding = self._state.adding
+            super().save(*args, **kwargs)
+
+            if adding:
+                OrgUnitClosure.objects.create(ancestor=self, descendant=self, depth=0)
+                self._link_subtree()
+            elif old_parent_id != self.parent_id:
+                self._unlink_subtree()
+                self._link_subtree()
+
+    def _subtree(self):
+        return list(
+            OrgUnitClosure.objects.filter(ancestor=self).values_list('descendant_id', 'depth')
+        )
+
+    def _unlink_subtree(self):
+        """Drop the paths from this unit's former ancestors into its subtree."""
+        OrgUnitClosure.objects.filter(
+            descendant_id__in=[d for d, _ in self._subtree()],
+            ancestor_id__in=OrgUnitClosure.objects.filter(
+                descendant=self, depth__gt=0
+            ).values('ancestor_id')
+        ).delete()
+
+    def _link_subtree(self):
+        """Add paths from every ancestor of the parent to every node of this subtree."""
+        if self.parent_id is None:
+            return
+        ancestors = OrgUnitClosure.objects.filter(descendant_id=self.parent_id).values_list('ancestor_id', 'depth')
+        OrgUnitClosure.objects.bulk_create([
+            OrgUnitClosure(ancestor_id=ancestor, descendant_id=descendant, depth=up + down + 1)
+            for ancestor, up in ancestors
+            for descendant, down in self._subtree()
+        ])
+
+
+class OrgUnitClosure(models.Model):
+    """
+    One (ancestor, descendant) path of the org tree, including each unit's
+    path to itself (depth 0). "All descendants of X" is a single indexed
+    join on ancestor.
+    """
+    ancestor = models.ForeignKey(OrgUnit, on_delete=models.CASCADE, related_name='descendant_links')
+    descendant = models.ForeignKey(OrgUnit, on_delete=models.CASCADE, related_name='ancestor_links')
+    depth = models.PositiveSmallIntegerField()
+
+    class Meta:
+        unique_together = ['ancestor', 'descendant']
+        indexes = [
+            models.Index(fields=['descendant', 'ancestor']),
+        ]
+
+    def __str__(self):
+        return f"{self.ancestor_id} -> {self.descendant_id} ({self.depth})"
+
+
+class ReportBatch(models.Model):
+    """
+    One version of a report type's data for a year and org unit.
+    Every import writes a new batch; readers only see the batch that
+    ActiveReportBatch points to, so switching or rolling back a year is a
+    single pointer update.
+    """
+    report_type = models.ForeignKey(
+        ReportType,
+        on_delete=models.CASCADE,
+        related_name='batches'
+    )
+    year = models.ForeignKey(
+        Year,
+        on_delete=models.CASCADE,
+        related_name='report_batches'
+    )
+    org_unit = models.ForeignKey(
+        OrgUnit,
+        on_delete=models.PROTECT,
+        related_name='report_batches'
+    )
+    parent = models.ForeignKey(
+        'self',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='children',
+        help_text="Batch that was active when this one was written"
+    )
+    source = models.CharField(max_length=50, blank=True, help_text="e.g. bulk_create, manual, seed")
+
+    created_by = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='report_batches'
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at', '-id']
+        verbose_name = 'Report Batch'
+        verbose_name_plural = 'Report Batches'
+        indexes = [
+            models.Index(fields=['report_type', 'year', '-created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.report_type.name} {self.year.year} {self.org_unit} #{self.pk}"
+
+
+class ActiveReportBatch(models.Model):
+    """Pointer to the batch readers see for one (report type, year, org unit)."""
+    report_type = models.ForeignKey(
+        ReportType,
+        on_delete=models.CASCADE,
+        related_name='active_batches'
+    )
+    year = models.ForeignKey(
+        Year,
+        on_delete=models.CASCADE,
+        related_name='active_report_batches'
+    )
+    org_unit = models.ForeignKey(
+        OrgUnit,
+        on_delete=models.PROTECT,
+        related_name='active_report_batches'
+    )
+    batch = models.OneToOneField(
+        ReportBatch,
+        on_delete=models.RESTRICT,
+        related_name='activation'
+    )
+
+    activated_by = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+'
+    )
+    activated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ['report_type', 'year', 'org_unit']
+        verbose_name = 'Active Report Batch'
+        verbose_name_plural = 'Active Report Batches'
+
+    def __str__(self):
+        return f"{self.report_type.name} {self.year.year} {self.org_unit} -> #{self.batch_id}"
+
+
+class ReportQuerySet(models.QuerySet):
+
+    def active(self):
+        """Reports of the active batch of each (report type, year, org unit)."""
+        return self.filter(batch__activation__isnull=False)
+
 
 class Report(models.Model):
     """
     Generic report data storage.
     Replaces DeliveryReportSnapshot and FinReportSnapshot.
     All actual data is stored in the 'data' JSONField.
+    Rows belong to an OrgUnit and a ReportBatch; use
+    Report.objects.active() for the current version of each year.
     """
 
     # Reference to report type and time period
@@ -125,6 +347,16 @@ class Report(models.Model):
         on_delete=models.CASCADE,
         related_name='reports'
     )
+    org_unit = models.ForeignKey(
+        OrgUnit,
+        on_delete=models.PROTECT,
+        related_name='reports'
+    )
+    batch = models.ForeignKey(
+        ReportBatch,
+        on_delete=models.CASCADE,
+        related_name='reports'
+    )
 
     # Flexible data storage - all report fields stored here as JSON
     data = models.JSONField(
@@ -150,13 +382,16 @@ class Report(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = ReportQuerySet.as_manager()
+
     class Meta:
-        unique_together = ['report_type', 'year', 'month']
+        unique_together = ['batch', 'month']
         ordering = ['-year__year', '-month__month']
         verbose_name = 'Report'
         verbose_name_plural = 'Reports'
         indexes = [
             models.Index(fields=['report_type', 'year', 'month']),
+            models.Index(fields=['org_unit', 'report_type', 'year']),
         ]
 
     def __str__(self):
@@ -165,3 +400,128 @@ class Report(models.Model):
     def get_field_value(self, field_name, default=None):
         """Helper method to safely get field values from data JSON"""
         return self.data.get(field_name, default)
+
+
+class ConsolidatedReport(models.Model):
+    """
+    Precomputed totals of one report type and month for an org unit and all
+    of its descendants (active reports only). Holds the additive fields of
+    the report type (see apps.reports.org.additive_fields); refreshed for
+    the ancestors of a unit whenever that unit's reports change.
+    """
+    report_type = models.ForeignKey(
+        ReportType,
+        on_delete=models.CASCADE,
+        related_name='consolidated_reports'
+    )
+    org_unit = models.ForeignKey(
+        OrgUnit,
+        on_delete=models.CASCADE,
+        related_name='consolidated_reports'
+    )
+    year = models.ForeignKey(
+        Year,
+        on_delete=models.CASCADE,
+        related_name='consolidated_reports'
+    )
+    month = models.ForeignKey(
+        Month,
+        on_delete=models.CASCADE,
+        related_name='consolidated_reports'
+    )
+    data = models.JSONField(default=dict)
+    unit_count = models.PositiveIntegerField(default=0, help_text="Units with a report in this month")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ['report_type', 'org_unit', 'month']
+        ordering = ['year__year', 'month__month']
+        verbose_name = 'Consolidated Report'
+        verbose_name_plural = 'Consolidated Reports'
+        indexes = [
+            models.Index(fields=['org_unit', 'report_type', 'year']),
+        ]
+
+    def __str__(self):
+        return f"{self.report_type.name} {self.org_unit} - {self.year.year}/{self.month.month}"
+
+
+class ReportRollup(models.Model):
+    """
+    Quarter, half-year, year-to-date and full-year values of one report type
+    for an org unit's own active reports of a year, each field rolled up as
+    its field_schema "rollup" declares (see apps.reports.rollups). Refreshed
+    for the (unit, year) pairs whose reports change.
+    """
+    PERIOD_CHOICES = [
+        ('Q1', 'Q1'), ('Q2', 'Q2'), ('Q3', 'Q3'), ('Q4', 'Q4'),
+        ('H1', 'H1'), ('H2', 'H2'),
+        ('YTD', 'Year to date'), ('FY', 'Full year'),
+    ]
+
+    report_type = models.ForeignKey(
+        ReportType,
+        on_delete=models.CASCADE,
+        related_name='rollups'
+    )
+    org_unit = models.ForeignKey(
+        OrgUnit,
+        on_delete=models.CASCADE,
+        related_name='rollups'
+    )
+    year = models.ForeignKey(
+        Year,
+        on_delete=models.CASCADE,
+        related_name='rollups'
+    )
+    period = models.CharField(max_length=3, choices=PERIOD_CHOICES)
+    data = models.JSONField(default=dict)
+    months = models.PositiveSmallIntegerField(default=0, help_text="Months with a report in the period")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ['report_type', 'org_unit', 'year', 'period']
+        ordering = ['year__year', 'period']
+        verbose_name = 'Report Rollup'
+        verbose_name_plural = 'Report Rollups'
+        indexes = [
+            models.Index(fields=['report_type', 'year', 'period']),
+        ]
+
+    def __str__(self):
+        return f"{self.report_type.name} {self.org_unit} - {self.year.year} {self.period}"
+
+
+class Benchmark(models.Model):
+    """
+    Target of one metric of a report type for a year, as given in the
+    Benchmark column of the delivery CSV ("85-90%", "$2.00", ">100%",
+    "<Revenue growth"). The text is kept as written; low/high are the parsed
+    bounds. A bound can instead be another metric of the same month
+    (low_reference/high_reference): "<Revenue growth" means at most
+    revenue_growth_mtm.
+    """
+    report_type = models.ForeignKey(
+        ReportType,
+        on_delete=models.CASCADE,
+        related_name='benchmarks'
+    )
+    year = models.ForeignKey(
+        Year,
+        on_delete=models.CASCADE,
+        related_name='benchmarks'
+    )
+    metric = models.CharField(max_length=100, help_text="Field name in the report type's field_schema")
+    text = models.CharField(max_length=100, help_text="Benchmark as written in the source file")
+    low = models.DecimalField(max_digits=15, decimal_places=4, null=True, blank=True)
+    high = models.DecimalField(max_digits=15, decimal_places=4, null=True, blank=True)
+    low_reference = models.CharField(max_length=100, blank=True, help_text="Metric used as lower bound")
+    high_reference = models.CharField(max_length=100, blank=True, help_text="Metric used as upper bound")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ['report_type', 'year', 'metric']
+        ordering = ['report_type', 'year__year', 'metric']
+
+    def __str__(self):
+        return f"{self.report_type.name} {self.year.year} {self.metric}: {self.text}"
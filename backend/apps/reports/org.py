@@ -0,0 +1,124 @@
+"""
+Organization tree and consolidated (company / department) totals.
+
+Reports belong to one OrgUnit. ConsolidatedReport holds, per unit, report
+type and month, the sum of the additive fields over the unit and all of its
+descendants. When a unit's reports change only the ancestors of that unit
+are re-summed, for the one year that changed, with a single join through
+OrgUnitClosure.
+"""
+from collections import defaultdict
+
+from django.db import transaction
+
+from .models import ConsolidatedReport, OrgUnit, OrgUnitClosure, Report, ReportType
+
+# field_schema types summed across units, unless the field sets
+# "aggregation": "none" (ratios and averages)
+ADDITIVE_TYPES = ('decimal', 'integer')
+
+
+def root_unit():
+    """The company-level unit that reports without an explicit unit belong to."""
+    unit, _ = OrgUnit.objects.get_or_create(
+        slug=OrgUnit.ROOT_SLUG, defaults={'name': 'Company'}
+    )
+    return unit
+
+
+def additive_fields(report_type):
+    """Fields of `report_type` whose values can be summed across units."""
+    return {
+        name for name, schema in report_type.field_schema.items()
+        if schema.get('type') in ADDITIVE_TYPES and schema.get('aggregation', 'sum') == 'sum'
+    }
+
+
+def refresh_consolidated(report_type, year, unit_ids):
+    """
+    Recompute the consolidated reports of `report_type` for `year` (a Year
+    or its id) for every ancestor of `unit_ids` (the units themselves
+    included).
+    Returns the number of consolidated rows written.
+    """
+    ancestors = set(
+        OrgUnitClosure.objects
+        .filter(descendant_id__in=list(unit_ids))
+        .values_list('ancestor_id', flat=True)
+    )
+    if not ancestors:
+        return 0
+
+    year_id = getattr(year, 'pk', year)
+    fields = additive_fields(report_type)
+    # One row per (ancestor, descendant report): the closure join does the tree walk
+    rows = (
+        Report.objects.active()
+        .filter(
+            report_type=report_type,
+            year_id=year_id,
+            org_unit__ancestor_links__ancestor_id__in=ancestors
+        )
+        .values_list('org_unit__ancestor_links__ancestor_id', 'month_id', 'data')
+    )
+
+    totals = defaultdict(dict)
+    counts = defaultdict(int)
+    for ancestor_id, month_id, data in rows:
+        summed = totals[(ancestor_id, month_id)]
+        counts[(ancestor_id, month_id)] += 1
+        for name in fields:
+            value = _number(data.get(name))
+            if value is not None:
+                summed[name] = summed.get(name, 0) + value
+
+    with transaction.atomic():
+        ConsolidatedReport.objects.filter(
+            report_type=report_type, year_id=year_id, org_unit_id__in=ancestors
+        ).delete()
+        ConsolidatedReport.objects.bulk_create([
+            ConsolidatedReport(
+                report_type=report_type,
+                org_unit_id=ancestor_id,
+                year_id=year_id,
+                month_id=month_id,
+                data={name: round(value, 2) for name, value in data.items()},
+                unit_count=counts[(ancestor_id, month_id)],
+            )
+            for (ancestor_id, month_id), data in totals.items()
+        ])
+
+    return len(totals)
+
+
+def refresh_subtree_move(unit, old_parent_id):
+    """
+    After `unit` moved from `old_parent_id`, re-sum its old and new
+    ancestors for every report type and year its subtree has data for.
+    """
+    subtree = OrgUnitClosure.objects.filter(ancestor=unit).values('descendant_id')
+    periods = (
+        Report.objects.active()
+        .filter(org_unit_id__in=subtree)
+        .values_list('report_type', 'year')
+        .distinct()
+        .order_by()
+    )
+    unit_ids = [unit.pk] + ([old_parent_id] if old_parent_id else [])
+    report_types = ReportType.objects.in_bulk({report_type_id for report_type_id, _ in periods})
+    for report_type_id, year_id in periods:
+        refresh_consolidated(report_types[report_type_id], year_id, unit_ids)
+
+
+def _number(value):
+    """A report value as a number; numeric strings count, anything else is None."""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return value
+    if isinstance(value, str):
+        try:
+            return float(value)
+        except ValueError:
+            return None
+    return None
@@ -0,0 +1,160 @@
+"""
+Quarter, half-year, year-to-date and full-year rollups of monthly reports.
+
+How a field rolls up over months is declared with "rollup" in its
+field_schema entry:
+
+- "sum": currency and counts (default for decimal and integer fields)
+- "mean": rates and averages (default for percentages and for fields marked
+  "aggregation": "none")
+- "last": balances and headcounts, e.g. FTE or ytd() totals
+- "min" / "max"
+
+Derived fields that only read their own month (gm_percent = gross profit /
+revenue) default to their formula evaluated over the rolled-up inputs, so a
+quarter's margin is the quarter's profit over its revenue rather than an
+average of monthly margins.
+
+All periods of a year are computed together: the year's months form a
+12 x fields array and each period is a row of a periods x months mask, so
+sums and counts are matrix products. Rollups are stored per report type,
+org unit and year (ReportRollup) and rebuilt for the (unit, year) pairs
+whose months changed.
+"""
+import warnings
+
+import numpy as np
+import pandas as pd
+from django.db import transaction
+
+from .formulas import evaluate_frame, schema_formulas, uses_lags
+from .matrix import numeric_fields, period_frame
+from .models import Report, ReportRollup
+
+ROLLUPS = ('sum', 'mean', 'last', 'min', 'max')
+PERIODS = {
+    'Q1': range(1, 4),
+    'Q2': range(4, 7),
+    'Q3': range(7, 10),
+    'Q4': range(10, 13),
+    'H1': range(1, 7),
+    'H2': range(7, 13),
+    'FY': range(1, 13),
+}
+# YTD runs from January through the year's last reported month
+YTD = 'YTD'
+
+
+def rollup_methods(field_schema):
+    """{field: rollup method or 'formula'} for the numeric fields of a field_schema."""
+    formulas = schema_formulas(field_schema)
+    methods = {}
+    for name in numeric_fields(field_schema):
+        schema = field_schema[name]
+        method = schema.get('rollup')
+        if method is None:
+            if name in formulas and not uses_lags(formulas, name):
+                method = 'formula'
+            elif schema.get('type') == 'percentage' or schema.get('aggregation') == 'none':
+                method = 'mean'
+            else:
+                method = 'sum'
+        methods[name] = method
+    return methods
+
+
+def compute_rollups(field_schema, frame):
+    """
+    Rollups of one year's months: `frame` has one row per 'YYYY-MM' period
+    of the year (derived fields computed, as from matrix.period_frame).
+    Returns {period: (data, months with a report)} for the periods with at
+    least one reported month.
+    """
+    if frame.empty:
+        return {}
+    methods = rollup_methods(field_schema)
+    fields = [name for name, method in methods.items() if method != 'formula']
+    month_numbers = [int(period[5:7]) for period in frame.index]
+    values = np.full((12, len(fields)), np.nan)
+    values[np.array(month_numbers) - 1] = (
+        frame.reindex(columns=fields).apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float)
+    )
+    reported = np.zeros(12, dtype=bool)
+    reported[np.array(month_numbers) - 1] = True
+
+    names = list(PERIODS) + [YTD]
+    masks = np.zeros((len(names), 12), dtype=bool)
+    for row, months in enumerate(PERIODS.values()):
+        masks[row, np.array(months) - 1] = True
+    masks[-1, :max(month_numbers)] = True
+
+    observed = ~np.isnan(values)
+    filled = np.where(observed, values, 0.0)
+    counts = masks.astype(float) @ observed
+    sums = masks.astype(float) @ filled
+    # Last observed month of each period and field (-1 if none)
+    positions = np.where(masks[:, :, None] & observed[None], np.arange(12)[None, :, None], -1)
+    last = positions.max(axis=1)
+    with warnings.catch_warnings(), np.errstate(invalid='ignore', divide='ignore'):
+        # Periods without values for a field give all-NaN slices
+        warnings.simplefilter('ignore', RuntimeWarning)
+        masked = np.where(masks[:, :, None], values[None], np.nan)
+        results = {
+            'sum': sums,
+            'mean': sums / counts,
+            'last': np.take_along_axis(values, np.maximum(last, 0), axis=0),
+            'min': np.nanmin(masked, axis=1),
+            'max': np.nanmax(masked, axis=1),
+        }
+    rolled = np.full((len(names), len(fields)), np.nan)
+    for column, name in enumerate(fields):
+        rolled[:, column] = results[methods[name]][:, column]
+    rolled[counts == 0] = np.nan
+
+    rolled = pd.DataFrame(rolled, index=names, columns=fields)
+    derived = [name for name, method in methods.items() if method == 'formula']
+    if derived:
+        # Formulas may read fields that are not numeric; those are null
+        inputs = [name for name in field_schema if name not in derived and name not in fields]
+        rolled = evaluate_frame(field_schema, rolled.reindex(columns=fields + inputs), fields=derived)
+        rolled = rolled.reindex(columns=list(methods))
+
+    month_counts = masks.astype(int) @ reported
+    rollups = {}
+    for row, name in enumerate(names):
+        if month_counts[row]:
+            data = {
+                field: None if np.isnan(value) else round(float(value), 2)
+                for field, value in rolled.iloc[row].items()
+            }
+            rollups[name] = (data, int(month_counts[row]))
+    return rollups
+
+
+def refresh_rollups(report_type, unit_years):
+    """
+    Rebuild the rollups of `report_type` for each (org unit id, year) of
+    `unit_years` from the unit's active reports of that year.
+    Returns the number of rollups written.
+    """
+    written = 0
+    for unit_id, year in sorted(set(unit_years)):
+        reports = Report.objects.active().filter(report_type=report_type, org_unit_id=unit_id)
+        frame = period_frame(report_type, reports, (year, 1), (year, 12))
+        rollups = compute_rollups(report_type.field_schema, frame)
+        year_id = reports.filter(year__year=year).values_list('year_id', flat=True).first()
+
+        with transaction.atomic():
+            ReportRollup.objects.filter(
+                report_type=report_type, org_unit_id=unit_id, year__year=year
+            ).delete()
+            if year_id is not None:
+                ReportRollup.objects.bulk_create([
+                    ReportRollup(
+                        report_type=report_type, org_unit_id=unit_id, year_id=year_id,
+                        period=period, data=data, months=months,
+                    )
+                    for period, (data, months) in rollups.items()
+                ])
+        written += len(rollups)
+    return written
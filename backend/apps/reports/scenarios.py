@@ -0,0 +1,230 @@
+"""
+What-if scenarios of the monthly P&L.
+
+A baseline is taken from the last twelve reported months of the financial
+report: the revenue of each calendar month, the COGS ratio, overhead per
+production FTE, the FTE count, the income tax rate and the dividend and
+emergency fund shares. Policy parameters are given as grids, e.g.
+
+    {"revenue_growth": [-10, 0, 10, 20], "cogs_ratio": [40, 45, 50],
+     "fte_growth": [0, 10], "dividends_percent": [40, 50, 60]}
+
+(all in percent; growth rates are annual), and every combination is one
+scenario. The P&L cascade
+
+    revenue -> cogs -> gross profit -> overhead (FTE x overhead per FTE)
+    -> net margin before tax -> income tax -> dividends, emergency fund,
+    retained earnings
+
+is evaluated for all scenarios and months at once as (scenarios x months)
+NumPy arrays, and summarized as percentile bands across scenarios: per
+month, and for the horizon's totals.
+
+Months are independent given the parameters, so large grids are split into
+blocks of months evaluated in a process pool; each worker returns its
+months' percentiles and its per-scenario partial totals, which keeps the
+merge exact. This module imports no Django code, so
+pool workers can import it without setting Django up.
+"""
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+# Scenario parameters, all in percent; None defaults come from the baseline
+PARAMETERS = {
+    'revenue_growth': 0.0,
+    'cogs_ratio': None,
+    'fte_growth': 0.0,
+    'income_tax_percent': None,
+    'dividends_percent': None,
+    'emergency_fund_percent': None,
+}
+METRICS = (
+    'accrual_revenue', 'cogs', 'gross_profit', 'production_team_fte', 'overhead',
+    'net_margin_before_tax', 'income_tax', 'dividends_to_be_paid',
+    'emergency_fund_to_be_saved', 'retained_earnings',
+)
+DEFAULT_PERCENTILES = (5, 25, 50, 75, 95)
+DEFAULT_HORIZON = 12
+MAX_HORIZON = 36
+MAX_SCENARIOS = 500_000
+# Scenarios x months above which month blocks go to the process pool
+POOL_THRESHOLD = 2_000_000
+BASELINE_MONTHS = 12
+
+_pool = None
+
+
+def baseline(frame):
+    """
+    Baseline of the scenarios from `frame` (one row per 'YYYY-MM' period in
+    order, financial report fields as float columns): the last
+    BASELINE_MONTHS rows. Returns a dict of plain values, or None without data.
+    """
+    frame = frame.reindex(columns=[
+        'accrual_revenue', 'cogs', 'overhead', 'production_team_fte', 'net_margin_before_tax',
+        'income_tax', 'dividends_percent', 'emergency_fund_percent',
+    ]).tail(BASELINE_MONTHS)
+    frame = frame[frame['accrual_revenue'].notna()]
+    if frame.empty:
+        return None
+
+    # Revenue of each calendar month, the recent average where one is missing
+    revenue = np.full(12, frame['accrual_revenue'].mean())
+    for period, value in frame['accrual_revenue'].items():
+        revenue[int(period[5:7]) - 1] = value
+
+    def ratio(numerator, denominator):
+        numerator, denominator = frame[numerator].sum(), frame[denominator].clip(lower=0).sum()
+        return float(numerator / denominator * 100) if denominator else 0.0
+
+    fte = frame['production_team_fte'].dropna()
+    last = frame.index[-1]
+    return {
+        'last_period': last,
+        'revenue_by_month': revenue.tolist(),
+        'cogs_ratio': ratio('cogs', 'accrual_revenue'),
+        'overhead_per_fte': float(frame['overhead'].sum() / fte.sum()) if fte.sum() else 0.0,
+        'production_team_fte': float(fte.iloc[-1]) if len(fte) else 0.0,
+        # Fixed overhead when there is no FTE count to scale it with
+        'overhead': float(frame['overhead'].mean()) if frame['overhead'].notna().any() else 0.0,
+        'income_tax_percent': ratio('income_tax', 'net_margin_before_tax'),
+        'dividends_percent': _mean(frame['dividends_percent']),
+        'emergency_fund_percent': _mean(frame['emergency_fund_percent']),
+    }
+
+
+def _mean(column):
+    return float(column.mean()) if column.notna().any() else 0.0
+
+
+def scenario_grid(base, grid):
+    """
+    The values of each parameter, from `grid` ({parameter: [values]}) or,
+    for parameters not in it, the baseline or PARAMETERS default.
+    """
+    unknown = set(grid) - set(PARAMETERS)
+    if unknown:
+        raise ValueError(f"Unknown scenario parameter(s): {', '.join(sorted(unknown))}")
+    return {
+        name: [float(v) for v in grid[name]] if name in grid else [default if default is not None else base[name]]
+        for name, default in PARAMETERS.items()
+    }
+
+
+def scenario_count(grid):
+    count = 1
+    for values in grid.values():
+        count *= len(values)
+    return count
+
+
+def _scenarios(grid):
+    """One array per parameter with a value per scenario (the grid's Cartesian product)."""
+    axes = np.meshgrid(*(np.asarray(grid[name], dtype=float) for name in PARAMETERS), indexing='ij')
+    return {name: axis.ravel() for name, axis in zip(PARAMETERS, axes)}
+
+
+def cascade(base, grid, steps):
+    """
+    The P&L of every scenario of `grid` for the months `steps` (1 = the
+    month after the baseline's last): {metric: scenarios x months array}.
+    """
+    p = {name: values[:, None] / 100 for name, values in _scenarios(grid).items()}
+    steps = np.asarray(steps)[None, :]
+    last = int(base['last_period'][:4]) * 12 + int(base['last_period'][5:7]) - 1
+    calendar = (last + steps) % 12
+
+    years = steps / 12
+    revenue = np.asarray(base['revenue_by_month'])[calendar] * (1 + p['revenue_growth']) ** years
+    cogs = revenue * p['cogs_ratio']
+    gross_profit = revenue - cogs
+    fte = base['production_team_fte'] * (1 + p['fte_growth']) ** years
+    if base['production_team_fte']:
+        overhead = fte * base['overhead_per_fte']
+    else:
+        overhead = np.broadcast_to(base['overhead'], fte.shape)
+    net_margin = gross_profit - overhead
+    income_tax = np.maximum(net_margin, 0) * p['income_tax_percent']
+    after_tax = net_margin - income_tax
+    distributable = np.maximum(after_tax, 0)
+    dividends = distributable * p['dividends_percent']
+    emergency_fund = distributable * p['emergency_fund_percent']
+
+    shape = np.broadcast_shapes(revenue.shape, fte.shape, net_margin.shape)
+    values = (
+        revenue, cogs, gross_profit, fte, overhead, net_margin, income_tax, dividends,
+        emergency_fund, after_tax - dividends - emergency_fund,
+    )
+    return {metric: np.broadcast_to(value, shape) for metric, value in zip(METRICS, values)}
+
+
+def _block(base, grid, steps, percentiles):
+    """
+    Evaluate the months `steps`: ({metric: percentiles x months}, {metric:
+    per-scenario total over these months}). Runs in pool workers.
+    """
+    results = cascade(base, grid, steps)
+    # Months x scenarios, so each month's values are contiguous to partition
+    bands = {
+        metric: np.percentile(np.ascontiguousarray(values.T), percentiles, axis=1)
+        for metric, values in results.items()
+    }
+    totals = {metric: values.sum(axis=1) for metric, values in results.items()}
+    return bands, totals
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        # spawn: workers must not inherit the parent's database connections
+        _pool = ProcessPoolExecutor(
+            max_workers=os.cpu_count() or 1, mp_context=multiprocessing.get_context('spawn')
+        )
+    return _pool
+
+
+def simulate(base, grid, horizon=DEFAULT_HORIZON, percentiles=DEFAULT_PERCENTILES):
+    """
+    Percentile bands of every metric across the scenarios of `grid` (as from
+    scenario_grid) over the `horizon` months after the baseline. Returns
+    {"scenarios", "periods", "percentiles", "bands": {metric: {"p5": [per
+    month], ...}}, "totals": {metric: {"p5": horizon total, ...}}}.
+    """
+    count = scenario_count(grid)
+    if count > MAX_SCENARIOS:
+        raise ValueError(f"{count} scenarios, at most {MAX_SCENARIOS} allowed")
+    percentiles = list(percentiles)
+    steps = np.arange(1, horizon + 1)
+
+    if count * horizon > POOL_THRESHOLD and horizon > 1:
+        blocks = [b for b in np.array_split(steps, min(horizon, os.cpu_count() or 1)) if len(b)]
+        futures = [_get_pool().submit(_block, base, grid, block, percentiles) for block in blocks]
+        parts = [future.result() for future in futures]
+    else:
+        parts = [_block(base, grid, steps, percentiles)]
+
+    bands = {metric: np.concatenate([part[0][metric] for part in parts], axis=1) for metric in METRICS}
+    totals = {metric: sum(part[1][metric] for part in parts) for metric in METRICS}
+
+    last = int(base['last_period'][:4]) * 12 + int(base['last_period'][5:7]) - 1
+    labels = [f'p{q:g}' for q in percentiles]
+    return {
+        'scenarios': count,
+        'periods': [f'{o // 12}-{o % 12 + 1:02d}' for o in last + steps],
+        'percentiles': percentiles,
+        'bands': {
+            metric: {label: _round(band[i]) for i, label in enumerate(labels)}
+            for metric, band in bands.items()
+        },
+        'totals': {
+            metric: dict(zip(labels, _round(np.percentile(total, percentiles))))
+            for metric, total in totals.items()
+        },
+    }
+
+
+def _round(values):
+    return np.round(np.asarray(values, dtype=float), 2).tolist()
@@ -1,5 +1,13 @@
 from rest_framework import serializers
-from .models import ReportType, Report
+from .checks import parse_checks
+from .formulas import FormulaError, schema_formulas
+from .org import root_unit
+from .rollups import ROLLUPS
+from .scenarios import DEFAULT_HORIZON, DEFAULT_PERCENTILES, MAX_HORIZON, MAX_SCENARIOS, PARAMETERS
+from .models import (
+    ReportType, Report, ReportBatch, ActiveReportBatch, OrgUnit, OrgUnitClosure, ConsolidatedReport,
+    ReportRollup, Benchmark
+)
 
 
 class ReportTypeSerializer(serializers.ModelSerializer):
@@ -10,16 +18,40 @@ class ReportTypeSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'name', 'slug', 'description', 'icon',
             'is_system', 'parsing_config', 'field_schema',
-            'display_config', 'created_at', 'updated_at'
+            'display_config', 'checks', 'created_at', 'updated_at'
         ]
         read_only_fields = ['id', 'is_system', 'created_at', 'updated_at']
 
+    def validate_field_schema(self, value):
+        """
+        Formulas must parse, use known fields and not form a cycle; rollups
+        must be a known method
+        """
+        if not isinstance(value, dict):
+            raise serializers.ValidationError("field_schema must be an object")
+        try:
+            schema_formulas(value)
+        except FormulaError as e:
+            raise serializers.ValidationError(str(e))
+        for name, schema in value.items():
+            if isinstance(schema, dict) and schema.get('rollup', ROLLUPS[0]) not in ROLLUPS:
+                raise serializers.ValidationError(
+                    f"Rollup of {name!r} must be one of: {', '.join(ROLLUPS)}"
+                )
+        return value
+
     def validate(self, attrs):
-        """Prevent editing system report types"""
+        """Prevent editing system report types; checks must parse and use known fields"""
         if self.instance and self.instance.is_system:
             raise serializers.ValidationError(
                 "System report types cannot be modified"
             )
+        if 'checks' in attrs:
+            field_schema = attrs.get('field_schema', getattr(self.instance, 'field_schema', {}))
+            try:
+                parse_checks(attrs['checks'], field_schema)
+            except FormulaError as e:
+                raise serializers.ValidationError({'checks': str(e)})
         return attrs
 
 
@@ -29,15 +61,65 @@ class ReportSerializer(serializers.ModelSerializer):
     year_value = serializers.IntegerField(source='year.year', read_only=True)
     month_value = serializers.IntegerField(source='month.month', read_only=True)
     month_display = serializers.CharField(source='month.month_display', read_only=True)
+    org_unit = serializers.SlugRelatedField(
+        slug_field='slug', queryset=OrgUnit.objects.all(), required=False,
+        help_text="Defaults to the company (root) unit"
+    )
 
     class Meta:
         model = Report
         fields = [
             'id', 'report_type', 'report_type_name',
             'year', 'year_value', 'month', 'month_value', 'month_display',
-            'data', 'created_at', 'updated_at'
+            'org_unit', 'batch', 'data', 'created_at', 'updated_at'
+        ]
+        read_only_fields = ['id', 'batch', 'created_at', 'updated_at']
+
+    def validate(self, attrs):
+        """
+        One report per month in the batch readers see (the model constraint is
+        per batch). Edits are written as a new version of the active batch, so
+        only reports of the active batch can be edited and a report cannot be
+        moved to another type, year or unit.
+        """
+        instance = self.instance
+        month = attrs.get('month', getattr(instance, 'month', None))
+        if instance is not None:
+            if not ActiveReportBatch.objects.filter(batch_id=instance.batch_id).exists():
+                raise serializers.ValidationError("Only reports of the active batch can be edited.")
+            for field in ('report_type', 'year', 'org_unit'):
+                if field in attrs and attrs[field] != getattr(instance, field):
+                    raise serializers.ValidationError({
+                        field: "Cannot be changed; delete the report and create it there instead."
+                    })
+            duplicates = Report.objects.filter(batch_id=instance.batch_id, month=month).exclude(pk=instance.pk)
+        else:
+            duplicates = Report.objects.active().filter(
+                report_type=attrs.get('report_type'), year=attrs.get('year'), month=month,
+                org_unit=attrs.get('org_unit') or root_unit()
+            )
+        if duplicates.exists():
+            raise serializers.ValidationError("The fields report_type, year, month must make a unique set.")
+        return attrs
+
+
+class ReportBatchSerializer(serializers.ModelSerializer):
+    """Serializer for one version of a report type's data for a year"""
+    report_type_slug = serializers.CharField(source='report_type.slug', read_only=True)
+    year_value = serializers.IntegerField(source='year.year', read_only=True)
+    org_unit = serializers.SlugRelatedField(slug_field='slug', read_only=True)
+    created_by_username = serializers.CharField(source='created_by.username', read_only=True, default=None)
+    is_active = serializers.BooleanField(read_only=True)
+    report_count = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = ReportBatch
+        fields = [
+            'id', 'report_type', 'report_type_slug', 'year', 'year_value', 'org_unit',
+            'parent', 'source', 'created_by_username', 'created_at',
+            'is_active', 'report_count'
         ]
-        read_only_fields = ['id', 'created_at', 'updated_at']
+        read_only_fields = fields
 
 
 class BulkReportCreateSerializer(serializers.Serializer):
@@ -49,6 +131,13 @@ class BulkReportCreateSerializer(serializers.Serializer):
         min_length=1,
         max_length=12
     )
+    mode = serializers.ChoiceField(choices=['replace', 'diff', 'bulk'], default='replace')
+    org_unit_slug = serializers.SlugField(required=False, help_text="Defaults to the company (root) unit")
+    benchmarks = serializers.DictField(
+        child=serializers.CharField(allow_blank=True, max_length=100),
+        required=False,
+        help_text="Benchmark column of the file: {field: text}, e.g. {\"gm_percent\": \"40-50%\"}"
+    )
 
     def validate_months(self, value):
         """Validate months data structure"""
@@ -66,3 +155,107 @@ class BulkReportCreateSerializer(serializers.Serializer):
                     "Month data must be a dictionary"
                 )
         return value
+
+
+class BatchRollbackSerializer(serializers.Serializer):
+    """Report type, year and org unit whose active batch should go back to its parent"""
+    report_type_slug = serializers.SlugField()
+    year = serializers.IntegerField(min_value=2000, max_value=2100)
+    org_unit_slug = serializers.SlugField(required=False, help_text="Defaults to the company (root) unit")
+
+
+class ScenarioSerializer(serializers.Serializer):
+    """Parameter grids of a what-if simulation over the financial report"""
+    report_type_slug = serializers.SlugField(default='financial')
+    org_unit_slug = serializers.SlugField(required=False, help_text="Defaults to the company (root) unit")
+    horizon = serializers.IntegerField(min_value=1, max_value=MAX_HORIZON, default=DEFAULT_HORIZON)
+    grid = serializers.DictField(
+        child=serializers.ListField(child=serializers.FloatField(min_value=-100, max_value=1000), min_length=1),
+        default=dict,
+        help_text="{parameter: [values in percent]}, e.g. {\"revenue_growth\": [-10, 0, 10]}"
+    )
+    percentiles = serializers.ListField(
+        child=serializers.FloatField(min_value=0, max_value=100),
+        min_length=1,
+        max_length=20,
+        default=list(DEFAULT_PERCENTILES)
+    )
+
+    def validate_grid(self, value):
+        """Known parameters only, and not more scenarios than MAX_SCENARIOS"""
+        unknown = set(value) - set(PARAMETERS)
+        if unknown:
+            raise serializers.ValidationError(
+                f"Unknown parameter(s) {', '.join(sorted(unknown))}; use {', '.join(PARAMETERS)}"
+            )
+        count = 1
+        for values in value.values():
+            count *= len(values)
+        if count > MAX_SCENARIOS:
+            raise serializers.ValidationError(f"{count} scenarios, at most {MAX_SCENARIOS} allowed")
+        return value
+
+
+class OrgUnitSerializer(serializers.ModelSerializer):
+    """Serializer for one node of the organization tree"""
+    parent = serializers.SlugRelatedField(
+        slug_field='slug', queryset=OrgUnit.objects.all(), required=False, allow_null=True
+    )
+
+    class Meta:
+        model = OrgUnit
+        fields = ['id', 'name', 'slug', 'parent', 'created_at']
+        read_only_fields = ['id', 'created_at']
+
+    def validate_parent(self, value):
+        """A unit cannot be moved under itself or one of its descendants"""
+        if self.instance and value and OrgUnitClosure.objects.filter(
+            ancestor=self.instance, descendant=value
+        ).exists():
+            raise serializers.ValidationError("A unit cannot be moved under itself or one of its descendants")
+        return value
+
+
+class ConsolidatedReportSerializer(serializers.ModelSerializer):
+    """Totals of a unit and all of its descendants for one month"""
+    report_type_slug = serializers.CharField(source='report_type.slug', read_only=True)
+    org_unit = serializers.SlugRelatedField(slug_field='slug', read_only=True)
+    year_value = serializers.IntegerField(source='year.year', read_only=True)
+    month_value = serializers.IntegerField(source='month.month', read_only=True)
+
+    class Meta:
+        model = ConsolidatedReport
+        fields = [
+            'report_type_slug', 'org_unit', 'year_value', 'month_value',
+            'data', 'unit_count', 'updated_at'
+        ]
+        read_only_fields = fields
+
+
+class ReportRollupSerializer(serializers.ModelSerializer):
+    """A unit's quarter, half-year, year-to-date or full-year values"""
+    report_type_slug = serializers.CharField(source='report_type.slug', read_only=True)
+    org_unit = serializers.SlugRelatedField(slug_field='slug', read_only=True)
+    year_value = serializers.IntegerField(source='year.year', read_only=True)
+
+    class Meta:
+        model = ReportRollup
+        fields = [
+            'report_type_slug', 'org_unit', 'year_value', 'period',
+            'data', 'months', 'updated_at'
+        ]
+        read_only_fields = fields
+
+
+class BenchmarkSerializer(serializers.ModelSerializer):
+    """A metric's target for one year, as written and as parsed bounds"""
+    report_type_slug = serializers.CharField(source='report_type.slug', read_only=True)
+    year_value = serializers.IntegerField(source='year.year', read_only=True)
+
+    class Meta:
+        model = Benchmark
+        fields = [
+            'id', 'report_type_slug', 'year_value', 'metric', 'text',
+            'low', 'high', 'low_reference', 'high_reference', 'updated_at'
+        ]
+        read_only_fields = fields
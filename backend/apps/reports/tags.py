@@ -0,0 +1,47 @@
+"""
+Result cache tags of report data (see utils.result_cache).
+
+A result read from the reports of one report type and year is tagged
+reports:<slug>:<year>; one read across every year of a type reports:<slug>:*,
+across every type of a year reports:*:<year>, and across everything
+reports:*:*. A write of a type's reports in some years bumps the tags of
+those years at each of these levels, so only results that could have read
+the written slice expire. Results also carry report_type:<slug> (or
+report_types when read across types), bumped when the report type itself
+changes: fields, formulas or rollup declarations.
+"""
+from utils.result_cache import results
+
+from .models import ReportType
+
+
+def report_tags(slug=None, years=None):
+    """Tags of a result read from the reports of type `slug` (any if None) in `years` (any if None)."""
+    scope = slug or '*'
+    tags = [f'report_type:{slug}' if slug else 'report_types']
+    if years is None:
+        tags.append(f'reports:{scope}:*')
+    else:
+        tags.extend(f'reports:{scope}:{year}' for year in years)
+    return tags
+
+
+def invalidate_reports(report_type, years):
+    """Expire the results that read reports of `report_type` in any of `years`."""
+    tags = [f'reports:{report_type.slug}:*', 'reports:*:*']
+    for year in set(years):
+        tags.extend([f'reports:{report_type.slug}:{year}', f'reports:*:{year}'])
+    results.invalidate(*tags)
+
+
+def invalidate_report_type(report_type):
+    """Expire every result that read reports of `report_type`."""
+    results.invalidate(f'report_type:{report_type.slug}', 'report_types')
+
+
+def invalidate_year(year):
+    """Expire every result that read reports of `year`, of any type."""
+    tags = [f'reports:*:{year}', 'reports:*:*']
+    for slug in ReportType.objects.values_list('slug', flat=True):
+        tags.extend([f'reports:{slug}:{year}', f'reports:{slug}:*'])
+    results.invalidate(*tags)
@@ -1,3 +1,1161 @@
-from django.test import TestCase
+import json
+import tempfile
+import threading
+import time
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+import pandas as pd
+from django.contrib.auth.models import User
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from apps.core.models import Year
+from apps.core.periods import get_or_create_months
+from utils.result_cache import SizedLocMemCache, results
+from utils.single_flight import load, worker_lock
+
+from . import anomalies, forecasting, rollups, scenarios
+from .correlations import lagged_correlations
+from .checks import run_checks
+from .dependencies import MetricGraph
+from .formulas import FormulaError, parse, schema_formulas
+from .models import (
+    ActiveReportBatch, Benchmark, ConsolidatedReport, OrgUnit, OrgUnitClosure, Report, ReportBatch, ReportRollup,
+    ReportType
+)
+from .serializers import ReportTypeSerializer
+
+
+class ReportBatchTests(TestCase):
+    """Every bulk-create writes a new batch; readers see only the active one."""
+
+    def setUp(self):
+        results.clear()
+        self.user = User.objects.create(username='versions')
+        self.report_type = ReportType.objects.create(name='Delivery', slug='delivery-versions')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _upload(self, revenue, months=range(1, 13), mode='replace'):
+        payload = {
+            'report_type_slug': self.report_type.slug,
+            'year': 2099,
+            'months': [{'month': m, 'data': {'revenue': revenue}} for m in months],
+            'mode': mode,
+        }
+        response = self.client.post('/api/reports/bulk-create/', payload, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        return response.data
+
+    def _revenues(self):
+        response = self.client.get('/api/reports/', {'report_type': self.report_type.slug, 'year': 2099})
+        return sorted({r['data']['revenue'] for r in response.data['results']})
+
+    def test_each_upload_activates_a_new_batch(self):
+        first = self._upload(100)
+        second = self._upload(200, months=[1])
+
+        self.assertNotEqual(first['batch'], second['batch'])
+        self.assertEqual(ActiveReportBatch.objects.get().batch_id, second['batch'])
+        self.assertEqual(ReportBatch.objects.get(pk=second['batch']).parent_id, first['batch'])
+        # January replaced, February-December carried forward
+        self.assertEqual(self._revenues(), [100, 200])
+        self.assertEqual(Report.objects.active().count(), 12)
+
+    def test_rollback_and_reactivate_swap_the_pointer(self):
+        first = self._upload(100)
+        second = self._upload(200)
+
+        response = self.client.post(
+            '/api/report-batches/rollback/',
+            {'report_type_slug': self.report_type.slug, 'year': 2099},
+            format='json'
+        )
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(response.data['id'], first['batch'])
+        self.assertEqual(self._revenues(), [100])
+
+        response = self.client.post(f'/api/report-batches/{second["batch"]}/activate/')
+        self.assertTrue(response.data['is_active'])
+        self.assertEqual(self._revenues(), [200])
+
+    def test_rollback_without_previous_version_is_rejected(self):
+        self._upload(100)
+
+        response = self.client.post(
+            '/api/report-batches/rollback/',
+            {'report_type_slug': self.report_type.slug, 'year': 2099},
+            format='json'
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_unchanged_diff_upload_keeps_the_active_batch(self):
+        first = self._upload(100)
+        again = self._upload(100, mode='diff')
+
+        self.assertEqual(again['batch'], first['batch'])
+        self.assertEqual(ReportBatch.objects.count(), 1)
+
+    def test_diff_upload_writes_and_reports_only_changes(self):
+        self._upload(100, months=[1, 2])
+        payload = {
+            'report_type_slug': self.report_type.slug,
+            'year': 2099,
+            'months': [
+                {'month': 1, 'data': {'revenue': 100}},
+                {'month': 2, 'data': {'revenue': 150}},
+                {'month': 3, 'data': {'revenue': 300, 'cost': 10}},
+                {'month': 4, 'data': {'revenue': None}},
+            ],
+            'mode': 'diff',
+        }
+
+        response = self.client.post('/api/reports/bulk-create/', payload, format='json')
+
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(response.data['created'], ['2099-03'])
+        self.assertEqual(response.data['updated'], ['2099-02'])
+        self.assertEqual(response.data['unchanged'], ['2099-01', '2099-04'])
+        self.assertEqual(
+            response.data['changes']['fields'], {'cost': ['2099-03'], 'revenue': ['2099-02', '2099-03']}
+        )
+        self.assertEqual(response.data['changes']['cells_changed'], 3)
+        self.assertEqual(self._revenues(), [100, 150, 300])
+        self.assertFalse(Report.objects.active().filter(month__month=4).exists())
+
+    def test_duplicate_month_is_rejected(self):
+        self._upload(100, months=[1, 2])
+        january, february = Report.objects.active().order_by('month__month')
+        payload = {
+            'report_type': self.report_type.pk, 'year': january.year_id, 'month': january.month_id,
+            'data': {'revenue': 300},
+        }
+
+        response = self.client.post('/api/reports/', payload, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('must make a unique set', str(response.data))
+
+        response = self.client.patch(f'/api/reports/{february.pk}/', {'month': january.month_id}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self._revenues(), [100])
+
+    def test_edits_and_deletes_activate_a_new_batch(self):
+        first = self._upload(100, months=[1, 2])
+        january = Report.objects.active().get(month__month=1)
+
+        response = self.client.patch(f'/api/reports/{january.pk}/', {'data': {'revenue': 150}}, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        edited = ReportBatch.objects.get(pk=response.data['batch'])
+        self.assertEqual(edited.parent_id, first['batch'])
+        self.assertEqual(ActiveReportBatch.objects.get().batch_id, edited.pk)
+        self.assertEqual(self._revenues(), [100, 150])
+        # The previous version is untouched
+        self.assertEqual(Report.objects.get(pk=january.pk).data, {'revenue': 100})
+
+        february = Report.objects.active().get(month__month=2)
+        self.assertEqual(self.client.delete(f'/api/reports/{february.pk}/').status_code, 204)
+        self.assertEqual(self._revenues(), [150])
+        self.assertEqual(Report.objects.active().count(), 1)
+
+        response = self.client.post(
+            '/api/report-batches/rollback/',
+            {'report_type_slug': self.report_type.slug, 'year': 2099},
+            format='json'
+        )
+        self.assertEqual(response.data['id'], edited.pk)
+        self.assertEqual(self._revenues(), [100, 150])
+
+    def test_only_the_month_and_data_of_active_reports_can_be_edited(self):
+        first = self._upload(100, months=[1])
+        self._upload(200, months=[1])
+        inactive = Report.objects.get(batch_id=first['batch'])
+        active = Report.objects.active().get()
+
+        response = self.client.patch(
+            f'/api/reports/{inactive.pk}/?batch={first["batch"]}', {'data': {'revenue': 300}}, format='json'
+        )
+        self.assertEqual(response.status_code, 400)
+        response = self.client.delete(f'/api/reports/{inactive.pk}/?batch={first["batch"]}')
+        self.assertEqual(response.status_code, 400)
+
+        other_year, _ = get_or_create_months(2098, [1])
+        response = self.client.patch(f'/api/reports/{active.pk}/', {'year': other_year.pk}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('year', response.data)
+
+        self.assertEqual(ReportBatch.objects.count(), 2)
+        self.assertEqual(Report.objects.get(pk=inactive.pk).data, {'revenue': 100})
+        self.assertEqual(self._revenues(), [200])
+
+    def test_batches_can_be_read_before_activation(self):
+        first = self._upload(100)
+        self._upload(200)
+
+        response = self.client.get('/api/reports/', {'batch': first['batch']})
+        self.assertEqual({r['data']['revenue'] for r in response.data['results']}, {100})
+
+        batches = self.client.get('/api/report-batches/', {'report_type': self.report_type.slug})
+        self.assertEqual([b['is_active'] for b in batches.data['results']], [True, False])
+        self.assertEqual([b['report_count'] for b in batches.data['results']], [12, 12])
+
+
+class OrgUnitTests(TestCase):
+    """Per-unit reports consolidated up the org tree through the closure table."""
+
+    def setUp(self):
+        results.clear()
+        self.user = User.objects.create(username='org')
+        self.report_type = ReportType.objects.create(
+            name='Delivery', slug='delivery-org',
+            field_schema={
+                'revenue': {'type': 'decimal'},
+                'fte': {'type': 'integer'},
+                'billability': {'type': 'percentage'},
+                'av_rate_h': {'type': 'decimal', 'aggregation': 'none'},
+            }
+        )
+        self.company = OrgUnit.objects.get(slug=OrgUnit.ROOT_SLUG)
+        self.delivery = OrgUnit.objects.create(name='Delivery', slug='delivery-dept', parent=self.company)
+        self.team_a = OrgUnit.objects.create(name='Team A', slug='team-a', parent=self.delivery)
+        self.team_b = OrgUnit.objects.create(name='Team B', slug='team-b', parent=self.delivery)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _upload(self, unit, revenue, months=(1, 2)):
+        response = self.client.post('/api/reports/bulk-create/', {
+            'report_type_slug': self.report_type.slug,
+            'year': 2099,
+            'org_unit_slug': unit.slug,
+            'months': [
+                {'month': m, 'data': {'revenue': revenue, 'fte': 2, 'billability': 80, 'av_rate_h': 30}}
+                for m in months
+            ],
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+
+    def _consolidated(self, unit, month=1):
+        return ConsolidatedReport.objects.get(
+            report_type=self.report_type, org_unit=unit, month__month=month
+        )
+
+    def test_closure_links_every_ancestor(self):
+        self.assertEqual(
+            sorted(OrgUnitClosure.objects.filter(descendant=self.team_a).values_list('ancestor__slug', 'depth')),
+            [('company', 2), ('delivery-dept', 1), ('team-a', 0)]
+        )
+
+        self.team_a.parent = self.company
+        self.team_a.save()
+        self.assertEqual(
+            sorted(OrgUnitClosure.objects.filter(descendant=self.team_a).values_list('ancestor__slug', 'depth')),
+            [('company', 1), ('team-a', 0)]
+        )
+
+        response = self.client.patch(f'/api/org-units/{self.delivery.slug}/', {'parent': 'team-b'}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_leaf_upload_rolls_up_additive_fields(self):
+        self._upload(self.team_a, 100)
+        self._upload(self.team_b, 50)
+
+        company = self._consolidated(self.company)
+        self.assertEqual(company.data, {'revenue': 150, 'fte': 4})
+        self.assertEqual(company.unit_count, 2)
+        self.assertEqual(self._consolidated(self.delivery).data['revenue'], 150)
+        self.assertEqual(self._consolidated(self.team_a).data['revenue'], 100)
+
+    def test_leaf_change_refreshes_only_its_ancestors(self):
+        self._upload(self.team_a, 100)
+        self._upload(self.team_b, 50)
+        sibling = self._consolidated(self.team_b)
+
+        self._upload(self.team_a, 300, months=[1])
+
+        self.assertEqual(self._consolidated(self.company).data['revenue'], 350)
+        self.assertEqual(self._consolidated(self.company, month=2).data['revenue'], 150)
+        # Team B is not an ancestor of Team A: its row was not rewritten
+        self.assertEqual(self._consolidated(self.team_b).pk, sibling.pk)
+
+    def test_moving_a_unit_re_sums_old_and_new_ancestors(self):
+        self._upload(self.team_a, 100)
+        self._upload(self.team_b, 50)
+
+        response = self.client.patch(f'/api/org-units/{self.team_a.slug}/', {'parent': 'company'}, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+
+        self.assertEqual(self._consolidated(self.delivery).data['revenue'], 50)
+        self.assertEqual(self._consolidated(self.company).data['revenue'], 150)
+
+    def test_consolidated_endpoint_filters_period_range(self):
+        self._upload(self.team_a, 100, months=range(1, 13))
+
+        response = self.client.get(f'/api/org-units/{self.company.slug}/consolidated/', {
+            'report_type': self.report_type.slug, 'from': '2099-03', 'to': '2099-05'
+        })
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual([r['month_value'] for r in response.data], [3, 4, 5])
+
+        # Unit reports stay out of the default (company) report list
+        reports = self.client.get('/api/reports/', {'report_type': self.report_type.slug})
+        self.assertEqual(reports.data['results'], [])
+        reports = self.client.get('/api/reports/', {'report_type': self.report_type.slug, 'org_unit': 'team-a'})
+        self.assertEqual(len(reports.data['results']), 12)
+
+
+class FormulaTests(TestCase):
+    """Derived field_schema metrics are computed column-wise over whole period ranges."""
+
+    def setUp(self):
+        results.clear()
+        self.user = User.objects.create(username='formulas')
+        self.report_type = ReportType.objects.create(name='Delivery', slug='delivery-formulas', field_schema={
+            'revenue': {'type': 'decimal'},
+            'gp': {'type': 'decimal'},
+            'gm_percent': {'type': 'percentage', 'formula': 'gp / revenue * 100', 'persist': True},
+            'gm_rounded': {'type': 'percentage', 'formula': 'round(gm_percent, 1)'},
+        })
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _upload(self, year, months):
+        response = self.client.post('/api/reports/bulk-create/', {
+            'report_type_slug': self.report_type.slug,
+            'year': year,
+            'months': [{'month': m, 'data': data} for m, data in months.items()],
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+
+    def test_parser_rejects_anything_but_arithmetic(self):
+        for source in ['__import__("os")', 'revenue.real', 'open("x")', 'revenue if gp else 0', '[gp]', '']:
+            with self.assertRaises(FormulaError, msg=source):
+                parse(source)
+        self.assertEqual(parse('max(gp, 0) / revenue').fields, {'gp', 'revenue'})
+
+    def test_schema_rejects_cycles_and_unknown_fields(self):
+        with self.assertRaisesRegex(FormulaError, 'cycle'):
+            schema_formulas({'a': {'formula': 'b + 1'}, 'b': {'formula': 'a * 2'}})
+        with self.assertRaisesRegex(FormulaError, 'unknown'):
+            schema_formulas({'a': {'formula': 'missing * 2'}})
+
+        serializer = ReportTypeSerializer(data={
+            'name': 'Broken', 'slug': 'broken', 'field_schema': {'a': {'formula': 'a + 1'}}
+        })
+        self.assertFalse(serializer.is_valid())
+        self.assertIn('field_schema', serializer.errors)
+
+    def test_constant_faults_are_null(self):
+        columns = {'gp': np.array([1.0, 2.0])}
+        for source in ['gp * (1/0)', '10 ** 400', '(0-8) ** 0.5', 'gp + 1e999999']:
+            self.assertTrue(np.isnan(parse(source).evaluate(columns, 2)).all(), source)
+        for source in ['10' * 400, 'round(gp, 99999999999999999999)']:
+            with self.assertRaises(FormulaError, msg=source):
+                parse(source)
+
+        self.report_type.field_schema['gm_percent']['formula'] = 'gp / revenue * (1/0)'
+        self.report_type.save()
+        self._upload(2098, {1: {'revenue': 200, 'gp': 50}})
+        self.assertIsNone(Report.objects.active().get().data.get('gm_percent'))
+
+    def test_persisted_formula_is_stored_on_upload(self):
+        self._upload(2098, {1: {'revenue': 200, 'gp': 50, 'gm_percent': 99}})
+        self.assertEqual(Report.objects.active().get().data['gm_percent'], 25.0)
+
+    def test_missing_inputs_keep_the_stored_value(self):
+        self._upload(2098, {1: {'revenue': 100, 'gm_percent': 42.5}})
+        self.assertEqual(Report.objects.active().get().data['gm_percent'], 42.5)
+
+    def test_series_spans_years_with_null_for_division_by_zero(self):
+        self._upload(2098, {11: {'revenue': 300, 'gp': 100}, 12: {'revenue': 0, 'gp': 10}})
+        self._upload(2099, {1: {'revenue': 400, 'gp': 100}, 2: {'revenue': 800, 'gp': 200}})
+
+        response = self.client.get('/api/reports/series/', {
+            'report_type': self.report_type.slug, 'from': '2098-11', 'to': '2099-01',
+            'fields': 'revenue,gm_rounded',
+        })
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(response.data['periods'], ['2098-11', '2098-12', '2099-01'])
+        self.assertEqual(response.data['series'], {
+            'revenue': [300, 0, 400],
+            'gm_rounded': [33.3, None, 25.0],
+        })
+
+
+class DependencyTests(TestCase):
+    """Saving a report recomputes only the derived cells downstream of it."""
+
+    SCHEMA = {
+        'revenue': {'type': 'decimal'},
+        'growth': {'type': 'decimal', 'formula': 'revenue - prev(revenue)', 'persist': True},
+        'revenue_ytd': {'type': 'decimal', 'formula': 'ytd(revenue)', 'persist': True},
+        'growth_share': {'type': 'decimal', 'formula': 'growth / revenue_ytd', 'persist': True},
+    }
+
+    def setUp(self):
+        results.clear()
+        self.user = User.objects.create(username='dependencies')
+        self.report_type = ReportType.objects.create(
+            name='Growth', slug='growth', field_schema=self.SCHEMA
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _upload(self, year, revenues):
+        response = self.client.post('/api/reports/bulk-create/', {
+            'report_type_slug': self.report_type.slug,
+            'year': year,
+            'months': [{'month': m, 'data': {'revenue': r}} for m, r in revenues.items()],
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+
+    def _data(self, year, month):
+        return Report.objects.active().get(year__year=year, month__month=month).data
+
+    def test_graph_walks_lags_in_topological_order(self):
+        graph = MetricGraph(self.SCHEMA)
+        self.assertEqual(graph.lookback, 11)
+        self.assertEqual(graph.affected({(2099, 11): {'revenue'}}), [
+            ((2099, 11), 'growth'), ((2099, 11), 'revenue_ytd'), ((2099, 11), 'growth_share'),
+            ((2099, 12), 'growth'), ((2099, 12), 'revenue_ytd'), ((2099, 12), 'growth_share'),
+        ])
+        self.assertEqual(graph.affected({(2099, 12): {'revenue'}})[-2:], [
+            ((2100, 1), 'growth'), ((2100, 1), 'growth_share'),
+        ])
+        self.assertEqual(graph.affected({(2099, 11): {'growth'}}), [((2099, 11), 'growth'), ((2099, 11), 'growth_share')])
+
+        with self.assertRaisesRegex(FormulaError, 'inside'):
+            parse('prev(ytd(revenue))')
+
+    def test_upload_computes_lagged_fields_across_years(self):
+        self._upload(2098, {12: 100})
+        self._upload(2099, {1: 150, 2: 120})
+
+        self.assertEqual(self._data(2099, 1)['growth'], 50)
+        self.assertEqual(self._data(2099, 2), {
+            'revenue': 120, 'growth': -30, 'revenue_ytd': 270, 'growth_share': -0.11
+        })
+        # The series reads the months before `from` that prev()/ytd() need
+        response = self.client.get('/api/reports/series/', {
+            'report_type': self.report_type.slug, 'from': '2099-02', 'fields': 'growth,revenue_ytd'
+        })
+        self.assertEqual(response.data, {'periods': ['2099-02'], 'series': {'growth': [-30], 'revenue_ytd': [270]}})
+
+    def test_editing_a_month_rewrites_only_downstream_reports(self):
+        self._upload(2098, {11: 80, 12: 100})
+        self._upload(2099, {1: 150, 2: 120})
+        november = Report.objects.active().get(year__year=2098, month__month=11)
+        december = Report.objects.active().get(year__year=2098, month__month=12)
+        untouched = Report.objects.filter(pk=november.pk).values_list('data', flat=True).get()
+
+        response = self.client.patch(f'/api/reports/{december.pk}/', {'data': {'revenue': 130}}, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+
+        self.assertEqual(self._data(2098, 12)['growth'], 50)
+        self.assertEqual(self._data(2098, 12)['revenue_ytd'], 210)
+        # Next year's January reads December through prev(); February does not
+        self.assertEqual(self._data(2099, 1)['growth'], 20)
+        self.assertEqual(self._data(2099, 2)['growth'], -30)
+        self.assertEqual(self._data(2098, 11), untouched)
+
+    def test_missing_lagged_inputs_keep_the_stored_value(self):
+        response = self.client.post('/api/reports/bulk-create/', {
+            'report_type_slug': self.report_type.slug,
+            'year': 2099,
+            'months': [{'month': 1, 'data': {'revenue': 150, 'growth': 7}}],
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+
+        # No December 2098 to read through prev()
+        self.assertEqual(self._data(2099, 1)['growth'], 7)
+        self.assertEqual(self._data(2099, 1)['revenue_ytd'], 150)
+
+    def test_changing_a_formula_rebuilds_stored_values(self):
+        self._upload(2099, {1: 100, 2: 120})
+        schema = dict(self.SCHEMA, growth={'type': 'decimal', 'formula': 'revenue / prev(revenue)', 'persist': True})
+        response = self.client.patch(
+            f'/api/report-types/{self.report_type.slug}/', {'field_schema': schema}, format='json'
+        )
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(self._data(2099, 2)['growth'], 1.2)
+
+
+class BenchmarkTests(TestCase):
+    """Deviations from benchmarks are computed for every metric and month at once."""
+
+    def setUp(self):
+        self.user = User.objects.create(username='benchmarks')
+        self.report_type = ReportType.objects.create(
+            name='Delivery', slug='delivery-benchmarks',
+            parsing_config={'field_mappings': {
+                'Revenue growth, MtM 2024': {'field': 'revenue_growth_mtm'},
+            }},
+            field_schema={
+                'utilization': {'type': 'percentage'},
+                'revenue_growth_mtm': {'type': 'percentage'},
+                'salary_growth_mtm': {'type': 'percentage'},
+                'revenue': {'type': 'decimal'},
+                'gp': {'type': 'decimal'},
+                'gm_percent': {'type': 'percentage', 'formula': 'gp / revenue * 100'},
+            }
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _upload(self, year, months, benchmarks):
+        response = self.client.post('/api/reports/bulk-create/', {
+            'report_type_slug': self.report_type.slug,
+            'year': year,
+            'months': [{'month': m, 'data': data} for m, data in months.items()],
+            'benchmarks': benchmarks,
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+
+    def test_bulk_create_stores_parsed_benchmarks(self):
+        self._upload(2099, {1: {'utilization': 80}}, {
+            'utilization': '85-90%', 'salary_growth_mtm': '<Revenue growth', 'gm_percent': ''
+        })
+        stored = {b.metric: b for b in Benchmark.objects.all()}
+        self.assertEqual(set(stored), {'utilization', 'salary_growth_mtm'})
+        self.assertEqual((stored['utilization'].low, stored['utilization'].high), (85, 90))
+        self.assertEqual(stored['salary_growth_mtm'].high_reference, 'revenue_growth_mtm')
+
+        # Re-uploading updates in place
+        self._upload(2099, {1: {'utilization': 80}}, {'utilization': '>70%'})
+        benchmark = Benchmark.objects.get(metric='utilization')
+        self.assertEqual((benchmark.text, benchmark.low, benchmark.high), ('>70%', 70, None))
+
+    def test_deviations_per_metric_and_month(self):
+        self._upload(2098, {
+            12: {'utilization': 95, 'revenue': 100, 'gp': 45},
+        }, {'utilization': '85-90%', 'gm_percent': '40-50%'})
+        self._upload(2099, {
+            1: {'utilization': 80, 'revenue_growth_mtm': 5, 'salary_growth_mtm': 7, 'revenue': 100, 'gp': 30},
+            2: {'utilization': 88, 'revenue_growth_mtm': 5, 'salary_growth_mtm': 4},
+        }, {'utilization': '>85%', 'salary_growth_mtm': '<Revenue growth', 'gm_percent': '40-50%'})
+
+        response = self.client.get('/api/benchmarks/deviations/', {
+            'report_type': self.report_type.slug, 'from': '2098-12', 'to': '2099-02'
+        })
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(response.data['periods'], ['2098-12', '2099-01', '2099-02'])
+        metrics = response.data['metrics']
+
+        # Each year is compared with its own benchmark
+        self.assertEqual(metrics['utilization']['benchmark'], ['85-90%', '>85%', '>85%'])
+        self.assertEqual(metrics['utilization']['status'], ['over', 'under', 'within'])
+        self.assertEqual(metrics['utilization']['deviation'], [5, -5, 0])
+        # Bounded by another metric of the same month
+        self.assertEqual(metrics['salary_growth_mtm']['status'], [None, 'over', 'within'])
+        self.assertEqual(metrics['salary_growth_mtm']['deviation'], [None, 2, 0])
+        # Derived metrics are compared too; no value, no status
+        self.assertEqual(metrics['gm_percent']['value'], [45, 30, None])
+        self.assertEqual(metrics['gm_percent']['status'], ['within', 'under', None])
+
+
+class CheckTests(TestCase):
+    """Identity checks are declared per report type and evaluated over all months at once."""
+
+    CHECKS = [
+        {'name': 'Gross profit', 'rule': 'gross_profit = accrual_revenue - cogs', 'tolerance': 1},
+        {'rule': 'overhead_by_fte = overhead / fte', 'tolerance': 0, 'relative_tolerance': 0.01},
+    ]
+
+    def setUp(self):
+        self.user = User.objects.create(username='checks')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_rules_are_validated_with_the_report_type(self):
+        schema = {'accrual_revenue': {}, 'cogs': {}, 'gross_profit': {}}
+        for checks in [
+            [{'rule': 'gross_profit == accrual_revenue - cogs'}],
+            [{'rule': 'gross_profit = accrual_revenue - missing'}],
+            [{'rule': 'gross_profit = prev(gross_profit)'}],
+            [{'rule': 'gross_profit = cogs', 'tolerance': -1}],
+        ]:
+            serializer = ReportTypeSerializer(data={
+                'name': 'Checked', 'slug': 'checked', 'field_schema': schema, 'checks': checks
+            })
+            self.assertFalse(serializer.is_valid(), checks)
+            self.assertIn('checks', serializer.errors)
+
+    def test_violations_over_many_years_of_months(self):
+        periods = [f'{year}-{month:02d}' for year in range(2090, 2100) for month in range(1, 13)]
+        frame = pd.DataFrame({
+            'accrual_revenue': 1000.0, 'cogs': 400.0, 'gross_profit': 600.5,
+            'overhead': 100.0, 'fte': 10, 'overhead_by_fte': 10.05,
+        }, index=periods)
+        frame.loc['2095-06', 'gross_profit'] = 590
+        frame.loc['2096-01', 'overhead_by_fte'] = 10.5
+        frame.loc['2097-03', 'fte'] = 0
+
+        violations = run_checks(self.CHECKS, frame)
+        # Within tolerance everywhere else; a zero FTE makes the right side null, so it is skipped
+        self.assertEqual(
+            [(v['check'], v['period'], v['difference']) for v in violations],
+            [('Gross profit', '2095-06', -10.0), ('overhead_by_fte = overhead / fte', '2096-01', 0.5)]
+        )
+        self.assertEqual(violations[1]['allowed'], 0.1)
+
+    def test_bulk_create_returns_violations(self):
+        report_type = ReportType.objects.create(
+            name='Financial', slug='financial-checks', checks=self.CHECKS[:1],
+            field_schema={'accrual_revenue': {}, 'cogs': {}, 'gross_profit': {}}
+        )
+        response = self.client.post('/api/reports/bulk-create/', {
+            'report_type_slug': report_type.slug,
+            'year': 2099,
+            'months': [
+                {'month': 1, 'data': {'accrual_revenue': 1000, 'cogs': 400, 'gross_profit': 600}},
+                {'month': 2, 'data': {'accrual_revenue': 1000, 'cogs': 400, 'gross_profit': 700}},
+            ],
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual([v['period'] for v in response.data['violations']], [2])
+        self.assertEqual(Report.objects.active().count(), 2)
+
+
+class AnomalyTests(TestCase):
+    """Months are scored against their trailing window and the same month of earlier years."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username='anomalies')
+        self.report_type = ReportType.objects.create(
+            name='Financial', slug='financial-anomalies',
+            field_schema={'revenue': {'type': 'decimal'}, 'bonus': {'type': 'decimal'}, 'note': {'type': 'text'}}
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    @staticmethod
+    def _history():
+        """Three years of small wiggles, a revenue spike and a December bonus that stops."""
+        noise = np.tile([6, -4, 9, -7, 3, -5, 8, -2, -9, 4, -6, 5], 3).astype(float)
+        revenue, bonus = 1000 + noise, 1000 + noise
+        revenue[30] = 1300
+        bonus[11], bonus[23], bonus[35] = 1500, 1520, 1000
+        periods = [f'{2095 + i // 12}-{i % 12 + 1:02d}' for i in range(36)]
+        return pd.DataFrame({'revenue': revenue, 'bonus': bonus}, index=periods)
+
+    def test_detect_by_method(self):
+        # A missing month leaves a gap in the grid rather than shifting history
+        found = anomalies.detect(self._history().drop(index='2096-05'))
+        flagged = {(a['period'], a['metric']): set(a['methods']) for a in found}
+        self.assertEqual(flagged, {
+            ('2095-12', 'bonus'): {'zscore', 'mad'},
+            # The first December inflates the rolling deviation; the median is unmoved
+            ('2096-12', 'bonus'): {'zscore', 'mad'},
+            ('2097-07', 'revenue'): {'zscore', 'mad'},
+            # Normal month by month, but Decembers used to be ~1510
+            ('2097-12', 'bonus'): {'seasonal'},
+        })
+        seasonal = found[-1]['methods']['seasonal']
+        self.assertEqual(seasonal['baseline'], 1510.0)
+        self.assertLess(seasonal['score'], -3)
+
+    def _upload(self, year, frame):
+        response = self.client.post('/api/reports/bulk-create/', {
+            'report_type_slug': self.report_type.slug,
+            'year': year,
+            'months': [
+                {'month': int(period[5:]), 'data': {**row, 'note': 'x'}}
+                for period, row in frame.to_dict('index').items() if period.startswith(str(year))
+            ],
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+
+    def test_endpoint_is_cached_until_an_import(self):
+        history = self._history()
+        for year in (2095, 2096, 2097):
+            self._upload(year, history)
+        params = {'report_type': self.report_type.slug, 'from': '2097-01'}
+
+        with mock.patch.object(anomalies, 'detect', wraps=anomalies.detect) as detect:
+            response = self.client.get('/api/reports/anomalies/', params)
+            self.assertEqual(response.status_code, 200, response.data)
+            self.assertEqual(
+                [(a['period'], a['metric']) for a in response.data['anomalies']],
+                [('2097-07', 'revenue'), ('2097-12', 'bonus')]
+            )
+            self.client.get('/api/reports/anomalies/', params)
+            self.assertEqual(detect.call_count, 1)
+
+            history.loc['2097-07', 'revenue'] = 1001
+            self._upload(2097, history)
+            response = self.client.get('/api/reports/anomalies/', params)
+            self.assertEqual(detect.call_count, 2)
+            self.assertEqual(
+                [(a['period'], a['metric']) for a in response.data['anomalies']],
+                [('2097-12', 'bonus')]
+            )
+
+        response = self.client.get('/api/reports/anomalies/', {**params, 'window': 1})
+        self.assertEqual(response.status_code, 400)
+
+
+class ForecastTests(TestCase):
+    """Every metric is fitted in one batch; derived fields follow their forecast inputs."""
+
+    SCHEMA = {
+        'revenue': {'type': 'decimal'},
+        'cogs': {'type': 'decimal'},
+        'overhead': {'type': 'decimal'},
+        'gm_percent': {'type': 'percentage', 'formula': '(revenue - cogs) / revenue * 100'},
+    }
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username='forecasts')
+        self.report_type = ReportType.objects.create(
+            name='Financial', slug='financial-forecasts', field_schema=self.SCHEMA
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    @staticmethod
+    def _history(years=3):
+        """Revenue growing 10 a month with a December peak, flat COGS, overhead never reported."""
+        months = np.arange(years * 12)
+        periods = [f'{2095 + m // 12}-{m % 12 + 1:02d}' for m in months]
+        revenue = 1000 + 10 * months + np.where(months % 12 == 11, 200, 0)
+        return pd.DataFrame({
+            'revenue': revenue.astype(float), 'cogs': 400.0, 'overhead': np.nan,
+        }, index=periods)
+
+    def test_forecast_frame(self):
+        frame = self._history()
+        frame['gm_percent'] = np.nan
+        result = forecasting.forecast_frame(self.SCHEMA, frame, horizon=13, method='linear')
+
+        self.assertEqual(result['history_end'], '2097-12')
+        self.assertEqual(result['periods'][:2], ['2098-01', '2098-02'])
+        revenue = result['metrics']['revenue']
+        self.assertEqual(revenue['method'], 'linear')
+        # Trend and December peak carried forward
+        self.assertAlmostEqual(revenue['values'][0], 1360, delta=1)
+        self.assertAlmostEqual(revenue['values'][11], 1670, delta=1)
+        self.assertLessEqual(revenue['low'][0], revenue['values'][0])
+        self.assertEqual(result['metrics']['overhead']['values'], [None] * 13)
+
+        gm = result['metrics']['gm_percent']
+        self.assertEqual(gm['method'], 'formula')
+        self.assertAlmostEqual(gm['values'][0], (1 - 400 / revenue['values'][0]) * 100, places=2)
+
+        smoothing = forecasting.forecast_frame(self.SCHEMA, frame, horizon=1, method='smoothing')
+        self.assertAlmostEqual(smoothing['metrics']['revenue']['values'][0], 1360, delta=15)
+
+    def test_endpoint_and_command(self):
+        history = self._history()
+        for year in (2095, 2096, 2097):
+            response = self.client.post('/api/reports/bulk-create/', {
+                'report_type_slug': self.report_type.slug,
+                'year': year,
+                'months': [
+                    {'month': int(period[5:]), 'data': {'revenue': row['revenue'], 'cogs': row['cogs']}}
+                    for period, row in history.iterrows() if period.startswith(str(year))
+                ],
+            }, format='json')
+            self.assertEqual(response.status_code, 201, response.data)
+
+        with mock.patch.object(forecasting, 'forecast_frame', wraps=forecasting.forecast_frame) as fitted:
+            response = self.client.get('/api/reports/forecast/', {'report_type': self.report_type.slug})
+            self.assertEqual(response.status_code, 200, response.data)
+            self.assertEqual(response.data['periods'], ['2098-01', '2098-02', '2098-03'])
+            self.assertEqual(set(response.data['metrics']), set(self.SCHEMA))
+            self.assertAlmostEqual(response.data['metrics']['revenue']['values'][0], 1360, delta=15)
+
+            self.client.get('/api/reports/forecast/', {'report_type': self.report_type.slug})
+            self.assertEqual(fitted.call_count, 1)
+
+        response = self.client.get('/api/reports/forecast/', {
+            'report_type': self.report_type.slug, 'method': 'arima'
+        })
+        self.assertEqual(response.status_code, 400)
+
+        out = StringIO()
+        call_command(
+            'forecast_reports', '--report-type', self.report_type.slug, '--horizon', '1', '--json', stdout=out
+        )
+        forecast = json.loads(out.getvalue())[self.report_type.slug]
+        self.assertEqual(forecast['periods'], ['2098-01'])
+
+
+class ScenarioTests(TestCase):
+    """Every combination of the parameter grids runs through the P&L cascade at once."""
+
+    def setUp(self):
+        self.user = User.objects.create(username='scenarios')
+        self.report_type = ReportType.objects.create(name='Financial', slug='financial-scenarios', field_schema={
+            name: {'type': 'decimal'} for name in (
+                'accrual_revenue', 'cogs', 'overhead', 'production_team_fte', 'net_margin_before_tax',
+                'income_tax', 'dividends_percent', 'emergency_fund_percent',
+            )
+        })
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    @staticmethod
+    def _history():
+        periods = [f'2098-{m:02d}' for m in range(1, 13)]
+        return pd.DataFrame({
+            'accrual_revenue': 100000.0, 'cogs': 45000.0, 'overhead': 20000.0, 'production_team_fte': 40.0,
+            'net_margin_before_tax': 35000.0, 'income_tax': 6650.0,
+            'dividends_percent': 50.0, 'emergency_fund_percent': 20.0,
+        }, index=periods)
+
+    def test_cascade_and_bands(self):
+        base = scenarios.baseline(self._history())
+        self.assertEqual((base['cogs_ratio'], base['overhead_per_fte'], base['income_tax_percent']), (45, 500, 19))
+
+        result = scenarios.simulate(base, scenarios.scenario_grid(base, {}), horizon=2)
+        self.assertEqual((result['scenarios'], result['periods']), (1, ['2099-01', '2099-02']))
+        # 100000 - 45% COGS - 40 FTE x 500 = 35000; 19% tax; 50% and 20% of the rest
+        self.assertEqual(result['bands']['net_margin_before_tax']['p50'], [35000.0, 35000.0])
+        self.assertEqual(result['bands']['dividends_to_be_paid']['p50'], [14175.0, 14175.0])
+        self.assertEqual(result['bands']['retained_earnings']['p50'], [8505.0, 8505.0])
+        self.assertEqual(result['totals']['income_tax']['p50'], 13300.0)
+
+        grid = scenarios.scenario_grid(base, {
+            'revenue_growth': [-20, 0, 20], 'cogs_ratio': [40, 50], 'fte_growth': [0, 10], 'dividends_percent': [0, 100],
+        })
+        result = scenarios.simulate(base, grid, horizon=12)
+        self.assertEqual(result['scenarios'], 24)
+        net = result['bands']['net_margin_before_tax']
+        self.assertLess(net['p5'][-1], net['p50'][-1])
+        self.assertLess(net['p50'][-1], net['p95'][-1])
+
+        # Month blocks evaluated in the process pool give the same answer
+        with mock.patch.object(scenarios, 'POOL_THRESHOLD', 0):
+            self.assertEqual(scenarios.simulate(base, grid, horizon=12), result)
+
+    def test_endpoint(self):
+        history = self._history()
+        response = self.client.post('/api/reports/bulk-create/', {
+            'report_type_slug': self.report_type.slug,
+            'year': 2098,
+            'months': [{'month': int(period[5:]), 'data': row} for period, row in history.to_dict('index').items()],
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+
+        response = self.client.post('/api/reports/scenarios/', {
+            'report_type_slug': self.report_type.slug,
+            'horizon': 3,
+            'grid': {'revenue_growth': [0, 10], 'dividends_percent': [40, 50, 60]},
+            'percentiles': [10, 90],
+        }, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(response.data['scenarios'], 6)
+        self.assertEqual(response.data['baseline']['last_period'], '2098-12')
+        self.assertEqual(set(response.data['bands']['dividends_to_be_paid']), {'p10', 'p90'})
+
+        response = self.client.post('/api/reports/scenarios/', {
+            'report_type_slug': self.report_type.slug, 'grid': {'price': [1]},
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class CorrelationTests(TestCase):
+    """Lagged correlations across report types come from one joined months x metrics array."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username='correlations')
+        self.delivery = ReportType.objects.create(
+            name='Delivery', slug='delivery-correlations',
+            field_schema={'utilization': {'type': 'percentage'}, 'fte': {'type': 'integer'}}
+        )
+        self.financial = ReportType.objects.create(
+            name='Financial', slug='financial-correlations',
+            field_schema={
+                'cash_income': {'type': 'decimal'},
+                'cash_per_fte': {'type': 'decimal', 'formula': 'cash_income / 10'},
+            }
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_matches_pairwise_pandas(self):
+        rng = np.random.default_rng(0)
+        values = rng.normal(size=(40, 5)) * [1, 10, 1e6, 0.1, 5] + 1e6
+        values[rng.random(values.shape) < 0.15] = np.nan
+        values[:, 4] = 3.0
+
+        correlations, counts = lagged_correlations(values, max_lag=2, min_periods=6)
+        frame = pd.DataFrame(values)
+        np.testing.assert_allclose(correlations[0], frame.corr(min_periods=6), atol=1e-10)
+        lag2 = pd.concat([frame.shift(2).add_prefix('a'), frame.add_prefix('b')], axis=1).corr(min_periods=6)
+        np.testing.assert_allclose(correlations[2], lag2.iloc[:5, 5:], atol=1e-10)
+        self.assertEqual(counts[0, 0, 0], np.count_nonzero(~np.isnan(values[:, 0])))
+
+    def _upload(self, report_type, data_by_month):
+        response = self.client.post('/api/reports/bulk-create/', {
+            'report_type_slug': report_type.slug,
+            'year': 2099,
+            'months': [{'month': m, 'data': data} for m, data in data_by_month.items()],
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+
+    def test_utilization_leads_cash_income(self):
+        utilization = [70, 85, 75, 90, 65, 80, 95, 72, 88, 78, 83, 68]
+        self._upload(self.delivery, {m: {'utilization': u, 'fte': 10} for m, u in enumerate(utilization, 1)})
+        # Cash follows the previous month's utilization
+        self._upload(self.financial, {
+            m: {'cash_income': 1000 * utilization[m - 2] + 7 * m} for m in range(2, 13)
+        })
+
+        params = {'report_types': f'{self.delivery.slug},{self.financial.slug}', 'max_lag': 2}
+        response = self.client.get('/api/analytics/correlations/', params)
+        self.assertEqual(response.status_code, 200, response.data)
+        metrics = response.data['metrics']
+        # By report type as requested; within a type in field_schema order, which jsonb does not keep
+        self.assertEqual(set(metrics[:2]), {f'{self.delivery.slug}.utilization', f'{self.delivery.slug}.fte'})
+        self.assertEqual(set(metrics[2:]), {f'{self.financial.slug}.cash_income', f'{self.financial.slug}.cash_per_fte'})
+        utilization, fte = metrics.index(f'{self.delivery.slug}.utilization'), metrics.index(f'{self.delivery.slug}.fte')
+        cash = metrics.index(f'{self.financial.slug}.cash_income')
+        self.assertEqual(len(response.data['periods']), 12)
+        self.assertGreater(response.data['correlations']['1'][utilization][cash], 0.99)
+        self.assertLess(response.data['correlations']['0'][utilization][cash], 0.9)
+        # FTE never varies
+        self.assertIsNone(response.data['correlations']['0'][fte][cash])
+        leader = response.data['drivers'][0]
+        self.assertEqual((leader['leader'], leader['lag']), (f'{self.delivery.slug}.utilization', 1))
+
+        # Cached until either report type changes
+        with mock.patch('apps.reports.correlations.lagged_correlations') as computed:
+            self.client.get('/api/analytics/correlations/', params)
+            computed.assert_not_called()
+
+        response = self.client.get('/api/analytics/correlations/', {'report_types': 'nope'})
+        self.assertEqual(response.status_code, 400)
+
+
+class RollupTests(TestCase):
+    """Quarters, halves, YTD and full year follow each field's rollup and track edits."""
+
+    SCHEMA = {
+        'revenue': {'type': 'decimal'},
+        'cogs': {'type': 'decimal'},
+        'fte': {'type': 'integer', 'rollup': 'last'},
+        'utilization': {'type': 'percentage'},
+        'gm_percent': {'type': 'percentage', 'formula': '(revenue - cogs) / revenue * 100'},
+        'revenue_ytd': {'type': 'decimal', 'formula': 'ytd(revenue)', 'persist': True, 'rollup': 'last'},
+        'note': {'type': 'string'},
+    }
+
+    def setUp(self):
+        results.clear()
+        self.user = User.objects.create(username='rollups')
+        self.report_type = ReportType.objects.create(
+            name='Rollups', slug='rollups', field_schema=self.SCHEMA
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _upload(self, year, months):
+        response = self.client.post('/api/reports/bulk-create/', {
+            'report_type_slug': self.report_type.slug,
+            'year': year,
+            'months': [{'month': m, 'data': data} for m, data in months.items()],
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+
+    def _rollups(self, **params):
+        response = self.client.get('/api/reports/rollups/', dict(params, report_type=self.report_type.slug))
+        self.assertEqual(response.status_code, 200, response.data)
+        return {(r['year_value'], r['period']): r for r in response.data}
+
+    def test_compute_rollups(self):
+        frame = pd.DataFrame({
+            'revenue': [100.0, 200.0, 300.0, 400.0, np.nan],
+            'cogs': [50.0, 50.0, 50.0, 100.0, 100.0],
+            'fte': [10.0, 11.0, 12.0, 12.0, 13.0],
+            'utilization': [80.0, 90.0, 70.0, 60.0, np.nan],
+        }, index=['2099-01', '2099-02', '2099-03', '2099-04', '2099-05'])
+        frame['revenue_ytd'] = frame['revenue'].fillna(0).cumsum()
+        result = rollups.compute_rollups(self.SCHEMA, frame)
+
+        self.assertEqual(set(result), {'Q1', 'Q2', 'H1', 'YTD', 'FY'})
+        q1, months = result['Q1']
+        self.assertEqual(months, 3)
+        self.assertEqual(q1, {
+            'revenue': 600, 'cogs': 150, 'fte': 12, 'utilization': 80,
+            'gm_percent': 75, 'revenue_ytd': 600,
+        })
+        q2, months = result['Q2']
+        self.assertEqual(months, 2)
+        # May has no revenue: sums and means skip it, "last" takes the last value there is
+        self.assertEqual((q2['revenue'], q2['fte'], q2['utilization']), (400, 13, 60))
+        self.assertEqual(result['YTD'], result['H1'])
+        self.assertEqual(result['FY'][0]['revenue'], 1000)
+        self.assertEqual(rollups.compute_rollups(self.SCHEMA, frame.iloc[:0]), {})
+
+    def test_rollups_refresh_when_a_month_changes(self):
+        self._upload(2099, {
+            1: {'revenue': 100, 'cogs': 40, 'fte': 5}, 2: {'revenue': 100, 'cogs': 40, 'fte': 6},
+            4: {'revenue': 200, 'cogs': 100, 'fte': 7},
+        })
+        result = self._rollups(year=2099)
+        self.assertEqual(set(result), {(2099, p) for p in ('Q1', 'Q2', 'H1', 'YTD', 'FY')})
+        self.assertEqual(result[(2099, 'Q1')]['data']['revenue'], 200)
+        self.assertEqual(result[(2099, 'Q1')]['months'], 2)
+        self.assertEqual(result[(2099, 'YTD')]['data']['revenue_ytd'], 400)
+
+        february = Report.objects.active().get(year__year=2099, month__month=2)
+        response = self.client.patch(f'/api/reports/{february.pk}/', {'data': {'revenue': 300, 'cogs': 40}}, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        result = self._rollups(year=2099, period='q1,fy')
+        self.assertEqual(set(result), {(2099, 'Q1'), (2099, 'FY')})
+        self.assertEqual(result[(2099, 'Q1')]['data']['revenue'], 400)
+        self.assertEqual(result[(2099, 'Q1')]['data']['gm_percent'], 80)
+        self.assertEqual(result[(2099, 'FY')]['data']['revenue_ytd'], 600)
+
+        april = Report.objects.active().get(year__year=2099, month__month=4)
+        self.assertEqual(self.client.delete(f'/api/reports/{april.pk}/').status_code, 204)
+        self.assertEqual(set(self._rollups()), {(2099, p) for p in ('Q1', 'H1', 'YTD', 'FY')})
+
+        response = self.client.get('/api/reports/rollups/', {'report_type': self.report_type.slug, 'period': 'Q5'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_changing_a_rollup_rebuilds(self):
+        self._upload(2099, {1: {'fte': 5}, 2: {'fte': 7}})
+        self.assertEqual(self._rollups()[(2099, 'Q1')]['data']['fte'], 7)
+
+        schema = dict(self.SCHEMA, fte={'type': 'integer', 'rollup': 'mean'})
+        response = self.client.patch(
+            f'/api/report-types/{self.report_type.slug}/', {'field_schema': schema}, format='json'
+        )
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(self._rollups()[(2099, 'Q1')]['data']['fte'], 6)
+
+        schema['fte'] = {'type': 'integer', 'rollup': 'median'}
+        serializer = ReportTypeSerializer(data={'name': 'Bad', 'slug': 'bad', 'field_schema': schema})
+        self.assertFalse(serializer.is_valid())
+
+    def test_rebuild_command_restores_rollups(self):
+        self._upload(2098, {12: {'revenue': 50}})
+        self._upload(2099, {1: {'revenue': 100}, 2: {'revenue': 200}})
+        expected = sorted(ReportRollup.objects.values_list('year__year', 'period', 'data'))
+        ReportRollup.objects.all().delete()
+        ReportRollup.objects.create(
+            report_type=self.report_type, org_unit=OrgUnit.objects.get(slug=OrgUnit.ROOT_SLUG),
+            year=Year.objects.create(year=2097), period='FY', data={'revenue': 1}
+        )
+
+        call_command('rebuild_rollups', stdout=StringIO())
+
+        self.assertEqual(sorted(ReportRollup.objects.values_list('year__year', 'period', 'data')), expected)
+
+
+class ResultCacheTests(TestCase):
+    """Report queries are served from the result cache until their report type and year change."""
+
+    def setUp(self):
+        results.clear()
+        self.user = User.objects.create(username='results', is_staff=True)
+        self.report_type = ReportType.objects.create(name='Delivery', slug='delivery-results')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _upload(self, year, revenue):
+        response = self.client.post('/api/reports/bulk-create/', {
+            'report_type_slug': self.report_type.slug,
+            'year': year,
+            'months': [{'month': 1, 'data': {'revenue': revenue}}],
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+
+    def _revenues(self, year, **params):
+        response = self.client.get('/api/reports/', {'report_type': self.report_type.slug, 'year': year, **params})
+        return [r['data']['revenue'] for r in response.data['results']]
+
+    def test_writes_expire_only_the_results_of_their_slice(self):
+        self._upload(2098, 100)
+        self._upload(2099, 200)
+        self.assertEqual(self._revenues(2098), [100])
+        self.assertEqual(self._revenues(2099), [200])
+        # Parameter order and blank parameters do not matter
+        with self.assertNumQueries(0):
+            self.assertEqual(self._revenues(2099, month=''), [200])
+
+        self._upload(2099, 250)
+        with self.assertNumQueries(0):
+            self.assertEqual(self._revenues(2098), [100])
+        self.assertEqual(self._revenues(2099), [250])
+
+        # Admin edits go through signals
+        report = Report.objects.active().get(year__year=2098)
+        report.data = {'revenue': 150}
+        report.save()
+        self.assertEqual(self._revenues(2098), [150])
+
+        Year.objects.get(year=2098).delete()
+        self.assertEqual(self._revenues(2098), [])
+
+        stats = self.client.get('/api/cache-stats/').data
+        self.assertEqual(
+            stats['namespaces']['reports.list'], {'hits': 2, 'misses': 5, 'shared': 0, 'hit_rate': 0.2857}
+        )
+
+    def test_concurrent_misses_compute_once(self):
+        computing, release = threading.Event(), threading.Event()
+        calls = []
+
+        def compute():
+            calls.append(1)
+            computing.set()
+            release.wait(5)
+            return {'value': 42}
+
+        answers = []
+        readers = [
+            threading.Thread(target=lambda: answers.append(
+                results.get_or_set('test.slow', {'q': 1}, ['test'], compute)
+            ))
+            for _ in range(5)
+        ]
+        readers[0].start()
+        computing.wait(5)
+        for reader in readers[1:]:
+            reader.start()
+        time.sleep(0.2)
+        release.set()
+        for reader in readers:
+            reader.join(5)
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(answers, [{'value': 42}] * 5)
+        stats = results.stats()['namespaces']['test.slow']
+        self.assertEqual((stats['misses'], stats['hits'] + stats['shared']), (1, 4))
+
+    def test_workers_waiting_on_a_file_lock_read_the_stored_result(self):
+        backend = caches['results']
+        answers = []
+        with tempfile.TemporaryDirectory() as directory, \
+                override_settings(SINGLE_FLIGHT='file', SINGLE_FLIGHT_LOCK_DIR=directory):
+            # Another worker is computing 'shared-key'
+            with worker_lock('shared-key', 1):
+                waiter = threading.Thread(target=lambda: answers.append(
+                    load(backend, 'shared-key', lambda: 'computed again', 60)
+                ))
+                waiter.start()
+                time.sleep(0.2)
+                backend.set('shared-key', 'computed once', 60)
+            waiter.join(5)
+        self.assertEqual(answers, [('computed once', 'hit')])
+
+    def test_sized_locmem_cache_evicts_least_recently_used_beyond_its_size(self):
+        backend = SizedLocMemCache('sized-test', {'OPTIONS': {'MAX_BYTES': 2500}})
+        backend.clear()
+        for key in 'abc':
+            backend.set(key, 'x' * 1000)
+        self.assertIsNone(backend.get('a'))
+        backend.get('b')
+        backend.set('d', 'x' * 1000)
+        self.assertEqual([key for key in 'abcd' if backend.get(key) is not None], ['b', 'd'])
+        # Larger than the whole cache: not kept
+        backend.set('e', 'x' * 3000)
+        self.assertIsNone(backend.get('e'))
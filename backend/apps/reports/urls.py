@@ -1,10 +1,16 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import ReportTypeViewSet, ReportViewSet
+from .views import (
+    ReportTypeViewSet, ReportViewSet, ReportBatchViewSet, OrgUnitViewSet, BenchmarkViewSet, AnalyticsViewSet
+)
 
 router = DefaultRouter()
 router.register(r'report-types', ReportTypeViewSet, basename='reporttype')
 router.register(r'reports', ReportViewSet, basename='report')
+router.register(r'report-batches', ReportBatchViewSet, basename='reportbatch')
+router.register(r'org-units', OrgUnitViewSet, basename='orgunit')
+router.register(r'benchmarks', BenchmarkViewSet, basename='benchmark')
+router.register(r'analytics', AnalyticsViewSet, basename='analytics')
 
 urlpatterns = [
     path('', include(router.urls)),
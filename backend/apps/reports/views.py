@@ -1,14 +1,45 @@
+import pandas as pd
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
+from django.db.models import Count, Exists, F, OuterRef
 from django.shortcuts import get_object_or_404
-from apps.core.models import Year, Month
-from .models import ReportType, Report
+from apps.core.periods import get_or_create_months
+from apps.imports.diff import diff_report_data, summarize_changes
+from apps.imports.loaders import bulk_upsert
+from apps.imports.locks import ImportLockTimeout, import_lock, lock_key
+from apps.imports.timing import StageTimer, record_import
+from utils.result_cache import results
+from .anomalies import report_anomalies
+from .benchmarks import deviations, store_benchmarks
+from .correlations import DEFAULT_MAX_LAG, DEFAULT_MIN_PERIODS, MAX_LAG, report_correlations
+from .forecasting import DEFAULT_HORIZON, MAX_HORIZON, METHODS, report_forecast
+from .checks import run_checks
+from .batches import activate, active_batch, start_batch
+from .dependencies import rebuild_derived
+from .formulas import FormulaError, apply_formulas
+from .matrix import metric_frame, period_frame, period_range_filter, series
+from .models import (
+    ReportType, Report, ReportBatch, ActiveReportBatch, OrgUnit, ConsolidatedReport, ReportRollup,
+    Benchmark
+)
+from .org import refresh_subtree_move, root_unit
+from .rollups import rollup_methods
+from .scenarios import baseline, scenario_grid, simulate
+from .tags import report_tags
 from .serializers import (
     ReportTypeSerializer,
     ReportSerializer,
-    BulkReportCreateSerializer
+    BulkReportCreateSerializer,
+    ReportBatchSerializer,
+    BatchRollbackSerializer,
+    ScenarioSerializer,
+    OrgUnitSerializer,
+    ConsolidatedReportSerializer,
+    ReportRollupSerializer,
+    BenchmarkSerializer
 )
 
 
@@ -32,6 +63,20 @@ class ReportTypeViewSet(viewsets.ModelViewSet):
         """Set created_by when creating new report type"""
         serializer.save(created_by=self.request.user)
 
+    def perform_update(self, serializer):
+        """
+        Rebuild stored derived fields and rollups when the formulas or the
+        rollup declarations changed; expire cached results when any field
+        changed
+        """
+        old_schema = serializer.instance.field_schema
+        report_type = serializer.save()
+        if (_formulas(report_type.field_schema) != _formulas(old_schema)
+                or rollup_methods(report_type.field_schema) != rollup_methods(old_schema)):
+            rebuild_derived(report_type)
+        elif report_type.field_schema != old_schema:
+            ReportType.objects.filter(pk=report_type.pk).update(data_version=F('data_version') + 1)
+
     def destroy(self, request, *args, **kwargs):
         """Prevent deletion of system report types"""
         instance = self.get_object()
@@ -46,9 +91,9 @@ class ReportTypeViewSet(viewsets.ModelViewSet):
 class ReportViewSet(viewsets.ModelViewSet):
     """
     ViewSet for managing report data.
-    Supports filtering by report_type, year, and month.
+    Supports filtering by report_type, year, month and org_unit.
     """
-    queryset = Report.objects.select_related('report_type', 'year', 'month').all()
+    queryset = Report.objects.select_related('report_type', 'year', 'month', 'org_unit').all()
     serializer_class = ReportSerializer
     permission_classes = [IsAuthenticated]
 
@@ -56,6 +101,18 @@ class ReportViewSet(viewsets.ModelViewSet):
         """Filter reports based on query parameters"""
         queryset = super().get_queryset()
 
+        # Active batches only, unless a specific batch is asked for: ?batch=42
+        batch_id = self.request.query_params.get('batch')
+        if batch_id and batch_id.isdigit():
+            queryset = queryset.filter(batch_id=batch_id)
+        else:
+            queryset = queryset.active()
+
+            # Company (root) unit by default; ?org_unit=<slug>, or 'all' for every unit
+            org_unit_slug = self.request.query_params.get('org_unit', OrgUnit.ROOT_SLUG)
+            if org_unit_slug != 'all':
+                queryset = queryset.filter(org_unit__slug=org_unit_slug)
+
         # Filter by report type slug
         report_type_slug = self.request.query_params.get('report_type')
         if report_type_slug:
@@ -78,9 +135,287 @@ class ReportViewSet(viewsets.ModelViewSet):
 
         return queryset
 
+    def list(self, request, *args, **kwargs):
+        """
+        Served from the result cache, tagged by the report type and year
+        filters, except for listings of a specific batch
+        """
+        if request.query_params.get('batch'):
+            return super().list(request, *args, **kwargs)
+        params = request.query_params.copy()
+        # Pagination links are absolute
+        params['_host'] = request.get_host()
+        year = request.query_params.get('year', '')
+        tags = report_tags(request.query_params.get('report_type'), [int(year)] if year.isdigit() else None)
+        return Response(results.get_or_set(
+            'reports.list', params, tags, lambda: super(ReportViewSet, self).list(request, *args, **kwargs).data
+        ))
+
     def perform_create(self, serializer):
-        """Set uploaded_by when creating new report"""
-        serializer.save(uploaded_by=self.request.user)
+        """
+        Write the report as a new version of the active batch of its year and
+        unit (carrying the other months forward) and activate it
+        """
+        report_type = serializer.validated_data['report_type']
+        year = serializer.validated_data['year']
+        org_unit = serializer.validated_data.get('org_unit') or root_unit()
+        self._apply_formulas(serializer)
+        batch = start_batch(
+            report_type, year, self.request.user, source='manual',
+            carry_from=active_batch(report_type, year, org_unit), org_unit=org_unit
+        )
+        report = serializer.save(uploaded_by=self.request.user, batch=batch, org_unit=org_unit)
+        activate(batch, self.request.user, months=[report.month.month])
+
+    def perform_update(self, serializer):
+        """
+        Write the edited report as a new version of its batch and activate it;
+        the previous version stays in the parent batch for rollback
+        """
+        old = serializer.instance
+        old_month = old.month.month
+        batch = start_batch(
+            old.report_type, old.year, self.request.user, source='manual',
+            carry_from=old.batch, skip_months=[old_month], org_unit=old.org_unit
+        )
+        self._apply_formulas(serializer)
+        # Saved as a new row of the new batch
+        old.pk = None
+        old._state.adding = True
+        report = serializer.save(uploaded_by=self.request.user, batch=batch)
+        activate(batch, self.request.user, months={old_month, report.month.month})
+
+    def perform_destroy(self, instance):
+        """Activate a new version of the batch without the report's month"""
+        if not ActiveReportBatch.objects.filter(batch_id=instance.batch_id).exists():
+            raise ValidationError("Only reports of the active batch can be deleted.")
+        month = instance.month.month
+        batch = start_batch(
+            instance.report_type, instance.year, self.request.user, source='manual',
+            carry_from=instance.batch, skip_months=[month], org_unit=instance.org_unit
+        )
+        activate(batch, self.request.user, months=[month])
+
+    def _apply_formulas(self, serializer):
+        """Store the computed value of persisted derived fields"""
+        data = serializer.validated_data.get('data')
+        report_type = serializer.validated_data.get('report_type') or serializer.instance.report_type
+        if data is not None:
+            apply_formulas(report_type.field_schema, {0: data})
+
+    @action(detail=False, methods=['get'])
+    def series(self, request):
+        """
+        Stored and derived metrics as one series per field over a period range.
+        Derived fields (field_schema entries with a "formula") are computed
+        from their inputs for all periods in one vectorized pass. Cached until
+        reports of the type in the range change; imports pre-render each
+        year's series.
+        Query params:
+        - report_type: report type slug (required)
+        - from / to: period range as YYYY-MM (optional, inclusive)
+        - fields: comma-separated fields (optional, default all)
+        - org_unit: as for the report list (default: company)
+        Returns {"periods": ["2024-01", ...], "series": {"revenue": [...], ...}}
+        """
+        report_type = get_object_or_404(ReportType, slug=request.query_params.get('report_type'))
+        try:
+            start = _period(request.query_params.get('from'))
+            end = _period(request.query_params.get('to'))
+        except ValueError:
+            return Response(
+                {"error": "from/to must be YYYY-MM"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        fields = request.query_params.get('fields')
+        fields = [f.strip() for f in fields.split(',') if f.strip()] if fields else None
+
+        def compute():
+            values, periods = series(report_type, self.get_queryset(), start, end, fields=fields)
+            return {"periods": periods, "series": values}
+
+        years = range(start[0], end[0] + 1) if start and end else None
+        try:
+            result = results.get_or_set(
+                'reports.series', request.query_params, report_tags(report_type.slug, years), compute
+            )
+        except FormulaError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(result)
+
+    @action(detail=False, methods=['get'])
+    def rollups(self, request):
+        """
+        Materialized quarter (Q1-Q4), half-year (H1, H2), year-to-date (YTD)
+        and full-year (FY) values of a report type, each field rolled up as
+        its field_schema "rollup" declares. Refreshed whenever a month changes;
+        responses are cached until then.
+        Query params:
+        - report_type: report type slug (required)
+        - year: year (optional, default all)
+        - period: comma-separated periods, e.g. Q1,H1 (optional, default all)
+        - org_unit: unit slug (default: company)
+        """
+        report_type = get_object_or_404(ReportType, slug=request.query_params.get('report_type'))
+        org_unit_slug = request.query_params.get('org_unit')
+        org_unit = get_object_or_404(OrgUnit, slug=org_unit_slug) if org_unit_slug else root_unit()
+
+        queryset = (
+            ReportRollup.objects
+            .filter(report_type=report_type, org_unit=org_unit)
+            .select_related('report_type', 'org_unit', 'year')
+        )
+        year = request.query_params.get('year')
+        if year:
+            try:
+                queryset = queryset.filter(year__year=int(year))
+            except ValueError:
+                return Response(
+                    {"error": "year must be an integer"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+        periods = request.query_params.get('period')
+        if periods:
+            periods = [p.strip().upper() for p in periods.split(',') if p.strip()]
+            unknown = set(periods) - {choice for choice, _ in ReportRollup.PERIOD_CHOICES}
+            if unknown:
+                return Response(
+                    {"error": f"Unknown period(s): {', '.join(sorted(unknown))}"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            queryset = queryset.filter(period__in=periods)
+
+        tags = report_tags(report_type.slug, [int(year)] if year else None)
+        return Response(results.get_or_set(
+            'reports.rollups', request.query_params, tags,
+            lambda: ReportRollupSerializer(queryset, many=True).data
+        ))
+
+    @action(detail=False, methods=['get'])
+    def anomalies(self, request):
+        """
+        Months whose metrics deviate from their own history, over every
+        numeric field of a report type: rolling z-score and MAD over the
+        trailing window, and a seasonal baseline of the same month in
+        earlier years. Cached until reports of the type next change.
+        Query params:
+        - report_type: report type slug (required)
+        - from / to: period range to report, as YYYY-MM (optional, inclusive);
+          months before it still count as history
+        - org_unit: unit slug (default: company)
+        - window: trailing months of the rolling baselines (default 12)
+        - threshold: |score| above which a month is flagged (default 3;
+          the MAD score uses 3.5 unless given)
+        Returns {"anomalies": [{"period", "metric", "value", "methods":
+        {"zscore" | "mad" | "seasonal": {"score", "baseline"}}}, ...]}
+        """
+        report_type = get_object_or_404(ReportType, slug=request.query_params.get('report_type'))
+        try:
+            start = _period(request.query_params.get('from'))
+            end = _period(request.query_params.get('to'))
+        except ValueError:
+            return Response(
+                {"error": "from/to must be YYYY-MM"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        options = {}
+        try:
+            if 'window' in request.query_params:
+                options['window'] = int(request.query_params['window'])
+                if not 2 <= options['window'] <= 120:
+                    raise ValueError
+            if 'threshold' in request.query_params:
+                options['threshold'] = options['mad_threshold'] = float(request.query_params['threshold'])
+                if not options['threshold'] > 0:
+                    raise ValueError
+        except ValueError:
+            return Response(
+                {"error": "window must be an integer from 2 to 120 and threshold a positive number"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        org_unit_slug = request.query_params.get('org_unit')
+        org_unit = get_object_or_404(OrgUnit, slug=org_unit_slug) if org_unit_slug else root_unit()
+
+        try:
+            anomalies = report_anomalies(report_type, org_unit, start, end, **options)
+        except FormulaError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({"anomalies": anomalies})
+
+    @action(detail=False, methods=['get'])
+    def forecast(self, request):
+        """
+        Projections of every numeric field of a report type for the next
+        months, all metrics fitted in one batch. Cached until reports of the
+        type next change.
+        Query params:
+        - report_type: report type slug (required)
+        - horizon: months to forecast after the last reported one (default 3)
+        - method: "linear" (trend + month effects), "smoothing"
+          (Holt-Winters) or "auto" (the better of both per metric; default)
+        - org_unit: unit slug (default: company)
+        Returns {"history_end", "periods", "metrics": {metric: {"method",
+        "values", "low", "high"}}}, one entry per forecast period in each list.
+        """
+        report_type = get_object_or_404(ReportType, slug=request.query_params.get('report_type'))
+        method = request.query_params.get('method', 'auto')
+        try:
+            horizon = int(request.query_params.get('horizon', DEFAULT_HORIZON))
+        except ValueError:
+            horizon = 0
+        if not 1 <= horizon <= MAX_HORIZON or method not in METHODS:
+            return Response(
+                {"error": f"horizon must be 1 to {MAX_HORIZON} and method one of {', '.join(METHODS)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        org_unit_slug = request.query_params.get('org_unit')
+        org_unit = get_object_or_404(OrgUnit, slug=org_unit_slug) if org_unit_slug else root_unit()
+
+        try:
+            result = report_forecast(report_type, org_unit, horizon, method)
+        except FormulaError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(result)
+
+    @action(detail=False, methods=['post'])
+    def scenarios(self, request):
+        """
+        What-if simulation of the monthly P&L over parameter grids, every
+        combination one scenario, all evaluated as broadcast arrays.
+        Expected payload (all optional):
+        {
+            "report_type_slug": "financial",
+            "org_unit_slug": "engineering",  # defaults to the company unit
+            "horizon": 12,  # months after the last reported one
+            "grid": {  # percent; parameters left out keep their baseline value
+                "revenue_growth": [-10, 0, 10, 20],  # annual
+                "cogs_ratio": [40, 45, 50],  # of revenue
+                "fte_growth": [0, 10],  # annual; overhead scales with FTE
+                "dividends_percent": [40, 50, 60],  # of after-tax profit
+                "emergency_fund_percent": [...],
+                "income_tax_percent": [...]
+            },
+            "percentiles": [5, 25, 50, 75, 95]
+        }
+        Returns {"baseline", "scenarios", "periods", "percentiles", "bands":
+        {metric: {"p5": [per month], ...}}, "totals": {metric: {"p5": ...}}}.
+        """
+        serializer = ScenarioSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        report_type = get_object_or_404(ReportType, slug=data['report_type_slug'])
+        org_unit_slug = data.get('org_unit_slug')
+        org_unit = get_object_or_404(OrgUnit, slug=org_unit_slug) if org_unit_slug else root_unit()
+
+        base = baseline(metric_frame(report_type, org_unit))
+        if base is None:
+            return Response(
+                {"error": "No reported revenue to build a baseline from"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        result = simulate(base, scenario_grid(base, data['grid']), data['horizon'], data['percentiles'])
+        return Response({"baseline": base, **result})
 
     @action(detail=False, methods=['post'], url_path='bulk-create')
     def bulk_create(self, request):
@@ -94,54 +429,430 @@ class ReportViewSet(viewsets.ModelViewSet):
                 {"month": 1, "data": {"fte": 14, "revenue": 1000.50, ...}},
                 {"month": 2, "data": {...}},
                 ...
-            ]
+            ],
+            "mode": "replace",  # "diff" to write only changed months, "bulk" for one upsert
+            "org_unit_slug": "engineering",  # optional, defaults to the company unit
+            "benchmarks": {"gm_percent": "40-50%", ...}  # optional, the file's Benchmark column
         }
+        The months are written to a new batch of that unit (unsent months
+        carried over from the active one), which is then activated and the
+        consolidated totals above the unit re-summed. In diff mode nothing is
+        written if no value changed. The report type's checks run on the sent
+        months; violations are returned but do not block the upload.
         """
-        serializer = BulkReportCreateSerializer(data=request.data)
-        serializer.is_valid(raise_exception=True)
+        timer = StageTimer()
+        with timer.stage('read'):
+            payload = request.data
+        with timer.stage('parse'):
+            serializer = BulkReportCreateSerializer(data=payload)
+            serializer.is_valid(raise_exception=True)
 
         report_type_slug = serializer.validated_data['report_type_slug']
         year_value = serializer.validated_data['year']
         months_data = serializer.validated_data['months']
+        mode = serializer.validated_data['mode']
 
         # Get or create ReportType
         report_type = get_object_or_404(ReportType, slug=report_type_slug)
+        org_unit_slug = serializer.validated_data.get('org_unit_slug')
+        org_unit = get_object_or_404(OrgUnit, slug=org_unit_slug) if org_unit_slug else root_unit()
 
-        # Get or create Year
-        year_obj, _ = Year.objects.get_or_create(year=year_value)
+        with timer.stage('check'):
+            # On the data as sent, before derived fields are overwritten
+            violations = run_checks(report_type.checks, pd.DataFrame.from_dict(
+                {m['month']: m['data'] for m in months_data}, orient='index'
+            ))
 
-        created_reports = []
-        updated_reports = []
+        changes = None
 
-        for month_data in months_data:
-            month_number = month_data['month']
-            data = month_data['data']
+        try:
+            lock = import_lock(lock_key(Report, year_value, report_type.slug), timer=timer)
+            with timer.until_exit('commit'), lock:
+                with timer.stage('resolve_periods'):
+                    # Get or create Year and all Months in a couple of queries
+                    year_obj, months = get_or_create_months(
+                        year_value, [m['month'] for m in months_data]
+                    )
 
-            # Get or create Month
-            month_obj, _ = Month.objects.get_or_create(
-                year=year_obj,
-                month=month_number
-            )
+                with timer.stage('write'):
+                    new_data = apply_formulas(
+                        report_type.field_schema, {m['month']: m['data'] for m in months_data}
+                    )
+                    current = active_batch(report_type, year_obj, org_unit)
+                    stored = {}
+                    if current is not None:
+                        stored = dict(
+                            current.reports
+                            .filter(month__month__in=list(new_data))
+                            .values_list('month__month', 'data')
+                        )
+
+                    if mode == 'diff':
+                        changed = diff_report_data(new_data, stored)
+                        created_months = set(new_data) - set(stored)
+                        changes = summarize_changes(
+                            changed, created_months, label=lambda m: f"{year_value}-{m:02d}"
+                        )
+                        written = [m for m, row_changed in changed.any(axis=1).items() if row_changed]
+                    else:
+                        written = list(new_data)
+
+                    # Nothing changed: keep serving the current batch
+                    batch = current
+                    if written:
+                        batch = start_batch(
+                            report_type, year_obj, request.user, source='bulk_create',
+                            carry_from=current, skip_months=written, org_unit=org_unit
+                        )
+                        self._write_reports(
+                            batch, months, {m: new_data[m] for m in written},
+                            request.user, bulk=mode == 'bulk'
+                        )
+                        activate(batch, request.user, months=written)
 
-            # Create or update Report
-            report, created = Report.objects.update_or_create(
-                report_type=report_type,
-                year=year_obj,
-                month=month_obj,
-                defaults={
-                    'data': data,
-                    'uploaded_by': request.user
-                }
+                    if serializer.validated_data.get('benchmarks'):
+                        store_benchmarks(report_type, year_obj, serializer.validated_data['benchmarks'])
+
+                timer.start('commit')
+        except ImportLockTimeout as e:
+            timings = record_import(
+                'bulk_create', timer, request.user,
+                year=year_value, report_type=report_type_slug, mode=mode, error=e
+            )
+            return Response(
+                {"error": str(e), "timings": timings},
+                status=status.HTTP_409_CONFLICT
             )
 
-            if created:
-                created_reports.append(f"{year_value}-{month_number:02d}")
-            else:
-                updated_reports.append(f"{year_value}-{month_number:02d}")
+        timings = record_import(
+            'bulk_create', timer, request.user,
+            year=year_value, report_type=report_type_slug, mode=mode,
+            rows=len(months_data)
+        )
+
+        if changes is not None:
+            return Response({
+                "message": "Reports processed successfully",
+                "batch": batch.id,
+                "org_unit": org_unit.slug,
+                "created": changes['created'],
+                "updated": changes['updated'],
+                "unchanged": changes['unchanged'],
+                "changes": changes,
+                "total": len(months_data),
+                "violations": violations,
+                "timings": timings
+            }, status=status.HTTP_201_CREATED)
 
+        labels = {m: f"{year_value}-{m:02d}" for m in new_data}
         return Response({
             "message": "Reports processed successfully",
-            "created": created_reports,
-            "updated": updated_reports,
-            "total": len(months_data)
+            "batch": batch.id,
+            "org_unit": org_unit.slug,
+            "created": [label for m, label in labels.items() if m not in stored],
+            "updated": [label for m, label in labels.items() if m in stored],
+            "total": len(months_data),
+            "violations": violations,
+            "timings": timings
         }, status=status.HTTP_201_CREATED)
+
+    def _write_reports(self, batch, months, data_by_month, user, bulk=False):
+        """
+        Insert the given months into a new batch: one bulk insert, or with
+        bulk=True one set-based upsert (COPY + merge on PostgreSQL).
+        """
+        if bulk:
+            bulk_upsert(
+                Report,
+                [
+                    {
+                        'batch_id': batch.pk,
+                        'report_type_id': batch.report_type_id,
+                        'year_id': batch.year_id,
+                        'org_unit_id': batch.org_unit_id,
+                        'month_id': months[month_number].pk,
+                        'data': data,
+                        'uploaded_by_id': user.pk,
+                    }
+                    for month_number, data in data_by_month.items()
+                ],
+                conflict_fields=['batch_id', 'month_id'],
+                update_fields=['data', 'uploaded_by_id']
+            )
+            return
+
+        Report.objects.bulk_create([
+            Report(
+                batch=batch,
+                report_type_id=batch.report_type_id,
+                year_id=batch.year_id,
+                org_unit_id=batch.org_unit_id,
+                month=months[month_number],
+                data=data,
+                uploaded_by=user
+            )
+            for month_number, data in data_by_month.items()
+        ])
+
+
+class ReportBatchViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Versions of each report type's data per year and org unit.
+    Filter with ?report_type=<slug>&year=<year>&org_unit=<slug>. Activating a batch (or
+    rolling back to the previous one) is a single pointer update.
+    """
+    serializer_class = ReportBatchSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        queryset = (
+            ReportBatch.objects
+            .select_related('report_type', 'year', 'org_unit', 'created_by')
+            .annotate(
+                report_count=Count('reports'),
+                is_active=Exists(ActiveReportBatch.objects.filter(batch=OuterRef('pk')))
+            )
+            # Meta.ordering is not applied to aggregated querysets
+            .order_by('-created_at', '-id')
+        )
+
+        report_type_slug = self.request.query_params.get('report_type')
+        if report_type_slug:
+            queryset = queryset.filter(report_type__slug=report_type_slug)
+
+        year_value = self.request.query_params.get('year')
+        if year_value:
+            queryset = queryset.filter(year__year=year_value)
+
+        org_unit_slug = self.request.query_params.get('org_unit')
+        if org_unit_slug:
+            queryset = queryset.filter(org_unit__slug=org_unit_slug)
+
+        return queryset
+
+    @action(detail=True, methods=['post'])
+    def activate(self, request, pk=None):
+        """Make this batch the one readers see for its report type and year."""
+        batch = self.get_object()
+        return self._activate(batch, request.user)
+
+    @action(detail=False, methods=['post'])
+    def rollback(self, request):
+        """
+        Re-activate the batch that was active before the current one.
+        Expected payload: {"report_type_slug": "delivery", "year": 2024}
+        (plus "org_unit_slug" for a unit other than the company)
+        """
+        serializer = BatchRollbackSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        current = get_object_or_404(
+            ActiveReportBatch.objects.select_related('batch'),
+            report_type__slug=serializer.validated_data['report_type_slug'],
+            year__year=serializer.validated_data['year'],
+            org_unit__slug=serializer.validated_data.get('org_unit_slug', OrgUnit.ROOT_SLUG)
+        ).batch
+        if current.parent_id is None:
+            return Response(
+                {"error": "The active batch has no previous version"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        return self._activate(current.parent, request.user)
+
+    def _activate(self, batch, user):
+        key = lock_key(Report, batch.year.year, batch.report_type.slug)
+        try:
+            # Wait for a running import of this year instead of racing it
+            with import_lock(key):
+                activate(batch, user)
+        except ImportLockTimeout as e:
+            return Response({"error": str(e)}, status=status.HTTP_409_CONFLICT)
+
+        batch = self.get_queryset().get(pk=batch.pk)
+        return Response(self.get_serializer(batch).data)
+
+
+class OrgUnitViewSet(viewsets.ModelViewSet):
+    """
+    The organization tree (company, departments, teams).
+    Moving a unit (changing its parent) re-sums the consolidated totals of
+    its old and new ancestors.
+    """
+    queryset = OrgUnit.objects.all()
+    serializer_class = OrgUnitSerializer
+    permission_classes = [IsAuthenticated]
+    lookup_field = 'slug'
+
+    def perform_update(self, serializer):
+        old_parent_id = serializer.instance.parent_id
+        unit = serializer.save()
+        if unit.parent_id != old_parent_id:
+            refresh_subtree_move(unit, old_parent_id)
+
+    def destroy(self, request, *args, **kwargs):
+        """Only empty leaf units can be deleted"""
+        instance = self.get_object()
+        if instance.slug == OrgUnit.ROOT_SLUG or instance.children.exists() or instance.reports.exists():
+            return Response(
+                {"error": "Only leaf units without reports can be deleted"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return super().destroy(request, *args, **kwargs)
+
+    @action(detail=True, methods=['get'])
+    def consolidated(self, request, slug=None):
+        """
+        Precomputed totals of this unit and all of its descendants.
+        Query params:
+        - report_type: report type slug (required)
+        - from / to: period range as YYYY-MM (optional, inclusive)
+        """
+        unit = self.get_object()
+        report_type_slug = request.query_params.get('report_type')
+        if not report_type_slug:
+            return Response(
+                {"error": "report_type is required"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        queryset = (
+            ConsolidatedReport.objects
+            .filter(org_unit=unit, report_type__slug=report_type_slug)
+            .select_related('report_type', 'org_unit', 'year', 'month')
+        )
+        try:
+            start = _period(request.query_params.get('from'))
+            end = _period(request.query_params.get('to'))
+        except ValueError:
+            return Response(
+                {"error": "from/to must be YYYY-MM"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        queryset = queryset.filter(period_range_filter(start, end))
+
+        return Response(ConsolidatedReportSerializer(queryset, many=True).data)
+
+
+class BenchmarkViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Per-year metric targets, stored from the Benchmark column of imports.
+    Filter with ?report_type=<slug>&year=<year>.
+    """
+    serializer_class = BenchmarkSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        queryset = Benchmark.objects.select_related('report_type', 'year')
+        report_type = self.request.query_params.get('report_type')
+        if report_type:
+            queryset = queryset.filter(report_type__slug=report_type)
+        year = self.request.query_params.get('year')
+        if year:
+            queryset = queryset.filter(year__year=year)
+        return queryset
+
+    @action(detail=False, methods=['get'])
+    def deviations(self, request):
+        """
+        Each benchmarked metric's deviation from its benchmark over a period range.
+        Query params:
+        - report_type: report type slug (required)
+        - from / to: period range as YYYY-MM (optional, inclusive)
+        - org_unit: unit slug (default: company)
+        Returns {"periods": [...], "metrics": {metric: {"benchmark", "value",
+        "low", "high", "deviation", "status"}}} with one entry per period in
+        each list; status is "over", "under", "within" or null.
+        """
+        report_type = get_object_or_404(ReportType, slug=request.query_params.get('report_type'))
+        try:
+            start = _period(request.query_params.get('from'))
+            end = _period(request.query_params.get('to'))
+        except ValueError:
+            return Response(
+                {"error": "from/to must be YYYY-MM"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        org_unit_slug = request.query_params.get('org_unit')
+        org_unit = get_object_or_404(OrgUnit, slug=org_unit_slug) if org_unit_slug else root_unit()
+
+        reports = Report.objects.active().filter(report_type=report_type, org_unit=org_unit)
+        frame = period_frame(report_type, reports, start, end)
+        years = {int(period[:4]) for period in frame.index}
+        benchmarks = Benchmark.objects.filter(
+            report_type=report_type, year__year__in=years
+        ).select_related('year')
+
+        return Response({"periods": list(frame.index), "metrics": deviations(frame, benchmarks)})
+
+
+class AnalyticsViewSet(viewsets.ViewSet):
+    """Analyses across the metrics of several report types."""
+    permission_classes = [IsAuthenticated]
+
+    @action(detail=False, methods=['get'])
+    def correlations(self, request):
+        """
+        Correlation matrices between all numeric fields of the given report
+        types, at lags 0..max_lag, with the strongest leading relationships.
+        Query params:
+        - report_types: comma-separated slugs (default: delivery,financial)
+        - from / to: period range as YYYY-MM (optional, inclusive)
+        - org_unit: unit slug (default: company)
+        - max_lag: months (default 3, at most 12)
+        - min_periods: months two metrics need in common (default 6)
+        Returns {"periods", "metrics": ["delivery.utilization", ...], "lags",
+        "correlations": {"0": [[r or null, ...], ...], "1": ...}, "drivers":
+        [{"leader", "follower", "lag", "r", "months"}]}; row i, column j of
+        lag L correlates metric i at month t - L with metric j at month t.
+        """
+        slugs = request.query_params.get('report_types', 'delivery,financial')
+        slugs = [slug.strip() for slug in slugs.split(',') if slug.strip()]
+        report_types = list(ReportType.objects.filter(slug__in=slugs))
+        missing = set(slugs) - {t.slug for t in report_types}
+        if missing or not slugs:
+            return Response(
+                {"error": f"Unknown report type(s): {', '.join(sorted(missing)) or '(none given)'}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        report_types.sort(key=lambda t: slugs.index(t.slug))
+        try:
+            start = _period(request.query_params.get('from'))
+            end = _period(request.query_params.get('to'))
+            max_lag = int(request.query_params.get('max_lag', DEFAULT_MAX_LAG))
+            min_periods = int(request.query_params.get('min_periods', DEFAULT_MIN_PERIODS))
+            if not 0 <= max_lag <= MAX_LAG or min_periods < 2:
+                raise ValueError
+        except ValueError:
+            return Response(
+                {"error": f"from/to must be YYYY-MM, max_lag 0 to {MAX_LAG} and min_periods at least 2"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        org_unit_slug = request.query_params.get('org_unit')
+        org_unit = get_object_or_404(OrgUnit, slug=org_unit_slug) if org_unit_slug else root_unit()
+
+        try:
+            result = report_correlations(report_types, org_unit, start, end, max_lag, min_periods)
+        except FormulaError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(result)
+
+
+def _period(value):
+    """Parse 'YYYY-MM' into (year, month); None stays None."""
+    if not value:
+        return None
+    year, month = value.split('-')
+    year, month = int(year), int(month)
+    if not 1 <= month <= 12:
+        raise ValueError(value)
+    return year, month
+
+
+def _formulas(field_schema):
+    """The formula and persist flag of each derived field."""
+    return {
+        name: (schema.get('formula'), schema.get('persist'))
+        for name, schema in field_schema.items()
+        if isinstance(schema, dict) and schema.get('formula')
+    }
@@ -87,9 +87,60 @@ else:
         'default': {
             'ENGINE': 'django.db.backends.sqlite3',
             'NAME': BASE_DIR / 'db.sqlite3',
+            # Set to a file path to run the threaded import tests on SQLite
+            'TEST': {'NAME': config('DB_TEST_NAME', default=None)},
         }
     }
 
+# Caches
+# The result cache of report queries and dashboards (utils.result_cache) uses
+# the 'results' cache. RESULT_CACHE_BACKEND is 'locmem' (per process, least
+# recently used entries evicted beyond RESULT_CACHE_MAX_ENTRIES entries or
+# RESULT_CACHE_MAX_BYTES bytes), 'file' (RESULT_CACHE_DIR), or the dotted path
+# of any Django cache backend with RESULT_CACHE_LOCATION.
+RESULT_CACHE_BACKEND = config('RESULT_CACHE_BACKEND', default='locmem')
+RESULT_CACHE_TIMEOUT = config('RESULT_CACHE_TIMEOUT', default=24 * 60 * 60, cast=int)
+
+if RESULT_CACHE_BACKEND == 'locmem':
+    RESULT_CACHE = {
+        'BACKEND': 'utils.result_cache.SizedLocMemCache',
+        'LOCATION': 'results',
+        'OPTIONS': {
+            'MAX_ENTRIES': config('RESULT_CACHE_MAX_ENTRIES', default=2000, cast=int),
+            'MAX_BYTES': config('RESULT_CACHE_MAX_BYTES', default=64 * 1024 * 1024, cast=int),
+        },
+    }
+elif RESULT_CACHE_BACKEND == 'file':
+    RESULT_CACHE = {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': config('RESULT_CACHE_DIR', default=str(BASE_DIR / 'cache' / 'results')),
+    }
+else:
+    RESULT_CACHE = {
+        'BACKEND': RESULT_CACHE_BACKEND,
+        'LOCATION': config('RESULT_CACHE_LOCATION', default=''),
+    }
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'results': RESULT_CACHE,
+}
+
+# Concurrent misses of one cached result are computed once per process
+# (utils.single_flight). 'file' (flock() in SINGLE_FLIGHT_LOCK_DIR) or
+# 'database' (PostgreSQL advisory locks) also coalesce them across worker
+# processes sharing a file or network result cache.
+SINGLE_FLIGHT = config('SINGLE_FLIGHT', default='process')
+SINGLE_FLIGHT_LOCK_DIR = config('SINGLE_FLIGHT_LOCK_DIR', default=str(BASE_DIR / 'cache' / 'locks'))
+# Seconds a request waits for another to compute a result before computing it itself
+SINGLE_FLIGHT_TIMEOUT = config('SINGLE_FLIGHT_TIMEOUT', default=30, cast=int)
+
+# Re-render the dashboards and chart series an import expired on a
+# background thread (apps.core.dashboard) instead of in the request
+DASHBOARD_WARM_ASYNC = config('DASHBOARD_WARM_ASYNC', default=True, cast=bool)
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 AUTH_PASSWORD_VALIDATORS = [
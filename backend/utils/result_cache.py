@@ -0,0 +1,211 @@
+"""
+Server-side cache of query results, invalidated by tag.
+
+A result is stored under its namespace (the query it answers), its
+normalized query parameters and the current version of each of its tags:
+the slices of data it was computed from, e.g. the reports of one report
+type and year. Invalidating a tag bumps its version, so every result that
+read the slice is missed from then on while results of other slices stay
+cached. Stale entries are never read again and age out of the backend.
+
+Results live in the Django cache named 'results' (settings.CACHES), which is
+configured by RESULT_CACHE_BACKEND: an in-memory cache evicting the least
+recently used entries beyond a count and size limit (SizedLocMemCache), a
+file-based cache, or any other Django cache backend. Concurrent misses of
+one result compute it once (utils.single_flight). Hits, misses and shared
+results are counted per namespace in each process.
+"""
+import hashlib
+import threading
+import time
+from collections import Counter
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+
+from .single_flight import load
+
+# How lookups were answered (see utils.single_flight.load)
+COUNTS = ('hit', 'miss', 'shared')
+
+# Pickled size of each entry of each SizedLocMemCache, by cache name
+_sizes = {}
+
+
+class SizedLocMemCache(LocMemCache):
+    """
+    LocMemCache that also bounds the total pickled size of its entries
+    (OPTIONS['MAX_BYTES']); like MAX_ENTRIES, the least recently used
+    entries are evicted first. An entry larger than the limit is not kept.
+    """
+
+    def __init__(self, name, params):
+        super().__init__(name, params)
+        self._max_bytes = int(params.get('OPTIONS', {}).get('MAX_BYTES') or 0)
+        self._sizes = _sizes.setdefault(name, {})
+
+    def _set(self, key, value, timeout=DEFAULT_TIMEOUT):
+        super()._set(key, value, timeout)
+        self._sizes[key] = len(value)
+        if self._max_bytes:
+            total = sum(self._sizes.values())
+            while total > self._max_bytes and self._cache:
+                oldest, _ = self._cache.popitem()
+                del self._expire_info[oldest]
+                total -= self._sizes.pop(oldest, 0)
+
+    def _cull(self):
+        super()._cull()
+        for key in set(self._sizes) - set(self._cache):
+            del self._sizes[key]
+
+    def _delete(self, key):
+        self._sizes.pop(key, None)
+        return super()._delete(key)
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+            self._expire_info.clear()
+            self._sizes.clear()
+
+
+def normalize(params):
+    """
+    Query parameters (a QueryDict or dict) as a canonical string: keys
+    sorted, blank values dropped, so equivalent queries share a result.
+    """
+    items = params.lists() if hasattr(params, 'lists') else (
+        (key, value if isinstance(value, (list, tuple)) else [value]) for key, value in params.items()
+    )
+    pairs = []
+    for key, values in items:
+        values = [str(value).strip() for value in values if value is not None and str(value).strip()]
+        pairs.extend((key, value) for value in values)
+    return urlencode(sorted(pairs))
+
+
+class ResultCache:
+    """Results of namespaced queries, tagged by the data they read."""
+
+    def __init__(self, alias='results', timeout=None):
+        self.alias = alias
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._counts = {how: Counter() for how in COUNTS}
+
+    @property
+    def backend(self):
+        return caches[self.alias]
+
+    def _default_timeout(self):
+        return self.timeout if self.timeout is not None else getattr(settings, 'RESULT_CACHE_TIMEOUT', 24 * 60 * 60)
+
+    def versions(self, tags):
+        """
+        Current version of each tag. A missing version starts at the current
+        time in milliseconds, so a version lost to eviction never matches
+        results cached under an earlier one.
+        """
+        keys = {tag: f'tag:{tag}' for tag in tags}
+        found = self.backend.get_many(list(keys.values()))
+        versions = {}
+        for tag, key in keys.items():
+            if key not in found:
+                self.backend.add(key, time.time_ns() // 1_000_000, None)
+                found[key] = self.backend.get(key)
+            versions[tag] = found[key]
+        return versions
+
+    def key(self, namespace, params, tags):
+        """Backend key of the result of `namespace` for `params` under the current versions of `tags`."""
+        versions = self.versions(sorted(set(tags)))
+        digest = hashlib.md5(
+            '|'.join([normalize(params), *(f'{tag}={version}' for tag, version in versions.items())]).encode()
+        ).hexdigest()
+        return f'result:{namespace}:{digest}'
+
+    def get_or_set(self, namespace, params, tags, compute, timeout=None):
+        """
+        The cached result of `namespace` for `params`, or compute() stored
+        under `tags`. Concurrent misses of one result compute it once (see
+        utils.single_flight).
+        """
+        result, how = load(
+            self.backend, self.key(namespace, params, tags), compute,
+            timeout if timeout is not None else self._default_timeout()
+        )
+        with self._lock:
+            self._counts[how][namespace] += 1
+        return result
+
+    def set(self, namespace, params, tags, result, timeout=None):
+        """Store `result` as the result of `namespace` for `params`, e.g. to warm it."""
+        self.backend.set(
+            self.key(namespace, params, tags), result,
+            timeout if timeout is not None else self._default_timeout()
+        )
+
+    def invalidate(self, *tags):
+        """
+        Expire every result read from any of `tags`. Inside a transaction the
+        tags are bumped again once it commits, so a result computed by
+        another connection from the data as it was before the commit does
+        not outlive it.
+        """
+        self.bump(*tags)
+        if transaction.get_connection().in_atomic_block:
+            transaction.on_commit(lambda: self.bump(*tags), robust=True)
+
+    def bump(self, *tags):
+        """Expire every result read from any of `tags` now, e.g. once the data has committed."""
+        self.versions(tags)
+        for tag in tags:
+            try:
+                self.backend.incr(f'tag:{tag}')
+            except ValueError:
+                # Evicted since it was read: the next read starts a new one
+                pass
+
+    def stats(self):
+        """
+        Lookups of this process, in total and per namespace: hits, misses
+        (computed), and shared (computed once for several concurrent misses).
+        """
+        with self._lock:
+            counts = {how: Counter(counter) for how, counter in self._counts.items()}
+        namespaces = sorted(set().union(*counts.values()))
+        backend = type(self.backend)
+        return {
+            'backend': f'{backend.__module__}.{backend.__qualname__}',
+            **_rates({how: sum(counter.values()) for how, counter in counts.items()}),
+            'namespaces': {
+                namespace: _rates({how: counter[namespace] for how, counter in counts.items()})
+                for namespace in namespaces
+            },
+        }
+
+    def clear(self):
+        """Drop every cached result and tag version and reset the counters."""
+        self.backend.clear()
+        with self._lock:
+            for counter in self._counts.values():
+                counter.clear()
+
+
+def _rates(counts):
+    lookups = sum(counts.values())
+    computed = counts['miss']
+    return {
+        'hits': counts['hit'],
+        'misses': computed,
+        'shared': counts['shared'],
+        'hit_rate': round(1 - computed / lookups, 4) if lookups else None,
+    }
+
+
+results = ResultCache()
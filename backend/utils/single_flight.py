@@ -0,0 +1,167 @@
+"""
+Single-flight loading of cached results.
+
+When a result expires under load, e.g. right after an import, every reader
+misses at once. load() lets the first of them compute it while the other
+threads of the process asking for the same key wait and share its result.
+
+With SINGLE_FLIGHT set to 'file' or 'database', the computing thread also
+holds a lock across worker processes and looks in the cache again once it
+has it, so a worker that waited for another finds the result there instead
+of computing it again. That needs a cache shared by the workers (a file or
+network cache, not locmem). 'file' uses flock() on files in
+SINGLE_FLIGHT_LOCK_DIR; 'database' uses PostgreSQL advisory locks and is
+in-process only on other databases. Keys are spread over LOCK_STRIPES locks,
+so the number of lock files stays bounded.
+
+Waiting never fails a read: after SINGLE_FLIGHT_TIMEOUT seconds, or when the
+computing thread failed, a waiter computes the result itself.
+"""
+import fcntl
+import hashlib
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connection, transaction
+
+LOCK_STRIPES = 256
+POLL_INTERVAL = 0.05
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.ok = False
+        self.result = None
+
+
+class SingleFlight:
+    """Concurrent calls for one key within a process run once and share the result."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn, timeout):
+        """
+        fn(), or the result of the call of fn() for `key` already running in
+        another thread. Returns (result, shared).
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        if not leader:
+            if call.done.wait(timeout) and call.ok:
+                return call.result, True
+            return fn(), False
+        try:
+            call.result = fn()
+            call.ok = True
+            return call.result, False
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+
+flights = SingleFlight()
+
+
+def _timeout():
+    return settings.SINGLE_FLIGHT_TIMEOUT
+
+
+def _stripe(key):
+    digest = hashlib.blake2b(key.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, 'big') % LOCK_STRIPES
+
+
+@contextmanager
+def worker_lock(key, timeout):
+    """
+    Hold the cross-process lock of `key` for the block, as SINGLE_FLIGHT
+    configures; yields whether it was acquired within `timeout` seconds.
+    """
+    if settings.SINGLE_FLIGHT == 'file':
+        with _file_lock(key, timeout) as acquired:
+            yield acquired
+    elif settings.SINGLE_FLIGHT == 'database' and connection.vendor == 'postgresql':
+        with _advisory_lock(key, timeout) as acquired:
+            yield acquired
+    else:
+        yield True
+
+
+@contextmanager
+def _file_lock(key, timeout):
+    directory = settings.SINGLE_FLIGHT_LOCK_DIR
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, f'{_stripe(key)}.lock'), 'a') as handle:
+        acquired = _poll(lambda: _try_flock(handle), timeout)
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+
+
+def _try_flock(handle):
+    try:
+        fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return True
+    except BlockingIOError:
+        return False
+
+
+@contextmanager
+def _advisory_lock(key, timeout):
+    # Transaction-level, so a failed computation cannot leave it held; in a
+    # key space of their own: (class id, stripe)
+    lock = [0x5F11, _stripe(key)]
+
+    def try_lock():
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_try_advisory_xact_lock(%s, %s)', lock)
+            return cursor.fetchone()[0]
+
+    with transaction.atomic():
+        yield _poll(try_lock, timeout)
+
+
+def _poll(try_acquire, timeout):
+    deadline = time.monotonic() + timeout
+    while not try_acquire():
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(POLL_INTERVAL)
+    return True
+
+
+def load(cache, key, compute, timeout):
+    """
+    cache.get(key), or compute() stored under `key` for `timeout` seconds,
+    computed once for all the callers that miss it together.
+    Returns (result, how): how is 'hit', 'miss', or 'shared' for a result
+    another thread of the process computed while this one waited.
+    """
+    result = cache.get(key)
+    if result is not None:
+        return result, 'hit'
+
+    def fill():
+        with worker_lock(key, _timeout()):
+            # Another worker may have stored it while this one waited
+            found = cache.get(key)
+            if found is not None:
+                return found, 'hit'
+            value = compute()
+            cache.set(key, value, timeout)
+            return value, 'miss'
+
+    (result, how), shared = flights.do(key, fill, _timeout())
+    return result, 'shared' if shared else how
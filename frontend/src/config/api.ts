@@ -24,6 +24,13 @@ export const API_ENDPOINTS = {
   // Dashboard
   DASHBOARD: (year: number, month: number) => `/dashboard/${year}/${month}/`,
 
+  // Several GET requests in one round trip
+  BATCH: '/batch/',
+
+  // Server-sent data-change events
+  EVENTS: '/events/',
+  EVENTS_TICKET: '/events/ticket/',
+
   // Base endpoint for generic API calls
   BASE: '',
 };
@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import {
   Box,
   Typography,
@@ -28,6 +28,9 @@ import {
   Legend,
   ResponsiveContainer,
 } from 'recharts';
+import { API_ENDPOINTS } from '../config/api';
+import { batchService } from '../services/batch.service';
+import { eventsService } from '../services/events.service';
 import { reportsService, Report, ReportType } from '../services/reports.service';
 
 type GroupingMode = 'month' | 'quarter' | 'half-year' | 'year';
@@ -77,9 +80,35 @@ export const DashboardPage: React.FC = () => {
     { value: 12, label: 'December' },
   ];
 
+  const reportTypesRef = useRef<ReportType[]>([]);
+
+  useEffect(() => {
+    loadData();
+  }, []);
+
   useEffect(() => {
-    loadReportTypes();
-    loadReports();
+    reportTypesRef.current = reportTypes;
+  }, [reportTypes]);
+
+  useEffect(() => {
+    // Re-fetch only the report type and year a committed change touched
+    return eventsService.subscribe(async (change) => {
+      if (!change.report_type) return;
+      const reportType = reportTypesRef.current.find(rt => rt.slug === change.report_type);
+      if (!reportType) {
+        loadData();
+        return;
+      }
+      try {
+        const fresh = await reportsService.getReports({ report_type: change.report_type, year: change.year });
+        setReports(current => [
+          ...current.filter(r => !(r.report_type === reportType.id && r.year_value === change.year)),
+          ...fresh,
+        ]);
+      } catch (err) {
+        console.error('Failed to refresh reports:', err);
+      }
+    }, loadData);
   }, []);
 
   useEffect(() => {
@@ -91,20 +120,24 @@ export const DashboardPage: React.FC = () => {
     initializeMetrics();
   }, [reports, reportTypes]);
 
-  const loadReportTypes = async () => {
-    try {
-      const types = await reportsService.getReportTypes();
-      setReportTypes(types);
-    } catch (err) {
-      console.error('Failed to load report types:', err);
-    }
-  };
-
-  const loadReports = async () => {
+  const loadData = async () => {
     setLoading(true);
     setError('');
     try {
-      const allReports = await reportsService.getReports({});
+      // Report types and reports in one round trip
+      const { types, reports: reportsResult } = await batchService.run({
+        types: { path: API_ENDPOINTS.REPORT_TYPES },
+        reports: { path: API_ENDPOINTS.REPORTS },
+      });
+      if (types.status === 200) {
+        setReportTypes(types.body.results || []);
+      } else {
+        console.error('Failed to load report types:', types.body);
+      }
+      if (reportsResult.status !== 200) {
+        throw new Error(reportsResult.body?.detail || 'Failed to load reports');
+      }
+      const allReports = reportsResult.body.results || reportsResult.body;
       setReports(Array.isArray(allReports) ? allReports : []);
     } catch (err: any) {
       const errorMsg = err.response?.data?.detail || err.message || 'Failed to load reports';
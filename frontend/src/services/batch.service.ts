@@ -0,0 +1,30 @@
+import api from './api';
+import { API_ENDPOINTS } from '../config/api';
+
+export interface BatchRequest {
+  path: string; // Relative to the API root, e.g. API_ENDPOINTS.REPORTS
+  params?: Record<string, string | number | boolean | Array<string | number>>;
+}
+
+export interface BatchResult<T = any> {
+  status: number;
+  body: T;
+}
+
+export const batchService = {
+  // Several GET requests answered in one round trip, keyed like `requests`
+  run: async <K extends string>(
+    requests: Record<K, BatchRequest>
+  ): Promise<Record<K, BatchResult>> => {
+    const apiRequests = Object.fromEntries(
+      Object.entries(requests as Record<string, BatchRequest>).map(([key, request]) => [
+        key,
+        { ...request, path: `/api${request.path}` },
+      ])
+    );
+    const response = await api.post<Record<K, BatchResult>>(API_ENDPOINTS.BATCH, {
+      requests: apiRequests,
+    });
+    return response.data;
+  },
+};
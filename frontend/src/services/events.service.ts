@@ -0,0 +1,70 @@
+import api from './api';
+import { API_BASE_URL, API_ENDPOINTS } from '../config/api';
+
+export interface DataChange {
+  source: 'reports' | 'snapshots';
+  report_type: string | null; // null for snapshot (dashboard) changes
+  year: number;
+  version: number | null;
+}
+
+export const eventsService = {
+  // Calls onChange for every data change committed on the server, and onReset when
+  // changes were missed; returns the function that unsubscribes
+  subscribe: (onChange: (change: DataChange) => void, onReset?: () => void): (() => void) => {
+    let source: EventSource | null = null;
+    let retry: ReturnType<typeof setTimeout> | undefined;
+    let lastEventId = '';
+    let closed = false;
+
+    const connect = (ticket: string) => {
+      // EventSource cannot send headers, so a short-lived ticket goes in the
+      // query instead of the access token
+      const params = new URLSearchParams({ ticket });
+      if (lastEventId) {
+        params.set('last_event_id', lastEventId);
+      }
+      source = new EventSource(`${API_BASE_URL}${API_ENDPOINTS.EVENTS}?${params}`);
+      source.addEventListener('change', (event) => {
+        const message = event as MessageEvent;
+        lastEventId = message.lastEventId;
+        onChange(JSON.parse(message.data));
+      });
+      source.addEventListener('reset', (event) => {
+        lastEventId = (event as MessageEvent).lastEventId;
+        onReset?.();
+      });
+      source.onerror = () => {
+        // The browser reconnects by itself unless the stream was refused,
+        // e.g. once the ticket expired
+        if (source?.readyState === EventSource.CLOSED && !closed) {
+          retry = setTimeout(open, 5000);
+        }
+      };
+    };
+
+    const open = async () => {
+      // Requested through api, which refreshes an expired access token (or
+      // sends the user to the login page)
+      try {
+        const response = await api.post<{ ticket: string }>(API_ENDPOINTS.EVENTS_TICKET);
+        if (!closed) {
+          connect(response.data.ticket);
+        }
+      } catch (error) {
+        // Offline: retried
+        console.error('Error opening the event stream:', error);
+        if (!closed) {
+          retry = setTimeout(open, 5000);
+        }
+      }
+    };
+
+    open();
+    return () => {
+      closed = true;
+      clearTimeout(retry);
+      source?.close();
+    };
+  },
+};